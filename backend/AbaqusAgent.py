@@ -1,14 +1,28 @@
 import subprocess
 import os
+import json
+import tempfile
+import time
+import numpy as np
 from backend.agents import SolverAgent, ExecutionResult
+from backend import metrics, odb_results
 import configparser
 
+# Failed environment checks are retried after this many seconds; successful
+# checks are cached for the lifetime of the process.
+SELF_CHECK_FAILURE_TTL = 60
+
+
 class AbaqusAgent(SolverAgent):
-    def __init__(self):
+    # Shared across instances, keyed by executable path: (result, timestamp)
+    _self_check_cache = {}
+
+    def __init__(self, abaqus_path: str = None, license_server: str = None):
         self.config = configparser.ConfigParser()
         self.config.read('backend/config.ini')
-        self.abaqus_path = self.config['ABAQUS']['executable_path']
-        self.license_server = self.config['ABAQUS']['license_server']
+        abaqus_config = self.config['ABAQUS'] if self.config.has_section('ABAQUS') else {}
+        self.abaqus_path = abaqus_path or abaqus_config.get('executable_path', '')
+        self.license_server = license_server or abaqus_config.get('license_server', '')
 
     def run(self, script_path: str, params: dict) -> ExecutionResult:
         """
@@ -20,7 +34,7 @@ class AbaqusAgent(SolverAgent):
 
         try:
             # Construct the command to run Abaqus
-            command = [self.abaqus_path, "cae", "noGUI=" + script_path]
+            command = self.build_command(script_path)
 
             # Add parameters to the command if needed, Abaqus scripts can take arguments
             # For simplicity, we assume the script reads a parameter file or uses environment variables
@@ -31,20 +45,48 @@ class AbaqusAgent(SolverAgent):
             if process.returncode != 0:
                 return ExecutionResult(success=False, output=stdout, error=stderr)
 
-            # After the analysis, we need to parse the results.
-            # This is a placeholder for the result parsing logic.
-            odb_path = os.path.splitext(script_path)[0] + ".odb"
-            if os.path.exists(odb_path):
-                results = self.parse_odb(odb_path)
-                return ExecutionResult(success=True, output=results, error="")
-            else:
-                return ExecutionResult(success=True, output="Analysis completed, but no ODB file found.", error="")
+            return self.collect_results(script_path, params.get("output_requests"))
 
         except Exception as e:
             return ExecutionResult(success=False, output="", error=str(e))
 
-    def self_check(self):
-        """Checks if the Abaqus executable path is valid."""
+    def build_command(self, script_path: str) -> list:
+        """Returns the command line that runs the given script in Abaqus/CAE without a GUI."""
+        return [self.abaqus_path, "cae", "noGUI=" + script_path]
+
+    def collect_results(self, script_path: str, output_requests: list = None) -> ExecutionResult:
+        """
+        Builds the result of a finished analysis from the ODB next to the script, if any.
+        The extracted arrays go in `data`; `output` only holds a short text summary of them.
+        """
+        odb_path = os.path.splitext(script_path)[0] + ".odb"
+        if not os.path.exists(odb_path):
+            return ExecutionResult(success=True, output="Analysis completed, but no ODB file found.", error="")
+        try:
+            results = self.parse_odb(odb_path, output_requests)
+        except Exception as e:
+            return ExecutionResult(success=False, output="", error=f"Failed to extract results from {odb_path}: {e}")
+        return ExecutionResult(success=True, output=odb_results.summarize_results(results), error="", data=results)
+
+    def self_check(self, refresh: bool = False):
+        """
+        Checks if the Abaqus executable path is valid.
+        The result is cached per executable so that jobs do not pay for a
+        version query each time; pass refresh=True to force a new check.
+        """
+        cached = self._self_check_cache.get(self.abaqus_path)
+        if cached and not refresh:
+            result, checked_at = cached
+            if result[0] or time.monotonic() - checked_at < SELF_CHECK_FAILURE_TTL:
+                metrics.CACHE_REQUESTS.inc(cache="abaqus_self_check", result="hit")
+                return result
+        metrics.CACHE_REQUESTS.inc(cache="abaqus_self_check", result="miss")
+
+        result = self._run_self_check()
+        self._self_check_cache[self.abaqus_path] = (result, time.monotonic())
+        return result
+
+    def _run_self_check(self):
         if not self.abaqus_path or not os.path.exists(self.abaqus_path):
             return False, "Abaqus executable path not configured or not found in config.ini"
 
@@ -59,16 +101,32 @@ class AbaqusAgent(SolverAgent):
         except FileNotFoundError:
             return False, f"Abaqus executable not found at: {self.abaqus_path}"
         except subprocess.TimeoutExpired:
+            process.kill()
             return False, "Abaqus command timed out."
         except Exception as e:
             return False, f"An error occurred while checking Abaqus: {e}"
 
 
-    def parse_odb(self, odb_path: str) -> str:
+    def parse_odb(self, odb_path: str, output_requests: list = None) -> dict:
         """
-        Parses the .odb file to extract results.
-        This requires a separate Python script that uses the Abaqus Python API.
+        Extracts the requested field/history outputs from the .odb file.
+        The ODB is streamed frame by frame by odb_results.py running under
+        `abaqus python`, which writes the reduced arrays to an .npz file.
         """
-        # This is a placeholder. In a real implementation, this would
-        # call a separate script to parse the .odb file.
-        return f"Results from {odb_path}"
+        output_requests = output_requests or odb_results.DEFAULT_OUTPUT_REQUESTS
+        # Validate the requests here rather than inside the Abaqus process
+        for request in output_requests:
+            odb_results.OutputRequest.from_dict(request)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            requests_path = os.path.join(temp_dir, "requests.json")
+            output_path = os.path.join(temp_dir, "results.npz")
+            with open(requests_path, "w") as f:
+                json.dump(output_requests, f)
+
+            command = [self.abaqus_path, "python", odb_results.__file__, odb_path, requests_path, output_path]
+            completed = subprocess.run(command, capture_output=True, text=True, cwd=temp_dir)
+            if completed.returncode != 0 or not os.path.exists(output_path):
+                raise RuntimeError(completed.stderr.strip() or "ODB extraction produced no output.")
+            with np.load(output_path) as npz:
+                return {name: npz[name] for name in npz.files}
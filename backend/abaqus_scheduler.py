@@ -0,0 +1,216 @@
+import asyncio
+import itertools
+import json
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.agents import ExecutionResult
+from backend.AbaqusAgent import AbaqusAgent
+
+# A data row of an Abaqus/Standard .sta file:
+# STEP INC ATT SEVERE EQUIL TOTAL  TOTAL_TIME STEP_TIME INC_OF_TIME ...
+STA_ROW_PATTERN = re.compile(r"^\s*(\d+)\s+(\d+)U?\s+(\d+)U?\s+\d+\s+\d+\s+\d+\s+([-+\d.Ee]+)\s+([-+\d.Ee]+)\s+([-+\d.Ee]+)")
+
+
+def license_tokens_for_cpus(cpus: int) -> int:
+    """Number of Abaqus analysis tokens checked out by a job using the given number of cores."""
+    return int(5 * max(cpus, 1) ** 0.422)
+
+
+class AbaqusJob:
+    """
+    State of a single queued or running Abaqus analysis.
+    """
+    def __init__(self, job_id: str, script_path: str, params: Dict[str, Any], work_dir: str):
+        self.job_id = job_id
+        self.script_path = script_path
+        self.params = params
+        self.work_dir = work_dir
+        # Abaqus names its output files after the script, e.g. beam.sta for beam.py
+        self.job_name = os.path.splitext(os.path.basename(script_path))[0]
+        self.status = "queued"
+        self.progress: Dict[str, Any] = {}
+        self.log: List[str] = []
+        self.result: Optional[ExecutionResult] = None
+        self._task: Optional[asyncio.Task] = None
+        self._process = None
+        self._offsets: Dict[str, int] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "script_path": self.script_path,
+            "status": self.status,
+            "progress": self.progress,
+            "log_tail": self.log[-20:],
+        }
+
+
+class AbaqusJobScheduler:
+    """
+    Queues Abaqus analyses and runs them asynchronously, with the number of
+    concurrent jobs capped by the license tokens and CPUs available.
+    """
+    def __init__(
+        self,
+        agent: AbaqusAgent = None,
+        license_tokens: int = 5,
+        cpus: int = os.cpu_count() or 1,
+        cpus_per_job: int = 1,
+        max_concurrent_jobs: int = 0,
+        poll_interval: float = 0.5,
+        progress_callback: Callable[[AbaqusJob], None] = None,
+    ):
+        self.agent = agent or AbaqusAgent()
+        self.cpus_per_job = max(cpus_per_job, 1)
+        self.tokens_per_job = license_tokens_for_cpus(self.cpus_per_job)
+        self.capacity = max(1, min(license_tokens // self.tokens_per_job, cpus // self.cpus_per_job))
+        if max_concurrent_jobs > 0:
+            self.capacity = min(self.capacity, max_concurrent_jobs)
+        self.poll_interval = poll_interval
+        self.progress_callback = progress_callback
+        self.jobs: Dict[str, AbaqusJob] = {}
+        self._slots = None
+        self._ids = itertools.count(1)
+
+    @classmethod
+    def from_config(cls, agent: AbaqusAgent = None, **kwargs) -> "AbaqusJobScheduler":
+        """Creates a scheduler sized from the [ABAQUS] section of config.ini."""
+        agent = agent or AbaqusAgent()
+        section = agent.config['ABAQUS'] if agent.config.has_section('ABAQUS') else {}
+        settings = {
+            "license_tokens": int(section.get('license_tokens', 5)),
+            "cpus": int(section.get('cpus', 0)) or os.cpu_count() or 1,
+            "cpus_per_job": int(section.get('cpus_per_job', 1)),
+            "max_concurrent_jobs": int(section.get('max_concurrent_jobs', 0)),
+        }
+        settings.update(kwargs)
+        return cls(agent=agent, **settings)
+
+    async def submit(self, script_path: str, params: Dict[str, Any] = None, work_dir: str = None) -> AbaqusJob:
+        """
+        Queues an analysis and returns immediately. The job runs once a
+        license/CPU slot is free; use wait() to get its ExecutionResult.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.capacity)
+        job_id = f"abaqus-{next(self._ids)}"
+        script_path = os.path.abspath(script_path)
+        job = AbaqusJob(job_id, script_path, params or {}, work_dir or os.path.dirname(script_path))
+        self.jobs[job_id] = job
+        job._task = asyncio.create_task(self._run_job(job))
+        return job
+
+    async def wait(self, job_id: str) -> ExecutionResult:
+        job = self.jobs[job_id]
+        try:
+            await asyncio.shield(job._task)
+        except asyncio.CancelledError:
+            if job.result is None:
+                raise
+        return job.result
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels a queued or running job. Returns False if it had already finished."""
+        job = self.jobs.get(job_id)
+        if job is None or job._task is None or job._task.done():
+            return False
+        job._task.cancel()
+        return True
+
+    def get_job(self, job_id: str) -> Optional[AbaqusJob]:
+        return self.jobs.get(job_id)
+
+    async def _run_job(self, job: AbaqusJob):
+        try:
+            async with self._slots:
+                ok, message = await asyncio.to_thread(self.agent.self_check)
+                if not ok:
+                    job.status = "failed"
+                    job.result = ExecutionResult(success=False, output="", error=f"Abaqus environment check failed: {message}")
+                    return
+                job.status = "running"
+                job.result = await self._execute(job)
+                job.status = "completed" if job.result.success else "failed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            job.result = ExecutionResult(success=False, output="", error="Abaqus job was cancelled.")
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.result = ExecutionResult(success=False, output="", error=str(e))
+
+    async def _execute(self, job: AbaqusJob) -> ExecutionResult:
+        os.makedirs(job.work_dir, exist_ok=True)
+        if job.params:
+            # The analysis script reads its parameters from params.json in its working directory
+            with open(os.path.join(job.work_dir, "params.json"), "w") as f:
+                json.dump(job.params, f)
+
+        command = self.agent.build_command(job.script_path)
+        job._process = await asyncio.create_subprocess_exec(
+            *command,
+            cwd=job.work_dir,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        communicate = asyncio.create_task(job._process.communicate())
+        try:
+            while not communicate.done():
+                await asyncio.wait({communicate}, timeout=self.poll_interval)
+                self._tail_progress(job)
+            stdout, stderr = communicate.result()
+        except asyncio.CancelledError:
+            await self._terminate(job._process)
+            communicate.cancel()
+            raise
+
+        output = stdout.decode(errors="replace")
+        error = stderr.decode(errors="replace")
+        if job._process.returncode != 0:
+            return ExecutionResult(success=False, output=output, error=error)
+        return await asyncio.to_thread(self.agent.collect_results, job.script_path, job.params.get("output_requests"))
+
+    async def _terminate(self, process):
+        if process.returncode is not None:
+            return
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), timeout=10)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+    def _tail_progress(self, job: AbaqusJob):
+        """
+        Reads lines appended to the job's .sta/.msg files since the last poll;
+        other jobs' files in a shared work directory are left alone.
+        """
+        updated = False
+        for path in (os.path.join(job.work_dir, job.job_name + extension) for extension in (".sta", ".msg")):
+            offset = job._offsets.get(path, 0)
+            try:
+                with open(path, "r", errors="replace") as f:
+                    f.seek(offset)
+                    chunk = f.read()
+                    # Only consume complete lines; a partial line is re-read next poll
+                    consumed = chunk.rfind("\n") + 1
+                    job._offsets[path] = offset + consumed
+            except OSError:
+                continue
+            for line in chunk[:consumed].splitlines():
+                job.log.append(line)
+                updated = True
+                match = STA_ROW_PATTERN.match(line) if path.endswith(".sta") else None
+                if match:
+                    job.progress = {
+                        "step": int(match.group(1)),
+                        "increment": int(match.group(2)),
+                        "total_time": float(match.group(4)),
+                        "step_time": float(match.group(5)),
+                    }
+                elif "COMPLETED" in line or "HAS NOT BEEN COMPLETED" in line:
+                    job.progress["message"] = line.strip()
+        if updated and self.progress_callback:
+            self.progress_callback(job)
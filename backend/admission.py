@@ -0,0 +1,258 @@
+"""
+Admission control and priority scheduling.
+
+Every request is put in a priority class by its route: "interactive"
+(cheap calls the UI waits on), "standard" (single workflow steps) or
+"batch" (optimization runs, whole workflows, bulk uploads). The request
+limiter caps the requests handled at once, in all and per class, so batch
+work cannot take every slot; requests over a limit wait in a bounded queue
+per class and are rejected with Overloaded (SERVER_OVERLOADED, HTTP 503)
+when the queue is full or they have waited too long.
+
+Inside a request, LLM calls, sandbox runs and embedding work take a slot
+of the limiter of that resource, again with a limit per class. The class
+travels with the request in a context variable, so code deep in a
+workflow does not need to be told. Whenever a slot frees, waiting work of
+the highest class gets it first.
+"""
+import asyncio
+import configparser
+import contextvars
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Deque, Dict, Optional
+
+from . import metrics
+
+PRIORITIES = ("interactive", "standard", "batch")
+DEFAULT_PRIORITY = "standard"
+RESOURCES = ("llm", "sandbox", "embedding")
+
+# Route (or route prefix) -> class; the longest matching prefix wins
+DEFAULT_ROUTE_CLASSES = {
+    "/api/test-connection": "interactive",
+    "/api/call-ai": "interactive",
+    "/api/llm/routing": "interactive",
+    "/api/admission": "interactive",
+    "/api/sessions": "interactive",
+    "/api/artifacts": "interactive",
+    "/api/surrogate/predict": "interactive",
+    "/api/step/solve": "interactive",
+    "/api/step/model": "standard",
+    "/api/step/generate-script": "standard",
+    "/api/step/execute": "standard",
+    "/api/step/synthesize": "standard",
+    "/api/upload-data": "standard",
+    "/api/compile-latex": "standard",
+    "/api/generate-latex-report": "standard",
+    "/api/step/run-script": "batch",
+    "/api/run-workflow": "batch",
+    "/api/run-optimization": "batch",
+    "/api/knowledge/process": "batch",
+    "/api/drawings/digitize": "batch",
+}
+# Never queued or rejected, so that an overloaded server can still be observed
+EXEMPT_ROUTES = ("/metrics",)
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("admission_priority", default=DEFAULT_PRIORITY)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+@contextmanager
+def priority_scope(priority: str):
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class Overloaded(Exception):
+    def __init__(self, limiter: str, priority: str, reason: str, retry_after: float):
+        self.limiter = limiter
+        self.priority = priority
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"{limiter} is saturated for {priority} work ({reason})")
+
+
+class PriorityLimiter:
+    """
+    At most `total` holders at once and at most `limits[class]` of each
+    class. Waiters are served highest class first, in arrival order within
+    a class. A class with `queue_sizes[class]` waiters rejects new ones, and
+    a waiter gives up after `max_wait[class]` seconds (0: no limit).
+    """
+    def __init__(self, name: str, total: int, limits: Dict[str, int] = None,
+                 queue_sizes: Dict[str, int] = None, max_wait: Dict[str, float] = None):
+        self.name = name
+        self.total = max(total, 1)
+        self.limits = {p: max(min((limits or {}).get(p, self.total), self.total), 1) for p in PRIORITIES}
+        self.queue_sizes = {p: (queue_sizes or {}).get(p, 0) for p in PRIORITIES}
+        self.max_wait = {p: (max_wait or {}).get(p, 0) for p in PRIORITIES}
+        self._running = {p: 0 for p in PRIORITIES}
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {p: deque() for p in PRIORITIES}
+
+    @property
+    def running(self) -> int:
+        return sum(self._running.values())
+
+    def _can_start(self, priority: str) -> bool:
+        return self.running < self.total and self._running[priority] < self.limits[priority]
+
+    async def acquire(self, priority: str):
+        waiters = self._waiters[priority]
+        if not waiters and self._can_start(priority):
+            self._running[priority] += 1
+            return
+        if self.queue_sizes[priority] and len(waiters) >= self.queue_sizes[priority]:
+            metrics.ADMISSION_REJECTED.inc(limiter=self.name, priority=priority, reason="queue_full")
+            raise Overloaded(self.name, priority, "queue_full", self.max_wait[priority] or 1.0)
+
+        started = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.max_wait[priority] or None)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                return
+            if waiter in waiters:
+                waiters.remove(waiter)
+            metrics.ADMISSION_REJECTED.inc(limiter=self.name, priority=priority, reason="timeout")
+            raise Overloaded(self.name, priority, "timeout", self.max_wait[priority])
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted as the caller went away
+                self.release(priority)
+            elif waiter in waiters:
+                waiters.remove(waiter)
+            raise
+        finally:
+            metrics.ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - started, limiter=self.name, priority=priority)
+
+    def release(self, priority: str):
+        self._running[priority] -= 1
+        for waiting in PRIORITIES:
+            waiters = self._waiters[waiting]
+            while waiters and self._can_start(waiting):
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    self._running[waiting] += 1
+                    waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority: str = None):
+        priority = priority or current_priority()
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "running": dict(self._running),
+            "queued": {p: len(waiters) for p, waiters in self._waiters.items()},
+            "limits": dict(self.limits),
+        }
+
+
+class AdmissionController:
+    def __init__(self, requests: PriorityLimiter, resources: Dict[str, PriorityLimiter],
+                 route_classes: Dict[str, str] = None, interactive_max_body_bytes: int = 16384, enabled: bool = True):
+        self.requests = requests
+        self.resources = resources
+        self.route_classes = route_classes or dict(DEFAULT_ROUTE_CLASSES)
+        self.interactive_max_body_bytes = interactive_max_body_bytes
+        self.enabled = enabled
+
+    def classify(self, path: str, body_bytes: int = 0) -> Optional[str]:
+        """The class of a request, or None if it is exempt from admission control."""
+        if path in EXEMPT_ROUTES:
+            return None
+        matches = [route for route in self.route_classes if path == route or path.startswith(route.rstrip("/") + "/")]
+        priority = self.route_classes[max(matches, key=len)] if matches else DEFAULT_PRIORITY
+        if priority == "interactive" and body_bytes > self.interactive_max_body_bytes:
+            # e.g. an /api/call-ai request carrying a whole report
+            return "standard"
+        return priority
+
+    async def admit(self, priority: str) -> Callable[[], None]:
+        """
+        Takes a request slot of the class. Returns the function that gives it
+        back, which may be called more than once; a request holds its slot
+        until the last byte of its response body is sent.
+        """
+        if not self.enabled:
+            return lambda: None
+        await self.requests.acquire(priority)
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.requests.release(priority)
+        return release
+
+    @asynccontextmanager
+    async def resource(self, name: str):
+        """Holds a slot of an LLM, sandbox or embedding limiter for the current class."""
+        if not self.enabled:
+            yield
+            return
+        async with self.resources[name].slot():
+            yield
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "requests": self.requests.snapshot(),
+            "resources": {name: limiter.snapshot() for name, limiter in self.resources.items()},
+        }
+
+
+def _per_class(section, key: str, default: Dict[str, float], cast=int) -> Dict[str, Any]:
+    return {p: cast(section.get(f"{key}.{p}", default.get(p, 0))) for p in PRIORITIES}
+
+
+def create_admission_controller() -> AdmissionController:
+    config = configparser.ConfigParser()
+    config.read('backend/config.ini')
+    section = config['ADMISSION'] if config.has_section('ADMISSION') else {}
+    requests = PriorityLimiter(
+        "requests",
+        int(section.get('requests', 32)),
+        _per_class(section, 'requests', {"interactive": 32, "standard": 12, "batch": 4}),
+        _per_class(section, 'queue', {"interactive": 128, "standard": 64, "batch": 16}),
+        _per_class(section, 'max_wait_seconds', {"interactive": 10, "standard": 60, "batch": 600}, float),
+    )
+    resource_defaults = {"llm": (16, {"batch": 8}), "sandbox": (2, {"batch": 1}), "embedding": (1, {})}
+    resources = {}
+    for name in RESOURCES:
+        total, limits = resource_defaults[name]
+        total = int(section.get(name, total))
+        resources[name] = PriorityLimiter(name, total, _per_class(section, name, {**{p: total for p in PRIORITIES}, **limits}))
+    route_classes = dict(DEFAULT_ROUTE_CLASSES)
+    for entry in section.get('routes', '').split(","):
+        if "=" in entry:
+            route, priority = (part.strip() for part in entry.split("=", 1))
+            if priority in PRIORITIES:
+                route_classes[route] = priority
+    return AdmissionController(
+        requests,
+        resources,
+        route_classes,
+        interactive_max_body_bytes=int(section.get('interactive_max_body_bytes', 16384)),
+        enabled=section.get('enabled', 'true').lower() not in ('false', '0', 'no', 'off'),
+    )
+
+
+# Shared by the request middleware and the LLM, sandbox and embedding call sites
+admission_controller = create_admission_controller()
@@ -0,0 +1,220 @@
+"""
+Load test of admission control: interactive latency under background load.
+
+    python -m backend.admission_benchmark --duration 20 --output admission.json
+    python -m backend.admission_benchmark --batch-workers 32 --standard-workers 16 --model mock-500ms
+
+Requests go to the in-process app through its ASGI interface, as in
+benchmark.py. Background workers run optimizations (batch) and the four
+step endpoints (standard) in a loop, with the "mock" LLM provider and the
+local sandbox; the optimization problem is worded so that no built-in
+solver applies and every iteration generates and runs a script. Meanwhile
+one client sends interactive requests one after another: a session, a
+built-in solve and a short /api/call-ai call.
+
+The test runs three phases of --duration seconds: without background load,
+with it and admission control disabled, and with it and admission control
+configured as in config.ini. The JSON report gives, per phase, interactive
+latency percentiles (overall and per request), background throughput, and
+how many requests were shed with SERVER_OVERLOADED.
+
+Run from the repository root, like the server.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+from .benchmark import OPTIMIZATION_GOAL, PARAMETERS, PROBLEM, _git_commit, _load_prompt_with_fallback, \
+    _summarize, run_steps_sample
+
+PHASES = ("idle", "unmanaged", "admission")
+# Mentions no support, so no built-in solver applies and the LLM and sandbox do the work
+BACKGROUND_PROBLEM = "Find the deflection curve of the member under the given load."
+
+
+def _interactive_requests(client, provider: str, model: str) -> List[tuple]:
+    # Coroutines, sent one after another by the caller
+    return [
+        ("session", client.post("/api/sessions")),
+        ("solve", client.post("/api/step/solve", json={"problem": PROBLEM, "parameters": PARAMETERS})),
+        ("call_ai", client.post("/api/call-ai", json={
+            "provider": provider, "model": model, "task": "verify", "data": {"solution": "w(L) = -F L^3 / (3EI)"},
+        })),
+    ]
+
+
+async def _optimization(client, provider: str, model: str):
+    return await client.post("/api/run-optimization", json={
+        "provider": provider,
+        "model": model,
+        "problem": BACKGROUND_PROBLEM,
+        "initial_parameters": PARAMETERS,
+        "solver_preference": "python",
+        "optimization_goal": OPTIMIZATION_GOAL,
+        "max_iterations": 5,
+    })
+
+
+async def run_phase(client, phase: str, duration: float, batch_workers: int, standard_workers: int,
+                    provider: str, model: str) -> Dict[str, Any]:
+    from . import main
+    deadline = time.perf_counter() + duration
+    background = {"batch": {"completed": 0, "shed": 0, "errors": 0}, "standard": {"completed": 0, "shed": 0, "errors": 0}}
+    latencies: Dict[str, List[float]] = {}
+    interactive = {"completed": 0, "shed": 0, "errors": 0}
+    controller = main.admission_controller
+
+    async def background_worker(kind: str):
+        counts = background[kind]
+        while time.perf_counter() < deadline:
+            try:
+                if kind == "batch":
+                    response = await _optimization(client, provider, model)
+                    if response.status_code == 503:
+                        counts["shed"] += 1
+                        # As a client honouring Retry-After would, without waiting past the phase
+                        await asyncio.sleep(min(1.0, max(0.0, deadline - time.perf_counter())))
+                        continue
+                    response.raise_for_status()
+                else:
+                    await run_steps_sample(client, provider, model)
+                counts["completed"] += 1
+            except Exception as e:
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                counts["shed" if status == 503 else "errors"] += 1
+
+    async def interactive_client():
+        # Let the background load build up first
+        await asyncio.sleep(min(1.0, duration / 4) if phase != "idle" else 0)
+        while time.perf_counter() < deadline:
+            for name, request in _interactive_requests(client, provider, model):
+                started = time.perf_counter()
+                response = await request
+                if response.status_code == 503:
+                    interactive["shed"] += 1
+                elif response.status_code != 200:
+                    interactive["errors"] += 1
+                else:
+                    interactive["completed"] += 1
+                    latencies.setdefault(name, []).append(time.perf_counter() - started)
+
+    workers = [] if phase == "idle" else (
+        [background_worker("batch") for _ in range(batch_workers)]
+        + [background_worker("standard") for _ in range(standard_workers)]
+    )
+    peak: Dict[str, int] = {}
+
+    async def sample_queues():
+        while time.perf_counter() < deadline:
+            for name, limiter in [("requests", controller.requests), *controller.resources.items()]:
+                queued = sum(limiter.snapshot()["queued"].values())
+                peak[name] = max(peak.get(name, 0), queued)
+            await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    await asyncio.gather(interactive_client(), sample_queues(), *workers)
+    elapsed = time.perf_counter() - started
+    return {
+        "phase": phase,
+        "admission": controller.enabled,
+        "duration_s": round(elapsed, 3),
+        "interactive": {
+            **interactive,
+            "latency_ms": _summarize([value for values in latencies.values() for value in values]),
+            "requests_ms": {name: _summarize(values) for name, values in latencies.items()},
+        },
+        "background": {
+            kind: {**counts, "throughput_per_s": round(counts["completed"] / elapsed, 4)}
+            for kind, counts in background.items()
+        },
+        "peak_queued": peak,
+    }
+
+
+async def run_admission_benchmark(duration: float, batch_workers: int, standard_workers: int,
+                                  provider: str = "mock", model: str = "mock-200ms") -> Dict[str, Any]:
+    import httpx
+    from . import admission, main, optimization_workflow, workflow
+    from .surrogates import SurrogateStore
+
+    report = {
+        "benchmark": "archimedes-admission",
+        "format_version": 1,
+        "git_commit": _git_commit(),
+        "settings": {
+            "duration_s": duration,
+            "batch_workers": batch_workers,
+            "standard_workers": standard_workers,
+            "provider": provider,
+            "model": model,
+            "sandbox": os.getenv("SANDBOX_BACKEND"),
+        },
+        "results": [],
+    }
+
+    def short_prompt(filename, data, base_folder="prompts"):
+        # The /api/call-ai templates are not part of every checkout; the size of the prompt is what matters here
+        return f"Task: {filename}\n{json.dumps(data)}"
+
+    transport = httpx.ASGITransport(app=main.app)
+    with tempfile.TemporaryDirectory() as surrogates_dir:
+        # Keep the runs out of the real surrogate index
+        store = SurrogateStore(surrogates_dir)
+        with patch.object(optimization_workflow, "load_prompt", _load_prompt_with_fallback(optimization_workflow.load_prompt)), \
+                patch.object(main, "load_prompt", short_prompt), \
+                patch.object(main, "surrogate_store", store), patch.object(workflow, "surrogate_store", store):
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+                for phase in PHASES:
+                    # A fresh controller per phase, so one phase's queues do not leak into the next
+                    controller = admission.create_admission_controller()
+                    controller.enabled = phase == "admission"
+                    with patch.object(main, "admission_controller", controller), \
+                            patch.object(workflow, "admission_controller", controller):
+                        report["results"].append(await run_phase(
+                            client, phase, duration, batch_workers, standard_workers, provider, model))
+    return report
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Interactive latency under background load, with and without admission control.")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per phase")
+    parser.add_argument("--batch-workers", type=int, default=24, help="clients running optimizations in a loop")
+    parser.add_argument("--standard-workers", type=int, default=8, help="clients running the step endpoints in a loop")
+    parser.add_argument("--provider", default="mock")
+    parser.add_argument("--model", default="mock-200ms", help='e.g. "mock-500ms" for a slower simulated model')
+    parser.add_argument("--sandbox", default="local", choices=["local", "docker"])
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    os.environ["SANDBOX_BACKEND"] = args.sandbox
+    report = asyncio.run(run_admission_benchmark(
+        args.duration, args.batch_workers, args.standard_workers, args.provider, args.model))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for result in report["results"]:
+        latency = result["interactive"]["latency_ms"] or {}
+        background = result["background"]
+        print(
+            f"{result['phase']:>10} interactive p50 {latency.get('p50', 0):9.1f} ms  p99 {latency.get('p99', 0):9.1f} ms"
+            f"  shed {result['interactive']['shed']:3d}"
+            f" | batch {background['batch']['throughput_per_s']:6.2f}/s (shed {background['batch']['shed']})"
+            f"  standard {background['standard']['throughput_per_s']:6.2f}/s",
+            file=sys.stderr,
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
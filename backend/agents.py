@@ -1,24 +1,125 @@
-import base64
+import configparser
+import glob
 import io
+import math
 import os
+import shutil
 import subprocess
+import sys
 import tempfile
+import time
+import weakref
 from abc import ABC, abstractmethod
 from contextlib import redirect_stdout, redirect_stderr
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 import matplotlib.pyplot as plt
 import numpy as np
 import scipy
 import sympy as sp
 
+from . import metrics, sandbox_data, sandbox_results, tracing
+from .artifacts import artifact_store
+from .datasets import dataset_store
+
+# Files in the job directory that are inputs or bookkeeping rather than outputs of the script
+JOB_INPUT_FILES = {"script.py", "sandbox_results.py", "sandbox_data.py", "output.txt", "error.txt", "data.csv"}
+JOB_INPUT_DIRS = {sandbox_results.RESULTS_DIR, sandbox_data.DATASET_DIR, "__pycache__"}
+
 
 class ExecutionResult:
-    def __init__(self, success: bool, output: str, error: str, image: str = None):
+    def __init__(self, success: bool, output: str, error: str, image: str = None, data: Dict[str, Any] = None, artifacts: List[Dict[str, Any]] = None):
         self.success = success
         self.output = output
         self.error = error
         self.image = image
+        # Structured numeric results (name -> NumPy array or scalar), if the solver produced any
+        self.data = data or {}
+        # References to output files (plots, CSVs, ...) kept in the artifact store
+        self.artifacts = artifacts or []
+
+
+def load_results(results_dir: str) -> Dict[str, Any]:
+    """
+    Loads the values emitted by a sandboxed script. Arrays are memory-mapped
+    read-only rather than copied; 0-d arrays become Python scalars.
+    """
+    data = {}
+    for path in sorted(glob.glob(os.path.join(results_dir, "*.npy"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, "rb") as f:
+            version = np.lib.format.read_magic(f)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape = read_header(f)[0]
+        if shape == ():
+            # np.memmap cannot represent 0-d arrays
+            data[name] = np.load(path, allow_pickle=False).item()
+        else:
+            data[name] = np.load(path, mmap_mode="r", allow_pickle=False)
+    return data
+
+
+def collect_artifacts(job_dir: str) -> List[Dict[str, Any]]:
+    """Copies every file the script wrote into the artifact store and returns their references."""
+    artifacts = []
+    for directory, subdirectories, files in os.walk(job_dir):
+        relative_dir = os.path.relpath(directory, job_dir)
+        if relative_dir == ".":
+            subdirectories[:] = [d for d in subdirectories if d not in JOB_INPUT_DIRS]
+        for filename in sorted(files):
+            if relative_dir == "." and filename in JOB_INPUT_FILES:
+                continue
+            name = filename if relative_dir == "." else os.path.join(relative_dir, filename).replace(os.sep, "/")
+            artifacts.append(artifact_store.put_file(os.path.join(directory, filename), name=name))
+    return artifacts
+
+
+def _finite_or_none(value):
+    if isinstance(value, list):
+        return [_finite_or_none(item) for item in value]
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def results_to_json(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Converts structured results to JSON-serializable values for API
+    responses. NaN and infinite values become None, since JSON has no
+    representation for them.
+    """
+    converted = {}
+    for name, value in data.items():
+        if isinstance(value, np.ndarray):
+            value = value.tolist()
+        elif isinstance(value, np.generic):
+            value = value.item()
+        converted[name] = _finite_or_none(value)
+    return converted
+
+
+def summarize_data(data: Dict[str, Any]) -> str:
+    """Describes structured results in a few lines, for prompts that need the numbers."""
+    lines = []
+    for name, value in data.items():
+        if isinstance(value, np.ndarray):
+            if value.size == 0:
+                lines.append(f"{name}: empty array")
+            else:
+                lines.append(f"{name}: array{list(value.shape)}, min={value.min():.6g}, max={value.max():.6g}, last={value.flat[-1]:.6g}")
+        else:
+            lines.append(f"{name} = {value:.6g}" if isinstance(value, float) else f"{name} = {value}")
+    return "\n".join(lines)
+
+
+def analyze_data(solver: str, data: Dict[str, Any]) -> str:
+    """The analysis of emitted results: the numbers as by summarize_data and any non-finite ones."""
+    lines = [f"Results of the {solver} solver:", summarize_data(data)]
+    non_finite = [name for name, value in data.items()
+                  if np.issubdtype(np.asarray(value).dtype, np.number) and not np.all(np.isfinite(value))]
+    if non_finite:
+        lines.append(f"Warning: non-finite values (NaN or infinite) in {', '.join(non_finite)}.")
+    return "\n".join(lines)
 
 
 class SolverAgent(ABC):
@@ -28,51 +129,101 @@ class SolverAgent(ABC):
 
 
 class PythonAgent(SolverAgent):
+    """
+    Runs generated Python scripts in a throwaway job directory.
+
+    The sandbox backend is "docker" (isolated, no network) unless set
+    otherwise in the [SANDBOX] section of config.ini or the SANDBOX_BACKEND
+    environment variable. "local" runs the script with the server's own
+    interpreter and no isolation; it exists for benchmarks and development
+    machines without Docker.
+    """
+    def __init__(self, sandbox: str = None, timeout: float = None):
+        config = configparser.ConfigParser()
+        config.read('backend/config.ini')
+        section = config['SANDBOX'] if config.has_section('SANDBOX') else {}
+        self.sandbox = sandbox or os.getenv("SANDBOX_BACKEND") or section.get('backend') or "docker"
+        self.timeout = timeout or float(section.get('timeout_seconds', 300))
+
     def run(self, code: str, params: Dict[str, Any], data_filepath: str = None) -> ExecutionResult:
         # This is a simple injection, a more robust solution would be to
         # pass parameters in a more secure way.
-        code_with_params = f"params = {params}\n{code}"
-        return self._execute_code(code_with_params, data_filepath)
+        code_with_params = f"params = {params}\nfrom sandbox_results import emit, emit_many\n{code}"
+        started = time.perf_counter()
+        status = "error"
+        with tracing.start_span("sandbox.run", attributes={"solver": "python", "sandbox": self.sandbox, "code_chars": len(code)}) as span:
+            try:
+                result = self._execute_code(code_with_params, data_filepath)
+                status = "success" if result.success else "failure"
+                if not result.success:
+                    span.set_status(tracing.STATUS_ERROR, result.error[-500:])
+                return result
+            finally:
+                span.set_attribute("status", status)
+                metrics.SANDBOX_RUN_SECONDS.observe(time.perf_counter() - started, solver="python", status=status)
 
     def _execute_code(self, code: str, data_filepath: str = None) -> ExecutionResult:
-        with tempfile.TemporaryDirectory() as temp_dir:
-            code_path = os.path.join(temp_dir, "script.py")
-            output_path = os.path.join(temp_dir, "output.txt")
-            error_path = os.path.join(temp_dir, "error.txt")
-            image_path = os.path.join(temp_dir, "plot.png")
-
-            with open(code_path, "w") as f:
-                f.write(code)
-
-            docker_command = [
-                "docker", "run", "--rm",
-                "--network=none",  # Disable networking
-                "-v", f"{temp_dir}:/usr/src/app",
-            ]
-            if data_filepath:
-                docker_command.extend(["-v", f"{data_filepath}:/usr/src/app/data.csv"])
-
-            docker_command.extend([
-                "archimedes-sandbox:latest",
-                "python", "script.py"
-            ])
+        temp_dir = tempfile.mkdtemp(prefix="archimedes-job-")
+        try:
+            result = self._run_in_sandbox(temp_dir, code, data_filepath)
+        except BaseException:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        if result.data:
+            # The memory-mapped results live in the job directory, so it is
+            # removed only once the result is no longer referenced.
+            weakref.finalize(result, shutil.rmtree, temp_dir, True)
+        else:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        return result
 
-            try:
-                subprocess.run(docker_command, check=True, capture_output=True, text=True)
-
-                with open(output_path, "r") as f:
-                    output = f.read()
-                with open(error_path, "r") as f:
-                    error = f.read()
-
-                image_b64 = None
-                if os.path.exists(image_path):
-                    with open(image_path, "rb") as f:
-                        image_b64 = base64.b64encode(f.read()).decode('utf-8')
-
-                return ExecutionResult(success=not error, output=output, error=error, image=image_b64)
-            except subprocess.CalledProcessError as e:
-                return ExecutionResult(success=False, output=e.stdout, error=e.stderr)
-            except FileNotFoundError:
-                # This error occurs if Docker is not installed or not in the system's PATH.
-                return ExecutionResult(success=False, output="", error="Docker not found. Please ensure Docker is installed and running.")
+    def _run_in_sandbox(self, temp_dir: str, code: str, data_filepath: str = None) -> ExecutionResult:
+        code_path = os.path.join(temp_dir, "script.py")
+
+        with open(code_path, "w") as f:
+            f.write(code)
+        shutil.copy(sandbox_results.__file__, os.path.join(temp_dir, "sandbox_results.py"))
+        shutil.copy(sandbox_data.__file__, os.path.join(temp_dir, "sandbox_data.py"))
+
+        dataset_dir = dataset_store.dataset_dir_for(data_filepath) if data_filepath else None
+        if dataset_dir:
+            dataset_store.touch(dataset_dir)
+        if self.sandbox == "local":
+            command = self._local_command(temp_dir, data_filepath, dataset_dir)
+        else:
+            command = self._docker_command(temp_dir, data_filepath, dataset_dir)
+
+        try:
+            completed = subprocess.run(command, cwd=temp_dir, check=True, capture_output=True, text=True, timeout=self.timeout)
+            data = load_results(os.path.join(temp_dir, sandbox_results.RESULTS_DIR))
+            artifacts = collect_artifacts(temp_dir)
+            return ExecutionResult(success=True, output=completed.stdout, error=completed.stderr, data=data, artifacts=artifacts)
+        except subprocess.CalledProcessError as e:
+            return ExecutionResult(success=False, output=e.stdout, error=e.stderr)
+        except subprocess.TimeoutExpired:
+            return ExecutionResult(success=False, output="", error=f"Script exceeded the time limit of {self.timeout} seconds.")
+        except FileNotFoundError:
+            # This error occurs if Docker is not installed or not in the system's PATH.
+            return ExecutionResult(success=False, output="", error="Docker not found. Please ensure Docker is installed and running.")
+
+    def _docker_command(self, temp_dir: str, data_filepath: str = None, dataset_dir: str = None) -> List[str]:
+        command = [
+            "docker", "run", "--rm",
+            "--network=none",  # Disable networking
+            "-v", f"{temp_dir}:/usr/src/app",
+        ]
+        if data_filepath:
+            command.extend(["-v", f"{data_filepath}:/usr/src/app/data.csv:ro"])
+        if dataset_dir:
+            # Pre-converted columns that the script can memory-map instead of parsing the CSV
+            command.extend(["-v", f"{dataset_dir}:/usr/src/app/{sandbox_data.DATASET_DIR}:ro"])
+        command.extend(["archimedes-sandbox:latest", "python", "script.py"])
+        return command
+
+    def _local_command(self, temp_dir: str, data_filepath: str = None, dataset_dir: str = None) -> List[str]:
+        # Same layout as the container's working directory, with links instead of mounts
+        if data_filepath:
+            os.symlink(os.path.abspath(data_filepath), os.path.join(temp_dir, "data.csv"))
+        if dataset_dir:
+            os.symlink(dataset_dir, os.path.join(temp_dir, sandbox_data.DATASET_DIR))
+        return [sys.executable, "script.py"]
@@ -0,0 +1,140 @@
+import configparser
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+from . import metrics
+
+ARTIFACT_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+THUMBNAIL_MEDIA_TYPES = ("image/png", "image/jpeg", "image/gif", "image/bmp", "image/tiff")
+
+
+class ArtifactStore:
+    """
+    A content-addressed file store for outputs produced by solver runs.
+
+    Files are stored once under the SHA-256 of their content and expire
+    `ttl_seconds` after they were last stored. Callers get back small
+    references (id, name, size, URL) instead of the file contents.
+    """
+    def __init__(self, root: str, ttl_seconds: int = 86400, url_prefix: str = "/api/artifacts"):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.url_prefix = url_prefix
+        self._last_purge = 0.0
+        os.makedirs(self.root, exist_ok=True)
+
+    def put_file(self, path: str, name: Optional[str] = None) -> Dict[str, Any]:
+        """Stores a copy of the file and returns a reference to it."""
+        name = name or os.path.basename(path)
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        artifact_id = digest.hexdigest()
+        target = self._path(artifact_id, os.path.splitext(name)[1].lower())
+
+        if os.path.exists(target):
+            # Same content already stored: just extend its lifetime
+            os.utime(target)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target))
+            os.close(fd)
+            shutil.copyfile(path, temp_path)
+            os.replace(temp_path, target)
+
+        self._maybe_purge()
+        media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        reference = {
+            "id": artifact_id,
+            "name": name,
+            "media_type": media_type,
+            "size": os.path.getsize(target),
+            "url": f"{self.url_prefix}/{artifact_id}",
+        }
+        if media_type in THUMBNAIL_MEDIA_TYPES:
+            reference["thumbnail_url"] = f"{self.url_prefix}/{artifact_id}/thumbnail"
+        return reference
+
+    def path_for(self, artifact_id: str) -> Optional[str]:
+        """Returns the stored file for an id, or None if it is unknown or has expired."""
+        if not ARTIFACT_ID_PATTERN.match(artifact_id):
+            return None
+        directory = os.path.join(self.root, artifact_id[:2])
+        if not os.path.isdir(directory):
+            return None
+        for entry in os.listdir(directory):
+            if entry.startswith(artifact_id):
+                path = os.path.join(directory, entry)
+                if time.time() - os.path.getmtime(path) <= self.ttl_seconds:
+                    return path
+        return None
+
+    def media_type_for(self, path: str) -> str:
+        return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    def thumbnail_for(self, artifact_id: str, size: int = 256) -> Optional[str]:
+        """
+        Returns a PNG thumbnail of an image artifact, generating it on first
+        request. Returns None if the artifact is missing or not an image.
+        """
+        source = self.path_for(artifact_id)
+        if source is None or self.media_type_for(source) not in THUMBNAIL_MEDIA_TYPES:
+            return None
+        thumbnail = os.path.join(self.root, "thumbnails", f"{artifact_id}_{size}.png")
+        if os.path.exists(thumbnail):
+            metrics.CACHE_REQUESTS.inc(cache="thumbnail", result="hit")
+            return thumbnail
+        metrics.CACHE_REQUESTS.inc(cache="thumbnail", result="miss")
+
+        # Pillow is installed with matplotlib
+        from PIL import Image
+        os.makedirs(os.path.dirname(thumbnail), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(thumbnail), suffix=".tmp")
+        os.close(fd)
+        with Image.open(source) as image:
+            image.thumbnail((size, size))
+            image.save(temp_path, format="PNG", optimize=True)
+        os.replace(temp_path, thumbnail)
+        return thumbnail
+
+    def purge_expired(self) -> int:
+        """Deletes expired artifacts and thumbnails. Returns the number of files removed."""
+        removed = 0
+        cutoff = time.time() - self.ttl_seconds
+        for directory, _, files in os.walk(self.root):
+            for entry in files:
+                path = os.path.join(directory, entry)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        self._last_purge = time.time()
+        return removed
+
+    def _maybe_purge(self):
+        if time.time() - self._last_purge > self.ttl_seconds / 10:
+            self.purge_expired()
+
+    def _path(self, artifact_id: str, extension: str) -> str:
+        return os.path.join(self.root, artifact_id[:2], artifact_id + extension)
+
+
+def create_artifact_store() -> ArtifactStore:
+    config = configparser.ConfigParser()
+    config.read('backend/config.ini')
+    section = config['ARTIFACTS'] if config.has_section('ARTIFACTS') else {}
+    root = section.get('directory') or os.path.join(tempfile.gettempdir(), "archimedes-artifacts")
+    return ArtifactStore(root, ttl_seconds=int(section.get('ttl_seconds', 86400)))
+
+
+# Shared store used by the solver agents and the artifact endpoints
+artifact_store = create_artifact_store()
@@ -0,0 +1,322 @@
+"""
+Offline benchmark of the step pipeline and the optimization workflow.
+
+    python -m backend.benchmark --concurrency 1 4 16 --samples 32 --output benchmark.json
+    python -m backend.benchmark --baseline benchmark.json --max-regression 20
+    python -m backend.benchmark --provider google --model gemini-1.5-pro --cassette beam --cassette-mode replay
+
+Requests go to the in-process app through its ASGI interface. LLM calls use
+the deterministic "mock" provider and scripts run in the local sandbox, so
+no API keys, network or Docker are needed and runs are comparable between
+commits. With --cassette, LLM calls are recorded to or replayed from a
+cassette instead (see cassettes.py), e.g. to load-test with real recorded
+responses. The optimization scenario runs with the built-in solvers
+turned off, since they solve the benchmark's beam without the LLM or the
+sandbox; the "builtin" scenario runs the same optimization through them.
+Each scenario is run at every concurrency level and reported as
+JSON: throughput, latency percentiles (overall and per pipeline stage) and
+peak memory. With --baseline, throughput and p50/p99 latency are compared
+against an earlier report and the exit code is 1 if any of them got worse
+by more than --max-regression percent.
+
+Run from the repository root, like the server.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+from unittest.mock import patch
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# The cantilever case of mvp_benchmark.md
+PROBLEM = "A cantilever beam of length L is clamped at one end and loaded by a point force F at the free end. Find the deflection curve."
+PARAMETERS = {"L": 10.0, "E": 210e9, "I": 1e-5, "F": 1000.0}
+# The tip deflection starts at about -0.159 m; the mock optimizer doubles I
+# each iteration, so the goal is met in the third iteration.
+OPTIMIZATION_GOAL = "max_deflection > -0.05"
+
+# Used when the prompt templates under prompts/ are not present in the checkout
+OPTIMIZER_PROMPT_FALLBACK = (
+    "Optimization goal: {optimization_goal}\n"
+    "Simulation results: {simulation_results}\n"
+    "Current parameters: {current_parameters}\n"
+    "Return the updated parameters as a JSON object."
+)
+
+
+class _Timer:
+    """Collects named stage durations for one benchmark sample."""
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+
+    async def stage(self, name: str, request):
+        started = time.perf_counter()
+        response = await request
+        self.stages[name] = time.perf_counter() - started
+        response.raise_for_status()
+        return response.json()
+
+
+async def run_steps_sample(client, provider: str, model: str) -> Dict[str, float]:
+    """One pass through the four step endpoints, as the frontend drives them."""
+    timer = _Timer()
+    common = {"provider": provider, "model": model}
+    modeling = await timer.stage("model", client.post("/api/step/model", json={**common, "problem": PROBLEM, "parameters": PARAMETERS}))
+    script = await timer.stage("generate_script", client.post("/api/step/generate-script", json={
+        **common, "modeling_result": modeling["computational_result"], "parameters": PARAMETERS,
+    }))
+    execution = await timer.stage("execute", client.post("/api/step/execute", json={
+        "script": script["computational_result"], "parameters": PARAMETERS,
+    }))
+    await timer.stage("synthesize", client.post("/api/step/synthesize", json={
+        **common, "history": {"modeling": modeling, "script": script, "execution": execution},
+    }))
+    return timer.stages
+
+
+async def run_optimization_sample(client, provider: str, model: str) -> Dict[str, float]:
+    timer = _Timer()
+    result = await timer.stage("optimization", client.post("/api/run-optimization", json={
+        "provider": provider,
+        "model": model,
+        "problem": PROBLEM,
+        "initial_parameters": PARAMETERS,
+        "solver_preference": "python",
+        "optimization_goal": OPTIMIZATION_GOAL,
+        "max_iterations": 5,
+    }))
+    if result["status"] != "success":
+        raise RuntimeError(f"Optimization did not converge: {result['message']}")
+    return timer.stages
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "steps": run_steps_sample,
+    "optimization": run_optimization_sample,
+    # The same optimization, solved by the built-in beam solver
+    "builtin": run_optimization_sample,
+}
+
+
+async def run_scenario(client, scenario: str, concurrency: int, samples: int, provider: str, model: str,
+                       trace_memory: bool = False) -> Dict[str, Any]:
+    """Runs `samples` samples of a scenario with at most `concurrency` in flight."""
+    sample = SCENARIOS[scenario]
+    latencies: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    errors: List[str] = []
+    remaining = iter(range(samples))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                stage_times = await sample(client, provider, model)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                continue
+            latencies.append(time.perf_counter() - started)
+            for name, duration in stage_times.items():
+                stages.setdefault(name, []).append(duration)
+
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+    heap_peak = None
+    if trace_memory:
+        heap_peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "samples": samples,
+        "errors": len(errors),
+        "error_examples": errors[:3],
+        "duration_s": round(duration, 4),
+        "throughput_per_s": round(len(latencies) / duration, 4) if duration > 0 else None,
+        "latency_ms": _summarize(latencies),
+        "stages_ms": {name: _summarize(values) for name, values in stages.items()},
+        "peak_rss_mb": _peak_rss_mb(),
+        "python_heap_peak_mb": round(heap_peak, 2) if heap_peak is not None else None,
+    }
+
+
+def _summarize(values: List[float]) -> Optional[Dict[str, float]]:
+    if not values:
+        return None
+    ms = np.asarray(values) * 1000
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+    return {
+        "p50": round(float(p50), 3),
+        "p90": round(float(p90), 3),
+        "p99": round(float(p99), 3),
+        "mean": round(float(ms.mean()), 3),
+        "max": round(float(ms.max()), 3),
+    }
+
+
+def _peak_rss_mb() -> Optional[Dict[str, float]]:
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 2**20 if sys.platform == "darwin" else 2**10
+    return {
+        "server": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 2),
+        "sandbox": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 2),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _load_prompt_with_fallback(load_prompt):
+    from .main import AppError, ErrorCodes
+
+    def load(filename, data, base_folder="prompts"):
+        try:
+            return load_prompt(filename, data, base_folder)
+        except AppError as e:
+            if e.error_code != ErrorCodes.FILE_NOT_FOUND or filename != "optimize_parameters_prompt.txt":
+                raise
+            return OPTIMIZER_PROMPT_FALLBACK.format(**data)
+    return load
+
+
+async def run_benchmark(scenarios: List[str], concurrency_levels: List[int], samples: int, model: str = "mock",
+                        warmup: int = 1, trace_memory: bool = False, provider: str = "mock",
+                        cassette_headers: Dict[str, str] = None) -> Dict[str, Any]:
+    import httpx
+    from .main import app
+    from . import cassettes, optimization_workflow, workflow
+
+    report = {
+        "benchmark": "archimedes-pipeline",
+        "format_version": 1,
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            "scenarios": scenarios,
+            "concurrency": concurrency_levels,
+            "samples": samples,
+            "provider": provider,
+            "model": model,
+            "sandbox": os.getenv("SANDBOX_BACKEND"),
+            "cassette": cassette_headers,
+        },
+        "results": [],
+    }
+    transport = httpx.ASGITransport(app=app)
+    with patch.object(optimization_workflow, "load_prompt", _load_prompt_with_fallback(optimization_workflow.load_prompt)), \
+            patch.object(cassettes.cassette_library, "allow_request_selection", bool(cassette_headers)):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None, headers=cassette_headers) as client:
+            for scenario in scenarios:
+                with patch.object(workflow, "builtin_solvers_enabled", lambda: scenario == "builtin"):
+                    # Warm caches and imports so the first measured sample is not an outlier
+                    for _ in range(warmup):
+                        await SCENARIOS[scenario](client, provider, model)
+                    for concurrency in concurrency_levels:
+                        report["results"].append(await run_scenario(client, scenario, concurrency, samples, provider, model, trace_memory))
+    return report
+
+
+def compare_reports(current: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Returns a description of every metric that regressed by more than `max_regression` percent."""
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in current["results"]:
+        before = previous.get((result["scenario"], result["concurrency"]))
+        if before is None or not result["latency_ms"] or not before["latency_ms"]:
+            continue
+        label = f"{result['scenario']} @ concurrency {result['concurrency']}"
+        checks = [
+            ("throughput", before["throughput_per_s"], result["throughput_per_s"], -1),
+            ("p50 latency", before["latency_ms"]["p50"], result["latency_ms"]["p50"], 1),
+            ("p99 latency", before["latency_ms"]["p99"], result["latency_ms"]["p99"], 1),
+        ]
+        for name, old, new, direction in checks:
+            if old and new is not None:
+                change = (new - old) / old * 100 * direction
+                if change > max_regression:
+                    regressions.append(f"{label}: {name} {old} -> {new} ({change:+.1f}% worse)")
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmark of the simulation pipeline.")
+    parser.add_argument("--scenario", nargs="+", choices=sorted(SCENARIOS), default=["steps", "optimization"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--samples", type=int, default=16, help="samples per scenario and concurrency level")
+    parser.add_argument("--provider", default="mock", help="LLM provider; anything but mock needs API keys or a cassette")
+    parser.add_argument("--model", default="mock", help='model name; for the mock provider e.g. "mock-200ms" adds 200 ms of simulated latency per call')
+    parser.add_argument("--cassette", help="record/replay LLM calls with this cassette")
+    parser.add_argument("--cassette-mode", default="replay", choices=["record", "replay", "replay_or_record"])
+    parser.add_argument("--replay-latency", default="recorded", help='delay for replayed responses: none, recorded or milliseconds')
+    parser.add_argument("--sandbox", default="local", choices=["local", "docker"])
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--trace-memory", action="store_true", help="also report the Python heap peak (slows the run down)")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=20.0, help="allowed regression in percent")
+    args = parser.parse_args(argv)
+
+    os.environ["SANDBOX_BACKEND"] = args.sandbox
+    cassette_headers = None
+    if args.cassette:
+        cassette_headers = {
+            "X-LLM-Cassette": args.cassette_mode,
+            "X-LLM-Cassette-Name": args.cassette,
+            "X-LLM-Replay-Latency": args.replay_latency,
+        }
+    report = asyncio.run(run_benchmark(
+        args.scenario, args.concurrency, args.samples, args.model, args.warmup, args.trace_memory,
+        provider=args.provider, cassette_headers=cassette_headers,
+    ))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for result in report["results"]:
+        latency = result["latency_ms"] or {}
+        print(
+            f"{result['scenario']:>12} c={result['concurrency']:<3} {result['throughput_per_s'] or 0:8.2f}/s "
+            f"p50={latency.get('p50', float('nan')):9.1f}ms p99={latency.get('p99', float('nan')):9.1f}ms errors={result['errors']}",
+            file=sys.stderr,
+        )
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_reports(report, json.load(f), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+"""
+Record/replay of LLM calls.
+
+A cassette is a gzip-compressed JSON file holding the responses to every
+prompt seen while recording, keyed by a hash of (provider, model, prompt).
+Identical responses are stored once. Replaying a cassette serves the same
+answers without calling the provider, optionally after the latency that
+was measured when recording (or a fixed one), so runs are reproducible and
+load tests cost nothing.
+
+Modes:
+    off                no cassette, calls go to the provider
+    record             call the provider and store the response
+    replay             serve stored responses; a prompt not on the cassette is an error
+    replay_or_record   serve stored responses and record the ones that are missing
+
+Recorded calls are written to disk at most every `flush_seconds`, and
+when the process exits (or on CassetteLibrary.flush()), since rewriting
+the whole compressed file for every call makes long recordings quadratic.
+
+The default comes from the [CASSETTES] section of config.ini. When
+`allow_request_selection` is enabled there, a request can choose its own
+mode with the X-LLM-Cassette, X-LLM-Cassette-Name and X-LLM-Replay-Latency
+headers.
+"""
+import asyncio
+import atexit
+import configparser
+import contextvars
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from . import metrics, tracing
+
+MODES = ("off", "record", "replay", "replay_or_record")
+CASSETTE_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+FORMAT_VERSION = 1
+
+_selection: contextvars.ContextVar = contextvars.ContextVar("cassette_selection", default=None)
+
+
+class CassetteMiss(LookupError):
+    pass
+
+
+class Cassette:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        self._responses: Dict[str, str] = {}
+        self._loaded_mtime = None
+        self._dirty = False
+        self._saved_at = 0.0
+        self._load()
+
+    @staticmethod
+    def key(provider: str, model: str, prompt: str) -> str:
+        digest = hashlib.sha256()
+        for part in (provider, model, prompt):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, provider: str, model: str, prompt: str) -> Optional[Tuple[str, float]]:
+        """Returns (response, recorded latency in ms), or None if the prompt was not recorded."""
+        self._reload_if_changed()
+        entry = self._entries.get(self.key(provider, model, prompt))
+        if entry is None:
+            return None
+        return self._responses[entry["response"]], entry["latency_ms"]
+
+    def record(self, provider: str, model: str, prompt: str, response: str, latency_ms: float):
+        response_hash = hashlib.sha256(response.encode("utf-8")).hexdigest()
+        with self._lock:
+            self._responses[response_hash] = response
+            self._entries[self.key(provider, model, prompt)] = {
+                "provider": provider,
+                "model": model,
+                "response": response_hash,
+                "latency_ms": round(latency_ms, 1),
+                "prompt_chars": len(prompt),
+            }
+            self._dirty = True
+
+    def save_due(self, interval: float) -> bool:
+        """Whether there are unsaved recordings and the last save is at least `interval` seconds old."""
+        return self._dirty and time.monotonic() - self._saved_at >= interval
+
+    def save(self):
+        """Writes the cassette atomically, so a concurrent reader never sees a partial file."""
+        # Serialized so that an older snapshot can never replace a newer one
+        with self._save_lock:
+            with self._lock:
+                payload = {"version": FORMAT_VERSION, "entries": dict(self._entries), "responses": dict(self._responses)}
+                self._dirty = False
+                self._saved_at = time.monotonic()
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with gzip.open(os.fdopen(fd, "wb"), "wt", encoding="utf-8") as f:
+                    json.dump(payload, f, separators=(",", ":"))
+                os.replace(temp_path, self.path)
+            except BaseException:
+                self._dirty = True
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            self._loaded_mtime = os.path.getmtime(self.path)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            payload = json.load(f)
+        if payload.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported cassette format in {self.path}")
+        with self._lock:
+            # Keep responses recorded in this process that are not on disk yet
+            self._entries = {**payload["entries"], **self._entries}
+            self._responses = {**payload["responses"], **self._responses}
+        self._loaded_mtime = os.path.getmtime(self.path)
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._loaded_mtime:
+            self._load()
+
+
+class CassetteSelection:
+    """How LLM calls in the current request use cassettes."""
+    def __init__(self, mode: str, cassette: str = "default", latency: str = "none"):
+        if mode not in MODES:
+            raise ValueError(f"Invalid cassette mode: {mode}. Expected one of {', '.join(MODES)}.")
+        if not CASSETTE_NAME_PATTERN.match(cassette):
+            raise ValueError(f"Invalid cassette name: {cassette}")
+        self.mode = mode
+        self.cassette = cassette
+        # "none", "recorded", or a fixed number of milliseconds
+        self.latency = latency
+        if latency not in ("none", "recorded"):
+            try:
+                float(latency)
+            except ValueError:
+                raise ValueError(f"Invalid replay latency: {latency}")
+
+    def replay_delay(self, recorded_ms: float) -> float:
+        if self.latency == "none":
+            return 0.0
+        if self.latency == "recorded":
+            return recorded_ms / 1000
+        return float(self.latency) / 1000
+
+
+class CassetteLibrary:
+    """Loads cassettes from a directory and applies the active selection to LLM calls."""
+    def __init__(self, directory: str, default: CassetteSelection = None, allow_request_selection: bool = False,
+                 flush_seconds: float = 5.0):
+        self.directory = directory
+        self.default = default or CassetteSelection("off")
+        self.allow_request_selection = allow_request_selection
+        self.flush_seconds = flush_seconds
+        self._cassettes: Dict[str, Cassette] = {}
+
+    def get(self, name: str) -> Cassette:
+        cassette = self._cassettes.get(name)
+        if cassette is None:
+            cassette = self._cassettes[name] = Cassette(os.path.join(self.directory, f"{name}.json.gz"))
+        return cassette
+
+    def flush(self):
+        """Writes every cassette with recordings that are not on disk yet."""
+        for cassette in list(self._cassettes.values()):
+            if cassette.save_due(0):
+                cassette.save()
+
+    def selection_from_headers(self, headers) -> Optional[CassetteSelection]:
+        """Reads a per-request selection from the X-LLM-Cassette headers, if allowed and present."""
+        mode = headers.get("x-llm-cassette")
+        if not mode or not self.allow_request_selection:
+            return None
+        return CassetteSelection(
+            mode.strip().lower(),
+            headers.get("x-llm-cassette-name") or self.default.cassette,
+            (headers.get("x-llm-replay-latency") or self.default.latency).strip().lower(),
+        )
+
+    async def call(self, provider: str, model: str, prompt: str, call: Callable[[str, str, str], Awaitable[str]]) -> str:
+        """Runs `call` (the real provider call) subject to the current cassette selection."""
+        selection = _selection.get() or self.default
+        if selection.mode == "off":
+            return await call(provider, model, prompt)
+
+        cassette = self.get(selection.cassette)
+        span = tracing.current_span()
+        if span is not None:
+            span.set_attribute("llm.cassette", selection.cassette)
+            span.set_attribute("llm.cassette_mode", selection.mode)
+        if selection.mode != "record":
+            recorded = cassette.lookup(provider, model, prompt)
+            if recorded is not None:
+                metrics.CACHE_REQUESTS.inc(cache="cassette", result="hit")
+                response, latency_ms = recorded
+                delay = selection.replay_delay(latency_ms)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                return response
+            metrics.CACHE_REQUESTS.inc(cache="cassette", result="miss")
+            if selection.mode == "replay":
+                raise CassetteMiss(f"No recorded response on cassette '{selection.cassette}' for this {provider}/{model} prompt.")
+
+        started = time.perf_counter()
+        response = await call(provider, model, prompt)
+        cassette.record(provider, model, prompt, response, (time.perf_counter() - started) * 1000)
+        if cassette.save_due(self.flush_seconds):
+            await asyncio.to_thread(cassette.save)
+        return response
+
+
+def use_selection(selection: Optional[CassetteSelection]) -> contextvars.Token:
+    """Sets the cassette selection for the current request; undo with reset_selection()."""
+    return _selection.set(selection)
+
+
+def reset_selection(token: contextvars.Token):
+    _selection.reset(token)
+
+
+def create_cassette_library() -> CassetteLibrary:
+    config = configparser.ConfigParser()
+    config.read('backend/config.ini')
+    section = config['CASSETTES'] if config.has_section('CASSETTES') else {}
+    directory = section.get('directory') or os.path.join(tempfile.gettempdir(), "archimedes-cassettes")
+    default = CassetteSelection(
+        os.getenv("LLM_CASSETTE_MODE") or section.get('mode') or "off",
+        section.get('cassette') or "default",
+        section.get('replay_latency') or "none",
+    )
+    allow = section.get('allow_request_selection', 'false').strip().lower() in ("1", "true", "yes")
+    return CassetteLibrary(directory, default, allow_request_selection=allow,
+                           flush_seconds=float(section.get('flush_seconds', 5)))
+
+
+# Shared library used by call_ai_provider
+cassette_library = create_cassette_library()
+# Recordings made since the last periodic save
+atexit.register(cassette_library.flush)
@@ -0,0 +1,189 @@
+import hashlib
+import itertools
+import re
+import zlib
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Words and single punctuation marks, about one subword token each for English technical text
+WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+SENTENCE_END_PATTERN = re.compile(r"[.!?]")
+SHINGLE_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+# Shingles hashed per vectorized step, bounding the (shingles, num_perm) temporary
+SIGNATURE_BATCH_SHINGLES = 100_000
+
+
+def token_spans(text: str, tokenizer: Optional[Callable] = None) -> np.ndarray:
+    """
+    Character offsets (N, 2) of the tokens of `text`. With a Hugging Face
+    fast tokenizer (e.g. SentenceTransformer.tokenizer) these are the
+    model's own tokens, so chunk sizes match what the model sees; otherwise
+    words and punctuation marks stand in for them.
+    """
+    if tokenizer is not None and getattr(tokenizer, "is_fast", False):
+        encoded = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        spans = np.asarray(encoded["offset_mapping"], dtype=np.int64).reshape(-1, 2)
+        return spans[spans[:, 1] > spans[:, 0]]
+    offsets = itertools.chain.from_iterable(match.span() for match in WORD_PATTERN.finditer(text))
+    return np.fromiter(offsets, dtype=np.int64).reshape(-1, 2)
+
+
+def chunk_spans(text: str, spans: np.ndarray, chunk_size: int = 200, overlap: int = 50) -> List[Tuple[int, int]]:
+    """
+    Character ranges of chunks of at most `chunk_size` tokens, each sharing
+    `overlap` tokens with the previous one. A chunk ends after the last
+    sentence end in the second half of its window, if there is one.
+    Each step is O(1) after one pass over the tokens.
+    """
+    if not 0 <= overlap < chunk_size:
+        raise ValueError("overlap must be at least 0 and smaller than chunk_size")
+    count = len(spans)
+    if count == 0:
+        return []
+    # last_end[i]: index of the last sentence-ending token at or before i, or -1
+    ends = np.isin(spans[:, 1], [match.end() for match in SENTENCE_END_PATTERN.finditer(text)])
+    last_end = np.maximum.accumulate(np.where(ends, np.arange(count), -1))
+
+    ranges = []
+    start = 0
+    while True:
+        stop = min(start + chunk_size, count)
+        if stop < count and last_end[stop - 1] >= start + chunk_size // 2:
+            stop = last_end[stop - 1] + 1
+        ranges.append((int(spans[start, 0]), int(spans[stop - 1, 1])))
+        if stop == count:
+            return ranges
+        start = max(stop - overlap, start + 1)
+
+
+def chunk_text(text: str, chunk_size: int = 200, overlap: int = 50, tokenizer: Optional[Callable] = None) -> List[str]:
+    """
+    Splits a text into chunks of at most `chunk_size` tokens, consecutive
+    chunks sharing `overlap` tokens. Chunks are slices of the original text.
+    """
+    if not text:
+        return []
+    return [text[start:stop] for start, stop in chunk_spans(text, token_spans(text, tokenizer), chunk_size, overlap)]
+
+
+def normalize(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+class NearDuplicateIndex:
+    """
+    Finds chunks that repeat, exactly or nearly, anything indexed before:
+    headers and footers on every page, the same document uploaded twice.
+
+    Each chunk gets a MinHash signature over its word `shingle`-grams;
+    signatures are split into `bands` for locality-sensitive lookup, and a
+    chunk whose estimated Jaccard similarity to an indexed one reaches
+    `threshold` is a duplicate. With 128 hashes in 16 bands of 8, pairs at
+    0.85 similarity become candidates with probability 0.99 and pairs at
+    0.4 with about 0.01.
+    """
+    def __init__(self, num_perm: int = 128, bands: int = 16, threshold: float = 0.85,
+                 shingle: int = 3, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle = shingle
+        # Permutations h -> a * h + b (mod 2^32) with odd a, applied to well-mixed shingle hashes
+        rng = np.random.default_rng(seed)
+        self._a = (rng.integers(0, 1 << 31, num_perm, dtype=np.uint32) * np.uint32(2) + np.uint32(1))[:, None]
+        self._b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint32)[:, None]
+        self._word_hashes: Dict[str, int] = {}
+        self._exact: Dict[bytes, int] = {}
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._signatures: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _shingles(self, words: Sequence[str]) -> np.ndarray:
+        """Hashes of the word `shingle`-grams, combined from per-word hashes."""
+        cache = self._word_hashes
+        for word in words:
+            if word not in cache:
+                cache[word] = zlib.crc32(word.encode("utf-8"))
+        hashes = np.fromiter((cache[word] for word in words), dtype=np.uint64, count=len(words))
+        if len(hashes) == 0:
+            return np.zeros(1, dtype=np.uint32)
+        size = min(self.shingle, len(hashes))
+        combined = np.zeros(len(hashes) - size + 1, dtype=np.uint64)
+        for offset in range(size):
+            combined = combined * SHINGLE_MULTIPLIER + hashes[offset:offset + len(combined)]
+        return np.unique((combined ^ (combined >> np.uint64(32))).astype(np.uint32))
+
+    def signatures(self, texts: Sequence[str]) -> np.ndarray:
+        """MinHash signatures (len(texts), num_perm), computed for many texts per vectorized step."""
+        hashes = [self._shingles(normalize(text)) for text in texts]
+        signatures = np.empty((len(hashes), self.num_perm), dtype=np.uint32)
+        first = 0
+        while first < len(hashes):
+            last, total = first, 0
+            while last < len(hashes) and (last == first or total + len(hashes[last]) <= SIGNATURE_BATCH_SHINGLES):
+                total += len(hashes[last])
+                last += 1
+            batch = hashes[first:last]
+            offsets = np.cumsum([0] + [len(h) for h in batch[:-1]])
+            # (num_perm, shingles), so each signature is a reduction over contiguous rows
+            permuted = self._a * np.concatenate(batch)[None, :] + self._b
+            signatures[first:last] = np.minimum.reduceat(permuted, offsets, axis=1).T
+            first = last
+        return signatures
+
+    def add(self, texts: Sequence[str]) -> List[Optional[int]]:
+        """
+        Indexes the texts, in order. Returns for each one the index of the
+        earlier text (in this call or before) it duplicates, or None if it
+        is new; duplicates are not indexed themselves.
+        """
+        signatures = self.signatures(texts)
+        matches = []
+        for text, signature in zip(texts, signatures):
+            exact_key = hashlib.sha1(" ".join(normalize(text)).encode("utf-8")).digest()
+            match = self._exact.get(exact_key)
+            if match is None:
+                match = self._similar(signature)
+            if match is None:
+                index = len(self._signatures)
+                self._signatures.append(signature)
+                self._exact[exact_key] = index
+                for band, key in enumerate(self._band_keys(signature)):
+                    self._buckets[band].setdefault(key, []).append(index)
+            matches.append(match)
+        return matches
+
+    def truncate(self, size: int):
+        """Forgets every text indexed after the first `size`, e.g. when they could not be stored."""
+        if size >= len(self._signatures):
+            return
+        self._exact = {key: index for key, index in self._exact.items() if index < size}
+        for buckets in self._buckets:
+            for key in [key for key, indices in buckets.items() if indices[-1] >= size]:
+                # Indices are appended in order, so the forgotten ones are at the end
+                kept = [index for index in buckets[key] if index < size]
+                if kept:
+                    buckets[key] = kept
+                else:
+                    del buckets[key]
+        del self._signatures[size:]
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def _similar(self, signature: np.ndarray) -> Optional[int]:
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            candidates.update(self._buckets[band].get(key, ()))
+        best, best_similarity = None, self.threshold
+        for index in candidates:
+            similarity = float(np.mean(self._signatures[index] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = index, similarity
+        return best
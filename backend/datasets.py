@@ -0,0 +1,233 @@
+import asyncio
+import configparser
+import csv
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from . import metrics
+
+MANIFEST_FILE = "manifest.json"
+CSV_FILE = "data.csv"
+UPLOAD_CHUNK_SIZE = 1 << 20
+CONVERSION_BLOCK_ROWS = 65536
+
+
+class DatasetStore:
+    """
+    Keeps uploaded CSV files on disk, keyed by the SHA-256 of their content.
+
+    Each dataset is converted once to one .npy file per column. Sandboxed
+    scripts get the directory mounted read-only and can memory-map the
+    columns, so the CSV is not parsed again on every run. Datasets not used
+    for `ttl_seconds` are removed.
+    """
+    def __init__(self, root: str, ttl_seconds: int = 7 * 86400):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(os.path.join(self.root, "incoming"), exist_ok=True)
+
+    async def save_upload(self, upload) -> Dict[str, Any]:
+        """
+        Streams an upload (anything with an async read(size)) to disk in
+        chunks, then converts it unless the same content is already stored.
+        """
+        fd, temp_path = tempfile.mkstemp(dir=os.path.join(self.root, "incoming"), suffix=".csv")
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+            manifest = await asyncio.to_thread(self._store, temp_path, digest.hexdigest())
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        await asyncio.to_thread(self.purge_stale)
+        return manifest
+
+    def _store(self, csv_path: str, dataset_id: str) -> Dict[str, Any]:
+        dataset_dir = os.path.join(self.root, dataset_id)
+        manifest = self.load_manifest(dataset_dir)
+        if manifest is not None:
+            metrics.CACHE_REQUESTS.inc(cache="dataset", result="hit")
+            self.touch(dataset_dir)
+            return manifest
+        metrics.CACHE_REQUESTS.inc(cache="dataset", result="miss")
+
+        # Build in a private directory, then publish it with an atomic rename
+        build_dir = os.path.join(self.root, "incoming", f"{dataset_id}-{uuid.uuid4().hex}")
+        os.makedirs(os.path.join(build_dir, "columns"))
+        try:
+            shutil.move(csv_path, os.path.join(build_dir, CSV_FILE))
+            columns, rows = convert_csv(os.path.join(build_dir, CSV_FILE), os.path.join(build_dir, "columns"))
+            manifest = {"dataset_id": dataset_id, "rows": rows, "columns": columns}
+            with open(os.path.join(build_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            try:
+                os.rename(build_dir, dataset_dir)
+            except OSError:
+                # Another request stored the same content first
+                shutil.rmtree(build_dir, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            raise
+        return self.load_manifest(dataset_dir)
+
+    def load_manifest(self, dataset_dir: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(dataset_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        manifest["filepath"] = os.path.join(dataset_dir, CSV_FILE)
+        return manifest
+
+    def dataset_dir_for(self, filepath: str) -> Optional[str]:
+        """Returns the dataset directory if the path is the CSV of a stored dataset."""
+        dataset_dir = os.path.dirname(os.path.abspath(filepath))
+        if os.path.dirname(dataset_dir) != os.path.abspath(self.root) or os.path.basename(filepath) != CSV_FILE:
+            return None
+        return dataset_dir if os.path.exists(os.path.join(dataset_dir, MANIFEST_FILE)) else None
+
+    def touch(self, dataset_dir: str):
+        """Marks a dataset as recently used so that it is not purged."""
+        os.utime(os.path.join(dataset_dir, MANIFEST_FILE))
+
+    def purge_stale(self) -> int:
+        """Removes datasets (and abandoned partial uploads) unused for longer than the TTL."""
+        removed = 0
+        cutoff = time.time() - self.ttl_seconds
+        for entry in os.listdir(self.root):
+            path = os.path.join(self.root, entry)
+            if entry == "incoming":
+                # Partial uploads are only abandoned if they are old
+                for partial in os.listdir(path):
+                    partial_path = os.path.join(path, partial)
+                    if os.path.getmtime(partial_path) >= cutoff:
+                        continue
+                    if os.path.isdir(partial_path):
+                        shutil.rmtree(partial_path, ignore_errors=True)
+                    else:
+                        os.remove(partial_path)
+                continue
+            marker = os.path.join(path, MANIFEST_FILE)
+            last_used = os.path.getmtime(marker) if os.path.exists(marker) else os.path.getmtime(path)
+            if last_used < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        return removed
+
+
+def convert_csv(csv_path: str, columns_dir: str) -> (List[Dict[str, str]], int):
+    """
+    Converts a CSV file with a header row to one .npy file per column.
+    Numeric columns become float64 (empty cells are NaN); any column with a
+    non-numeric value is stored as strings. The file is read once, in
+    blocks: each column is converted to numbers for as long as its cells
+    parse, and its cells are also spilled as text to disk, from which a
+    column found to hold text is written. Memory use does not grow with
+    the file size.
+    """
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        names = [name.strip() or f"column_{i}" for i, name in enumerate(header)]
+        raw_files = {i: open(os.path.join(columns_dir, f"{i}.raw"), "wb") for i in range(len(names))}
+        text_files = {i: open(os.path.join(columns_dir, f"{i}.text"), "w", encoding="utf-8") for i in range(len(names))}
+        text_widths = {i: 1 for i in range(len(names))}
+        rows = 0
+        try:
+            block = []
+            for row in reader:
+                if not row:
+                    continue
+                block.append(row)
+                if len(block) == CONVERSION_BLOCK_ROWS:
+                    _write_block(block, raw_files, text_files, text_widths)
+                    rows += len(block)
+                    block = []
+            if block:
+                _write_block(block, raw_files, text_files, text_widths)
+                rows += len(block)
+        finally:
+            for spill in [*raw_files.values(), *text_files.values()]:
+                spill.close()
+
+    columns = []
+    for i, name in enumerate(names):
+        target = os.path.join(columns_dir, f"{i}.npy")
+        raw_path = os.path.join(columns_dir, f"{i}.raw")
+        text_path = os.path.join(columns_dir, f"{i}.text")
+        if i not in raw_files:
+            _save_text_column(text_path, target, rows, text_widths[i])
+            dtype = "str"
+        else:
+            if rows:
+                array = np.lib.format.open_memmap(target, mode="w+", dtype=np.float64, shape=(rows,))
+                array[:] = np.memmap(raw_path, dtype=np.float64, mode="r", shape=(rows,))
+                array.flush()
+                del array
+            else:
+                np.save(target, np.empty(0, dtype=np.float64))
+            dtype = "float64"
+        for spill_path in (raw_path, text_path):
+            if os.path.exists(spill_path):
+                os.remove(spill_path)
+        columns.append({"name": name, "dtype": dtype, "file": f"columns/{i}.npy"})
+    return columns, rows
+
+
+def _write_block(block, raw_files, text_files, text_widths):
+    for i, text in text_files.items():
+        cells = [row[i] if i < len(row) else "" for row in block]
+        # One JSON list per block, so that cells may hold newlines
+        text.write(json.dumps(cells) + "\n")
+        text_widths[i] = max(text_widths[i], max(len(cell) for cell in cells))
+        raw = raw_files.get(i)
+        if raw is None:
+            continue
+        try:
+            values = np.array([float(cell.strip()) if cell.strip() else np.nan for cell in cells], dtype=np.float64)
+        except ValueError:
+            # A text column: it is written from its spilled cells
+            raw_files.pop(i).close()
+            continue
+        raw.write(values.tobytes())
+
+
+def _save_text_column(text_path: str, target: str, rows: int, width: int):
+    if not rows:
+        np.save(target, np.empty(0, dtype=str))
+        return
+    array = np.lib.format.open_memmap(target, mode="w+", dtype=f"<U{width}", shape=(rows,))
+    start = 0
+    with open(text_path, "r", encoding="utf-8") as f:
+        for line in f:
+            cells = json.loads(line)
+            array[start:start + len(cells)] = cells
+            start += len(cells)
+    array.flush()
+    del array
+
+
+def create_dataset_store() -> DatasetStore:
+    config = configparser.ConfigParser()
+    config.read('backend/config.ini')
+    section = config['DATASETS'] if config.has_section('DATASETS') else {}
+    root = section.get('directory') or os.path.join(tempfile.gettempdir(), "archimedes-datasets")
+    return DatasetStore(root, ttl_seconds=int(section.get('ttl_seconds', 7 * 86400)))
+
+
+# Shared store used by the upload endpoint and the Python sandbox
+dataset_store = create_dataset_store()
@@ -0,0 +1,579 @@
+"""
+Drawing-to-CAD pipeline: line segments, text and their associations.
+
+A scanned or rendered engineering drawing is turned into finite line
+segments, OCR text boxes, and the segment each piece of text belongs to
+(e.g. a dimension value and its dimension line):
+
+    result = digitize("drawing.png")
+    write_dxf(result, "drawing.dxf")
+
+Segments are (N, 4) float arrays of x1, y1, x2, y2 in pixels. Segment
+detectors report one physical line as several overlapping or broken
+pieces, so `merge_collinear` groups pieces by direction and offset and
+joins overlapping intervals, all with array operations. Text is matched
+to segments through `GridIndex`, a uniform grid over the segments, so each
+text box is only compared with the segments near it. OCR only reads the
+regions that look like words once the segments are erased.
+
+OpenCV and Tesseract (pytesseract) are only needed by the functions that
+read images or run OCR; the geometry and the DXF export (dxf_writer.py)
+work with NumPy alone.
+"""
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+DEFAULT_ANGLE_TOLERANCE = np.deg2rad(3.0)
+
+
+class TextBox:
+    """One OCR word with its bounding box in pixels."""
+    def __init__(self, text: str, left: float, top: float, width: float, height: float, confidence: float = 100.0):
+        self.text = text
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.confidence = confidence
+
+    @property
+    def center(self) -> Tuple[float, float]:
+        return self.left + self.width / 2, self.top + self.height / 2
+
+    def to_dict(self) -> Dict:
+        return {"text": self.text, "left": self.left, "top": self.top, "width": self.width,
+                "height": self.height, "confidence": self.confidence}
+
+
+class DrawingResult:
+    """Segments, circles, text and text-to-segment associations found in one drawing."""
+    def __init__(self, segments: np.ndarray, text_boxes: List[TextBox], associations: List[Dict],
+                 circles: Optional[np.ndarray] = None):
+        self.segments = segments
+        self.text_boxes = text_boxes
+        self.associations = associations
+        # (N, 3) of x, y, radius
+        self.circles = circles if circles is not None else np.empty((0, 3))
+
+
+def as_segments(segments) -> np.ndarray:
+    return np.asarray(segments, dtype=float).reshape(-1, 4)
+
+
+def ink_mask(gray: np.ndarray) -> np.ndarray:
+    """Binary (0/255) mask of the drawn pixels, for dark-on-light and light-on-dark drawings alike."""
+    import cv2
+
+    ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+    if np.count_nonzero(ink) > ink.size / 2:
+        # Light drawing on a dark background
+        ink = cv2.bitwise_not(ink)
+    return ink
+
+
+def stroke_width(ink: np.ndarray) -> float:
+    """Typical stroke width in pixels: twice the median distance transform along the stroke centres."""
+    import cv2
+
+    distance = cv2.distanceTransform(ink, cv2.DIST_L2, 3)
+    ridge = (distance > 0) & (distance >= cv2.dilate(distance, np.ones((3, 3), np.uint8)))
+    return float(2 * np.median(distance[ridge])) if ridge.any() else 1.0
+
+
+def detect_segments(gray: np.ndarray, method: str = "hough", threshold: int = 50, min_length: float = 20.0,
+                    max_gap: float = 5.0) -> np.ndarray:
+    """
+    Finds finite line segments in a grayscale image with the probabilistic
+    Hough transform ("hough") or OpenCV's line segment detector ("lsd").
+    Returns the raw detections; see merge_collinear.
+
+    The Hough transform runs on the ink mask rather than on Canny edges,
+    which would turn every stroke into two parallel lines.
+    """
+    import cv2
+
+    if method == "lsd":
+        lines = cv2.createLineSegmentDetector(cv2.LSD_REFINE_STD).detect(gray)[0]
+        segments = as_segments(lines if lines is not None else [])
+        lengths = np.hypot(segments[:, 2] - segments[:, 0], segments[:, 3] - segments[:, 1])
+        return segments[lengths >= min_length]
+    if method != "hough":
+        raise ValueError(f"Unknown segment detector '{method}'. Use 'hough' or 'lsd'.")
+    lines = cv2.HoughLinesP(ink_mask(gray), 1, np.pi / 180, threshold, minLineLength=min_length, maxLineGap=max_gap)
+    return as_segments(lines if lines is not None else [])
+
+
+def extract_lines(gray: np.ndarray, method: str = "hough") -> np.ndarray:
+    """Detected and merged segments, with the merge tolerance set from the stroke width."""
+    segments = detect_segments(gray, method=method)
+    return merge_collinear(segments, distance_tolerance=max(2.0, stroke_width(ink_mask(gray))))
+
+
+def detect_circles(gray: np.ndarray, min_radius: int = 0, max_radius: int = 0, min_distance: float = 20.0) -> np.ndarray:
+    """Circles (N, 3) of x, y, radius from the Hough gradient method; max_radius 0 means unbounded."""
+    import cv2
+
+    # Smoothing keeps the gradient directions of thick or noisy strokes consistent
+    circles = cv2.HoughCircles(cv2.medianBlur(gray, 5), cv2.HOUGH_GRADIENT, 1, min_distance, param1=50, param2=30,
+                               minRadius=min_radius, maxRadius=max_radius)
+    return np.asarray(circles if circles is not None else [], dtype=float).reshape(-1, 3)
+
+
+def _sorted_unique(values: np.ndarray) -> np.ndarray:
+    """np.unique for large integer arrays, by sorting (faster than hashing here)."""
+    values = np.sort(values)
+    return values[np.concatenate(([True], values[1:] != values[:-1]))] if len(values) else values
+
+
+def _chain_labels(values: np.ndarray, order: np.ndarray, breaks: np.ndarray) -> np.ndarray:
+    """Labels elements by run: a new run starts wherever `breaks` (in `order`) is True."""
+    labels = np.empty(len(values), dtype=np.int64)
+    labels[order] = np.cumsum(np.concatenate(([True], breaks))) - 1
+    return labels
+
+
+def merge_collinear(segments, angle_tolerance: float = DEFAULT_ANGLE_TOLERANCE, distance_tolerance: float = 2.0,
+                    gap_tolerance: float = 5.0) -> np.ndarray:
+    """
+    Merges segments that lie on the same line and overlap or are separated
+    by at most `gap_tolerance` pixels into one segment.
+
+    Segments are grouped by direction (within `angle_tolerance` radians) and
+    then by perpendicular offset (in bins of `distance_tolerance` pixels),
+    and their intervals along the common direction are joined.
+
+    Pieces that fell into neighbouring bins, parallel detections of both
+    edges of a thick stroke, and short detections whose direction is only
+    known to a few degrees are then absorbed: any segment whose endpoints
+    both lie within `distance_tolerance` of a longer merged line, and that
+    overlaps it, is folded into it.
+    """
+    merged = _merge_runs(as_segments(segments), angle_tolerance, distance_tolerance, gap_tolerance)
+    for _ in range(3):
+        merged, absorbed = _absorb_short(merged, distance_tolerance, gap_tolerance)
+        if not absorbed:
+            break
+    return merged
+
+
+def _merge_runs(segments: np.ndarray, angle_tolerance: float, distance_tolerance: float,
+                gap_tolerance: float) -> np.ndarray:
+    n = len(segments)
+    if n < 2:
+        return segments.copy()
+    p1, p2 = segments[:, :2], segments[:, 2:]
+    delta = p2 - p1
+    length = np.maximum(np.hypot(delta[:, 0], delta[:, 1]), 1e-9)
+
+    # Direction in [0, pi); lines just below pi are nearly the same as lines just above 0
+    theta = np.arctan2(delta[:, 1], delta[:, 0]) % np.pi
+    theta = np.where(theta > np.pi - angle_tolerance, theta - np.pi, theta)
+    order = np.argsort(theta, kind="stable")
+    direction_group = _chain_labels(theta, order, np.diff(theta[order]) > angle_tolerance)
+    group_theta = (np.bincount(direction_group, weights=theta * length)
+                   / np.bincount(direction_group, weights=length))[direction_group]
+    direction = np.stack([np.cos(group_theta), np.sin(group_theta)], axis=1)
+    normal = np.stack([-direction[:, 1], direction[:, 0]], axis=1)
+
+    # Perpendicular offset of each segment from the origin, binned within its direction group.
+    # Bins rather than chaining: across a whole sheet the offsets of distinct parallel lines
+    # drift with the small error in the group direction and would chain together.
+    rho = np.einsum("ij,ij->i", (p1 + p2) / 2, normal)
+    rho_bin = np.floor(rho / distance_tolerance).astype(np.int64)
+    rho_bin -= rho_bin.min()
+    line_key = direction_group * (rho_bin.max() + 1) + rho_bin
+
+    # Intervals along the line; a running maximum per line finds where they stop overlapping
+    t1 = np.einsum("ij,ij->i", p1, direction)
+    t2 = np.einsum("ij,ij->i", p2, direction)
+    start, end = np.minimum(t1, t2), np.maximum(t1, t2)
+    order = np.lexsort((start, line_key))
+    start, end = start[order], end[order]
+    group = np.cumsum(np.concatenate(([0], np.diff(line_key[order]) != 0)))
+    # Offsetting each line by more than the span of all intervals keeps the running maximum per line
+    span = end.max() - start.min() + 1.0
+    running_end = np.maximum.accumulate(end + group * span) - group * span
+    new_run = np.concatenate(([True], (group[1:] != group[:-1]) | (start[1:] > running_end[:-1] + gap_tolerance)))
+    runs = np.flatnonzero(new_run)
+    return _fit_runs(segments[order], length[order], runs)
+
+
+def _fit_runs(segments: np.ndarray, length: np.ndarray, runs: np.ndarray) -> np.ndarray:
+    """
+    One segment per run of pieces (runs start at the given indices): the
+    total least squares line through the pieces, each weighted by its
+    length, clipped to the extent of their endpoints. Pieces spanning a
+    thick stroke from edge to edge average out to its centre line.
+    """
+    p1, p2 = segments[:, :2], segments[:, 2:]
+    middle = (p1 + p2) / 2
+    delta = p2 - p1
+    # Second moments of each piece as a uniform line: midpoint plus L^2/12 along it
+    xx = length * (middle[:, 0] ** 2 + delta[:, 0] ** 2 / 12)
+    yy = length * (middle[:, 1] ** 2 + delta[:, 1] ** 2 / 12)
+    xy = length * (middle[:, 0] * middle[:, 1] + delta[:, 0] * delta[:, 1] / 12)
+    weight = np.add.reduceat(length, runs)
+    center = np.add.reduceat(middle * length[:, None], runs) / weight[:, None]
+    sxx = np.add.reduceat(xx, runs) / weight - center[:, 0] ** 2
+    syy = np.add.reduceat(yy, runs) / weight - center[:, 1] ** 2
+    sxy = np.add.reduceat(xy, runs) / weight - center[:, 0] * center[:, 1]
+    angle = 0.5 * np.arctan2(2 * sxy, sxx - syy)
+    direction = np.stack([np.cos(angle), np.sin(angle)], axis=1)
+
+    run_of = np.repeat(np.arange(len(runs)), np.diff(np.append(runs, len(segments))))
+    t1 = np.einsum("ij,ij->i", p1 - center[run_of], direction[run_of])
+    t2 = np.einsum("ij,ij->i", p2 - center[run_of], direction[run_of])
+    start = np.minimum.reduceat(np.minimum(t1, t2), runs)
+    end = np.maximum.reduceat(np.maximum(t1, t2), runs)
+    return np.hstack([center + start[:, None] * direction, center + end[:, None] * direction])
+
+
+def _absorb_short(segments: np.ndarray, distance_tolerance: float, gap_tolerance: float) -> Tuple[np.ndarray, int]:
+    """
+    Folds each segment into the longest longer segment whose line passes
+    within `distance_tolerance` of both its endpoints and whose extent
+    (plus `gap_tolerance`) it overlaps. Returns (segments, number absorbed).
+    """
+    if len(segments) < 2:
+        return segments, 0
+    p1, p2 = segments[:, :2], segments[:, 2:]
+    delta = p2 - p1
+    length = np.hypot(delta[:, 0], delta[:, 1])
+    direction = delta / np.maximum(length, 1e-9)[:, None]
+    normal = np.stack([-direction[:, 1], direction[:, 0]], axis=1)
+
+    reach = distance_tolerance + gap_tolerance
+    index = GridIndex(segments)
+    short, long = index.query(np.hstack([np.minimum(p1, p2) - reach, np.maximum(p1, p2) + reach]))
+    candidate = length[long] > length[short]
+    short, long = short[candidate], long[candidate]
+    # Perpendicular distance of both endpoints from the longer segment's line
+    offset1 = np.abs(np.einsum("ij,ij->i", p1[short] - p1[long], normal[long]))
+    offset2 = np.abs(np.einsum("ij,ij->i", p2[short] - p1[long], normal[long]))
+    t1 = np.einsum("ij,ij->i", p1[short] - p1[long], direction[long])
+    t2 = np.einsum("ij,ij->i", p2[short] - p1[long], direction[long])
+    fits = ((offset1 <= distance_tolerance) & (offset2 <= distance_tolerance)
+            & (np.maximum(t1, t2) >= -gap_tolerance) & (np.minimum(t1, t2) <= length[long] + gap_tolerance))
+    short, long, t1, t2 = short[fits], long[fits], t1[fits], t2[fits]
+    if len(short) == 0:
+        return segments, 0
+
+    # The longest target per absorbed segment; targets that are absorbed themselves wait for the next round
+    order = np.lexsort((-length[long], short))
+    first = order[np.concatenate(([True], np.diff(short[order]) != 0))]
+    short, long, t1, t2 = short[first], long[first], t1[first], t2[first]
+    absorbed = np.zeros(len(segments), dtype=bool)
+    absorbed[short] = True
+    keep = ~absorbed[long]
+    short, long, t1, t2 = short[keep], long[keep], t1[keep], t2[keep]
+    absorbed[:] = False
+    absorbed[short] = True
+
+    start = np.zeros(len(segments))
+    end = length.copy()
+    np.minimum.at(start, long, np.minimum(t1, t2))
+    np.maximum.at(end, long, np.maximum(t1, t2))
+    extended = np.hstack([p1 + start[:, None] * direction, p1 + end[:, None] * direction])
+    return extended[~absorbed], len(short)
+
+
+def point_segment_distances(points: np.ndarray, segments: np.ndarray) -> np.ndarray:
+    """Distance from points[i] to segments[i], row by row."""
+    p1, p2 = segments[:, :2], segments[:, 2:]
+    delta = p2 - p1
+    squared = np.einsum("ij,ij->i", delta, delta)
+    t = np.einsum("ij,ij->i", points - p1, delta) / np.where(squared > 0, squared, 1.0)
+    closest = p1 + np.clip(t, 0.0, 1.0)[:, None] * delta
+    return np.hypot(*(points - closest).T)
+
+
+class GridIndex:
+    """
+    Uniform grid over line segments for neighbourhood queries.
+
+    Each segment is registered in the cells it passes through (sampled every
+    half cell along the segment), so long diagonal lines do not fill their
+    whole bounding box. Cells are stored sorted by key with the segment ids
+    of each cell contiguous, so lookups are a binary search.
+    """
+    def __init__(self, segments, cell_size: Optional[float] = None):
+        self.segments = as_segments(segments)
+        n = len(self.segments)
+        if cell_size is None:
+            cell_size = self.default_cell_size(self.segments)
+        self.cell_size = float(cell_size)
+        if n == 0:
+            self.origin = np.zeros(2)
+            self.shape = (0, 0)
+            self.keys = np.empty(0, dtype=np.int64)
+            self.offsets = np.zeros(1, dtype=np.int64)
+            self.ids = np.empty(0, dtype=np.int64)
+            return
+        p1, p2 = self.segments[:, :2], self.segments[:, 2:]
+        self.origin = np.minimum(p1, p2).min(axis=0)
+        extent = np.maximum(p1, p2).max(axis=0) - self.origin
+        columns, rows = (np.floor(extent / self.cell_size).astype(np.int64) + 1)
+        self.shape = (int(rows), int(columns))
+
+        delta = p2 - p1
+        samples = np.ceil(np.hypot(delta[:, 0], delta[:, 1]) / (self.cell_size / 2)).astype(np.int64) + 1
+        segment_ids = np.repeat(np.arange(n, dtype=np.int64), samples)
+        first_sample = np.cumsum(samples) - samples
+        step = np.arange(len(segment_ids)) - np.repeat(first_sample, samples)
+        t = step / np.maximum(samples - 1, 1)[segment_ids]
+        points = p1[segment_ids] + t[:, None] * delta[segment_ids]
+        cells = self._cells(points)
+        pairs = _sorted_unique(self._key(cells[:, 0], cells[:, 1]) * n + segment_ids)
+        cell_keys, self.ids = np.divmod(pairs, n)
+        starts = np.flatnonzero(np.concatenate(([True], cell_keys[1:] != cell_keys[:-1])))
+        self.keys = cell_keys[starts]
+        self.offsets = np.append(starts, len(pairs)).astype(np.int64)
+
+    @staticmethod
+    def default_cell_size(segments: np.ndarray) -> float:
+        """About the median segment length, but never below 8 pixels."""
+        if len(segments) == 0:
+            return 64.0
+        lengths = np.hypot(segments[:, 2] - segments[:, 0], segments[:, 3] - segments[:, 1])
+        return float(max(np.median(lengths), 8.0))
+
+    def _cells(self, points: np.ndarray) -> np.ndarray:
+        return np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+
+    def _key(self, column: np.ndarray, row: np.ndarray) -> np.ndarray:
+        return row * self.shape[1] + column
+
+    def query(self, boxes) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Candidate pairs for axis-aligned query boxes (M, 4) of x0, y0, x1, y1:
+        returns (box indices, segment indices) covering every segment that
+        passes within the box, and possibly a few nearby ones.
+        """
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        if len(boxes) == 0 or len(self.ids) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        rows, columns = self.shape
+        # One extra cell on each side: a segment is only sampled every half cell
+        low = self._cells(np.minimum(boxes[:, :2], boxes[:, 2:])) - 1
+        high = self._cells(np.maximum(boxes[:, :2], boxes[:, 2:])) + 1
+        low = np.maximum(low, 0)
+        high = np.minimum(high, [columns - 1, rows - 1])
+        width = np.maximum(high[:, 0] - low[:, 0] + 1, 0)
+        height = np.maximum(high[:, 1] - low[:, 1] + 1, 0)
+        cell_counts = width * height
+
+        # Every (box, cell) combination
+        box_ids = np.repeat(np.arange(len(boxes), dtype=np.int64), cell_counts)
+        first_cell = np.cumsum(cell_counts) - cell_counts
+        local = np.arange(len(box_ids)) - np.repeat(first_cell, cell_counts)
+        safe_width = np.maximum(width, 1)[box_ids]
+        keys = self._key(low[box_ids, 0] + local % safe_width, low[box_ids, 1] + local // safe_width)
+
+        slot = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = self.keys[slot] == keys
+        box_ids, slot = box_ids[found], slot[found]
+        counts = self.offsets[slot + 1] - self.offsets[slot]
+
+        # Every (box, segment registered in the cell) combination, without repeats
+        pair_box = np.repeat(box_ids, counts)
+        first_id = np.cumsum(counts) - counts
+        position = np.repeat(self.offsets[slot], counts) + np.arange(len(pair_box)) - np.repeat(first_id, counts)
+        pairs = _sorted_unique(pair_box * len(self.segments) + self.ids[position])
+        return np.divmod(pairs, len(self.segments))
+
+    def nearest(self, points, max_distance: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nearest segment to each point within `max_distance`: returns
+        (segment index or -1, distance or inf) per point.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        nearest = np.full(len(points), -1, dtype=np.int64)
+        distances = np.full(len(points), np.inf)
+        point_ids, segment_ids = self.query(np.hstack([points - max_distance, points + max_distance]))
+        if len(point_ids) == 0:
+            return nearest, distances
+        pair_distances = point_segment_distances(points[point_ids], self.segments[segment_ids])
+        within = pair_distances <= max_distance
+        point_ids, segment_ids, pair_distances = point_ids[within], segment_ids[within], pair_distances[within]
+        # Closest first within each point; ties go to the lower segment index
+        order = np.lexsort((segment_ids, pair_distances, point_ids))
+        first = order[np.concatenate(([True], np.diff(point_ids[order]) != 0))] if len(order) else order
+        nearest[point_ids[first]] = segment_ids[first]
+        distances[point_ids[first]] = pair_distances[first]
+        return nearest, distances
+
+
+def associate_text(text_boxes: List[TextBox], segments, max_distance: float = 50.0,
+                   index: Optional[GridIndex] = None) -> List[Dict]:
+    """
+    Matches each text box to the nearest segment within `max_distance` of
+    its centre. Pass a prebuilt `index` to reuse it across calls.
+    """
+    if index is None:
+        index = GridIndex(segments)
+    if not text_boxes:
+        return []
+    centers = np.array([box.center for box in text_boxes], dtype=float)
+    nearest, distances = index.nearest(centers, max_distance)
+    associations = []
+    for box, segment_id, distance in zip(text_boxes, nearest, distances):
+        if segment_id < 0:
+            continue
+        associations.append({
+            "text": box.text,
+            "box": box.to_dict(),
+            "segment": int(segment_id),
+            "line": [float(value) for value in index.segments[segment_id]],
+            "distance": float(distance),
+        })
+    return associations
+
+
+def read_text(gray: np.ndarray, min_confidence: float = 60.0) -> List[TextBox]:
+    """Runs Tesseract on the image and returns the confident, non-empty words."""
+    import pytesseract
+
+    data = pytesseract.image_to_data(gray, output_type=pytesseract.Output.DICT)
+    boxes = []
+    for i, text in enumerate(data["text"]):
+        confidence = float(data["conf"][i])
+        if confidence > min_confidence and text.strip():
+            boxes.append(TextBox(text.strip(), data["left"][i], data["top"][i], data["width"][i],
+                                 data["height"][i], confidence))
+    return boxes
+
+
+def find_text_regions(gray: np.ndarray, segments: Optional[np.ndarray] = None, min_height: int = 6,
+                      max_height: int = 80, line_width: int = 5, padding: int = 3) -> np.ndarray:
+    """
+    Bounding boxes (M, 4) of x, y, width, height around probable words, so
+    that OCR only has to look at those. Ink on the detected `segments` is
+    erased first; what remains is joined horizontally into words and kept
+    if it is about one text line tall.
+    """
+    import cv2
+
+    ink = ink_mask(gray)
+    if segments is not None and len(segments):
+        lines = np.round(as_segments(segments)).astype(np.int32).reshape(-1, 2, 2)
+        cv2.polylines(ink, list(lines), False, 0, line_width)
+    words = cv2.dilate(ink, cv2.getStructuringElement(cv2.MORPH_RECT, (max(min_height, 3), 3)))
+    stats = cv2.connectedComponentsWithStats(words, connectivity=8)[2][1:]
+    x, y, width, height = stats[:, 0], stats[:, 1], stats[:, 2], stats[:, 3]
+    keep = (height >= min_height) & (height <= max_height) & (width >= min_height // 2)
+    x0 = np.maximum(x[keep] - padding, 0)
+    y0 = np.maximum(y[keep] - padding, 0)
+    x1 = np.minimum(x[keep] + width[keep] + padding, gray.shape[1])
+    y1 = np.minimum(y[keep] + height[keep] + padding, gray.shape[0])
+    return np.stack([x0, y0, x1 - x0, y1 - y0], axis=1).astype(np.int64)
+
+
+class OcrEngine:
+    """
+    Reads text in given regions of a page.
+
+    With tesserocr installed, one Tesseract instance is loaded in-process and
+    reused for every region and page. Otherwise pytesseract is used, which
+    starts the tesseract program for each call, so the regions of a page
+    are stacked into one image and read in a single call.
+    """
+    MOSAIC_PADDING = 10
+
+    def __init__(self, language: str = "eng", min_confidence: float = 60.0):
+        self.language = language
+        self.min_confidence = min_confidence
+        try:
+            import tesserocr
+        except ImportError:
+            self._api = None
+        else:
+            self._api = tesserocr.PyTessBaseAPI(lang=language, psm=tesserocr.PSM.SINGLE_LINE)
+
+    @property
+    def in_process(self) -> bool:
+        return self._api is not None
+
+    def read_regions(self, gray: np.ndarray, regions: np.ndarray) -> List[TextBox]:
+        if len(regions) == 0:
+            return []
+        if self._api is not None:
+            return self._read_in_process(gray, regions)
+        return self._read_mosaic(gray, regions)
+
+    def _read_in_process(self, gray: np.ndarray, regions: np.ndarray) -> List[TextBox]:
+        from PIL import Image
+
+        self._api.SetImage(Image.fromarray(gray))
+        boxes = []
+        for x, y, width, height in regions:
+            self._api.SetRectangle(int(x), int(y), int(width), int(height))
+            text = self._api.GetUTF8Text().strip()
+            confidence = float(self._api.MeanTextConf())
+            if text and confidence > self.min_confidence:
+                boxes.append(TextBox(text, int(x), int(y), int(width), int(height), confidence))
+        return boxes
+
+    def _read_mosaic(self, gray: np.ndarray, regions: np.ndarray) -> List[TextBox]:
+        import pytesseract
+
+        pad = self.MOSAIC_PADDING
+        heights = regions[:, 3]
+        tops = pad + np.concatenate(([0], np.cumsum(heights + pad)[:-1]))
+        mosaic = np.full((int(tops[-1] + heights[-1] + pad), int(regions[:, 2].max() + 2 * pad)),
+                         int(np.median(gray)), dtype=np.uint8)
+        for (x, y, width, height), top in zip(regions, tops):
+            mosaic[top:top + height, pad:pad + width] = gray[y:y + height, x:x + width]
+
+        data = pytesseract.image_to_data(mosaic, lang=self.language, config="--psm 6",
+                                         output_type=pytesseract.Output.DICT)
+        boxes = []
+        for i, text in enumerate(data["text"]):
+            confidence = float(data["conf"][i])
+            if confidence <= self.min_confidence or not text.strip():
+                continue
+            # Map the word back to the region it was cut from
+            region = int(np.searchsorted(tops, data["top"][i] + data["height"][i] / 2, side="right")) - 1
+            region = min(max(region, 0), len(regions) - 1)
+            x, y = regions[region, :2]
+            boxes.append(TextBox(text.strip(), int(x + data["left"][i] - pad), int(y + data["top"][i] - tops[region]),
+                                 data["width"][i], data["height"][i], confidence))
+        return boxes
+
+
+def load_grayscale(image: Union[str, np.ndarray]) -> np.ndarray:
+    import cv2
+
+    if isinstance(image, str):
+        gray = cv2.imread(image, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            raise FileNotFoundError(f"Could not read image '{image}'.")
+        return gray
+    return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def digitize(image: Union[str, np.ndarray], method: str = "hough", max_text_distance: float = 50.0,
+             ocr: bool = True, ocr_engine: Optional[OcrEngine] = None) -> DrawingResult:
+    """
+    Segments, text and associations of one drawing (a path or an image
+    array). OCR only runs on the text regions left after the segments are
+    erased; pass `ocr_engine` to reuse a loaded engine across drawings.
+    """
+    gray = load_grayscale(image)
+    segments = extract_lines(gray, method=method)
+    text_boxes = []
+    if ocr:
+        text_boxes = (ocr_engine or OcrEngine()).read_regions(gray, find_text_regions(gray, segments))
+    return DrawingResult(segments, text_boxes, associate_text(text_boxes, segments, max_text_distance))
+
+
+def write_dxf(result: DrawingResult, output_path: str, snap_tolerance: float = 3.0,
+              height: Optional[float] = None) -> Dict[str, int]:
+    """
+    Writes the result as DXF through dxf_writer.export_drawing: geometry
+    deduplicated and chained into polylines, dimension lines and text on
+    their own layers. Returns the entity counts.
+    """
+    from .dxf_writer import export_drawing
+
+    return export_drawing(result, output_path, snap_tolerance=snap_tolerance, height=height)
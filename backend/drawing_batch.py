@@ -0,0 +1,247 @@
+"""
+Batch digitization of drawings in a process pool.
+
+    python -m backend.drawing_batch drawings/ extra.png --output-dir dxf/ --workers 4
+
+Each drawing is decoded, its segments detected and merged, the text
+regions read by OCR and the result written as DXF in a worker process.
+Every worker loads its OCR engine once, when it starts, and reuses it for
+all drawings it gets. Results are streamed as each drawing finishes (one
+JSON line per drawing on the CLI), followed by a summary with the
+throughput in pages per second.
+
+The same processor backs the /api/drawings/digitize endpoint; its pool is
+only started on first use.
+"""
+import argparse
+import configparser
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp")
+# How often a run waiting for drawings checks whether it was cancelled
+CANCEL_POLL_SECONDS = 0.2
+
+# The OCR engine of this worker process, loaded by _init_worker
+_ocr_engine = None
+
+
+def _init_worker(ocr_language: Optional[str]):
+    global _ocr_engine
+    try:
+        import cv2
+        # One process per core already; OpenCV's own threads would oversubscribe
+        cv2.setNumThreads(1)
+    except ImportError:
+        pass
+    if ocr_language:
+        from .drawing import OcrEngine
+        _ocr_engine = OcrEngine(ocr_language)
+
+
+def process_drawing(path: str, output_dir: str, method: str = "hough", dxf_name: Optional[str] = None) -> Dict:
+    """
+    Digitizes one drawing into `output_dir` (as `dxf_name`, by default the
+    image's name with a .dxf extension); runs in a worker process and never raises.
+    """
+    from .drawing import DrawingResult, associate_text, extract_lines, find_text_regions, load_grayscale, write_dxf
+
+    result = {"path": path}
+    timings = {}
+    started = time.perf_counter()
+
+    def lap(stage):
+        nonlocal started
+        now = time.perf_counter()
+        timings[stage] = round((now - started) * 1000, 2)
+        started = now
+
+    try:
+        gray = load_grayscale(path)
+        lap("decode")
+        segments = extract_lines(gray, method=method)
+        lap("segments")
+        text_boxes = []
+        if _ocr_engine is not None:
+            regions = find_text_regions(gray, segments)
+            result["text_regions"] = len(regions)
+            text_boxes = _ocr_engine.read_regions(gray, regions)
+        lap("ocr")
+        associations = associate_text(text_boxes, segments)
+        lap("associate")
+        dxf_path = os.path.join(output_dir, dxf_name or os.path.splitext(os.path.basename(path))[0] + ".dxf")
+        entities = write_dxf(DrawingResult(segments, text_boxes, associations), dxf_path)
+        lap("dxf")
+        result.update({
+            "dxf": dxf_path,
+            "entities": entities,
+            "shape": list(gray.shape),
+            "segments": len(segments),
+            "text": [box.text for box in text_boxes],
+            "associations": associations,
+        })
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["timings_ms"] = timings
+    return result
+
+
+def _dxf_names() -> Callable[[str], str]:
+    """
+    Names the DXF files of one run: the image's name with a .dxf extension,
+    or if that is taken (a/plan.png and b/plan.png, plan.png and plan.tif)
+    with a short hash of the image path added.
+    """
+    used = set()
+
+    def name(path: str) -> str:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        candidate = f"{stem}.dxf"
+        if candidate.lower() in used:
+            candidate = f"{stem}-{hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]}.dxf"
+        used.add(candidate.lower())
+        return candidate
+    return name
+
+
+def expand_paths(inputs: Iterable[str]) -> List[str]:
+    """Files as given, plus the images in any directories (not recursive), sorted per directory."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(os.path.join(item, name) for name in sorted(os.listdir(item))
+                         if name.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            paths.append(item)
+    return paths
+
+
+class DrawingProcessor:
+    """A process pool of drawing workers, each with its own loaded OCR engine."""
+    def __init__(self, workers: Optional[int] = None, ocr_language: Optional[str] = "eng", method: str = "hough"):
+        self.workers = workers or os.cpu_count() or 1
+        self.ocr_language = ocr_language
+        self.method = method
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                                 initargs=(self.ocr_language,))
+            return self._pool
+
+    def run(self, paths: Iterable[str], output_dir: str, max_in_flight: Optional[int] = None,
+            cancel: Optional[threading.Event] = None) -> Iterator[Dict]:
+        """
+        Yields one result per drawing in completion order. At most
+        `max_in_flight` drawings (default: twice the workers) are queued at
+        once, so a long list does not hold every pending result in memory.
+        Once `cancel` is set, the run stops within CANCEL_POLL_SECONDS and
+        drops the drawings not yet done, even while another thread waits in it.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        limit = max_in_flight or self.workers * 2
+        pending: Dict[Future, str] = {}
+        remaining = iter(paths)
+        dxf_name = _dxf_names()
+        try:
+            while True:
+                if cancel is not None and cancel.is_set():
+                    return
+                for path in remaining:
+                    pending[self.pool.submit(process_drawing, path, output_dir, self.method, dxf_name(path))] = path
+                    if len(pending) >= limit:
+                        break
+                if not pending:
+                    return
+                done, _ = wait(pending, timeout=CANCEL_POLL_SECONDS if cancel is not None else None,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    try:
+                        yield future.result()
+                    except Exception as e:
+                        # The worker died (e.g. out of memory) rather than the drawing failing
+                        yield {"path": path, "error": f"{type(e).__name__}: {e}", "timings_ms": {}}
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+
+class BatchSummary:
+    """Running totals of a batch, for the final throughput report."""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.pages = 0
+        self.errors = 0
+
+    def add(self, result: Dict):
+        self.pages += 1
+        if "error" in result:
+            self.errors += 1
+
+    def to_dict(self) -> Dict:
+        seconds = time.perf_counter() - self.started
+        return {
+            "pages": self.pages,
+            "errors": self.errors,
+            "seconds": round(seconds, 3),
+            "pages_per_second": round(self.pages / seconds, 3) if seconds > 0 else None,
+        }
+
+
+def create_drawing_processor() -> DrawingProcessor:
+    config = configparser.ConfigParser()
+    config.read('backend/config.ini')
+    section = config['DRAWINGS'] if config.has_section('DRAWINGS') else {}
+    workers = int(section.get('workers') or 0) or None
+    return DrawingProcessor(workers, section.get('ocr_language', 'eng') or None, section.get('method', 'hough'))
+
+
+# Shared processor used by the API
+drawing_processor = create_drawing_processor()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Digitize drawings into DXF files in parallel.")
+    parser.add_argument("inputs", nargs="+", help="image files or directories of images")
+    parser.add_argument("--output-dir", default="dxf", help="where the DXF files are written")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--method", default="hough", choices=["hough", "lsd"])
+    parser.add_argument("--language", default="eng", help="Tesseract language")
+    parser.add_argument("--no-ocr", action="store_true", help="only extract geometry")
+    args = parser.parse_args(argv)
+
+    paths = expand_paths(args.inputs)
+    summary = BatchSummary()
+    with DrawingProcessor(args.workers, None if args.no_ocr else args.language, args.method) as processor:
+        for result in processor.run(paths, args.output_dir):
+            summary.add(result)
+            print(json.dumps(result), flush=True)
+    print(json.dumps({"summary": summary.to_dict()}), flush=True)
+    return 1 if summary.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""
+Benchmark of the drawing pipeline geometry on large synthetic drawings.
+
+    python -m backend.drawing_benchmark --rectangles 250 1000 4000 --output drawing_benchmark.json
+    python -m backend.drawing_benchmark --image scan.png
+
+A synthetic drawing is a sheet of rectangular parts, each with a dimension
+line and its value above it, so 1000 rectangles give 5000 lines and 1000
+text labels. Detector output is simulated the way the probabilistic Hough
+transform reports a scan: every line broken into pieces and repeated with
+sub-pixel jitter. For each size the report gives:
+
+- merge: time to merge the detections back into lines, and how many lines
+  came out compared with the number drawn;
+- associate: time to match every label to its dimension line with the grid
+  index, with a dense all-pairs distance matrix, and with the per-box,
+  per-line Python loop of the original script (the last two only while the
+  number of pairs is small enough), and whether they agree;
+- dxf: time and file size to write the drawing as DXF with the bulk writer
+  (dxf_writer.py) from the merged lines, against writing every raw
+  detection, and every merged line, one entity at a time with ezdxf (when
+  installed and the drawing has at most MAX_EZDXF_ENTITIES entities);
+- detect: with OpenCV installed, the drawing is also rendered and run
+  through segment detection.
+
+With --image, a real drawing is digitized instead (needs OpenCV and
+Tesseract) and the stage times are reported.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .drawing import DrawingResult, GridIndex, TextBox, associate_text, merge_collinear, point_segment_distances
+from .dxf_writer import export_drawing
+
+PART_SIZE = 60
+PART_SPACING = 40
+LABEL_OFFSET = 12
+MAX_LOOP_PAIRS = 2_000_000
+MAX_DENSE_PAIRS = 50_000_000
+MAX_EZDXF_ENTITIES = 200_000
+
+
+def synthetic_drawing(rectangles: int, seed: int = 0) -> Tuple[np.ndarray, List[TextBox], np.ndarray]:
+    """
+    Returns (lines, labels, the index in `lines` of each label's dimension
+    line) for a sheet of `rectangles` parts laid out on a square grid.
+    """
+    rng = np.random.default_rng(seed)
+    columns = int(np.ceil(np.sqrt(rectangles)))
+    pitch = PART_SIZE + PART_SPACING
+    index = np.arange(rectangles)
+    x0 = (index % columns) * pitch + PART_SPACING
+    y0 = (index // columns) * pitch + PART_SPACING
+    width = rng.integers(PART_SIZE // 2, PART_SIZE + 1, rectangles)
+    height = rng.integers(PART_SIZE // 2, PART_SIZE - LABEL_OFFSET, rectangles)
+    y0 = y0 + LABEL_OFFSET * 2
+    x1, y1 = x0 + width, y0 + height
+    dimension_y = y0 - LABEL_OFFSET
+    lines = np.concatenate([
+        np.stack([x0, y0, x1, y0], axis=1),
+        np.stack([x1, y0, x1, y1], axis=1),
+        np.stack([x1, y1, x0, y1], axis=1),
+        np.stack([x0, y1, x0, y0], axis=1),
+        np.stack([x0, dimension_y, x1, dimension_y], axis=1),
+    ]).astype(float)
+    labels = [TextBox(str(int(w)), float(x + w / 2 - 9), float(y - LABEL_OFFSET - 11), 18.0, 10.0)
+              for x, y, w in zip(x0, dimension_y, width)]
+    return lines, labels, np.arange(rectangles) + 4 * rectangles
+
+
+def simulate_detections(lines: np.ndarray, duplicates: int = 2, pieces: int = 2, jitter: float = 0.3,
+                        seed: int = 0) -> np.ndarray:
+    """Breaks every line into `pieces` with small gaps and repeats each piece with jitter."""
+    rng = np.random.default_rng(seed)
+    p1, p2 = lines[:, :2], lines[:, 2:]
+    # A 2-pixel gap between consecutive pieces
+    gap = (2.0 / np.maximum(np.hypot(*(p2 - p1).T), 1.0))[:, None]
+    parts = []
+    for k in range(pieces):
+        start = p1 + (k / pieces + (gap / 2 if k else 0)) * (p2 - p1)
+        end = p1 + ((k + 1) / pieces - (gap / 2 if k < pieces - 1 else 0)) * (p2 - p1)
+        parts.append(np.hstack([start, end]))
+    pieces_array = np.concatenate(parts)
+    copies = [pieces_array + rng.normal(0.0, jitter, pieces_array.shape) for _ in range(duplicates + 1)]
+    detections = np.concatenate(copies)
+    return detections[rng.permutation(len(detections))]
+
+
+def associate_dense(centers: np.ndarray, segments: np.ndarray, max_distance: float) -> np.ndarray:
+    """All-pairs reference: nearest segment per point from the full distance matrix."""
+    n = len(segments)
+    rows = max(1, 1_000_000 // max(n, 1))
+    nearest = []
+    for i in range(0, len(centers), rows):
+        chunk = centers[i:i + rows]
+        distances = point_segment_distances(np.repeat(chunk, n, axis=0), np.tile(segments, (len(chunk), 1)))
+        distances = distances.reshape(len(chunk), n)
+        best = distances.argmin(axis=1)
+        nearest.append(np.where(distances[np.arange(len(chunk)), best] <= max_distance, best, -1))
+    return np.concatenate(nearest)
+
+
+def associate_loop(centers: np.ndarray, segments: np.ndarray, max_distance: float) -> np.ndarray:
+    """The original approach: every text box against every line in Python."""
+    nearest = []
+    for cx, cy in centers:
+        best, best_distance = -1, max_distance
+        for i, (x1, y1, x2, y2) in enumerate(segments):
+            dx, dy = x2 - x1, y2 - y1
+            squared = dx * dx + dy * dy
+            t = ((cx - x1) * dx + (cy - y1) * dy) / squared if squared else 0.0
+            t = min(max(t, 0.0), 1.0)
+            distance = ((cx - x1 - t * dx) ** 2 + (cy - y1 - t * dy) ** 2) ** 0.5
+            if distance < best_distance or (best < 0 and distance <= best_distance):
+                best, best_distance = i, distance
+        nearest.append(best)
+    return np.array(nearest)
+
+
+def _timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def render(lines: np.ndarray, labels: List[TextBox]) -> np.ndarray:
+    import cv2
+
+    size = np.ceil(lines.reshape(-1, 2).max(axis=0)).astype(int) + PART_SPACING
+    image = np.full((size[1], size[0]), 255, np.uint8)
+    for x1, y1, x2, y2 in lines.round().astype(int):
+        cv2.line(image, (x1, y1), (x2, y2), 0, 2)
+    for label in labels:
+        cv2.putText(image, label.text, (int(label.left), int(label.top + label.height)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, 0, 1)
+    return image
+
+
+def run_size(rectangles: int, max_distance: float = 30.0, seed: int = 0, detect: bool = True) -> Dict:
+    lines, labels, expected = synthetic_drawing(rectangles, seed)
+    detections = simulate_detections(lines, seed=seed)
+    merged, merge_ms = _timed(merge_collinear, detections)
+
+    centers = np.array([label.center for label in labels])
+    index, index_ms = _timed(GridIndex, merged)
+    (grid, _), grid_ms = _timed(index.nearest, centers, max_distance)
+    associations, associate_ms = _timed(associate_text, labels, merged, max_distance, index)
+    result = {
+        "rectangles": rectangles,
+        "lines_drawn": len(lines),
+        "labels": len(labels),
+        "merge": {
+            "detections": len(detections),
+            "lines_merged": len(merged),
+            "ms": round(merge_ms, 2),
+        },
+        "associate": {
+            "grid_ms": round(index_ms + grid_ms, 2),
+            "grid_build_ms": round(index_ms, 2),
+            "associate_text_ms": round(associate_ms, 2),
+            # Merged dimension lines sit at the dimension line's position
+            "labels_on_dimension_line": int(np.sum(np.abs(merged[grid.clip(0), 1] - lines[expected, 1]) < 2)),
+        },
+    }
+    pairs = len(centers) * len(merged)
+    if pairs <= MAX_DENSE_PAIRS:
+        dense, dense_ms = _timed(associate_dense, centers, merged, max_distance)
+        result["associate"]["dense_ms"] = round(dense_ms, 2)
+        result["associate"]["grid_matches_dense"] = bool(np.array_equal(grid, dense))
+    if pairs <= MAX_LOOP_PAIRS:
+        loop, loop_ms = _timed(associate_loop, centers, merged, max_distance)
+        result["associate"]["loop_ms"] = round(loop_ms, 2)
+        result["associate"]["grid_matches_loop"] = bool(np.array_equal(grid, loop))
+    result["dxf"] = run_dxf(DrawingResult(merged, labels, associations), detections)
+    if detect:
+        result["detect"] = run_detection(lines, labels)
+    return result
+
+
+def _write_ezdxf(segments: np.ndarray, labels: List[TextBox], path: str):
+    """The original writer: one ezdxf entity per line and label."""
+    import ezdxf
+
+    doc = ezdxf.new()
+    msp = doc.modelspace()
+    for x1, y1, x2, y2 in segments:
+        msp.add_line((x1, y1), (x2, y2))
+    for label in labels:
+        msp.add_text(label.text, dxfattribs={"height": label.height, "insert": (label.left, label.top + label.height)})
+    doc.saveas(path)
+
+
+def run_dxf(result: DrawingResult, detections: np.ndarray) -> Dict:
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "bulk.dxf")
+        counts, bulk_ms = _timed(export_drawing, result, path)
+        report = {"bulk": {"ms": round(bulk_ms, 2), "bytes": os.path.getsize(path), "entities": counts}}
+        try:
+            import ezdxf  # noqa: F401
+        except ImportError:
+            return report
+        for name, segments in (("ezdxf_detections", detections), ("ezdxf_merged", result.segments)):
+            if len(segments) + len(result.text_boxes) > MAX_EZDXF_ENTITIES:
+                continue
+            path = os.path.join(scratch, name + ".dxf")
+            _, ezdxf_ms = _timed(_write_ezdxf, segments, result.text_boxes, path)
+            report[name] = {"ms": round(ezdxf_ms, 2), "bytes": os.path.getsize(path)}
+    return report
+
+
+def run_detection(lines: np.ndarray, labels: List[TextBox]) -> Optional[Dict]:
+    try:
+        import cv2  # noqa: F401
+    except ImportError:
+        return None
+    from .drawing import detect_segments, ink_mask, stroke_width
+
+    image = render(lines, labels)
+    segments, detect_ms = _timed(detect_segments, image)
+    tolerance = max(2.0, stroke_width(ink_mask(image)))
+    merged, merge_ms = _timed(merge_collinear, segments, distance_tolerance=tolerance)
+    return {"image": list(image.shape), "detections": len(segments), "lines_merged": len(merged),
+            "detect_ms": round(detect_ms, 2), "merge_ms": round(merge_ms, 2)}
+
+
+def run_image(path: str, method: str) -> Dict:
+    from .drawing import detect_segments, ink_mask, load_grayscale, read_text, stroke_width
+
+    gray, load_ms = _timed(load_grayscale, path)
+    segments, detect_ms = _timed(detect_segments, gray, method=method)
+    tolerance = max(2.0, stroke_width(ink_mask(gray)))
+    merged, merge_ms = _timed(merge_collinear, segments, distance_tolerance=tolerance)
+    boxes, ocr_ms = _timed(read_text, gray)
+    associations, associate_ms = _timed(associate_text, boxes, merged)
+    return {
+        "image": path, "shape": list(gray.shape), "detections": len(segments), "lines_merged": len(merged),
+        "text_boxes": len(boxes), "associations": len(associations),
+        "ms": {"load": round(load_ms, 2), "detect": round(detect_ms, 2), "merge": round(merge_ms, 2),
+               "ocr": round(ocr_ms, 2), "associate": round(associate_ms, 2)},
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark of the drawing-to-CAD geometry.")
+    parser.add_argument("--rectangles", nargs="+", type=int, default=[250, 1000, 4000],
+                        help="synthetic drawing sizes; each rectangle adds five lines and one label")
+    parser.add_argument("--max-distance", type=float, default=30.0, help="text association radius in pixels")
+    parser.add_argument("--no-detect", action="store_true", help="skip rendering and OpenCV segment detection")
+    parser.add_argument("--image", help="digitize this drawing instead of the synthetic ones")
+    parser.add_argument("--method", default="hough", choices=["hough", "lsd"])
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    if args.image:
+        report = {"results": [run_image(args.image, args.method)]}
+    else:
+        report = {"results": [run_size(size, args.max_distance, detect=not args.no_detect) for size in args.rectangles]}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
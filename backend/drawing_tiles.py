@@ -0,0 +1,308 @@
+"""
+Tiled processing of very large scanned drawings.
+
+    python -m backend.drawing_tiles scan.tif --output scan.dxf --tile 2048 --overlap 256 --workers 4
+    python -m backend.drawing_tiles --synthetic 20000x28000 --workers 4
+
+An A0 sheet scanned at 600 dpi is about 20000 x 28000 pixels; running
+Canny, Hough and HoughCircles over it in one piece needs several copies of
+the whole raster. Here the raster is converted once to a grayscale .npy
+file that every worker maps read-only, and cut into overlapping tiles
+that are processed in a process pool. A worker only ever holds one tile
+and its intermediate images, and at most `max_in_flight` tiles are queued,
+so peak memory depends on the tile size, not on the drawing.
+
+That bound only holds from end to end for a .npy raster, which is used as
+it is, without being read into memory at all. Any other image file is
+decoded whole by OpenCV once, to write the .npy file. That needs the full
+raster in memory, about 560 MB for an A0 sheet at 600 dpi. Most scans are
+Group 4 or LZW TIFFs, which neither OpenCV nor Pillow can decode in strips.
+Where memory is tight, convert large scans to .npy beforehand, e.g. on a
+machine with more memory.
+
+Before that, a coarse pass measures the contrast in blocks of `scale`
+pixels, strip by strip, and only tiles that contain ink at that resolution
+are processed; blank sheet areas cost nothing.
+
+Results are stitched in drawing coordinates. Segments cut by a tile border
+appear in both tiles, overlapping in the overlap area, and are joined by
+merge_collinear together with the other duplicates. A circle is kept only
+by the tile whose core (the tile minus half the overlap on inner sides)
+contains its centre; circles up to half the overlap in radius therefore
+always lie entirely in the tile that keeps them, and each is reported once.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .drawing import DrawingResult, as_segments, merge_collinear
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+Tile = Tuple[int, int, int, int]
+
+
+def plan_tiles(height: int, width: int, tile_size: int, overlap: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Tile windows and cores, each (N, 4) of y0, x0, y1, x1. Windows overlap
+    by `overlap` pixels; the cores partition the image exactly.
+    """
+    if overlap >= tile_size:
+        raise ValueError("The tile overlap must be smaller than the tile size.")
+    stride = tile_size - overlap
+
+    def starts(length):
+        count = max(int(np.ceil((length - overlap) / stride)), 1)
+        return np.minimum(np.arange(count) * stride, max(length - tile_size, 0))
+
+    def cores(begin, length):
+        end = np.minimum(begin + tile_size, length)
+        # Split each overlap down the middle; the outer edges go to the image border
+        core_begin = np.concatenate(([0], (begin[1:] + end[:-1]) // 2))
+        core_end = np.concatenate(((begin[1:] + end[:-1]) // 2, [length]))
+        return end, core_begin, core_end
+
+    y0, x0 = starts(height), starts(width)
+    y1, core_y0, core_y1 = cores(y0, height)
+    x1, core_x0, core_x1 = cores(x0, width)
+    rows, columns = np.meshgrid(np.arange(len(y0)), np.arange(len(x0)), indexing="ij")
+    rows, columns = rows.ravel(), columns.ravel()
+    windows = np.stack([y0[rows], x0[columns], y1[rows], x1[columns]], axis=1)
+    core = np.stack([core_y0[rows], core_x0[columns], core_y1[rows], core_x1[columns]], axis=1)
+    return windows, core
+
+
+def coarse_contrast(raster: np.ndarray, scale: int, strip_rows: int = 1024) -> np.ndarray:
+    """
+    Contrast (max - min grey level) in blocks of `scale` x `scale` pixels,
+    computed strip by strip so the raster is never copied whole. Unlike a
+    block mean, a one-pixel line still shows at full strength, whatever the
+    polarity of the drawing.
+    """
+    height, width = raster.shape
+    strip_rows = max(strip_rows // scale, 1) * scale
+    coarse_width = -(-width // scale)
+    strips = []
+    for top in range(0, height, strip_rows):
+        strip = np.asarray(raster[top:top + strip_rows])
+        pad_rows = -strip.shape[0] % scale
+        pad_columns = -width % scale
+        if pad_rows or pad_columns:
+            strip = np.pad(strip, ((0, pad_rows), (0, pad_columns)), mode="edge")
+        blocks = strip.reshape(-1, scale, coarse_width, scale)
+        strips.append(blocks.max(axis=(1, 3)) - blocks.min(axis=(1, 3)))
+    return np.concatenate(strips)
+
+
+def select_tiles(contrast: np.ndarray, windows: np.ndarray, scale: int, threshold: int = 40) -> np.ndarray:
+    """Mask of the tiles whose window contains a coarse block with more than `threshold` contrast."""
+    ink = (contrast > threshold).astype(np.int64)
+    # Summed-area table: ink inside any window in constant time
+    table = np.zeros((ink.shape[0] + 1, ink.shape[1] + 1), dtype=np.int64)
+    table[1:, 1:] = ink.cumsum(axis=0).cumsum(axis=1)
+    y0, x0 = windows[:, 0] // scale, windows[:, 1] // scale
+    y1 = np.minimum(-(-windows[:, 2] // scale), ink.shape[0])
+    x1 = np.minimum(-(-windows[:, 3] // scale), ink.shape[1])
+    return (table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0]) > 0
+
+
+def detect_tile(tile: np.ndarray, max_radius: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Default per-tile detector: probabilistic Hough segments and Hough circles."""
+    from .drawing import detect_circles, detect_segments
+
+    return detect_segments(tile), detect_circles(tile, max_radius=max_radius)
+
+
+def _init_tile_worker():
+    try:
+        import cv2
+        cv2.setNumThreads(1)
+    except ImportError:
+        pass
+
+
+def _process_tile(raster_path: str, window: Tile, core: Tile, max_radius: int,
+                  detector: Callable) -> Tuple[np.ndarray, np.ndarray]:
+    y0, x0, y1, x1 = window
+    raster = np.load(raster_path, mmap_mode="r")
+    tile = np.ascontiguousarray(raster[y0:y1, x0:x1])
+    del raster
+    segments, circles = detector(tile, max_radius)
+    segments = as_segments(segments) + [x0, y0, x0, y0]
+    circles = np.asarray(circles, dtype=float).reshape(-1, 3) + [x0, y0, 0]
+    core_y0, core_x0, core_y1, core_x1 = core
+    owned = ((circles[:, 0] >= core_x0) & (circles[:, 0] < core_x1)
+             & (circles[:, 1] >= core_y0) & (circles[:, 1] < core_y1))
+    return segments, circles[owned]
+
+
+def _peak_rss_mb() -> Optional[Dict[str, float]]:
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    unit = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "main": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit, 1),
+        "largest_worker": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit, 1),
+    }
+
+
+class TiledProcessor:
+    """Runs a per-tile detector over a large raster in a process pool and stitches the results."""
+    def __init__(self, tile_size: int = 2048, overlap: int = 256, workers: Optional[int] = None, scale: int = 16,
+                 coarse_pass: bool = True, max_in_flight: Optional[int] = None, detector: Callable = detect_tile,
+                 scratch_dir: Optional[str] = None, distance_tolerance: float = 4.0):
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.workers = workers or os.cpu_count() or 1
+        self.scale = scale
+        self.coarse_pass = coarse_pass
+        self.max_in_flight = max_in_flight or self.workers * 2
+        self.detector = detector
+        self.scratch_dir = scratch_dir
+        # Merge tolerance when stitching; about the stroke width of the scan
+        self.distance_tolerance = distance_tolerance
+        self.stats: Dict = {}
+
+    def process(self, image) -> DrawingResult:
+        """
+        Segments and circles of a drawing given as an image path, a .npy
+        raster path, or a 2-D uint8 array.
+        """
+        scratch = tempfile.mkdtemp(prefix="tiles-", dir=self.scratch_dir)
+        try:
+            raster_path = self._prepare_raster(image, scratch)
+            return self._process_raster(raster_path)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    def _prepare_raster(self, image, scratch: str) -> str:
+        # Only a .npy raster is never read whole; an image file is decoded in one piece (see the module docstring)
+        if isinstance(image, str) and image.lower().endswith(".npy"):
+            return image
+        if isinstance(image, str):
+            from .drawing import load_grayscale
+            image = load_grayscale(image)
+        path = os.path.join(scratch, "raster.npy")
+        raster = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=image.shape)
+        raster[:] = image
+        raster.flush()
+        del raster
+        return path
+
+    def _process_raster(self, raster_path: str) -> DrawingResult:
+        started = time.perf_counter()
+        raster = np.load(raster_path, mmap_mode="r")
+        if raster.ndim != 2:
+            raise ValueError("Tiled processing needs a single-channel (grayscale) raster.")
+        windows, cores = plan_tiles(raster.shape[0], raster.shape[1], self.tile_size, self.overlap)
+        selected = np.ones(len(windows), dtype=bool)
+        if self.coarse_pass:
+            selected = select_tiles(coarse_contrast(raster, self.scale), windows, self.scale)
+        del raster
+        coarse_seconds = time.perf_counter() - started
+
+        segments, circles = [], []
+        max_radius = self.overlap // 2
+        jobs = iter(zip(windows[selected].tolist(), cores[selected].tolist()))
+        with ProcessPoolExecutor(self.workers, initializer=_init_tile_worker) as pool:
+            pending = set()
+            while True:
+                for window, core in jobs:
+                    pending.add(pool.submit(_process_tile, raster_path, tuple(window), tuple(core), max_radius,
+                                            self.detector))
+                    if len(pending) >= self.max_in_flight:
+                        break
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    tile_segments, tile_circles = future.result()
+                    segments.append(tile_segments)
+                    circles.append(tile_circles)
+        detect_seconds = time.perf_counter() - started - coarse_seconds
+
+        merged = merge_collinear(np.concatenate(segments) if segments else np.empty((0, 4)),
+                                 distance_tolerance=self.distance_tolerance)
+        self.stats = {
+            "tiles": int(len(windows)),
+            "tiles_processed": int(selected.sum()),
+            "raw_segments": int(sum(len(part) for part in segments)),
+            "segments": int(len(merged)),
+            "circles": int(sum(len(part) for part in circles)),
+            "coarse_seconds": round(coarse_seconds, 3),
+            "detect_seconds": round(detect_seconds, 3),
+            "stitch_seconds": round(time.perf_counter() - started - coarse_seconds - detect_seconds, 3),
+        }
+        return DrawingResult(merged, [], [], np.concatenate(circles) if circles else None)
+
+
+def synthetic_sheet(height: int, width: int, path: str, seed: int = 0) -> str:
+    """
+    Writes a .npy sheet with a border, a grid of parts (rectangles with a
+    hole each) over the left half, and a blank right half.
+    """
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    raster = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=(height, width))
+    pitch = 400
+    for top in range(0, height, 4096):
+        band = np.full((min(4096, height - top), width), 255, np.uint8)
+        cv2.rectangle(band, (20, 20 - top), (width - 20, height - 20 - top), 0, 4)
+        for y in range(max(100, (top // pitch) * pitch - pitch), min(top + 4096 + pitch, height - 400), pitch):
+            for x in range(100, width // 2 - 400, pitch):
+                w, h = (int(v) for v in rng.integers(150, 300, 2))
+                cv2.rectangle(band, (x, y - top), (x + w, y + h - top), 0, 3)
+                cv2.circle(band, (x + w // 2, y + h // 2 - top), 40, 0, 3)
+        raster[top:top + len(band)] = band
+    raster.flush()
+    return path
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Tiled segment and circle detection for large drawings.")
+    parser.add_argument("image", nargs="?", help="image file or .npy grayscale raster")
+    parser.add_argument("--synthetic", help="generate a HEIGHTxWIDTH test sheet instead, e.g. 20000x28000")
+    parser.add_argument("--output", help="write the result as DXF")
+    parser.add_argument("--tile", type=int, default=2048)
+    parser.add_argument("--overlap", type=int, default=256)
+    parser.add_argument("--scale", type=int, default=16, help="block size of the coarse pass")
+    parser.add_argument("--no-coarse", action="store_true", help="process every tile")
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args(argv)
+    if not args.image and not args.synthetic:
+        parser.error("give an image or --synthetic")
+
+    scratch = tempfile.mkdtemp(prefix="tiles-bench-")
+    try:
+        image = args.image
+        if args.synthetic:
+            height, width = (int(v) for v in args.synthetic.lower().split("x"))
+            image = synthetic_sheet(height, width, os.path.join(scratch, "sheet.npy"))
+        processor = TiledProcessor(args.tile, args.overlap, args.workers, args.scale, not args.no_coarse)
+        started = time.perf_counter()
+        result = processor.process(image)
+        report = {**processor.stats, "seconds": round(time.perf_counter() - started, 3), "peak_rss_mb": _peak_rss_mb()}
+        if args.output:
+            from .drawing import write_dxf
+            write_dxf(result, args.output)
+        print(json.dumps(report, indent=2))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
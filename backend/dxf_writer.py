@@ -0,0 +1,276 @@
+"""
+Bulk DXF export of digitized drawings.
+
+Entities are written straight to the output as DXF R12 (AC1009) text, in
+chunks, instead of being built up one by one as objects first, so a
+drawing with hundreds of thousands of entities is written in one pass with
+bounded memory. R12 is the most widely readable DXF version and needs no
+object handles or class tables.
+
+Before writing, the geometry is cleaned up:
+
+- endpoints closer than `snap_tolerance` are snapped to one point, so lines
+  that should meet do meet;
+- duplicate lines (in either direction) and zero-length lines are dropped;
+- lines that meet end to end are chained into polylines (closed where they
+  form a loop), and vertices where the chain goes straight on are dropped.
+
+Text is written on the TEXT layer and the lines it was associated with
+(see drawing.associate_text) on the DIMENSIONS layer; other geometry goes
+on GEOMETRY. Each text and its line carry the same association number as
+extended data of the ARCHIMEDES application, so the pairing survives the
+round trip through CAD software.
+"""
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple, Union
+
+import numpy as np
+
+APP_ID = "ARCHIMEDES"
+# Layer name -> ACI colour
+LAYERS = {"GEOMETRY": 7, "DIMENSIONS": 1, "TEXT": 3}
+CHUNK_SIZE = 10000
+
+
+def snap_points(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Moves points closer than about `tolerance` onto their common mean. Points
+    are clustered on a grid of `tolerance`, then again on a grid shifted by
+    half a cell, so pairs split by a cell border in the first pass are
+    joined in the second.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if len(points) == 0 or tolerance <= 0:
+        return points.copy()
+    for shift in (0.0, 0.5):
+        cells = np.floor(points / tolerance + shift).astype(np.int64)
+        cells -= cells.min(axis=0)
+        keys = cells[:, 1] * (cells[:, 0].max() + 1) + cells[:, 0]
+        _, cluster = np.unique(keys, return_inverse=True)
+        counts = np.bincount(cluster)
+        means = np.stack([np.bincount(cluster, weights=points[:, axis]) / counts for axis in (0, 1)], axis=1)
+        points = means[cluster]
+    return points
+
+
+def dedupe_segments(segments: np.ndarray, snap_tolerance: float = 3.0, decimals: int = 3) -> np.ndarray:
+    """Snaps endpoints and drops zero-length and duplicate segments (in either direction)."""
+    segments = np.asarray(segments, dtype=float).reshape(-1, 4)
+    if len(segments) == 0:
+        return segments
+    points = snap_points(segments.reshape(-1, 2), snap_tolerance).round(decimals).reshape(-1, 4)
+    first, second = points[:, :2], points[:, 2:]
+    # Canonical direction: the lexicographically smaller endpoint first
+    swap = (first[:, 0] > second[:, 0]) | ((first[:, 0] == second[:, 0]) & (first[:, 1] > second[:, 1]))
+    canonical = np.where(swap[:, None], points[:, [2, 3, 0, 1]], points)
+    canonical = canonical[np.any(canonical[:, :2] != canonical[:, 2:], axis=1)]
+    return np.unique(canonical, axis=0)
+
+
+def _straight_vertices(vertices: np.ndarray, lengths: np.ndarray, closed: np.ndarray,
+                       tolerance: float = 1e-6) -> np.ndarray:
+    """
+    Marks the vertices where a polyline continues in the same direction, for
+    many polylines at once; `vertices` holds them back to back.
+    """
+    starts = np.cumsum(lengths) - lengths
+    ends = starts + lengths - 1
+    index = np.arange(len(vertices))
+    chain = np.repeat(np.arange(len(lengths)), lengths)
+    previous = np.where(index == starts[chain], ends[chain], index - 1)
+    following = np.where(index == ends[chain], starts[chain], index + 1)
+    incoming = vertices - vertices[previous]
+    outgoing = vertices[following] - vertices
+    cross = incoming[:, 0] * outgoing[:, 1] - incoming[:, 1] * outgoing[:, 0]
+    scale = np.hypot(*incoming.T) * np.hypot(*outgoing.T)
+    straight = (np.abs(cross) <= tolerance * np.maximum(scale, 1e-12)) & (np.einsum("ij,ij->i", incoming, outgoing) > 0)
+    open_end = ~closed[chain] & ((index == starts[chain]) | (index == ends[chain]))
+    return straight & ~open_end & (lengths[chain] > 2)
+
+
+def chain_polylines(segments: np.ndarray) -> List[Tuple[np.ndarray, bool]]:
+    """
+    Chains segments that share endpoints into polylines. Chains break at
+    points where other than two segments meet. Returns (vertices, closed)
+    per chain; a chain of one segment has two vertices.
+    """
+    segments = np.asarray(segments, dtype=float).reshape(-1, 4)
+    if len(segments) == 0:
+        return []
+    nodes, ends = np.unique(segments.reshape(-1, 2), axis=0, return_inverse=True)
+    ends = ends.reshape(-1, 2)
+    degree = np.bincount(ends.ravel(), minlength=len(nodes))
+    # Edges incident to each node, CSR style
+    incident = np.argsort(ends.ravel(), kind="stable") // 2
+    offsets = np.concatenate(([0], np.cumsum(degree)))
+    used = np.zeros(len(segments), dtype=bool)
+
+    def walk(start: int, edge: int) -> List[int]:
+        path = [start]
+        node = start
+        while True:
+            used[edge] = True
+            node = ends[edge, 1] if ends[edge, 0] == node else ends[edge, 0]
+            path.append(node)
+            if degree[node] != 2 or node == start:
+                return path
+            a, b = incident[offsets[node]:offsets[node] + 2]
+            edge = b if a == edge else a
+            if used[edge]:
+                return path
+
+    chains = []
+    for start in np.flatnonzero(degree != 2):
+        for edge in incident[offsets[start]:offsets[start + 1]]:
+            if not used[edge]:
+                chains.append(walk(start, edge))
+    # What is left are closed loops of degree-2 nodes
+    for edge in np.flatnonzero(~used):
+        if not used[edge]:
+            chains.append(walk(ends[edge, 0], edge))
+
+    closed = np.array([len(path) > 3 and path[0] == path[-1] for path in chains])
+    paths = [path[:-1] if is_closed else path for path, is_closed in zip(chains, closed)]
+    lengths = np.array([len(path) for path in paths])
+    vertices = nodes[np.concatenate(paths)]
+    keep = ~_straight_vertices(vertices, lengths, closed)
+    kept = np.add.reduceat(keep, np.cumsum(lengths) - lengths)
+    split = np.split(vertices[keep], np.cumsum(kept)[:-1])
+    return list(zip(split, closed.tolist()))
+
+
+class DxfWriter:
+    """
+    Streams a DXF R12 file. Entities are formatted in chunks and written as
+    they come; nothing but the current chunk is kept in memory. With
+    `height`, y is flipped (y' = height - y) from image to CAD orientation.
+    """
+    def __init__(self, target: Union[str, TextIO], layers: Dict[str, int] = None, precision: int = 3,
+                 height: Optional[float] = None):
+        self._own_stream = isinstance(target, str)
+        self.stream = open(target, "w", encoding="utf-8", newline="\n") if self._own_stream else target
+        self.layers = layers or LAYERS
+        self.number = f"{{:.{precision}f}}"
+        self.height = height
+        self.counts = {"LINE": 0, "POLYLINE": 0, "CIRCLE": 0, "TEXT": 0}
+        self._write_header()
+
+    def _y(self, y: np.ndarray) -> np.ndarray:
+        return self.height - y if self.height is not None else y
+
+    def _write_header(self):
+        parts = ["0\nSECTION\n2\nHEADER\n9\n$ACADVER\n1\nAC1009\n0\nENDSEC\n",
+                 "0\nSECTION\n2\nTABLES\n",
+                 f"0\nTABLE\n2\nLAYER\n70\n{len(self.layers)}\n"]
+        for name, color in self.layers.items():
+            parts.append(f"0\nLAYER\n2\n{name}\n70\n0\n62\n{color}\n6\nCONTINUOUS\n")
+        parts.append("0\nENDTAB\n")
+        parts.append(f"0\nTABLE\n2\nAPPID\n70\n1\n0\nAPPID\n2\n{APP_ID}\n70\n0\n0\nENDTAB\n")
+        parts.append("0\nENDSEC\n0\nSECTION\n2\nENTITIES\n")
+        self.stream.write("".join(parts))
+
+    @staticmethod
+    def _xdata(association: Optional[int]) -> str:
+        if association is None:
+            return ""
+        return f"1001\n{APP_ID}\n1000\nassociation\n1071\n{int(association)}\n"
+
+    def write_lines(self, segments: np.ndarray, layer: str = "GEOMETRY", associations: Iterable[int] = None):
+        """Writes LINE entities; `associations` gives an association number per line."""
+        segments = np.asarray(segments, dtype=float).reshape(-1, 4).copy()
+        segments[:, [1, 3]] = self._y(segments[:, [1, 3]])
+        n = self.number
+        template = f"0\nLINE\n8\n{layer}\n10\n{n}\n20\n{n}\n11\n{n}\n21\n{n}\n"
+        associations = list(associations) if associations is not None else None
+        for begin in range(0, len(segments), CHUNK_SIZE):
+            rows = segments[begin:begin + CHUNK_SIZE].tolist()
+            if associations is None:
+                self.stream.write("".join(template.format(*row) for row in rows))
+            else:
+                self.stream.write("".join(template.format(*row) + self._xdata(a)
+                                          for row, a in zip(rows, associations[begin:begin + CHUNK_SIZE])))
+        self.counts["LINE"] += len(segments)
+
+    def write_polylines(self, polylines: Iterable[Tuple[np.ndarray, bool]], layer: str = "GEOMETRY"):
+        """Writes POLYLINE entities with their VERTEX entities; two-vertex chains become LINEs."""
+        n = self.number
+        vertex = f"0\nVERTEX\n8\n{layer}\n10\n{n}\n20\n{n}\n"
+        lines, parts = [], []
+        for vertices, closed in polylines:
+            if len(vertices) == 2 and not closed:
+                lines.append(vertices.ravel())
+                continue
+            vertices = np.asarray(vertices, dtype=float).copy()
+            vertices[:, 1] = self._y(vertices[:, 1])
+            parts.append(f"0\nPOLYLINE\n8\n{layer}\n66\n1\n70\n{1 if closed else 0}\n")
+            parts.extend(vertex.format(x, y) for x, y in vertices.tolist())
+            parts.append(f"0\nSEQEND\n8\n{layer}\n")
+            self.counts["POLYLINE"] += 1
+            if len(parts) >= CHUNK_SIZE:
+                self.stream.write("".join(parts))
+                parts = []
+        self.stream.write("".join(parts))
+        if lines:
+            self.write_lines(np.array(lines), layer)
+
+    def write_circles(self, circles: np.ndarray, layer: str = "GEOMETRY"):
+        circles = np.asarray(circles, dtype=float).reshape(-1, 3).copy()
+        circles[:, 1] = self._y(circles[:, 1])
+        n = self.number
+        template = f"0\nCIRCLE\n8\n{layer}\n10\n{n}\n20\n{n}\n40\n{n}\n"
+        for begin in range(0, len(circles), CHUNK_SIZE):
+            self.stream.write("".join(template.format(*row) for row in circles[begin:begin + CHUNK_SIZE].tolist()))
+        self.counts["CIRCLE"] += len(circles)
+
+    def write_text(self, text: str, x: float, y: float, height: float, layer: str = "TEXT",
+                   association: Optional[int] = None):
+        # Group code 1 values are single lines
+        text = " ".join(str(text).split())
+        n = self.number
+        self.stream.write(f"0\nTEXT\n8\n{layer}\n10\n{n}\n20\n{n}\n40\n{n}\n1\n{{}}\n".format(
+            x, float(self._y(np.float64(y))), height, text) + self._xdata(association))
+        self.counts["TEXT"] += 1
+
+    def close(self):
+        self.stream.write("0\nENDSEC\n0\nEOF\n")
+        if self._own_stream:
+            self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _box_key(box: Dict) -> Tuple:
+    return box["text"], box["left"], box["top"], box["width"], box["height"]
+
+
+def export_drawing(result, target: Union[str, TextIO], snap_tolerance: float = 3.0, polylines: bool = True,
+                   height: Optional[float] = None) -> Dict[str, int]:
+    """
+    Writes a DrawingResult (see drawing.py) as DXF and returns entity counts.
+    Lines that text was associated with are kept as individual lines on the
+    DIMENSIONS layer; everything else is cleaned up as described above.
+    """
+    segments = np.asarray(result.segments, dtype=float).reshape(-1, 4)
+    dimension_ids = sorted({association["segment"] for association in result.associations})
+    numbers = {segment: number for number, segment in enumerate(dimension_ids)}
+    geometry = np.delete(segments, dimension_ids, axis=0)
+    cleaned = dedupe_segments(geometry, snap_tolerance)
+
+    with DxfWriter(target, height=height) as writer:
+        if polylines:
+            writer.write_polylines(chain_polylines(cleaned))
+        else:
+            writer.write_lines(cleaned)
+        writer.write_circles(result.circles)
+        writer.write_lines(segments[dimension_ids], "DIMENSIONS", [numbers[s] for s in dimension_ids])
+        by_box = {_box_key(a["box"]): numbers[a["segment"]] for a in result.associations}
+        for box in result.text_boxes:
+            writer.write_text(box.text, box.left, box.top + box.height, box.height,
+                              association=by_box.get(_box_key(box.to_dict())))
+        counts = dict(writer.counts)
+    counts["duplicates_removed"] = len(geometry) - len(cleaned)
+    return counts
+
@@ -0,0 +1,124 @@
+"""
+Benchmark of response encodings for /api/run-optimization payloads.
+
+    python -m backend.encoding_benchmark --iterations 5 20 --points 20000 --output encoding_benchmark.json
+
+A synthetic optimization run has `--iterations` iterations with the result
+shape of run_engineering_workflow: model text, its review and the script
+(the same in every iteration, as when the model returns the same answer
+for the same problem), a short solver log, two artifact references and
+`--points` float results per array in three arrays, which change every
+iteration, as does one of the parameters. For the full and slim history
+the report gives, per body format (json with the standard library, json
+with orjson, msgpack) and compression (none, gzip, br), the body size and
+the milliseconds to serialize and compress it. Formats whose package is
+not installed are left out.
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from . import encoding
+from .encoding import slim_history
+
+MODEL_TEXT = "The cantilever is modeled as an Euler-Bernoulli beam of length L with a tip load P. " * 60
+SCRIPT_TEXT = "import numpy as np\nx = np.linspace(0, L, n)\nw = P * x**2 * (3 * L - x) / (6 * E * I)\n" * 50
+
+
+def synthetic_history(iterations: int, points: int, seed: int = 0) -> List[Dict]:
+    rng = np.random.default_rng(seed)
+    history = []
+    for i in range(iterations):
+        thickness = 0.01 + 0.002 * i
+        history.append({
+            "iteration": i + 1,
+            "parameters": {"length": 2.0, "load": 1000.0, "youngs_modulus": 210e9, "thickness": thickness},
+            "results": {
+                "modeling_result": MODEL_TEXT,
+                "model_review_result": "The model is adequate for small deflections. " * 20,
+                "simulation_script": SCRIPT_TEXT,
+                "execution_result": {
+                    "output": f"max deflection {1e-3 / (i + 1):.6g}\nsolver finished\n",
+                    "error": None,
+                    "artifacts": [
+                        {"id": f"{i:064x}", "name": "deflection.png", "size": 48213, "url": f"/api/artifacts/{i:064x}"},
+                        {"id": f"{i + 1:064x}", "name": "stress.png", "size": 51377, "url": f"/api/artifacts/{i + 1:064x}"},
+                    ],
+                    "data": {name: rng.normal(size=points).tolist() for name in ("x", "deflection", "stress")},
+                },
+                "analysis_result": f"Iteration {i + 1}: the deflection is above the limit. " * 10,
+            },
+        })
+    return history
+
+
+def _serializers():
+    serializers = {"json": lambda payload: json.dumps(payload).encode("utf-8")}
+    if encoding.orjson is not None:
+        serializers["orjson"] = encoding.dumps_json
+    if encoding.msgpack is not None:
+        serializers["msgpack"] = encoding.dumps_msgpack
+    return serializers
+
+
+def _timed_ms(function, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def measure(payload: Dict, repeat: int = 3) -> Dict[str, Dict]:
+    codings = [None, "gzip"] + (["br"] if encoding.brotli is not None else [])
+    results = {}
+    for name, serialize in _serializers().items():
+        body = serialize(payload)
+        serialize_ms = _timed_ms(lambda: serialize(payload), repeat)
+        for coding in codings:
+            compressed = encoding.compress(body, coding)
+            compress_ms = _timed_ms(lambda: encoding.compress(body, coding), repeat) if coding else 0.0
+            results[f"{name}+{coding or 'identity'}"] = {
+                "bytes": len(compressed),
+                "ms": round(serialize_ms + compress_ms, 2),
+            }
+    return results
+
+
+def run_size(iterations: int, points: int, repeat: int = 3) -> Dict:
+    history = synthetic_history(iterations, points)
+    report = {"iterations": iterations, "points": points}
+    for mode, entries in (("full", history), ("slim", slim_history(history))):
+        report[mode] = measure({"status": "failed", "history_mode": mode, "history": entries}, repeat)
+    baseline = report["full"]["json+identity"]
+    report["smallest"] = min(((mode, key, value["bytes"]) for mode in ("full", "slim")
+                              for key, value in report[mode].items()), key=lambda item: item[2])
+    report["baseline"] = baseline
+    return report
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark of API response encodings.")
+    parser.add_argument("--iterations", nargs="+", type=int, default=[5, 20], help="optimization iterations")
+    parser.add_argument("--points", type=int, default=20000, help="floats per result array")
+    parser.add_argument("--repeat", type=int, default=3, help="timing repetitions; the best is reported")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {"results": [run_size(size, args.points, args.repeat) for size in args.iterations]}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+"""
+3D reconstruction from a single isometric drawing.
+
+In an isometric view the three model axes are drawn in fixed directions:
+X down to the right and Y down to the left, both `angle` degrees below the
+horizontal, and Z straight up. A 2D junction fixes two of its vertex's
+three coordinates; the third, the depth along the viewing direction, is
+only fixed through the edges: an edge drawn parallel to a model axis joins
+two vertices that agree in the other two coordinates.
+
+`reconstruct` solves for all vertices at once as one sparse linear least
+squares problem:
+
+- two projection rows per vertex: the vertex should project onto its
+  junction;
+- two rows per axis-parallel edge: the two coordinates other than the
+  edge's axis are equal at both ends (weighted by `axis_weight`, and
+  re-weighted robustly against edges that only look axis-parallel);
+- one gauge row per group of vertices connected by axis-parallel edges,
+  putting the group's first vertex at depth zero. A single view cannot
+  place such groups in depth relative to each other;
+  `Reconstruction.component` tells which group each vertex belongs to.
+
+Junctions and edges come from line segments (e.g. drawing.extract_lines)
+through `junctions_from_segments`:
+
+    segments = extract_lines(load_grayscale("part.png"))
+    points, edges = junctions_from_segments(segments)
+    model = reconstruct(points, edges, angle=30.0)
+"""
+from typing import Dict, Tuple, Union
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import spsolve
+from scipy.spatial import cKDTree
+
+from .drawing import GridIndex
+
+# For each axis, the other two
+OTHER_AXES = np.array([[1, 2], [0, 2], [0, 1]])
+
+
+def axis_directions(angle: float = 30.0) -> np.ndarray:
+    """Image directions (3, 2) of the model X, Y and Z axes; image y points down."""
+    a = np.deg2rad(angle)
+    return np.array([[np.cos(a), np.sin(a)], [-np.cos(a), np.sin(a)], [0.0, -1.0]])
+
+
+def projection_matrix(angle: float = 30.0, scale: float = 1.0) -> np.ndarray:
+    """The (2, 3) matrix taking model coordinates to image pixels; `scale` is pixels per model unit."""
+    return scale * axis_directions(angle).T
+
+
+def view_direction(angle: float = 30.0) -> np.ndarray:
+    """The model direction that projects to a point: the depth direction of the view."""
+    return np.array([1.0, 1.0, 2.0 * np.sin(np.deg2rad(angle))])
+
+
+def junctions_from_segments(segments: np.ndarray, tolerance: float = 5.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Turns segments into a graph: (points (V, 2), edges (E, 2) of point
+    indices). A segment is split where another segment ends on it (a T
+    junction, or collinear edges merged into one line by the detector), and
+    endpoints within `tolerance` of each other become one junction, placed
+    where their lines meet. Crossings without a shared endpoint are not
+    junctions.
+    """
+    segments = np.asarray(segments, dtype=float).reshape(-1, 4)
+    if len(segments) == 0:
+        return np.empty((0, 2)), np.empty((0, 2), dtype=np.int64)
+    endpoints = segments.reshape(-1, 2)
+    boxes = np.hstack([endpoints - tolerance, endpoints + tolerance])
+    point_ids, segment_ids = GridIndex(segments).query(boxes)
+    keep = point_ids // 2 != segment_ids
+    point_ids, segment_ids = point_ids[keep], segment_ids[keep]
+
+    p1, p2 = segments[segment_ids, :2], segments[segment_ids, 2:]
+    delta = p2 - p1
+    length = np.hypot(*delta.T)
+    t = np.einsum("ij,ij->i", endpoints[point_ids] - p1, delta) / np.maximum(length, 1e-12) ** 2
+    offset = endpoints[point_ids] - p1
+    distance = np.abs(delta[:, 0] * offset[:, 1] - delta[:, 1] * offset[:, 0]) / np.maximum(length, 1e-12)
+    interior = (distance <= tolerance) & (t * length > tolerance) & ((1 - t) * length > tolerance)
+
+    # Split points as (segment, t), plus both ends of every segment
+    n = len(segments)
+    owner = np.concatenate([np.arange(n), np.arange(n), segment_ids[interior]])
+    position = np.concatenate([np.zeros(n), np.ones(n), t[interior]])
+    order = np.lexsort((position, owner))
+    owner, position = owner[order], position[order]
+    points = segments[owner, :2] + position[:, None] * (segments[owner, 2:] - segments[owner, :2])
+
+    # Points within `tolerance` of each other, directly or through others, are one junction
+    pairs = cKDTree(points).query_pairs(tolerance, output_type="ndarray")
+    graph = coo_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])), shape=(len(points), len(points)))
+    vertex_ids = connected_components(graph, directed=False)[1]
+    vertices = _corner_points(points, vertex_ids, segments[owner], tolerance)
+    consecutive = np.flatnonzero(owner[1:] == owner[:-1])
+    edges = np.sort(np.stack([vertex_ids[consecutive], vertex_ids[consecutive + 1]], axis=1), axis=1)
+    edges = np.unique(edges[edges[:, 0] != edges[:, 1]], axis=0)
+    return vertices, edges
+
+
+def _corner_points(points: np.ndarray, cluster: np.ndarray, segments: np.ndarray,
+                   tolerance: float) -> np.ndarray:
+    """
+    One point per cluster: where the lines of the cluster's segments meet
+    (least squares over their normals), or the cluster mean where they are
+    (nearly) parallel. Thick strokes leave detected endpoints short of or
+    past the corner; the intersection of the lines is the corner itself.
+    """
+    count = np.bincount(cluster)
+    mean = np.stack([np.bincount(cluster, weights=points[:, k]) for k in (0, 1)], axis=1) / count[:, None]
+    delta = segments[:, 2:] - segments[:, :2]
+    normal = np.stack([-delta[:, 1], delta[:, 0]], axis=1) / np.maximum(np.hypot(*delta.T), 1e-12)[:, None]
+    # Sum of n n^T and of n n^T p per cluster, p on each segment's line
+    offset = np.einsum("ij,ij->i", normal, segments[:, :2])
+    a = np.stack([np.bincount(cluster, weights=normal[:, r] * normal[:, c]) for r, c in ((0, 0), (0, 1), (1, 1))])
+    b = np.stack([np.bincount(cluster, weights=normal[:, k] * offset) for k in (0, 1)])
+    det = a[0] * a[2] - a[1] ** 2
+    # det / count^2 is sin^2 of the angle between two lines: ignore angles under about 10 degrees
+    solvable = det > 0.03 * count ** 2
+    safe = np.where(solvable, det, 1.0)
+    corner = np.stack([(a[2] * b[0] - a[1] * b[1]) / safe, (a[0] * b[1] - a[1] * b[0]) / safe], axis=1)
+    near = np.hypot(*(corner - mean).T) <= 2 * tolerance
+    return np.where((solvable & near)[:, None], corner, mean)
+
+
+def classify_edges(points: np.ndarray, edges: np.ndarray, angle: float = 30.0,
+                   angle_tolerance: float = 5.0) -> np.ndarray:
+    """The model axis (0, 1, 2 for X, Y, Z) each edge is drawn parallel to, or -1."""
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    vectors = points[edges[:, 1]] - points[edges[:, 0]]
+    lengths = np.hypot(*vectors.T)
+    cosines = np.abs(vectors @ axis_directions(angle).T) / np.maximum(lengths, 1e-12)[:, None]
+    axes = cosines.argmax(axis=1)
+    aligned = (cosines.max(axis=1) >= np.cos(np.deg2rad(angle_tolerance))) & (lengths > 0)
+    return np.where(aligned, axes, -1)
+
+
+class Reconstruction:
+    """3D vertices (V, 3) for a drawing's junction graph, with per-edge axes and fit residuals."""
+    def __init__(self, vertices: np.ndarray, edges: np.ndarray, axes: np.ndarray, component: np.ndarray,
+                 projection_rms: float, axis_rms: float):
+        self.vertices = vertices
+        self.edges = edges
+        self.axes = axes
+        self.component = component
+        self.projection_rms = projection_rms
+        self.axis_rms = axis_rms
+
+    @property
+    def components(self) -> int:
+        return int(self.component.max()) + 1 if len(self.component) else 0
+
+    def to_dict(self) -> Dict:
+        return {
+            "vertices": self.vertices.round(3).tolist(),
+            "edges": self.edges.tolist(),
+            "axes": self.axes.tolist(),
+            "components": self.components,
+            "projection_rms": self.projection_rms,
+            "axis_rms": self.axis_rms,
+        }
+
+
+def build_system(points: np.ndarray, edges: np.ndarray, axes: np.ndarray, angle: float = 30.0,
+                 scale: float = 1.0, axis_weight: Union[float, np.ndarray] = 10.0):
+    """
+    The sparse least squares system (matrix, right-hand side, component per
+    vertex) over the 3V unknowns x0, y0, z0, x1, ...; see the module notes.
+    `axis_weight` is one weight, or one per axis-parallel edge.
+    """
+    v = len(points)
+    projection = projection_matrix(angle, scale)
+    vertex = np.arange(v)
+
+    # Projection rows 2i, 2i+1 over columns 3i..3i+2
+    rows = [np.repeat(np.arange(2 * v), 3)]
+    columns = [(3 * vertex[:, None, None] + np.arange(3)[None, None, :]).repeat(2, axis=1).ravel()]
+    values = [np.broadcast_to(projection, (v, 2, 3)).ravel()]
+
+    # Axis rows: w * (P_j[m] - P_i[m]) = 0 for the two other axes m
+    aligned = np.flatnonzero(axes >= 0)
+    i, j = edges[aligned, 0], edges[aligned, 1]
+    others = OTHER_AXES[axes[aligned]]
+    base = 2 * v + 2 * np.arange(len(aligned))[:, None] + np.arange(2)[None, :]
+    rows += [base.ravel(), base.ravel()]
+    columns += [(3 * j[:, None] + others).ravel(), (3 * i[:, None] + others).ravel()]
+    weight = np.repeat(np.broadcast_to(np.asarray(axis_weight, dtype=float), len(aligned)), 2)
+    values += [weight, -weight]
+
+    # Gauge rows: the depth of each component's first vertex is zero
+    graph = coo_matrix((np.ones(len(aligned)), (i, j)), shape=(v, v))
+    count, component = connected_components(graph, directed=False)
+    roots = np.unique(component, return_index=True)[1]
+    gauge_base = 2 * v + 2 * len(aligned)
+    depth = view_direction(angle)
+    depth /= np.linalg.norm(depth)
+    rows.append(np.repeat(gauge_base + np.arange(count), 3))
+    columns.append((3 * roots[:, None] + np.arange(3)).ravel())
+    values.append(np.tile(depth, count))
+
+    shape = (gauge_base + count, 3 * v)
+    matrix = coo_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))), shape=shape)
+    rhs = np.zeros(shape[0])
+    rhs[:2 * v] = points.ravel()
+    return matrix.tocsr(), rhs, component
+
+
+def reconstruct(points: np.ndarray, edges: np.ndarray, angle: float = 30.0, scale: float = 1.0,
+                axis_weight: float = 10.0, angle_tolerance: float = 5.0, robust_iterations: int = 3,
+                robust_scale: float = 2.0) -> Reconstruction:
+    """
+    Solves for the 3D vertices of the junction graph (points (V, 2) in
+    pixels, edges (E, 2)); see the module notes. Coordinates are in model
+    units, with the image origin at the model origin.
+
+    Edges that only look axis-parallel (e.g. two lines at different depths
+    that happen to line up in the view) contradict the rest; over
+    `robust_iterations` re-solves each axis constraint is down-weighted by
+    how far it pulls its vertices off their junctions (Cauchy weights,
+    `robust_scale` pixels), so a few of them do not distort the whole model.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    axes = classify_edges(points, edges, angle, angle_tolerance)
+    if len(points) == 0:
+        return Reconstruction(np.empty((0, 3)), edges, axes, np.empty(0, dtype=np.int64), 0.0, 0.0)
+    v, aligned = len(points), int(np.sum(axes >= 0))
+    weights = np.full(aligned, axis_weight)
+    for _ in range(robust_iterations + 1):
+        matrix, rhs, component = build_system(points, edges, axes, angle, scale, weights)
+        # Normal equations: sparse and positive definite thanks to the gauge rows
+        solution = spsolve((matrix.T @ matrix).tocsc(), matrix.T @ rhs)
+        residual = matrix @ solution - rhs
+        # How far each edge is from axis-parallel, and how hard its constraint pulls
+        # its vertices off their junctions (in pixels): constraints that only hold by
+        # moving vertices away from the drawing are the suspect ones
+        deviation = np.hypot(*(residual[2 * v:2 * v + 2 * aligned].reshape(-1, 2) / weights[:, None]).T)
+        pull = weights ** 2 * deviation / scale
+        if not aligned or pull.max() < robust_scale / 2:
+            break
+        weights = axis_weight / (1.0 + (pull / robust_scale) ** 2)
+    projection_rms = float(np.sqrt(np.mean(residual[:2 * v] ** 2)))
+    axis_rms = float(np.sqrt(np.mean((deviation * scale) ** 2))) if aligned else 0.0
+    return Reconstruction(solution.reshape(-1, 3), edges, axes, component, projection_rms, axis_rms)
@@ -1,78 +1,108 @@
-import re
-from typing import List
-import numpy as np
+import configparser
+import threading
+from typing import Any, Dict, List, Optional
 from sentence_transformers import SentenceTransformer
 
-def chunk_text(text: str, chunk_size: int = 200, overlap: int = 50) -> List[str]:
-    """
-    Splits a text into overlapping chunks.
-    """
-    if not text:
-        return []
-
-    # A simple sentence-based chunking for now.
-    # A more robust solution might use tokenizers.
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    chunks = []
-    current_chunk = ""
-
-    for sentence in sentences:
-        if len(current_chunk) + len(sentence) < chunk_size:
-            current_chunk += sentence + " "
-        else:
-            chunks.append(current_chunk.strip())
-            # Start new chunk with overlap
-            overlap_text = " ".join(current_chunk.split()[-overlap:])
-            current_chunk = overlap_text + " " + sentence + " "
-
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-
-    return chunks
+from . import metrics
+from .chunking import NearDuplicateIndex, chunk_text
+from .reranker import CrossEncoderReranker, create_reranker
+from .vector_index import VectorIndex
 
 class KnowledgeBase:
     """
     A simple in-memory knowledge base that stores and retrieves text chunks.
+
+    Documents are split into chunks of `chunk_tokens` model tokens sharing
+    `overlap_tokens`. Chunks that repeat ones already stored (exactly, or
+    nearly with `dedup_threshold` estimated Jaccard similarity) are not
+    embedded or stored again; a threshold above 1 turns this off.
+
+    Embeddings are searched through a VectorIndex; with `quantization`
+    "int8" or "binary" only compact codes stay in memory and the
+    candidates are re-ranked with the full vectors from `vector_directory`.
+
+    With a `reranker`, the best `rerank_candidates` chunks by embedding are
+    ordered again by the cross-encoder before the top_k are returned.
     """
-    def __init__(self):
+    def __init__(self, chunk_tokens: int = 200, overlap_tokens: int = 50, dedup_threshold: float = 0.85,
+                 quantization: str = "none", vector_directory: Optional[str] = None, rerank_factor: int = 10,
+                 reranker: Optional[CrossEncoderReranker] = None, rerank_candidates: int = 20):
         self.chunks = []
-        self._embeddings = []
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        self._index = VectorIndex(quantization, vector_directory, rerank_factor=rerank_factor)
         self._model = SentenceTransformer('allenai/scincl-base-p')
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self._duplicates = NearDuplicateIndex(threshold=dedup_threshold)
+        # Documents are added from worker threads; the chunks must line up with their embeddings
+        self._lock = threading.Lock()
 
-    def add_document(self, text: str):
+    def add_document(self, text: str) -> Dict[str, Any]:
         """
         Adds a document to the knowledge base, splitting it into chunks.
+        Returns how many chunks were added and how many were duplicates.
         """
-        new_chunks = chunk_text(text)
-        if new_chunks:
-            self.chunks.extend(new_chunks)
-            new_embeddings = self._model.encode(new_chunks, convert_to_tensor=False)
-            if self._embeddings:
-                self._embeddings = np.vstack([self._embeddings, new_embeddings])
+        new_chunks = chunk_text(text, self.chunk_tokens, self.overlap_tokens,
+                                tokenizer=getattr(self._model, "tokenizer", None))
+        with self._lock:
+            indexed = len(self._duplicates)
+            if self._duplicates.threshold <= 1:
+                matches = self._duplicates.add(new_chunks)
+                unique_chunks = [chunk for chunk, match in zip(new_chunks, matches) if match is None]
             else:
-                self._embeddings = new_embeddings
+                unique_chunks = new_chunks
+            if unique_chunks:
+                try:
+                    with metrics.EMBEDDING_SECONDS.time():
+                        new_embeddings = self._model.encode(unique_chunks, convert_to_tensor=False)
+                except Exception:
+                    # Otherwise a retry of the same document would find only duplicates and add nothing
+                    self._duplicates.truncate(indexed)
+                    raise
+                metrics.EMBEDDED_CHUNKS.inc(len(unique_chunks))
+                self.chunks.extend(unique_chunks)
+                self._index.add(new_embeddings)
+        metrics.CACHE_REQUESTS.inc(len(new_chunks) - len(unique_chunks), cache="knowledge_chunk", result="hit")
+        metrics.CACHE_REQUESTS.inc(len(unique_chunks), cache="knowledge_chunk", result="miss")
+        return {"chunks": len(new_chunks), "added": len(unique_chunks),
+                "duplicates": len(new_chunks) - len(unique_chunks)}
 
 
+    @metrics.RETRIEVAL_SECONDS.time()
     def get_relevant_chunks(self, query: str, top_k: int = 3) -> List[str]:
         """
-        Retrieves the most relevant chunks for a given query.
-        For now, this uses a simple keyword matching approach.
-        A more advanced implementation would use vector embeddings.
+        Retrieves the most relevant chunks for a given query, by cosine
+        similarity of their embeddings to the query's.
         """
-        if not self.chunks or self._embeddings is None or len(self._embeddings) == 0:
+        if not self.chunks or len(self._index) == 0:
             return []
 
         query_embedding = self._model.encode([query], convert_to_tensor=False)
+        if self.reranker is None:
+            top_indices, _ = self._index.search(query_embedding[0], top_k)
+            return [self.chunks[i] for i in top_indices]
+
+        candidates, _ = self._index.search(query_embedding[0], max(top_k, self.rerank_candidates))
+        order, _ = self.reranker.rerank(query, [self.chunks[i] for i in candidates], top_k)
+        return [self.chunks[candidates[i]] for i in order]
 
-        # Cosine similarity
-        cos_scores = np.dot(self._embeddings, query_embedding.T) / (
-            np.linalg.norm(self._embeddings, axis=1) * np.linalg.norm(query_embedding)
-        )
 
-        # Get top_k scores
-        top_indices = np.argsort(cos_scores.flatten())[-top_k:][::-1]
+def create_knowledge_base() -> KnowledgeBase:
+    config = configparser.ConfigParser()
+    config.read('backend/config.ini')
+    section = config['KNOWLEDGE'] if config.has_section('KNOWLEDGE') else {}
+    return KnowledgeBase(
+        chunk_tokens=int(section.get('chunk_tokens', 200)),
+        overlap_tokens=int(section.get('overlap_tokens', 50)),
+        dedup_threshold=float(section.get('dedup_threshold', 0.85)),
+        quantization=section.get('quantization', 'none'),
+        vector_directory=section.get('vector_directory') or None,
+        rerank_factor=int(section.get('rerank_factor', 10)),
+        reranker=create_reranker(section),
+        rerank_candidates=int(section.get('rerank_candidates', 20)),
+    )
 
-        return [self.chunks[i] for i in top_indices]
 
 # In-memory singleton instance of the KnowledgeBase
-knowledge_base_instance = KnowledgeBase()
+knowledge_base_instance = create_knowledge_base()
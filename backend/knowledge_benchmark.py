@@ -0,0 +1,127 @@
+"""
+Benchmark of knowledge ingestion: chunking and near-duplicate suppression.
+
+    python -m backend.knowledge_benchmark --documents 20 200 --output knowledge_benchmark.json
+
+The synthetic corpus is made of engineering-like documents of `--pages`
+pages, each page between the same header and footer as in exported PDFs.
+A fraction `--reuploads` of the documents is uploaded a second time with
+a word changed here and there. The report compares the
+previous chunker (200-character chunks that took their 50-*word*
+overlap by re-splitting the whole current chunk, so a chunk repeated most
+of the one before) with chunking by tokens, with and without
+NearDuplicateIndex. For each it gives the number of chunks that would be
+embedded, the characters they contain and the time taken. Embedding time
+grows with both.
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from .chunking import NearDuplicateIndex, chunk_text
+
+HEADER = "Archimedes Engineering Handbook. Internal use only. Revision 4, all rights reserved."
+FOOTER = "This page is part of a controlled document; printed copies are not maintained."
+WORDS = ("beam stress strain load moment deflection stiffness modulus shear bending torsion column buckling "
+         "plate shell element mesh node boundary condition support fixed pinned cantilever span section "
+         "inertia density thermal conduction convection flux temperature gradient vibration frequency mode "
+         "damping spring mass solver iteration convergence tolerance residual").split()
+
+
+def legacy_chunk_text(text: str, chunk_size: int = 200, overlap: int = 50) -> List[str]:
+    """The chunker used before token-based chunking, kept for comparison."""
+    if not text:
+        return []
+    sentences = re.split(r'(?<=[.!?])\s+', text)
+    chunks = []
+    current_chunk = ""
+    for sentence in sentences:
+        if len(current_chunk) + len(sentence) < chunk_size:
+            current_chunk += sentence + " "
+        else:
+            chunks.append(current_chunk.strip())
+            overlap_text = " ".join(current_chunk.split()[-overlap:])
+            current_chunk = overlap_text + " " + sentence + " "
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    return chunks
+
+
+def synthetic_corpus(documents: int, pages: int = 5, sentences_per_page: int = 40,
+                     reuploads: float = 0.2, seed: int = 0) -> List[str]:
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for _ in range(documents):
+        document = []
+        for _ in range(pages):
+            sentences = [" ".join(rng.choice(WORDS, rng.integers(8, 20))).capitalize() + "."
+                         for _ in range(sentences_per_page)]
+            document.append("\n".join([HEADER, " ".join(sentences), FOOTER]))
+        corpus.append("\n\n".join(document))
+    for index in rng.choice(documents, int(documents * reuploads), replace=False):
+        # A re-upload with a corrected word here and there
+        words = corpus[index].split(" ")
+        for position in rng.choice(len(words), max(1, len(words) // 200), replace=False):
+            words[position] = rng.choice(WORDS)
+        corpus.append(" ".join(words))
+    return corpus
+
+
+def run_chunker(corpus: List[str], method: str) -> Dict:
+    started = time.perf_counter()
+    duplicates = 0
+    if method == "legacy":
+        chunks = [chunk for text in corpus for chunk in legacy_chunk_text(text)]
+    elif method == "tokens":
+        chunks = [chunk for text in corpus for chunk in chunk_text(text)]
+    else:
+        index = NearDuplicateIndex()
+        chunks = []
+        for text in corpus:
+            document_chunks = chunk_text(text)
+            matches = index.add(document_chunks)
+            chunks.extend(chunk for chunk, match in zip(document_chunks, matches) if match is None)
+            duplicates += len(matches) - matches.count(None)
+    elapsed = time.perf_counter() - started
+    return {
+        "chunks": len(chunks),
+        "characters": sum(len(chunk) for chunk in chunks),
+        "duplicates_skipped": duplicates,
+        "ms": round(elapsed * 1000, 2),
+    }
+
+
+def run_size(documents: int, pages: int = 5, reuploads: float = 0.2) -> Dict:
+    corpus = synthetic_corpus(documents, pages, reuploads=reuploads)
+    return {
+        "documents": len(corpus),
+        "characters": sum(len(text) for text in corpus),
+        "methods": {method: run_chunker(corpus, method) for method in ("legacy", "tokens", "tokens+dedup")},
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark of knowledge chunking and deduplication.")
+    parser.add_argument("--documents", nargs="+", type=int, default=[20, 200], help="corpus sizes in documents")
+    parser.add_argument("--pages", type=int, default=5, help="pages per document")
+    parser.add_argument("--reuploads", type=float, default=0.2, help="fraction of documents uploaded twice")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {"results": [run_size(size, args.pages, args.reuploads) for size in args.documents]}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+import asyncio
+import configparser
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from . import metrics
+
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+FIGURE_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]+\.(png|jpe?g|pdf|eps)$", re.IGNORECASE)
+RERUN_PATTERN = re.compile(r"Rerun to get|Label\(s\) may have changed|There were undefined references")
+SOURCE_NAME = "report"
+# Files a pass reads back from the previous one
+AUX_EXTENSIONS = (".aux", ".toc", ".out")
+# Where the auxiliary files of the last successful pass are kept
+GOOD_AUX_DIR = "last-good"
+
+
+class LatexTimeoutError(Exception):
+    pass
+
+
+class CompileResult:
+    def __init__(self, success: bool, pdf_path: Optional[str], log: str, cached: bool = False, passes: int = 0, duration: float = 0.0):
+        self.success = success
+        self.pdf_path = pdf_path
+        self.log = log
+        self.cached = cached
+        self.passes = passes
+        self.duration = duration
+
+    @property
+    def errors(self) -> List[str]:
+        """The error lines of the TeX log, which is what a fix prompt needs."""
+        lines = self.log.splitlines()
+        errors = []
+        for i, line in enumerate(lines):
+            if line.startswith("!") or re.match(r"^.+:\d+: ", line):
+                errors.append("\n".join(lines[i:i + 3]))
+        return errors
+
+
+class LatexCompiler:
+    """
+    Compiles LaTeX documents server-side.
+
+    - At most `max_workers` TeX processes run at once; each pass is killed
+      after `timeout` seconds.
+    - Compiled PDFs are cached by a hash of the engine, source and figures,
+      so compiling the same document again is free.
+    - Compiles that share a session id reuse one working directory. The
+      .aux/.toc/.out files of the last successful pass are kept there and
+      restored after a failed one, so a fix iteration usually needs one
+      pass instead of a full rebuild.
+    - Figures are copied into the working directory, never linked, so
+      nothing the engine writes there can reach the caller's files, and
+      are embedded by the engine as-is.
+    """
+    def __init__(self, engine_path: str = "pdflatex", cache_dir: str = None, max_workers: int = 2,
+                 timeout: float = 60, max_passes: int = 3, max_sessions: int = 32, max_cached_pdfs: int = 256):
+        self.engine_path = engine_path
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "archimedes-latex")
+        self.timeout = timeout
+        self.max_passes = max_passes
+        self.max_sessions = max_sessions
+        self.max_cached_pdfs = max_cached_pdfs
+        self._max_workers = max_workers
+        self._workers = None
+        self._session_locks: Dict[str, asyncio.Lock] = {}
+        os.makedirs(os.path.join(self.cache_dir, "pdf"), exist_ok=True)
+        os.makedirs(os.path.join(self.cache_dir, "sessions"), exist_ok=True)
+
+    def cache_key(self, source: str, figures: Dict[str, str]) -> str:
+        digest = hashlib.sha256()
+        digest.update(os.path.basename(self.engine_path).encode())
+        digest.update(source.encode("utf-8"))
+        for name in sorted(figures):
+            digest.update(name.encode())
+            with open(figures[name], "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        return digest.hexdigest()
+
+    async def compile(self, source: str, figures: Dict[str, str] = None, session_id: str = None) -> CompileResult:
+        """
+        Compiles `source` to PDF. `figures` maps the file names used in
+        \\includegraphics to files on disk.
+        """
+        figures = figures or {}
+        for name in figures:
+            if not FIGURE_NAME_PATTERN.match(name):
+                raise ValueError(f"Invalid figure file name: {name}")
+            if os.path.splitext(name)[0].lower() == SOURCE_NAME:
+                # report.pdf would be overwritten by the engine's output
+                raise ValueError(f"Figure file name clashes with the compiled document: {name}")
+        if session_id is not None and not SESSION_ID_PATTERN.match(session_id):
+            raise ValueError(f"Invalid session id: {session_id}")
+
+        started = time.monotonic()
+        key = await asyncio.to_thread(self.cache_key, source, figures)
+        cached_pdf = os.path.join(self.cache_dir, "pdf", f"{key}.pdf")
+        if os.path.exists(cached_pdf):
+            metrics.CACHE_REQUESTS.inc(cache="latex_pdf", result="hit")
+            os.utime(cached_pdf)
+            return CompileResult(True, cached_pdf, "", cached=True, duration=time.monotonic() - started)
+        metrics.CACHE_REQUESTS.inc(cache="latex_pdf", result="miss")
+
+        if self._workers is None:
+            self._workers = asyncio.Semaphore(self._max_workers)
+        session_id = session_id or key[:16]
+        lock = self._session_locks.setdefault(session_id, asyncio.Lock())
+        async with lock, self._workers:
+            work_dir = self._prepare_session(session_id, source, figures)
+            success, log, passes = await self._run_passes(work_dir)
+            if not success:
+                return CompileResult(False, None, log, passes=passes, duration=time.monotonic() - started)
+            temp_pdf = f"{cached_pdf}.{session_id}.tmp"
+            shutil.copyfile(os.path.join(work_dir, f"{SOURCE_NAME}.pdf"), temp_pdf)
+            os.replace(temp_pdf, cached_pdf)
+            self._evict_pdfs()
+        return CompileResult(True, cached_pdf, log, passes=passes, duration=time.monotonic() - started)
+
+    def _prepare_session(self, session_id: str, source: str, figures: Dict[str, str]) -> str:
+        work_dir = os.path.join(self.cache_dir, "sessions", session_id)
+        os.makedirs(work_dir, exist_ok=True)
+        os.utime(work_dir)
+        with open(os.path.join(work_dir, f"{SOURCE_NAME}.tex"), "w", encoding="utf-8") as f:
+            f.write(source)
+        for name, path in figures.items():
+            target = os.path.join(work_dir, name)
+            if os.path.exists(target):
+                # Unlinked first: it may be a hard link made by an earlier version
+                os.remove(target)
+            shutil.copyfile(path, target)
+        self._evict_sessions(keep=session_id)
+        return work_dir
+
+    async def _run_passes(self, work_dir: str) -> (bool, str, int):
+        aux_path = os.path.join(work_dir, f"{SOURCE_NAME}.aux")
+        log = ""
+        for passes in range(1, self.max_passes + 1):
+            aux_before = _file_hash(aux_path)
+            try:
+                returncode, log = await self._run_engine(work_dir)
+            except LatexTimeoutError:
+                _restore_aux(work_dir)
+                raise
+            if returncode != 0:
+                # A broken .aux from a failed pass must not poison the next attempt
+                _restore_aux(work_dir)
+                return False, log, passes
+            _snapshot_aux(work_dir)
+            if _file_hash(aux_path) == aux_before and not RERUN_PATTERN.search(log):
+                return True, log, passes
+        return True, log, self.max_passes
+
+    async def _run_engine(self, work_dir: str) -> (int, str):
+        process = await asyncio.create_subprocess_exec(
+            self.engine_path, "-interaction=nonstopmode", "-halt-on-error", "-file-line-error", f"{SOURCE_NAME}.tex",
+            cwd=work_dir,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        try:
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise LatexTimeoutError(f"LaTeX compilation exceeded {self.timeout} seconds.")
+        return process.returncode, stdout.decode("utf-8", errors="replace")
+
+    def _evict_sessions(self, keep: str):
+        sessions_dir = os.path.join(self.cache_dir, "sessions")
+        sessions = sorted(
+            (os.path.getmtime(os.path.join(sessions_dir, name)), name) for name in os.listdir(sessions_dir) if name != keep
+        )
+        for _, name in sessions[:max(0, len(sessions) + 1 - self.max_sessions)]:
+            shutil.rmtree(os.path.join(sessions_dir, name), ignore_errors=True)
+            self._session_locks.pop(name, None)
+
+
+    def _evict_pdfs(self):
+        pdf_dir = os.path.join(self.cache_dir, "pdf")
+        pdfs = sorted((os.path.getmtime(os.path.join(pdf_dir, name)), name) for name in os.listdir(pdf_dir))
+        for _, name in pdfs[:max(0, len(pdfs) - self.max_cached_pdfs)]:
+            os.remove(os.path.join(pdf_dir, name))
+
+
+def _file_hash(path: str) -> Optional[str]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _snapshot_aux(work_dir: str):
+    good_dir = os.path.join(work_dir, GOOD_AUX_DIR)
+    os.makedirs(good_dir, exist_ok=True)
+    for extension in AUX_EXTENSIONS:
+        current = os.path.join(work_dir, SOURCE_NAME + extension)
+        kept = os.path.join(good_dir, SOURCE_NAME + extension)
+        if os.path.exists(current):
+            shutil.copyfile(current, kept)
+        elif os.path.exists(kept):
+            os.remove(kept)
+
+
+def _restore_aux(work_dir: str):
+    """Puts back the auxiliary files of the last successful pass, or removes them if there was none."""
+    for extension in AUX_EXTENSIONS:
+        current = os.path.join(work_dir, SOURCE_NAME + extension)
+        kept = os.path.join(work_dir, GOOD_AUX_DIR, SOURCE_NAME + extension)
+        if os.path.exists(kept):
+            shutil.copyfile(kept, current)
+        elif os.path.exists(current):
+            os.remove(current)
+
+
+def create_latex_compiler() -> LatexCompiler:
+    config = configparser.ConfigParser()
+    config.read('backend/config.ini')
+    section = config['LATEX'] if config.has_section('LATEX') else {}
+    return LatexCompiler(
+        engine_path=os.getenv("TEXLIVE_PATH") or section.get('engine_path') or "pdflatex",
+        cache_dir=section.get('cache_dir') or None,
+        max_workers=int(section.get('max_workers', 2)),
+        timeout=float(section.get('timeout_seconds', 60)),
+    )
+
+
+# Shared compiler used by the LaTeX endpoints
+latex_compiler = create_latex_compiler()
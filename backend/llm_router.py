@@ -0,0 +1,220 @@
+"""
+Latency-based routing and hedged requests across LLM providers.
+
+Requests with provider "auto" are routed here by call_ai_provider. The
+model field selects the allowed targets: "auto" for the targets in the
+[ROUTING] section of config.ini, or a comma-separated list such as
+"google/gemini-1.5-flash,deepseek/deepseek-chat".
+
+For each (provider, model) the router keeps the latency and outcome of its
+last `window` calls. A call goes to the healthy target with the lowest
+median latency. If it has not answered once its usual high-percentile
+latency has passed, the same prompt is sent to the next target as well.
+The first successful answer is used and the other request is cancelled.
+A target that fails is skipped for a cool-down period.
+"""
+import asyncio
+import configparser
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import metrics, tracing
+
+Target = Tuple[str, str]
+
+
+class TargetStats:
+    """Rolling latency and error statistics of one (provider, model)."""
+    def __init__(self, window: int = 100):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+
+    def record(self, latency: float, ok: bool):
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+            self.consecutive_failures = 0
+        else:
+            self.consecutive_failures += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        return float(np.percentile(np.fromiter(self.latencies, dtype=float), q))
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "calls": len(self.outcomes),
+            "error_rate": round(self.error_rate, 3),
+            "p50_seconds": self.percentile(50),
+            "p95_seconds": self.percentile(95),
+            "healthy": time.monotonic() >= self.unhealthy_until,
+        }
+
+
+class LLMRouter:
+    def __init__(self, targets: List[Target] = None, hedge: bool = True, hedge_percentile: float = 95,
+                 min_hedge_delay: float = 1.0, initial_hedge_delay: float = 15.0, window: int = 100,
+                 min_samples: int = 5, max_error_rate: float = 0.5, max_consecutive_failures: int = 3,
+                 cooldown: float = 30.0):
+        self.targets = targets or []
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.initial_hedge_delay = initial_hedge_delay
+        self.window = window
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.max_consecutive_failures = max_consecutive_failures
+        self.cooldown = cooldown
+        self.stats: Dict[Target, TargetStats] = {}
+
+    def parse_targets(self, spec: str) -> List[Target]:
+        """Parses "auto" or "provider/model,provider/model" into targets."""
+        if not spec or spec.strip() == "auto":
+            if not self.targets:
+                raise ValueError("No routing targets are configured in the [ROUTING] section.")
+            return list(self.targets)
+        targets = []
+        for item in spec.split(","):
+            provider, separator, model = item.strip().partition("/")
+            if not separator or not provider or not model:
+                raise ValueError(f"Invalid routing target '{item.strip()}'; expected provider/model.")
+            if provider == "auto":
+                # Would route back into the router without end
+                raise ValueError(f"Invalid routing target '{item.strip()}'; a target must name a provider, not auto.")
+            targets.append((provider, model))
+        return targets
+
+    def stats_for(self, target: Target) -> TargetStats:
+        stats = self.stats.get(target)
+        if stats is None:
+            stats = self.stats[target] = TargetStats(self.window)
+        return stats
+
+    def is_healthy(self, target: Target) -> bool:
+        stats = self.stats_for(target)
+        if time.monotonic() < stats.unhealthy_until:
+            return False
+        return len(stats.outcomes) < self.min_samples or stats.error_rate <= self.max_error_rate
+
+    def rank(self, targets: List[Target]) -> List[Target]:
+        """
+        Orders targets by health, then median latency. Targets without
+        latency samples come first so that they get measured; ties keep the
+        given order.
+        """
+        def score(item):
+            index, target = item
+            p50 = self.stats_for(target).percentile(50)
+            return (not self.is_healthy(target), p50 if p50 is not None else -1.0, index)
+        return [target for _, target in sorted(enumerate(targets), key=score)]
+
+    def hedge_delay(self, target: Target) -> float:
+        stats = self.stats_for(target)
+        if len(stats.latencies) < self.min_samples:
+            return self.initial_hedge_delay
+        return max(self.min_hedge_delay, stats.percentile(self.hedge_percentile))
+
+    async def route(self, spec: str, prompt: str, call: Callable[[str, str, str], Awaitable[str]]) -> str:
+        """
+        Sends the prompt to the best target in `spec` using `call(provider,
+        model, prompt)`, hedging to the next one if it is slow and failing
+        over to the rest if it errors.
+        """
+        ranked = self.rank(self.parse_targets(spec))
+        with tracing.start_span("llm.route", attributes={"llm.route.targets": ",".join(f"{p}/{m}" for p, m in ranked)}) as span:
+            remaining = list(ranked)
+            running: Dict[asyncio.Task, Target] = {}
+            errors = []
+            loop = asyncio.get_running_loop()
+
+            def start_next():
+                target = remaining.pop(0)
+                running[asyncio.create_task(self._attempt(target, prompt, call))] = target
+                return target
+
+            primary = start_next()
+            hedge_at = loop.time() + self.hedge_delay(primary) if self.hedge and remaining else None
+            try:
+                while running:
+                    timeout = max(0.0, hedge_at - loop.time()) if hedge_at is not None else None
+                    done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                    if not done:
+                        # The primary is slower than usual: send the same prompt to the runner-up
+                        start_next()
+                        hedge_at = None
+                        span.set_attribute("llm.route.hedged", True)
+                        continue
+                    for task in done:
+                        target = running.pop(task)
+                        if task.exception() is None:
+                            span.set_attribute("llm.route.target", f"{target[0]}/{target[1]}")
+                            if len(ranked) > 1 and self.hedge:
+                                metrics.LLM_HEDGES.inc(outcome="primary_won" if target == primary else "fallback_won")
+                            return task.result()
+                        errors.append(task.exception())
+                    if not running and remaining:
+                        # Everything in flight failed: fail over immediately
+                        start_next()
+                        hedge_at = None
+                raise errors[-1]
+            finally:
+                for task in running:
+                    task.cancel()
+                if running:
+                    await asyncio.gather(*running, return_exceptions=True)
+
+    async def _attempt(self, target: Target, prompt: str, call) -> str:
+        started = time.perf_counter()
+        try:
+            response = await call(target[0], target[1], prompt)
+        except asyncio.CancelledError:
+            # The loser of a hedge: its latency is unknown, not a failure
+            raise
+        except Exception:
+            self._record(target, time.perf_counter() - started, ok=False)
+            raise
+        self._record(target, time.perf_counter() - started, ok=True)
+        return response
+
+    def _record(self, target: Target, latency: float, ok: bool):
+        stats = self.stats_for(target)
+        stats.record(latency, ok)
+        if stats.consecutive_failures >= self.max_consecutive_failures:
+            stats.unhealthy_until = time.monotonic() + self.cooldown
+            stats.consecutive_failures = 0
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {f"{provider}/{model}": stats.to_dict() for (provider, model), stats in self.stats.items()}
+
+
+def create_llm_router() -> LLMRouter:
+    config = configparser.ConfigParser()
+    config.read('backend/config.ini')
+    section = config['ROUTING'] if config.has_section('ROUTING') else {}
+    router = LLMRouter(
+        hedge=section.get('hedge', 'true').strip().lower() in ("1", "true", "yes"),
+        hedge_percentile=float(section.get('hedge_percentile', 95)),
+        min_hedge_delay=float(section.get('min_hedge_delay_seconds', 1)),
+        initial_hedge_delay=float(section.get('initial_hedge_delay_seconds', 15)),
+        window=int(section.get('window', 100)),
+        max_error_rate=float(section.get('max_error_rate', 0.5)),
+        cooldown=float(section.get('cooldown_seconds', 30)),
+    )
+    if section.get('targets'):
+        router.targets = router.parse_targets(section.get('targets'))
+    return router
+
+
+# Shared router used for provider "auto"
+llm_router = create_llm_router()
@@ -1,4 +1,6 @@
+import asyncio
 import os
+import httpx
 import requests
 import traceback
 import configparser
@@ -10,9 +12,12 @@ from pydantic import BaseModel
 from typing import Dict, Any, List, Optional
 import io
 import base64
+import csv
 import json
+import time
 from contextlib import redirect_stdout, redirect_stderr
 import tempfile
+import threading
 import shutil
 import subprocess
 import zipfile
@@ -25,12 +30,19 @@ import scipy
 import matplotlib.pyplot as plt
 import google.generativeai as genai
 
+from . import cassettes, metrics, tracing
+from .admission import Overloaded, admission_controller, priority_scope
+from .llm_router import llm_router
+from .mock_provider import call_mock_api
+
 # --- Error Handling ---
 class AppError(Exception):
     def __init__(self, error_code: str, message: str, suggestion: str = "No suggestion provided."):
         self.error_code = error_code
         self.message = message
         self.suggestion = suggestion
+        # Lets clients quote the trace of the request that failed
+        self.trace_id = tracing.current_trace_id()
         super().__init__(self.message)
 
 # Define specific error codes
@@ -40,6 +52,14 @@ class ErrorCodes:
     FILE_NOT_FOUND = "FILE_NOT_FOUND"
     PYTHON_EXECUTION_ERROR = "PYTHON_EXECUTION_ERROR"
     INVALID_INPUT = "INVALID_INPUT"
+    LATEX_COMPILE_ERROR = "LATEX_COMPILE_ERROR"
+    LATEX_TIMEOUT = "LATEX_TIMEOUT"
+    CASSETTE_MISS = "CASSETTE_MISS"
+    SESSION_NOT_FOUND = "SESSION_NOT_FOUND"
+    SESSION_CONFLICT = "SESSION_CONFLICT"
+    NO_BUILTIN_SOLVER = "NO_BUILTIN_SOLVER"
+    NO_SURROGATE_DATA = "NO_SURROGATE_DATA"
+    SERVER_OVERLOADED = "SERVER_OVERLOADED"
     UNKNOWN_ERROR = "UNKNOWN_ERROR"
 
 # --- Config Parser Setup ---
@@ -59,9 +79,27 @@ async def app_exception_handler(request: Request, exc: AppError):
             "error_code": exc.error_code,
             "message": exc.message,
             "suggestion": exc.suggestion,
+            "trace_id": exc.trace_id,
+        },
+    )
+
+def _overloaded_response(exc: Overloaded) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+        content={
+            "error_code": ErrorCodes.SERVER_OVERLOADED,
+            "message": f"The server is too busy for {exc.priority} requests right now ({exc.limiter}: {exc.reason}).",
+            "suggestion": "Retry after the number of seconds in the Retry-After header.",
+            "trace_id": tracing.current_trace_id(),
         },
     )
 
+@app.exception_handler(Overloaded)
+async def overloaded_exception_handler(request: Request, exc: Overloaded):
+    # Shed while waiting for an LLM, sandbox or embedding slot
+    return _overloaded_response(exc)
+
 @app.exception_handler(Exception)
 async def generic_exception_handler(request: Request, exc: Exception):
     return JSONResponse(
@@ -70,16 +108,117 @@ async def generic_exception_handler(request: Request, exc: Exception):
             "error_code": ErrorCodes.UNKNOWN_ERROR,
             "message": "An unexpected server error occurred.",
             "suggestion": "Please contact support or try again later.",
-            "detail": str(exc) # Optional: for debugging
+            "detail": str(exc), # Optional: for debugging
+            "trace_id": getattr(exc, "trace_id", None),
         },
     )
 
+def _content_length(request: Request) -> int:
+    """The declared body size; a missing or malformed header counts as 0."""
+    try:
+        return max(int(request.headers.get("content-length") or 0), 0)
+    except ValueError:
+        return 0
+
+# Registered first so it runs inside the metrics and tracing middleware, which then see shed requests
+@app.middleware("http")
+async def admit_requests(request: Request, call_next):
+    priority = admission_controller.classify(request.url.path, _content_length(request))
+    if priority is None:
+        return await call_next(request)
+    try:
+        release = await admission_controller.admit(priority)
+    except Overloaded as e:
+        return _overloaded_response(e)
+    try:
+        with priority_scope(priority):
+            response = await call_next(request)
+    except BaseException:
+        release()
+        raise
+    # Streaming responses (e.g. /api/drawings/digitize) do their work while the body is sent
+    response.body_iterator = _release_after(response.body_iterator, release)
+    return response
+
+async def _release_after(body_iterator, release):
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        release()
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, so ids in URLs don't create new series
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status),
+        )
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    with tracing.start_span(
+        f"{request.method} {request.url.path}",
+        kind="SERVER",
+        attributes={"http.request.method": request.method, "url.path": request.url.path},
+        traceparent=request.headers.get("traceparent"),
+    ) as span:
+        try:
+            response = await call_next(request)
+        except Exception as e:
+            # Unhandled errors are rendered outside this middleware; keep the id for the error payload
+            e.trace_id = span.trace_id
+            raise
+        route = request.scope.get("route")
+        if route is not None:
+            span.name = f"{request.method} {route.path}"
+            span.set_attribute("http.route", route.path)
+        span.set_attribute("http.response.status_code", response.status_code)
+        if response.status_code >= 500:
+            span.set_status(tracing.STATUS_ERROR)
+        response.headers["X-Trace-Id"] = span.trace_id
+        response.headers["traceparent"] = span.traceparent
+        return response
+
+@app.middleware("http")
+async def select_cassette(request: Request, call_next):
+    try:
+        selection = cassettes.cassette_library.selection_from_headers(request.headers)
+    except ValueError as e:
+        # Raised before routing, so the AppError handler does not apply here
+        return JSONResponse(
+            status_code=400,
+            content={
+                "error_code": ErrorCodes.INVALID_INPUT,
+                "message": str(e),
+                "suggestion": "Check the X-LLM-Cassette, X-LLM-Cassette-Name and X-LLM-Replay-Latency headers.",
+            },
+        )
+    if selection is None:
+        return await call_next(request)
+    token = cassettes.use_selection(selection)
+    try:
+        return await call_next(request)
+    finally:
+        cassettes.reset_selection(token)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id", "traceparent"],
 )
 
 # --- Environment and API Key Loading ---
@@ -87,7 +226,6 @@ load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-TEXLIVE_PATH = r"D:\texlive\2025\bin\windows\pdflatex.exe"
 
 # Configure the Google Generative AI client
 if GEMINI_API_KEY:
@@ -125,9 +263,11 @@ class IterationData(BaseModel):
 class LatexReportRequest(BaseModel):
     problem: str
     final_status: str
-    iteration_history: List[IterationData]
+    # Or leave it out and give session_id: the session's iteration-<n> steps are used
+    iteration_history: Optional[List[IterationData]] = None
     provider: str
     model: str
+    session_id: Optional[str] = None
 
 
 
@@ -154,12 +294,55 @@ def load_prompt(filename: str, data: Dict[str, Any], base_folder: str = "prompts
 
 # --- AI Call Handlers ---
 async def call_ai_provider(provider: str, model: str, prompt: str) -> str:
+    if provider == "auto":
+        # The router calls back into this function once per target it tries
+        try:
+            return await llm_router.route(model, prompt, call_ai_provider)
+        except ValueError as e:
+            raise AppError(
+                error_code=ErrorCodes.INVALID_INPUT,
+                message=str(e),
+                suggestion='Use model "auto" or a comma-separated list of provider/model targets.'
+            )
+    metrics.LLM_PROMPT_CHARS.observe(len(prompt), provider=provider)
+    status = "error"
+    started = time.perf_counter()
+    attributes = {"gen_ai.system": provider, "gen_ai.request.model": model, "llm.prompt_chars": len(prompt)}
+    with tracing.start_span("llm.call", kind="CLIENT", attributes=attributes) as span:
+        try:
+            response = await cassettes.cassette_library.call(provider, model, prompt, _dispatch_ai_provider)
+            status = "ok"
+        except cassettes.CassetteMiss as e:
+            raise AppError(
+                error_code=ErrorCodes.CASSETTE_MISS,
+                message=str(e),
+                suggestion="Record the cassette again, or use the replay_or_record mode to fill in missing responses."
+            )
+        except asyncio.CancelledError:
+            # e.g. the slower request of a hedged pair
+            status = "cancelled"
+            raise
+        finally:
+            metrics.LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, provider=provider, model=model, status=status)
+        span.set_attribute("llm.response_chars", len(response))
+    metrics.LLM_RESPONSE_CHARS.observe(len(response), provider=provider)
+    return response
+
+async def _dispatch_ai_provider(provider: str, model: str, prompt: str) -> str:
+    # Cassette replays never get here, so only calls that reach a provider hold an LLM slot
+    async with admission_controller.resource("llm"):
+        return await _call_provider(provider, model, prompt)
+
+async def _call_provider(provider: str, model: str, prompt: str) -> str:
     if provider == "google":
         return await call_gemini_api(model, prompt)
     elif provider == "openai":
         return await call_openai_api(model, prompt)
     elif provider == "deepseek":
         return await call_deepseek_api(model, prompt)
+    elif provider == "mock":
+        # Deterministic offline responses for benchmarks and development
+        return await call_mock_api(model, prompt)
     else:
         raise HTTPException(status_code=400, detail="Invalid AI provider.")
 
@@ -167,6 +350,9 @@ async def call_gemini_api(model: str, prompt: str) -> str:
     try:
         model_instance = genai.GenerativeModel(model)
         response = await model_instance.generate_content_async(prompt)
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            _record_token_usage("google", model, getattr(usage, "prompt_token_count", 0), getattr(usage, "candidates_token_count", 0))
         if response.parts:
             return "".join(part.text for part in response.parts)
         else:
@@ -189,59 +375,76 @@ async def call_gemini_api(model: str, prompt: str) -> str:
         )
 
 async def call_openai_api(model: str, prompt: str) -> str:
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {OPENAI_API_KEY}"}
-    json_payload = {"model": model, "messages": [{"role": "user", "content": prompt}]}
-    try:
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=json_payload, timeout=120)
-        response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"]
-    except requests.exceptions.Timeout:
-        raise AppError(
-            error_code=ErrorCodes.AI_API_TIMEOUT,
-            message="OpenAI API request timed out.",
-            suggestion="The request took too long to complete. Check your network connection or try again later."
-        )
-    except requests.exceptions.RequestException as e:
-        raise AppError(
-            error_code=ErrorCodes.AI_API_ERROR,
-            message=f"OpenAI API Error: {str(e)}",
-            suggestion="An error occurred with the OpenAI API. Check your API key, model name, and network status."
-        )
+    return await _call_chat_completions("openai", "OpenAI", "https://api.openai.com/v1/chat/completions", OPENAI_API_KEY, model, prompt)
 
 async def call_deepseek_api(model: str, prompt: str) -> str:
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {DEEPSEEK_API_KEY}"}
+    return await _call_chat_completions("deepseek", "DeepSeek", "https://api.deepseek.com/v1/chat/completions", DEEPSEEK_API_KEY, model, prompt)
+
+async def _call_chat_completions(provider: str, label: str, url: str, api_key: str, model: str, prompt: str) -> str:
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
     json_payload = {"model": model, "messages": [{"role": "user", "content": prompt}]}
     try:
-        response = requests.post("https://api.deepseek.com/v1/chat/completions", headers=headers, json=json_payload, timeout=120)
+        # Async, so that cancelling the slower request of a hedged pair closes its connection
+        # instead of leaving it running (and billed) in a worker thread
+        async with httpx.AsyncClient(timeout=120) as client:
+            response = await client.post(url, headers=headers, json=json_payload)
         response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"]
-    except requests.exceptions.Timeout:
+        body = response.json()
+        usage = body.get("usage") or {}
+        _record_token_usage(provider, model, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+        return body["choices"][0]["message"]["content"]
+    except httpx.TimeoutException:
         raise AppError(
             error_code=ErrorCodes.AI_API_TIMEOUT,
-            message="DeepSeek API request timed out.",
+            message=f"{label} API request timed out.",
             suggestion="The request took too long to complete. Check your network connection or try again later."
         )
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         raise AppError(
             error_code=ErrorCodes.AI_API_ERROR,
-            message=f"DeepSeek API Error: {str(e)}",
-            suggestion="An error occurred with the DeepSeek API. Check your API key, model name, and network status."
+            message=f"{label} API Error: {str(e)}",
+            suggestion=f"An error occurred with the {label} API. Check your API key, model name, and network status."
         )
 
+def _record_token_usage(provider: str, model: str, prompt_tokens: int, completion_tokens: int):
+    metrics.LLM_TOKENS.inc(prompt_tokens or 0, provider=provider, model=model, kind="prompt")
+    metrics.LLM_TOKENS.inc(completion_tokens or 0, provider=provider, model=model, kind="completion")
+    span = tracing.current_span()
+    if span is not None:
+        span.set_attribute("gen_ai.usage.input_tokens", int(prompt_tokens or 0))
+        span.set_attribute("gen_ai.usage.output_tokens", int(completion_tokens or 0))
+
 
 # --- API Endpoints ---
+@app.get("/metrics")
+async def get_metrics():
+    return Response(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/llm/routing")
+async def get_llm_routing():
+    """Rolling latency/error statistics used to route provider "auto" calls."""
+    return {"targets": [f"{provider}/{model}" for provider, model in llm_router.targets], "stats": llm_router.snapshot()}
+
+@app.get("/api/admission")
+async def get_admission():
+    """Running and queued work per priority class, for requests and each resource."""
+    return admission_controller.snapshot()
+
+PROVIDER_URLS = {
+    "google": "https://generativelanguage.googleapis.com",
+    "openai": "https://api.openai.com",
+    "deepseek": "https://api.deepseek.com"
+}
+
 @app.post("/api/test-connection")
 async def test_connection(request: ConnectionTestRequest):
-    urls = {
-        "google": "https://generativelanguage.googleapis.com",
-        "openai": "https://api.openai.com",
-        "deepseek": "https://api.deepseek.com"
-    }
-    url = urls.get(request.provider)
+    if request.provider == "auto":
+        return await _test_routing_targets()
+    url = PROVIDER_URLS.get(request.provider)
     if not url:
         raise AppError(error_code=ErrorCodes.INVALID_INPUT, message="Invalid provider.")
     try:
-        requests.get(url, timeout=10)
+        await asyncio.to_thread(requests.get, url, timeout=10)
         return {"status": "success", "provider": request.provider, "message": f"Successfully connected to {request.provider}."}
     except requests.exceptions.RequestException as e:
         raise AppError(
@@ -250,6 +453,40 @@ async def test_connection(request: ConnectionTestRequest):
             suggestion="Could not connect to the AI provider. Check your network or the provider's status page."
         )
 
+async def _test_routing_targets():
+    """Probes every provider of the [ROUTING] targets; "auto" works while one of them is reachable."""
+    providers = list(dict.fromkeys(provider for provider, _ in llm_router.targets))
+    if not providers:
+        raise AppError(
+            error_code=ErrorCodes.INVALID_INPUT,
+            message="No routing targets are configured.",
+            suggestion="Add provider/model targets to the [ROUTING] section of config.ini."
+        )
+
+    async def probe(provider):
+        if provider == "mock":
+            return None
+        if provider not in PROVIDER_URLS:
+            return "unknown provider"
+        try:
+            await asyncio.to_thread(requests.get, PROVIDER_URLS[provider], timeout=10)
+            return None
+        except requests.exceptions.RequestException as e:
+            return str(e)
+
+    failures = dict(zip(providers, await asyncio.gather(*(probe(provider) for provider in providers))))
+    failed = {provider: error for provider, error in failures.items() if error is not None}
+    if len(failed) == len(providers):
+        raise AppError(
+            error_code=ErrorCodes.AI_API_ERROR,
+            message="Connection failed to every routing target: " + "; ".join(f"{p}: {e}" for p, e in failed.items()),
+            suggestion="Could not connect to any configured AI provider. Check your network or the providers' status pages."
+        )
+    message = f"Connected to {', '.join(p for p in providers if p not in failed)}."
+    if failed:
+        message += f" Unreachable targets are skipped: {', '.join(failed)}."
+    return {"status": "success", "provider": "auto", "message": message}
+
 @app.post("/api/call-ai")
 async def call_ai_endpoint(request: AIRequest):
     prompt_file_map = {
@@ -295,9 +532,12 @@ async def generate_latex_report(request: LatexReportRequest):
     This is a dedicated endpoint for the complex task of generating a LaTeX report.
     It correctly serializes the structured iteration history into a string for the AI prompt.
     """
+    iteration_history = request.iteration_history
+    if iteration_history is None:
+        iteration_history = _session_iterations(_require_session(request.session_id))
     try:
         history_str = ""
-        for item in request.iteration_history:
+        for item in iteration_history:
             history_str += f"### Iteration {item.iteration_number}\n\n"
             if item.solution_attempt:
                 history_str += f"**Solution Attempt:**\n```\n{item.solution_attempt}\n```\n\n"
@@ -332,9 +572,21 @@ async def generate_latex_report(request: LatexReportRequest):
 
 
 from fastapi import UploadFile, File
-from .workflow import run_engineering_workflow
-from .optimization_workflow import run_optimization_workflow
+from .workflow import max_fix_attempts, run_engineering_workflow, run_script_with_fixes
+from .solvers import match_solver, run_builtin
+from .surrogates import script_hash, surrogate_store
+from .script_checks import extract_code, format_problems, load_allowed_imports, validate_script
+from .optimization_workflow import HISTORY_MODES, run_optimization_workflow
 from .knowledge import knowledge_base_instance
+from .artifacts import artifact_store
+from .datasets import dataset_store
+from .latex_compiler import latex_compiler, LatexTimeoutError
+from .drawing_batch import BatchSummary, IMAGE_EXTENSIONS, drawing_processor
+from .sessions import Session, SessionNotFound, VersionConflict, session_store
+from .encoding import encode_response
+
+# Artifacts are content-addressed, so a given URL always serves the same bytes
+ARTIFACT_CACHE_HEADERS = {"Cache-Control": "public, max-age=31536000, immutable"}
 
 class WorkflowRequest(BaseModel):
     provider: str
@@ -351,12 +603,31 @@ class OptimizationRequest(BaseModel):
     solver_preference: str
     optimization_goal: str
     max_iterations: int = 5
+    # "slim" stores each iteration after the first as a merge patch from the previous one
+    history_mode: str = "full"
+    # Start from earlier parameters of the problem that met a numeric goal, if there are any
+    warm_start: bool = False
 
 @app.post("/api/upload-data")
 async def upload_data(file: UploadFile = File(...)):
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".csv") as temp_file:
-        temp_file.write(await file.read())
-        return {"filepath": temp_file.name}
+    """
+    Streams the uploaded CSV to the dataset store, which keeps it (and a
+    per-column binary copy) under its content hash for sandbox runs.
+    """
+    try:
+        manifest = await dataset_store.save_upload(file)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise AppError(
+            error_code=ErrorCodes.INVALID_INPUT,
+            message=f"Could not read the uploaded file as CSV: {e}",
+            suggestion="Upload a UTF-8 encoded CSV file with a header row."
+        )
+    return {
+        "filepath": manifest["filepath"],
+        "dataset_id": manifest["dataset_id"],
+        "rows": manifest["rows"],
+        "columns": [column["name"] for column in manifest["columns"]],
+    }
 
 @app.post("/api/knowledge/process")
 async def process_knowledge(file: UploadFile = File(...)):
@@ -366,8 +637,10 @@ async def process_knowledge(file: UploadFile = File(...)):
     try:
         content = await file.read()
         text = content.decode('utf-8')
-        knowledge_base_instance.add_document(text)
-        return {"status": "success", "filename": file.filename, "chunks_added": len(knowledge_base_instance.chunks)}
+        async with admission_controller.resource("embedding"):
+            added = await asyncio.to_thread(knowledge_base_instance.add_document, text)
+        return {"status": "success", "filename": file.filename, "chunks_added": len(knowledge_base_instance.chunks),
+                "duplicates_skipped": added["duplicates"]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process knowledge file: {str(e)}")
 
@@ -378,27 +651,177 @@ class StepModelRequest(BaseModel):
     parameters: Dict[str, Any]
     knowledge_base: Optional[str] = None
     # No revision needed here as the 'problem' field is the editable content
+    # With a session id, the step result is kept on the server for the next steps
+    session_id: Optional[str] = None
 
 class StepGenerateScriptRequest(BaseModel):
     provider: str
     model: str
-    modeling_result: str
+    # Taken from the session's step-model result when left out
+    modeling_result: Optional[str] = None
     parameters: Dict[str, Any]
     knowledge_base: Optional[str] = None
     revised_content: Optional[str] = None
+    session_id: Optional[str] = None
 
 class StepExecuteRequest(BaseModel):
-    script: str
+    # Taken from the session's step-generate-script result when left out
+    script: Optional[str] = None
     parameters: Dict[str, Any]
     data_filepath: Optional[str] = None
+    session_id: Optional[str] = None
+    # Adds the run's scalar results to the problem's surrogate index when given
+    problem: Optional[str] = None
+
+class StepRunScriptRequest(BaseModel):
+    provider: str
+    model: str
+    # Taken from the session's step-generate-script result when left out
+    script: Optional[str] = None
+    parameters: Dict[str, Any]
+    data_filepath: Optional[str] = None
+    session_id: Optional[str] = None
+    # [SANDBOX] max_fix_attempts when left out
+    max_attempts: Optional[int] = None
+
+class StepSolveRequest(BaseModel):
+    # Only used to tell cases apart that the parameters do not (e.g. beam supports)
+    problem: str = ""
+    parameters: Dict[str, Any]
+    session_id: Optional[str] = None
+
+class SurrogatePredictRequest(BaseModel):
+    problem: str
+    parameters: Dict[str, Any]
+    # The index of this script; the problem's largest index when left out
+    script: Optional[str] = None
 
 class StepSynthesizeRequest(BaseModel):
     provider: str
     model: str
-    history: Dict[str, Any]
+    # The session's step results when left out
+    history: Optional[Dict[str, Any]] = None
     knowledge_base: Optional[str] = None
+    session_id: Optional[str] = None
+
+class StepPatchRequest(BaseModel):
+    # JSON merge patch: only the changed fields, null deletes a field
+    patch: Dict[str, Any]
+    # Rejects the patch if the step was written since this version was read
+    expected_version: Optional[int] = None
 
+# Steps whose results make up the history given to the synthesis step
+WORKFLOW_STEPS = ["step-model", "step-generate-script", "step-execute"]
+ITERATION_STEP_PATTERN = re.compile(r"^iteration-(\d+)$")
 
+
+def _require_session(session_id: Optional[str]) -> Session:
+    if not session_id:
+        raise AppError(
+            error_code=ErrorCodes.INVALID_INPUT,
+            message="Either the full step input or a session_id is required.",
+            suggestion="Create a session with POST /api/sessions and pass its session_id."
+        )
+    try:
+        return session_store.get(session_id)
+    except SessionNotFound:
+        raise _session_not_found(session_id)
+
+def _check_session(session_id: Optional[str]):
+    """Fails a step that names an unknown session before it calls the LLM or the sandbox."""
+    if session_id:
+        _require_session(session_id)
+
+def _session_not_found(session_id: str) -> AppError:
+    return AppError(
+        error_code=ErrorCodes.SESSION_NOT_FOUND,
+        message=f"Session not found: {session_id}",
+        suggestion="The session may have expired. Start a new session or send the step inputs in full."
+    )
+
+def _session_result(session_id: Optional[str], step: str) -> Any:
+    """The computational_result of an earlier step in the session."""
+    session = _require_session(session_id)
+    if step not in session.steps:
+        raise AppError(
+            error_code=ErrorCodes.INVALID_INPUT,
+            message=f"Session {session_id} has no result for {step}.",
+            suggestion=f"Run {step} with this session_id first."
+        )
+    return session.steps[step].data.get("computational_result")
+
+def _session_iterations(session: Session) -> List[IterationData]:
+    numbered = [(int(match.group(1)), name) for name in session.steps
+                if (match := ITERATION_STEP_PATTERN.match(name))]
+    return [IterationData(**session.steps[name].data) for _, name in sorted(numbered)]
+
+def _store_step(session_id: Optional[str], step: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Keeps the result in the session, if there is one, and tells the client its version."""
+    if not session_id:
+        return result
+    stored = _put_step(session_id, step, result)
+    return {**result, "session": {"session_id": session_id, "step": step, "version": stored.version}}
+
+def _put_step(session_id: str, step: str, data: Dict[str, Any], expected_version: Optional[int] = None,
+              patch: bool = False):
+    try:
+        if patch:
+            return session_store.patch_step(session_id, step, data, expected_version)
+        return session_store.put_step(session_id, step, data, expected_version)
+    except SessionNotFound:
+        raise _session_not_found(session_id)
+    except VersionConflict as e:
+        raise AppError(
+            error_code=ErrorCodes.SESSION_CONFLICT,
+            message=str(e),
+            suggestion="The step was changed in the meantime. Fetch it again and reapply the edit."
+        )
+    except KeyError:
+        raise AppError(error_code=ErrorCodes.INVALID_INPUT, message=f"Session {session_id} has no step {step}.")
+    except ValueError as e:
+        raise AppError(error_code=ErrorCodes.INVALID_INPUT, message=str(e))
+
+
+@app.post("/api/sessions")
+async def create_session():
+    """Starts a server-side session; step endpoints given its id keep their results in it."""
+    return session_store.create().summary()
+
+@app.get("/api/sessions/{session_id}")
+async def get_session(session_id: str, include_data: bool = False):
+    session = _require_session(session_id)
+    summary = session.summary()
+    if include_data:
+        summary["history"] = session.history()
+    return summary
+
+@app.delete("/api/sessions/{session_id}")
+async def delete_session(session_id: str):
+    session_store.delete(session_id)
+    return {"status": "deleted", "session_id": session_id}
+
+@app.get("/api/sessions/{session_id}/steps/{step}")
+async def get_session_step(session_id: str, step: str):
+    session = _require_session(session_id)
+    if step not in session.steps:
+        raise AppError(error_code=ErrorCodes.INVALID_INPUT, message=f"Session {session_id} has no step {step}.")
+    stored = session.steps[step]
+    return {"step": step, "version": stored.version, "data": stored.data}
+
+@app.put("/api/sessions/{session_id}/steps/{step}")
+async def put_session_step(session_id: str, step: str, data: Dict[str, Any], expected_version: Optional[int] = None):
+    """Stores a step output, e.g. an iteration-<n> record for the LaTeX report."""
+    stored = _put_step(session_id, step, data, expected_version)
+    return {"step": step, **stored.summary()}
+
+@app.patch("/api/sessions/{session_id}/steps/{step}")
+async def patch_session_step(session_id: str, step: str, request: StepPatchRequest):
+    """Applies the user's edit of a step as a merge patch instead of re-uploading the step."""
+    stored = _put_step(session_id, step, request.patch, request.expected_version, patch=True)
+    return {"step": step, **stored.summary()}
+
+
+@metrics.CITATION_SECONDS.time()
 def process_citations(text: str, knowledge_base: str) -> (str, list):
     """
     Processes the AI's response to replace [source] markers with citation spans
@@ -454,12 +877,18 @@ def process_citations(text: str, knowledge_base: str) -> (str, list):
     return processed_text, citations
 
 
+async def _relevant_chunks(query: str) -> List[str]:
+    # Embedding the query is CPU-bound; keep it off the event loop and share the model in turn
+    async with admission_controller.resource("embedding"):
+        return await asyncio.to_thread(knowledge_base_instance.get_relevant_chunks, query)
+
 @app.post("/api/step/model")
 async def step_model(request: StepModelRequest):
     """
     Handles the modeling step, now with RAG.
     """
-    relevant_chunks = knowledge_base_instance.get_relevant_chunks(request.problem)
+    _check_session(request.session_id)
+    relevant_chunks = await _relevant_chunks(request.problem)
     knowledge_section = f"**Background Knowledge:**\n---\n{''.join(relevant_chunks)}\n---\n" if relevant_chunks else ""
 
     modeling_prompt = f"{knowledge_section}**Your Task:**\nProblem: {request.problem}\nParameters: {json.dumps(request.parameters)}"
@@ -473,22 +902,27 @@ async def step_model(request: StepModelRequest):
     ai_review_raw = await call_ai_provider(request.provider, request.model, review_prompt)
     ai_review, citations2 = process_citations(ai_review_raw, "\n".join(relevant_chunks))
 
-    return {"computational_result": modeling_result, "ai_review": ai_review, "citations": citations1 + citations2}
+    result = {"computational_result": modeling_result, "ai_review": ai_review, "citations": citations1 + citations2}
+    return _store_step(request.session_id, "step-model", result)
 
 @app.post("/api/step/generate-script")
 async def step_generate_script(request: StepGenerateScriptRequest):
     """
     Handles the script generation step, now with RAG.
     """
-    query = request.modeling_result
-    relevant_chunks = knowledge_base_instance.get_relevant_chunks(query)
+    _check_session(request.session_id)
+    modeling_result = request.modeling_result
+    if modeling_result is None:
+        modeling_result = _session_result(request.session_id, "step-model")
+    query = modeling_result
+    relevant_chunks = await _relevant_chunks(query)
     knowledge_section = f"**Background Knowledge:**\n---\n{''.join(relevant_chunks)}\n---\n" if relevant_chunks else ""
 
     # If user provides revised content, use it. Otherwise, generate from AI.
     if request.revised_content:
         simulation_script = request.revised_content
     else:
-        script_prompt = f"{knowledge_section}**Your Task:**\nBased on the modeling result, generate a simulation script.\nModeling Result:\n{request.modeling_result}\nParameters: {json.dumps(request.parameters)}"
+        script_prompt = f"{knowledge_section}**Your Task:**\nBased on the modeling result, generate a simulation script.\nModeling Result:\n{modeling_result}\nParameters: {json.dumps(request.parameters)}"
         simulation_script = await call_ai_provider(request.provider, request.model, script_prompt)
 
     # AI always reviews the script that is being passed to the next step
@@ -496,14 +930,28 @@ async def step_generate_script(request: StepGenerateScriptRequest):
     ai_review_raw = await call_ai_provider(request.provider, request.model, review_prompt)
     ai_review, citations = process_citations(ai_review_raw, "\n".join(relevant_chunks))
 
-
-    return {"computational_result": simulation_script, "ai_review": ai_review, "citations": citations}
+    result = {"computational_result": simulation_script, "ai_review": ai_review, "citations": citations}
+    return _store_step(request.session_id, "step-generate-script", result)
 
 @app.post("/api/step/execute")
-async def step_execute(request: StepExecuteRequest):
-    from agents import PythonAgent
+async def step_execute(request: StepExecuteRequest, http_request: Request):
+    from .agents import PythonAgent, results_to_json
+    _check_session(request.session_id)
+    script = request.script
+    if script is None:
+        script = _session_result(request.session_id, "step-generate-script")
+    script = extract_code(script)
+    problems = validate_script(script, request.parameters, load_allowed_imports())
+    if problems:
+        # Rejected before the sandbox: the script would fail there the same way
+        raise AppError(
+            error_code=ErrorCodes.PYTHON_EXECUTION_ERROR,
+            message=f"Python script check failed:\n{format_problems(problems)}",
+            suggestion="Fix the reported lines, or use /api/step/run-script to have the model fix the script."
+        )
     agent = PythonAgent()
-    execution_result = agent.run(request.script, request.parameters, request.data_filepath)
+    async with admission_controller.resource("sandbox"):
+        execution_result = await asyncio.to_thread(agent.run, script, request.parameters, request.data_filepath)
 
     if not execution_result.success:
         raise AppError(
@@ -511,27 +959,276 @@ async def step_execute(request: StepExecuteRequest):
             message=f"Python execution failed: {execution_result.error}",
             suggestion="The Python script failed to execute. Check the script for errors and try again."
         )
+    if request.problem:
+        await asyncio.to_thread(surrogate_store.record, request.problem, script_hash(script),
+                                request.parameters, execution_result.data)
 
     # This is a placeholder for AI review of the execution
     ai_review = "AI analysis of the execution result would go here."
 
-    return {
+    result = {
         "computational_result": {
             "output": execution_result.output,
-            "image": execution_result.image,
+            "artifacts": execution_result.artifacts,
+            "data": results_to_json(execution_result.data),
         },
         "ai_review": ai_review,
     }
+    return encode_response(http_request, _store_step(request.session_id, "step-execute", result))
+
+@app.post("/api/step/run-script")
+async def step_run_script(request: StepRunScriptRequest, http_request: Request):
+    """Like /api/step/execute, but a failing script is sent back to the model to fix, and the attempts are reported."""
+    from .agents import results_to_json
+    _check_session(request.session_id)
+    script = request.script
+    if script is None:
+        script = _session_result(request.session_id, "step-generate-script")
+    max_attempts = request.max_attempts if request.max_attempts is not None else max_fix_attempts()
+    if max_attempts < 1:
+        raise AppError(
+            error_code=ErrorCodes.INVALID_INPUT,
+            message="max_attempts must be at least 1",
+            suggestion="Leave max_attempts out to use the configured limit."
+        )
+    fixed = await run_script_with_fixes(request.provider, request.model, script, request.parameters,
+                                        request.data_filepath, max_attempts)
+    execution_result = fixed["execution_result"]
+    if not execution_result.success:
+        raise AppError(
+            error_code=ErrorCodes.PYTHON_EXECUTION_ERROR,
+            message=f"Python execution failed after {fixed['report']['attempt_count']} attempts: {execution_result.error}",
+            suggestion="Check the problem statement and parameters, or allow more attempts."
+        )
+
+    result = {
+        "computational_result": {
+            "output": execution_result.output,
+            "artifacts": execution_result.artifacts,
+            "data": results_to_json(execution_result.data),
+        },
+        "script": fixed["script"],
+        "fix_loop": fixed["report"],
+        "ai_review": "AI analysis of the execution result would go here.",
+    }
+    return encode_response(http_request, _store_step(request.session_id, "step-execute", result))
+
+@app.post("/api/step/solve")
+async def step_solve(request: StepSolveRequest, http_request: Request):
+    """
+    Solves a canonical problem with a built-in closed-form solver instead of
+    modeling, script generation and execution, with the response of
+    /api/step/execute. Fails with NO_BUILTIN_SOLVER if none applies.
+    """
+    from .agents import results_to_json
+    _check_session(request.session_id)
+    match = match_solver(request.parameters, request.problem)
+    if match is None:
+        raise AppError(
+            error_code=ErrorCodes.NO_BUILTIN_SOLVER,
+            message="No built-in solver applies to these parameters.",
+            suggestion="Use /api/step/model, /api/step/generate-script and /api/step/execute instead."
+        )
+    execution_result = run_builtin(match)
+    if not execution_result.success:
+        raise AppError(
+            error_code=ErrorCodes.PYTHON_EXECUTION_ERROR,
+            message=f"Built-in {match.name} solver failed: {execution_result.error}",
+            suggestion="Check the parameter values, e.g. for zero lengths or stiffnesses."
+        )
+    await asyncio.to_thread(surrogate_store.record, request.problem, f"builtin-{match.name}-{match.variant}",
+                            request.parameters, execution_result.data)
+
+    result = {
+        "computational_result": {
+            "output": execution_result.output,
+            "artifacts": execution_result.artifacts,
+            "data": results_to_json(execution_result.data),
+        },
+        "solver": {**match.to_dict(), "model": match.description},
+        "ai_review": "AI analysis of the execution result would go here.",
+    }
+    return encode_response(http_request, _store_step(request.session_id, "step-execute", result))
+
+@app.post("/api/surrogate/predict")
+async def surrogate_predict(request: SurrogatePredictRequest):
+    """
+    Estimates the scalar results of a run from earlier runs of the problem,
+    with a standard deviation per result, e.g. to show while the run is pending.
+    """
+    script_key = script_hash(extract_code(request.script)) if request.script is not None else None
+    estimate = await asyncio.to_thread(surrogate_store.predict, request.problem, request.parameters, script_key)
+    if estimate is None:
+        raise AppError(
+            error_code=ErrorCodes.NO_SURROGATE_DATA,
+            message="There are no earlier runs of this problem with these parameter names.",
+            suggestion="Run the simulation; its results are added to the index when it succeeds."
+        )
+    return estimate
 
 @app.post("/api/step/synthesize")
 async def step_synthesize(request: StepSynthesizeRequest):
-    query = json.dumps(request.history)
-    relevant_chunks = knowledge_base_instance.get_relevant_chunks(query)
+    _check_session(request.session_id)
+    if request.history is not None:
+        query = json.dumps(request.history)
+        history_text = json.dumps(request.history, indent=2)
+    else:
+        # Same text as json.dumps(history, indent=2), from the JSON kept per step
+        history_text = _require_session(request.session_id).history_json(WORKFLOW_STEPS)
+        query = history_text
+    relevant_chunks = await _relevant_chunks(query)
     knowledge_section = f"**Background Knowledge:**\n---\n{''.join(relevant_chunks)}\n---\n" if relevant_chunks else ""
-    synthesis_prompt = f"{knowledge_section}**Your Task:**\nSynthesize a final report based on the following history:\n{json.dumps(request.history, indent=2)}"
+    synthesis_prompt = f"{knowledge_section}**Your Task:**\nSynthesize a final report based on the following history:\n{history_text}"
     synthesis_report_raw = await call_ai_provider(request.provider, request.model, synthesis_prompt)
     synthesis_report, citations = process_citations(synthesis_report_raw, "\n".join(relevant_chunks))
-    return {"synthesis_report": synthesis_report, "citations": citations}
+    return _store_step(request.session_id, "step-synthesize", {"synthesis_report": synthesis_report, "citations": citations})
+
+
+class LatexCompileRequest(BaseModel):
+    latex: str
+    # Reuse the same id across fix iterations of one document to compile incrementally
+    session_id: Optional[str] = None
+    # File name used in \includegraphics -> artifact id of the figure
+    figures: Dict[str, str] = {}
+
+@app.post("/api/compile-latex")
+async def compile_latex(request: LatexCompileRequest):
+    """
+    Compiles a LaTeX document to PDF on the server. On failure the error
+    lines of the TeX log are returned so they can be fed to fix_latex_code.
+    """
+    figures = {}
+    for name, artifact_id in request.figures.items():
+        path = artifact_store.path_for(artifact_id)
+        if path is None:
+            raise AppError(
+                error_code=ErrorCodes.FILE_NOT_FOUND,
+                message=f"Figure artifact not found: {artifact_id}",
+                suggestion="The figure may have expired. Re-run the simulation to regenerate it."
+            )
+        figures[name] = path
+
+    try:
+        result = await latex_compiler.compile(request.latex, figures, request.session_id)
+    except ValueError as e:
+        raise AppError(error_code=ErrorCodes.INVALID_INPUT, message=str(e))
+    except LatexTimeoutError as e:
+        raise AppError(
+            error_code=ErrorCodes.LATEX_TIMEOUT,
+            message=str(e),
+            suggestion="The document may contain an infinite loop or be too large. Simplify it and try again."
+        )
+    except FileNotFoundError:
+        raise AppError(
+            error_code=ErrorCodes.FILE_NOT_FOUND,
+            message=f"TeX engine not found: {latex_compiler.engine_path}",
+            suggestion="Install TeX Live and set engine_path in the [LATEX] section of config.ini or the TEXLIVE_PATH environment variable."
+        )
+
+    if not result.success:
+        raise AppError(
+            error_code=ErrorCodes.LATEX_COMPILE_ERROR,
+            message="\n\n".join(result.errors) or result.log[-2000:],
+            suggestion="Fix the reported errors (e.g. with the fix_latex_code task) and compile again with the same session_id."
+        )
+    return FileResponse(
+        result.pdf_path,
+        media_type="application/pdf",
+        headers={"X-Latex-Cached": str(result.cached).lower(), "X-Latex-Passes": str(result.passes)},
+    )
+
+
+@app.get("/api/artifacts/{artifact_id}")
+async def get_artifact(artifact_id: str, request: Request):
+    """
+    Serves a stored run artifact. Supports conditional requests and byte
+    ranges so the frontend can fetch large outputs lazily.
+    """
+    path = artifact_store.path_for(artifact_id)
+    if path is None:
+        raise AppError(
+            error_code=ErrorCodes.FILE_NOT_FOUND,
+            message=f"Artifact not found: {artifact_id}",
+            suggestion="The artifact may have expired. Re-run the simulation to regenerate it."
+        )
+    return _artifact_response(request, path, f'"{artifact_id}"', artifact_store.media_type_for(path))
+
+@app.get("/api/artifacts/{artifact_id}/thumbnail")
+async def get_artifact_thumbnail(artifact_id: str, request: Request, size: int = 256):
+    if not 16 <= size <= 1024:
+        raise AppError(error_code=ErrorCodes.INVALID_INPUT, message="Thumbnail size must be between 16 and 1024 pixels.")
+    path = artifact_store.thumbnail_for(artifact_id, size)
+    if path is None:
+        raise AppError(
+            error_code=ErrorCodes.FILE_NOT_FOUND,
+            message=f"No image artifact found for: {artifact_id}",
+            suggestion="The artifact may have expired or is not an image."
+        )
+    return _artifact_response(request, path, f'"{artifact_id}-{size}"', "image/png")
+
+def _artifact_response(request: Request, path: str, etag: str, media_type: str) -> Response:
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={**ARTIFACT_CACHE_HEADERS, "ETag": etag})
+    return FileResponse(path, media_type=media_type, headers={**ARTIFACT_CACHE_HEADERS, "ETag": etag})
+
+
+@app.post("/api/drawings/digitize")
+async def digitize_drawings(files: List[UploadFile] = File(...)):
+    """
+    Digitizes uploaded drawings into DXF files in the drawing process pool.
+    Streams one JSON line per drawing as soon as it is done, with the DXF
+    as an artifact reference, and a final summary line with pages/second.
+    """
+    for file in files:
+        if not (file.filename or "").lower().endswith(IMAGE_EXTENSIONS):
+            raise AppError(
+                error_code=ErrorCodes.INVALID_INPUT,
+                message=f"Not a supported drawing image: {file.filename}",
+                suggestion=f"Upload images of type {', '.join(IMAGE_EXTENSIONS)}."
+            )
+    workdir = tempfile.mkdtemp(prefix="drawings-")
+    names = {}
+    for index, file in enumerate(files):
+        path = os.path.join(workdir, f"{index}-{os.path.basename(file.filename)}")
+        with open(path, "wb") as f:
+            await asyncio.to_thread(shutil.copyfileobj, file.file, f)
+        names[path] = file.filename
+
+    async def stream():
+        summary = BatchSummary()
+        cancel = threading.Event()
+        results = drawing_processor.run(list(names), os.path.join(workdir, "dxf"), cancel=cancel)
+        step = None
+
+        def clean_up(*_):
+            try:
+                results.close()
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        try:
+            while True:
+                # Shielded, so that a client going away does not lose track of the thread still in the generator
+                step = asyncio.ensure_future(asyncio.to_thread(next, results, None))
+                result = await asyncio.shield(step)
+                if result is None:
+                    break
+                summary.add(result)
+                name = names[result["path"]]
+                result["path"] = name
+                if "dxf" in result:
+                    result["dxf"] = artifact_store.put_file(result["dxf"], os.path.splitext(name)[0] + ".dxf")
+                yield json.dumps(result) + "\n"
+            yield json.dumps({"summary": summary.to_dict()}) + "\n"
+        finally:
+            cancel.set()
+            if step is None or step.done():
+                clean_up()
+            else:
+                # The generator can only be closed once its thread has left it, which `cancel` makes quick
+                step.add_done_callback(clean_up)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 
 @app.post("/api/run-workflow", deprecated=True)
@@ -546,8 +1243,14 @@ async def run_workflow_endpoint(request: WorkflowRequest, data_filepath: str = N
     )
 
 @app.post("/api/run-optimization")
-async def run_optimization_endpoint(request: OptimizationRequest, data_filepath: str = None):
-    return await run_optimization_workflow(
+async def run_optimization_endpoint(request: OptimizationRequest, http_request: Request, data_filepath: str = None):
+    if request.history_mode not in HISTORY_MODES:
+        raise AppError(
+            error_code=ErrorCodes.INVALID_INPUT,
+            message=f"Unknown history_mode: {request.history_mode}",
+            suggestion=f"Use one of: {', '.join(HISTORY_MODES)}."
+        )
+    result = await run_optimization_workflow(
         request.provider,
         request.model,
         request.problem,
@@ -556,7 +1259,10 @@ async def run_optimization_endpoint(request: OptimizationRequest, data_filepath:
         request.optimization_goal,
         request.max_iterations,
         data_filepath,
+        request.history_mode,
+        warm_start=request.warm_start,
     )
+    return encode_response(http_request, result)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,175 @@
+"""
+Minimal Prometheus-compatible metrics.
+
+Counters and histograms are kept in process memory and rendered in the
+Prometheus text exposition format by the /metrics endpoint. Recording a
+value is a dict lookup and a few additions under a lock, so it is cheap
+enough to call on every request.
+"""
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+# Seconds; spans fast in-process work up to slow LLM calls and solver runs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+SIZE_BUCKETS = (100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000)
+
+
+class _Metric(ABC):
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _format_labels(self, key: Tuple[str, ...], extra: str = "") -> str:
+        parts = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        pass
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._format_labels(key)} {_number(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts (last is +Inf), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the with-block, also when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def sum(self, **labels) -> float:
+        state = self._values.get(self._key(labels))
+        return state[1] if state else 0.0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        lines = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                bucket_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{self._format_labels(key, bucket_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered.")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+REGISTRY = Registry()
+
+# --- HTTP ---
+HTTP_REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Time spent handling HTTP requests.", ["method", "route", "status"])
+ADMISSION_WAIT_SECONDS = Histogram("admission_wait_seconds", "Time queued for a request, LLM, sandbox or embedding slot.", ["limiter", "priority"])
+ADMISSION_REJECTED = Counter("admission_rejected_total", "Work shed by admission control.", ["limiter", "priority", "reason"])
+
+# --- LLM providers ---
+LLM_REQUEST_SECONDS = Histogram("llm_request_duration_seconds", "Latency of LLM provider calls.", ["provider", "model", "status"])
+LLM_PROMPT_CHARS = Histogram("llm_prompt_chars", "Size of prompts sent to LLM providers, in characters.", ["provider"], buckets=SIZE_BUCKETS)
+LLM_RESPONSE_CHARS = Histogram("llm_response_chars", "Size of LLM responses, in characters.", ["provider"], buckets=SIZE_BUCKETS)
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by LLM providers.", ["provider", "model", "kind"])
+LLM_HEDGES = Counter("llm_routed_requests_total", "Routed LLM calls by which target answered first.", ["outcome"])
+
+# --- Solvers ---
+SANDBOX_RUN_SECONDS = Histogram("sandbox_run_duration_seconds", "Wall time of sandboxed solver runs.", ["solver", "status"])
+BUILTIN_SOLVER_SECONDS = Histogram("builtin_solver_duration_seconds", "Time spent in built-in closed-form solvers.", ["solver"])
+SCRIPT_ATTEMPTS = Counter("script_attempts_total", "Generated script attempts by where they stopped.", ["stage", "result"])
+
+# --- Knowledge base ---
+EMBEDDING_SECONDS = Histogram("embedding_duration_seconds", "Time spent embedding knowledge chunks.")
+EMBEDDED_CHUNKS = Counter("embedded_chunks_total", "Knowledge chunks embedded.")
+RETRIEVAL_SECONDS = Histogram("retrieval_duration_seconds", "Time to retrieve relevant knowledge chunks for a query.")
+RERANK_SECONDS = Histogram("rerank_duration_seconds", "Time spent re-ranking retrieval candidates with the cross-encoder.", ["outcome"])
+CITATION_SECONDS = Histogram("citation_processing_duration_seconds", "Time spent matching [source] citations.")
+
+# --- Workflow ---
+WORKFLOW_STEP_SECONDS = Histogram("workflow_step_duration_seconds", "Duration of individual workflow steps.", ["step"])
+
+# --- Caches ---
+CACHE_REQUESTS = Counter("cache_requests_total", "Lookups in internal caches.", ["cache", "result"])
@@ -0,0 +1,81 @@
+"""
+A deterministic, offline stand-in for an LLM provider.
+
+Selected with provider "mock". Each prompt is classified by the workflow
+step that produced it and answered with a fixed response for the
+cantilever benchmark case (see mvp_benchmark.md): a model description, a
+review, a runnable simulation script, an analysis, or a parameter update
+for the optimization loop. The same prompt always gets the same answer, so
+benchmark runs are repeatable and cost nothing.
+
+The model name may end in a latency such as "mock-200ms"; the response is
+then delayed by that long to imitate a remote model.
+"""
+import asyncio
+import json
+import re
+
+MODEL_LATENCY_PATTERN = re.compile(r"(\d+)ms$")
+PARAMETER_PATTERN = r'"{name}":\s*([-+]?[\d.]+(?:[eE][-+]?\d+)?)'
+
+MODELING_RESPONSE = """The structure is a cantilever beam of length L with bending stiffness EI, clamped at x = 0 and loaded by a point force F at the free end.
+Euler-Bernoulli theory gives d^4w/dx^4 = 0 with w(0) = 0, w'(0) = 0, w''(L) = 0 and w'''(L) = -F/(EI).
+The solution is w(x) = -F x^2 (3L - x) / (6EI), with the largest deflection -F L^3 / (3EI) at the tip."""
+
+REVIEW_RESPONSE = """The boundary conditions and sign convention are consistent and the closed-form solution satisfies all four of them.
+No changes are required."""
+
+SIMULATION_SCRIPT = """import numpy as np
+
+L = float(params.get("L", 10.0))
+E = float(params.get("E", 210e9))
+I = float(params.get("I", 1e-5))
+F = float(params.get("F", 1000.0))
+
+x = np.linspace(0.0, L, 201)
+w = -F * x**2 * (3 * L - x) / (6 * E * I)
+
+emit("x", x)
+emit("deflection", w)
+emit("max_deflection", float(w[-1]))
+print(f"Maximum deflection: {w[-1]:.6e} m")
+"""
+
+ANALYSIS_RESPONSE = """The computed tip deflection matches the analytical value -F L^3 / (3EI).
+The deflection curve is cubic in x with zero slope at the clamped end."""
+
+SYNTHESIS_RESPONSE = """## Summary
+The cantilever beam was modelled with Euler-Bernoulli theory, solved in closed form and evaluated numerically.
+The simulated tip deflection agrees with the analytical solution."""
+
+
+def mock_response(prompt: str) -> str:
+    """Returns the canned response for the workflow step that produced `prompt`."""
+    if "optimization goal" in prompt.lower() or "optimization_goal" in prompt:
+        return _parameter_update(prompt)
+    if "Solver:" in prompt and "Output:" in prompt:
+        return ANALYSIS_RESPONSE
+    if "Synthesize a final report" in prompt:
+        return SYNTHESIS_RESPONSE
+    if "Review the following" in prompt:
+        return REVIEW_RESPONSE
+    if "generate a simulation script" in prompt or ("Modeling Result:" in prompt and "Parameters:" in prompt):
+        return SIMULATION_SCRIPT
+    if "Modeling Result:" in prompt:
+        return REVIEW_RESPONSE
+    return MODELING_RESPONSE
+
+
+def _parameter_update(prompt: str) -> str:
+    # Doubling the second moment of area halves the deflection, so a
+    # deflection limit is reached after a predictable number of iterations.
+    matches = re.findall(PARAMETER_PATTERN.format(name="I"), prompt)
+    current = float(matches[-1]) if matches else 1e-5
+    return json.dumps({"I": current * 2})
+
+
+async def call_mock_api(model: str, prompt: str) -> str:
+    latency = MODEL_LATENCY_PATTERN.search(model or "")
+    if latency:
+        await asyncio.sleep(int(latency.group(1)) / 1000)
+    return mock_response(prompt)
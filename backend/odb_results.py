@@ -0,0 +1,310 @@
+"""
+Streaming extraction of field/history outputs from Abaqus result files.
+
+Results are read one frame at a time and reduced immediately to a scalar
+(or a small per-set vector), so memory stays bounded however large the
+result file is. Only the compact arrays and a short text summary are
+handed back to the workflow.
+
+This module only depends on NumPy so that it can also be run inside
+Abaqus Python, where ``odbAccess`` is available:
+
+    abaqus python odb_results.py job.odb requests.json results.npz
+
+For tests and local development, a JSON-lines fixture stands in for an
+ODB file. The first line is a header, each following line is one frame:
+
+    {"format": "odb-fixture", "sets": {"TIP": [101, 102]},
+     "history": {"Step-1": {"Node ASSEMBLY.1": {"U2": [[0.0, 0.0], [1.0, -0.1]]}}}}
+    {"step": "Step-1", "frame": 1, "time": 1.0,
+     "fields": {"S": {"labels": [1, 2], "components": ["MISES"], "values": [[1.0e6], [2.0e6]]}}}
+"""
+import json
+import sys
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+FIXTURE_FORMAT = "odb-fixture"
+REDUCTIONS = ("max", "min", "mean", "abs_max", "values")
+ODB_INVARIANTS = ("MISES", "TRESCA", "PRESS", "INV3", "MAGNITUDE", "MAX_PRINCIPAL", "MID_PRINCIPAL", "MIN_PRINCIPAL")
+
+DEFAULT_OUTPUT_REQUESTS = [
+    {"name": "max_mises", "variable": "S", "component": "MISES", "reduction": "max"},
+    {"name": "max_displacement", "variable": "U", "component": "MAGNITUDE", "reduction": "max"},
+]
+
+
+class OutputRequest:
+    """
+    One quantity to extract, e.g. the maximum Mises stress over a set, or
+    the U2 history of a node. `region` is a node/element set name; None means
+    the whole model. `kind` is "field" or "history".
+    """
+    def __init__(self, name: str, variable: str, component: Optional[str] = None, region: Optional[str] = None,
+                 reduction: str = "max", kind: str = "field", step: Optional[str] = None, frame_stride: int = 1):
+        if reduction not in REDUCTIONS:
+            raise ValueError(f"Unknown reduction '{reduction}' for output '{name}'. Use one of {REDUCTIONS}.")
+        if kind not in ("field", "history"):
+            raise ValueError(f"Unknown output kind '{kind}' for output '{name}'.")
+        self.name = name
+        self.variable = variable
+        self.component = component
+        self.region = region
+        self.reduction = reduction
+        self.kind = kind
+        self.step = step
+        self.frame_stride = max(int(frame_stride), 1)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "OutputRequest":
+        return cls(**data)
+
+
+class ResultFrame(ABC):
+    """A single output frame; field values are only loaded when requested."""
+    def __init__(self, step: str, index: int, time: float):
+        self.step = step
+        self.index = index
+        self.time = time
+
+    @abstractmethod
+    def has_variable(self, variable: str) -> bool:
+        pass
+
+    @abstractmethod
+    def field_values(self, variable: str, component: Optional[str], region: Optional[str]) -> np.ndarray:
+        pass
+
+
+class FixtureResultReader:
+    """Reads the JSON-lines fixture format described in the module docstring."""
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "r", encoding="utf-8") as f:
+            self.header = json.loads(f.readline())
+        if self.header.get("format") != FIXTURE_FORMAT:
+            raise ValueError(f"{path} is not an ODB fixture file.")
+        self.sets = {name.upper(): np.asarray(labels) for name, labels in self.header.get("sets", {}).items()}
+
+    def iter_frames(self) -> Iterator[ResultFrame]:
+        with open(self.path, "r", encoding="utf-8") as f:
+            f.readline()
+            for line in f:
+                if line.strip():
+                    yield _FixtureFrame(json.loads(line), self.sets)
+
+    def has_region(self, region: str) -> bool:
+        return region.upper() in self.sets
+
+    def history(self, step: Optional[str], region: str, variable: str) -> np.ndarray:
+        steps = self.header.get("history", {})
+        for step_name in ([step] if step else list(steps)):
+            data = steps.get(step_name, {}).get(region, {}).get(variable)
+            if data is not None:
+                return np.asarray(data, dtype=np.float64).reshape(-1, 2)
+        raise KeyError(f"History output {variable} not found for region '{region}'.")
+
+    def close(self):
+        pass
+
+
+class _FixtureFrame(ResultFrame):
+    def __init__(self, record: Dict[str, Any], sets: Dict[str, np.ndarray]):
+        super().__init__(record["step"], int(record["frame"]), float(record["time"]))
+        self._fields = record.get("fields", {})
+        self._sets = sets
+
+    def has_variable(self, variable):
+        return variable in self._fields
+
+    def field_values(self, variable, component, region):
+        field = self._fields[variable]
+        values = np.asarray(field["values"], dtype=np.float64)
+        if values.ndim == 1:
+            values = values[:, None]
+        components = field.get("components", [])
+        if component is not None:
+            if component == "MAGNITUDE" and component not in components:
+                values = np.linalg.norm(values, axis=1)
+            else:
+                values = values[:, components.index(component)]
+        if region is not None:
+            labels = np.asarray(field["labels"])
+            values = values[np.isin(labels, self._sets[region.upper()])]
+        return values
+
+
+class OdbResultReader:
+    """Reads a real .odb file through the Abaqus Python API (`abaqus python` only)."""
+    def __init__(self, path: str):
+        from odbAccess import openOdb
+        self.path = path
+        self.odb = openOdb(path, readOnly=True)
+
+    def iter_frames(self) -> Iterator[ResultFrame]:
+        for step_name, step in self.odb.steps.items():
+            for frame in step.frames:
+                yield _OdbFrame(self.odb, step_name, frame)
+
+    def has_region(self, region: str) -> bool:
+        try:
+            _find_odb_set(self.odb, region)
+        except KeyError:
+            return False
+        return True
+
+    def history(self, step: Optional[str], region: str, variable: str) -> np.ndarray:
+        for step_name, odb_step in self.odb.steps.items():
+            if step and step_name != step:
+                continue
+            history_region = odb_step.historyRegions.get(region)
+            if history_region is not None and variable in history_region.historyOutputs:
+                return np.asarray(history_region.historyOutputs[variable].data, dtype=np.float64)
+        raise KeyError(f"History output {variable} not found for region '{region}'.")
+
+    def close(self):
+        self.odb.close()
+
+
+class _OdbFrame(ResultFrame):
+    def __init__(self, odb, step_name, frame):
+        super().__init__(step_name, frame.incrementNumber, frame.frameValue)
+        self._odb = odb
+        self._frame = frame
+
+    def has_variable(self, variable):
+        return variable in self._frame.fieldOutputs.keys()
+
+    def field_values(self, variable, component, region):
+        import abaqusConstants
+        field = self._frame.fieldOutputs[variable]
+        if region is not None:
+            field = field.getSubset(region=_find_odb_set(self._odb, region))
+        if component in ODB_INVARIANTS:
+            field = field.getScalarField(invariant=getattr(abaqusConstants, component))
+        elif component is not None:
+            field = field.getScalarField(componentLabel=component)
+        blocks = [np.asarray(block.data, dtype=np.float64) for block in field.bulkDataBlocks]
+        if not blocks:
+            return np.empty(0)
+        return np.concatenate(blocks).squeeze()
+
+
+
+def _find_odb_set(odb, name):
+    """A node or element set of the assembly, or of an instance as "INSTANCE.SET"."""
+    assembly = odb.rootAssembly
+    key = name.upper()
+    for sets in (assembly.nodeSets, assembly.elementSets):
+        if key in sets.keys():
+            return sets[key]
+    if "." in key:
+        instance_name, set_name = key.split(".", 1)
+        if instance_name in assembly.instances.keys():
+            instance = assembly.instances[instance_name]
+            for sets in (instance.nodeSets, instance.elementSets):
+                if set_name in sets.keys():
+                    return sets[set_name]
+    raise KeyError(f"Set '{name}' not found in {odb.name}.")
+
+
+def open_result_file(path: str):
+    """Opens a result file, using the fixture reader for JSON-lines fixtures."""
+    with open(path, "rb") as f:
+        is_fixture = f.read(1) == b"{"
+    return FixtureResultReader(path) if is_fixture else OdbResultReader(path)
+
+
+def _reduce(values: np.ndarray, reduction: str):
+    if reduction == "values":
+        return values.astype(np.float32)
+    if values.size == 0:
+        return np.nan
+    if reduction == "max":
+        return values.max()
+    if reduction == "min":
+        return values.min()
+    if reduction == "mean":
+        return values.mean()
+    return np.abs(values).max()
+
+
+def extract_results(reader, requests: List[OutputRequest]) -> Dict[str, np.ndarray]:
+    """
+    Streams through the reader's frames once and reduces every requested
+    field output per frame. Returns `<name>` (values per frame, float32) and
+    `<name>_time` arrays; history outputs are returned as-is. A request for
+    a set the result file does not have raises KeyError.
+    """
+    results = {}
+    field_requests = [r for r in requests if r.kind == "field"]
+    times = {r.name: [] for r in field_requests}
+    values = {r.name: [] for r in field_requests}
+    frame_counts = {}
+    for request in field_requests:
+        if request.region is not None and not reader.has_region(request.region):
+            raise KeyError(f"Set '{request.region}' of output '{request.name}' not found in {reader.path}.")
+
+    for frame in reader.iter_frames():
+        for request in field_requests:
+            if request.step and frame.step != request.step:
+                continue
+            count = frame_counts.get(request.name, 0)
+            frame_counts[request.name] = count + 1
+            if count % request.frame_stride:
+                continue
+            if not frame.has_variable(request.variable):
+                # The variable is not written in every frame (e.g. the initial frame)
+                continue
+            data = frame.field_values(request.variable, request.component, request.region)
+            times[request.name].append(frame.time)
+            values[request.name].append(_reduce(np.asarray(data), request.reduction))
+
+    for request in field_requests:
+        results[f"{request.name}_time"] = np.asarray(times[request.name], dtype=np.float32)
+        if request.reduction == "values":
+            results[request.name] = np.stack(values[request.name]) if values[request.name] else np.empty((0, 0), dtype=np.float32)
+        else:
+            results[request.name] = np.asarray(values[request.name], dtype=np.float32)
+
+    for request in requests:
+        if request.kind == "history":
+            data = reader.history(request.step, request.region, request.variable)[::request.frame_stride]
+            results[f"{request.name}_time"] = data[:, 0].astype(np.float32)
+            results[request.name] = data[:, 1].astype(np.float32)
+
+    return results
+
+
+def summarize_results(results: Dict[str, np.ndarray]) -> str:
+    """Formats the extracted arrays as a few lines of text for the LLM analysis step."""
+    lines = []
+    for name, values in results.items():
+        if name.endswith("_time"):
+            continue
+        time = results.get(f"{name}_time", np.empty(0))
+        if values.size == 0 or np.all(np.isnan(values)):
+            lines.append(f"{name}: no data")
+        elif values.ndim > 1:
+            lines.append(f"{name}: {values.shape[0]} frames x {values.shape[1]} values, final max={np.nanmax(values[-1]):.6g}, final min={np.nanmin(values[-1]):.6g}")
+        else:
+            peak = int(np.nanargmax(np.abs(values)))
+            lines.append(
+                f"{name}: final={values[-1]:.6g}, peak={values[peak]:.6g} at t={time[peak]:.6g}, "
+                f"min={np.nanmin(values):.6g}, max={np.nanmax(values):.6g}, frames={values.size}"
+            )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # Usage: abaqus python odb_results.py <odb_path> <requests.json> <output.npz>
+    odb_path, requests_path, output_path = sys.argv[1:4]
+    with open(requests_path, "r") as f:
+        output_requests = [OutputRequest.from_dict(r) for r in json.load(f)]
+    result_reader = open_result_file(odb_path)
+    try:
+        np.savez(output_path, **extract_results(result_reader, output_requests))
+    finally:
+        result_reader.close()
@@ -1,9 +1,37 @@
+import asyncio
 import json
-from typing import Dict, Any
+import operator
+import re
+from typing import Dict, Any, Optional
+
+import numpy as np
 from fastapi import HTTPException
 from .main import call_ai_provider, load_prompt
-from .workflow import run_engineering_workflow
+from .workflow import run_engineering_workflow, _workflow_step
+from .encoding import slim_history
+from .surrogates import surrogate_store
+from . import tracing
+
+NUMERIC_GOAL_PATTERN = re.compile(r"^\s*([A-Za-z_][A-Za-z0-9_]*)\s*(<=|>=|<|>)\s*([-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?)\s*$")
+GOAL_OPERATORS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+HISTORY_MODES = ("full", "slim")
+
+
+def evaluate_numeric_goal(optimization_goal: str, data: Dict[str, Any]) -> Optional[bool]:
+    """
+    Checks a goal such as "max_deflection < 0.001" directly against the
+    numeric results emitted by the script. For arrays every element must
+    satisfy the condition. Returns None if the goal is not of this form or
+    refers to a result that was not emitted.
+    """
+    match = NUMERIC_GOAL_PATTERN.match(optimization_goal)
+    if not match or match.group(1) not in data:
+        return None
+    name, op, threshold = match.groups()
+    return bool(np.all(GOAL_OPERATORS[op](np.asarray(data[name]), float(threshold))))
+
 
+@tracing.traced("optimization_workflow")
 async def run_optimization_workflow(
     provider: str,
     model: str,
@@ -13,12 +41,24 @@ async def run_optimization_workflow(
     optimization_goal: str,
     max_iterations: int = 5,
     data_filepath: str = None,
+    history_mode: str = "full",
+    warm_start: bool = False,
 ):
     """
     Runs an optimization loop to find the best parameters for a given problem.
+    With history_mode "slim" the history is returned as by slim_history.
+    With warm_start, a numeric goal and earlier runs of the problem that met
+    it, the loop starts from the nearest of their parameters instead.
     """
     current_parameters = initial_parameters.copy()
     iteration_history = []
+    prior = None
+    if warm_start:
+        prior = await asyncio.to_thread(
+            surrogate_store.nearest_satisfying, problem, initial_parameters,
+            lambda results: evaluate_numeric_goal(optimization_goal, results))
+        if prior is not None:
+            current_parameters.update(prior["parameters"])
 
     for i in range(max_iterations):
         # Run the simulation with the current parameters
@@ -34,19 +74,23 @@ async def run_optimization_workflow(
         iteration_history.append(
             {
                 "iteration": i + 1,
-                "parameters": current_parameters,
+                "parameters": current_parameters.copy(),
                 "results": simulation_result,
             }
         )
 
-        # Check if the optimization goal is met.
-        # This is a simplified check. A more robust solution would involve
-        # a more sophisticated analysis of the results.
-        if optimization_goal in simulation_result.get("analysis_result", ""):
+        # Check if the optimization goal is met, numerically when the goal
+        # refers to an emitted result, otherwise from the AI analysis text.
+        goal_met = evaluate_numeric_goal(optimization_goal, simulation_result["execution_result"].get("data", {}))
+        if goal_met is None:
+            goal_met = optimization_goal in simulation_result.get("analysis_result", "")
+        if goal_met:
             return {
                 "status": "success",
                 "message": "Optimization goal met.",
-                "history": iteration_history,
+                "history_mode": history_mode,
+                "warm_start": prior,
+                "history": slim_history(iteration_history) if history_mode == "slim" else iteration_history,
             }
 
         # If the goal is not met, ask the AI to suggest new parameters.
@@ -57,7 +101,8 @@ async def run_optimization_workflow(
         }
         prompt = load_prompt("optimize_parameters_prompt.txt", prompt_data)
 
-        new_parameters_str = await call_ai_provider(provider, model, prompt)
+        with _workflow_step("parameter_update"):
+            new_parameters_str = await call_ai_provider(provider, model, prompt)
 
         try:
             new_parameters = json.loads(new_parameters_str)
@@ -71,5 +116,7 @@ async def run_optimization_workflow(
     return {
         "status": "failed",
         "message": f"Optimization goal not met after {max_iterations} iterations.",
-        "history": iteration_history,
+        "history_mode": history_mode,
+        "warm_start": prior,
+        "history": slim_history(iteration_history) if history_mode == "slim" else iteration_history,
     }
@@ -0,0 +1,119 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from . import metrics
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class CrossEncoderReranker:
+    """
+    Second retrieval stage: scores (query, chunk) pairs with a cross-encoder
+    and orders the first-stage candidates by that score.
+
+    Pairs not yet in the LRU cache of `cache_size` scores are split into
+    batches of `batch_size` and scored on a pool of `workers` threads (the
+    model runs outside the GIL). If they are not all scored within
+    `budget_seconds` of the call, the candidates keep their first-stage
+    order; batches still running finish in the background and their
+    scores are cached for the next time the query is asked, while batches
+    that have not started are dropped, so a backlog cannot build up behind
+    slow queries and push later ones over budget too.
+    """
+    def __init__(self, model_name: str, batch_size: int = 16, workers: int = 2,
+                 budget_seconds: float = 0.3, cache_size: int = 10000):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.budget_seconds = budget_seconds
+        self.cache_size = cache_size
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[bytes, bytes], float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rerank")
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name)
+        return self._model
+
+    def rerank(self, query: str, chunks: Sequence[str], top_k: int) -> Tuple[List[int], bool]:
+        """
+        Returns the indices into `chunks` of the top_k chunks, best first,
+        and whether they were re-ranked (False: first-stage order, because
+        the budget ran out or scoring failed).
+        """
+        started = time.perf_counter()
+        query_key = _digest(query)
+        keys = [(query_key, _digest(chunk)) for chunk in chunks]
+        scores = self._cached(keys)
+        missing = [i for i, key in enumerate(keys) if key not in scores]
+        metrics.CACHE_REQUESTS.inc(len(chunks) - len(missing), cache="rerank", result="hit")
+        metrics.CACHE_REQUESTS.inc(len(missing), cache="rerank", result="miss")
+
+        if missing:
+            futures = []
+            for start in range(0, len(missing), self.batch_size):
+                batch = missing[start:start + self.batch_size]
+                futures.append(self._executor.submit(
+                    self._score, query, [chunks[i] for i in batch], [keys[i] for i in batch]))
+            done, pending = wait(futures, timeout=self.budget_seconds, return_when=FIRST_EXCEPTION)
+            failed = any(future.exception() is not None for future in done)
+            if pending or failed:
+                for future in pending:
+                    future.cancel()
+                outcome = "failed" if failed else "over_budget"
+                metrics.RERANK_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+                return list(range(min(top_k, len(chunks)))), False
+            for future in done:
+                scores.update(future.result())
+
+        order = sorted(range(len(chunks)), key=lambda i: -scores[keys[i]])
+        metrics.RERANK_SECONDS.observe(time.perf_counter() - started, outcome="reranked")
+        return order[:top_k], True
+
+    def _score(self, query: str, chunks: List[str], keys: List[Tuple[bytes, bytes]]) -> Dict[Tuple[bytes, bytes], float]:
+        values = self.model.predict([(query, chunk) for chunk in chunks], batch_size=len(chunks),
+                                    show_progress_bar=False)
+        scores = {key: float(value) for key, value in zip(keys, values)}
+        with self._cache_lock:
+            for key, value in scores.items():
+                self._cache[key] = value
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return scores
+
+    def _cached(self, keys: List[Tuple[bytes, bytes]]) -> Dict[Tuple[bytes, bytes], float]:
+        found = {}
+        with self._cache_lock:
+            for key in keys:
+                value = self._cache.get(key)
+                if value is not None:
+                    self._cache.move_to_end(key)
+                    found[key] = value
+        return found
+
+
+def create_reranker(section) -> Optional[CrossEncoderReranker]:
+    """A reranker from a [KNOWLEDGE] config section, or None if rerank_model is empty."""
+    model_name = section.get('rerank_model', '')
+    if not model_name:
+        return None
+    return CrossEncoderReranker(
+        model_name,
+        batch_size=int(section.get('rerank_batch_size', 16)),
+        workers=int(section.get('rerank_workers', 2)),
+        budget_seconds=float(section.get('rerank_budget_ms', 300)) / 1000,
+        cache_size=int(section.get('rerank_cache_size', 10000)),
+    )
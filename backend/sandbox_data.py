@@ -0,0 +1,28 @@
+"""
+Access to the uploaded dataset for scripts running in the sandbox.
+
+When a dataset is attached to a run, its directory is mounted read-only at
+dataset/ next to the script. The raw CSV is still available as data.csv,
+but each column is also stored as a .npy file that can be memory-mapped
+without parsing:
+
+    from sandbox_data import load_dataset
+    data = load_dataset()
+    plt.scatter(data["x"], data["deflection"])
+"""
+import json
+import os
+
+import numpy as np
+
+DATASET_DIR = "dataset"
+
+
+def load_dataset():
+    """Returns the dataset columns as a dict of read-only memory-mapped arrays."""
+    with open(os.path.join(DATASET_DIR, "manifest.json"), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    return {
+        column["name"]: np.load(os.path.join(DATASET_DIR, column["file"]), mmap_mode="r", allow_pickle=False)
+        for column in manifest["columns"]
+    }
@@ -0,0 +1,34 @@
+"""
+Result channel for scripts running in the sandbox.
+
+This file is copied next to every sandboxed script, and `emit` is imported
+before the script runs. Each call saves one value as `.npy` under results/
+in the job directory. The backend memory-maps these files, so numeric
+results need no parsing out of stdout.
+
+    emit("deflection", w_vals)
+    emit("max_deflection", float(w_vals.min()))
+"""
+import os
+import re
+
+import numpy as np
+
+RESULTS_DIR = "results"
+NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def emit(name, value):
+    """Saves a named scalar or array. Only numeric data is accepted."""
+    if not NAME_PATTERN.match(name):
+        raise ValueError(f"Invalid result name '{name}': use letters, digits and underscores only.")
+    array = np.asarray(value)
+    if array.dtype.kind not in "biufc":
+        raise TypeError(f"Result '{name}' must be numeric, got dtype {array.dtype}.")
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    np.save(os.path.join(RESULTS_DIR, f"{name}.npy"), array, allow_pickle=False)
+
+
+def emit_many(**values):
+    for name, value in values.items():
+        emit(name, value)
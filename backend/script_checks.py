@@ -0,0 +1,190 @@
+"""
+Static checks of generated simulation scripts, run before the sandbox.
+
+A script that does not parse, imports a module the sandbox image does not
+have, uses a name that is never defined (typically a missing import) or
+reads a parameter that was not given fails in the sandbox too, after
+container start-up and library imports. These checks find those failures
+from the AST in well under a millisecond, and results are cached by
+script text, so a script that is checked again (e.g. re-submitted
+unchanged) costs a dict lookup.
+"""
+import ast
+import builtins
+import configparser
+import os
+import re
+import sys
+import sysconfig
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+
+# Dockerfile.sandbox runs Python 3.9 whatever the server runs, so the server's module list is
+# corrected for it; update these together with the image
+STDLIB_ADDED_AFTER_SANDBOX = frozenset({"tomllib", "annotationlib", "compression"})
+STDLIB_REMOVED_AFTER_SANDBOX = frozenset({
+    "aifc", "asynchat", "asyncore", "audioop", "binhex", "cgi", "cgitb", "chunk", "crypt", "distutils",
+    "formatter", "imghdr", "imp", "lib2to3", "mailcap", "nis", "nntplib", "ossaudiodev",
+    "parser", "pipes", "smtpd", "sndhdr", "spwd", "sunau", "symbol", "telnetlib", "uu", "xdrlib",
+})
+
+
+def _standard_library() -> FrozenSet[str]:
+    names = getattr(sys, "stdlib_module_names", None)
+    if names is None:  # Python < 3.10
+        stdlib = sysconfig.get_paths()["stdlib"]
+        names = {os.path.splitext(entry)[0] for entry in os.listdir(stdlib) if entry.isidentifier()
+                 or entry.endswith(".py")} | set(sys.builtin_module_names)
+    return frozenset(names) - STDLIB_ADDED_AFTER_SANDBOX | STDLIB_REMOVED_AFTER_SANDBOX
+
+
+# The standard library, the packages installed by Dockerfile.sandbox and the helpers copied next to the script
+DEFAULT_ALLOWED_IMPORTS = _standard_library() | frozenset({
+    "numpy", "scipy", "sympy", "matplotlib", "mpl_toolkits",
+    "sandbox_data", "sandbox_results",
+})
+# Defined by PythonAgent.run before the script, or by the interpreter
+KNOWN_NAMES = frozenset({"params", "emit", "emit_many", "__file__"}) | frozenset(dir(builtins))
+IMPORT_ERROR_NAMES = frozenset({"ImportError", "ModuleNotFoundError", "Exception", "BaseException"})
+CODE_BLOCK_PATTERN = re.compile(r"```(?:python|py)?[^\n]*\n(.*?)```", re.DOTALL)
+VALIDATION_CACHE_SIZE = 1024
+
+
+def extract_code(text: str) -> str:
+    """The code of the longest ```python block of an LLM answer, or the text itself if it has none."""
+    blocks = CODE_BLOCK_PATTERN.findall(text)
+    return max(blocks, key=len).strip() + "\n" if blocks else text
+
+
+class ScriptProblem:
+    __slots__ = ("kind", "message", "line")
+
+    def __init__(self, kind: str, message: str, line: Optional[int] = None):
+        self.kind = kind
+        self.message = message
+        self.line = line
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "message": self.message, "line": self.line}
+
+    def __str__(self) -> str:
+        return f"line {self.line}: {self.message}" if self.line else self.message
+
+
+def _bound_names(tree: ast.AST) -> set:
+    """Every name the script binds anywhere, without regard to scope."""
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                names.add(alias.asname or alias.name.split(".")[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            names.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            names.add(node.rest)
+    return names
+
+
+def _parameter_key(node: ast.AST) -> Optional[str]:
+    """The literal key of params["key"], if node is one."""
+    if (isinstance(node, ast.Subscript) and isinstance(node.ctx, ast.Load)
+            and isinstance(node.value, ast.Name) and node.value.id == "params"):
+        if isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str):
+            return node.slice.value
+    return None
+
+
+def _guarded_imports(tree: ast.AST) -> set:
+    """Import statements inside a try that catches ImportError, which the script expects may fail."""
+    guarded = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Try) and any(
+                handler.type is None or (isinstance(handler.type, ast.Name) and handler.type.id in IMPORT_ERROR_NAMES)
+                or (isinstance(handler.type, ast.Tuple) and any(
+                    isinstance(element, ast.Name) and element.id in IMPORT_ERROR_NAMES for element in handler.type.elts))
+                for handler in node.handlers):
+            for statement in node.body:
+                guarded.update(id(child) for child in ast.walk(statement) if isinstance(child, (ast.Import, ast.ImportFrom)))
+    return guarded
+
+
+@lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def _check(code: str, parameter_names: Optional[FrozenSet[str]], allowed_imports: FrozenSet[str]) -> Tuple[ScriptProblem, ...]:
+    try:
+        tree = ast.parse(code)
+        compile(tree, "script.py", "exec")
+    except SyntaxError as e:
+        return (ScriptProblem("syntax", f"SyntaxError: {e.msg}", e.lineno),)
+    except ValueError as e:
+        return (ScriptProblem("syntax", str(e)),)
+
+    problems = []
+    star_import = False
+    guarded = _guarded_imports(tree)
+    for node in ast.walk(tree):
+        if id(node) in guarded:
+            continue
+        if isinstance(node, ast.Import):
+            modules = [(alias.name, node.lineno) for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                problems.append(ScriptProblem("import", "Relative imports are not available in the sandbox", node.lineno))
+                continue
+            star_import = star_import or any(alias.name == "*" for alias in node.names)
+            modules = [(node.module, node.lineno)]
+        else:
+            continue
+        for module, line in modules:
+            if module.split(".")[0] not in allowed_imports:
+                problems.append(ScriptProblem(
+                    "import", f"Module '{module}' is not available in the sandbox (allowed: {', '.join(sorted(allowed_imports))})", line))
+
+    bound = _bound_names(tree)
+    if not star_import:
+        known = bound | KNOWN_NAMES
+        reported = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in known and node.id not in reported:
+                reported.add(node.id)
+                problems.append(ScriptProblem("name", f"NameError: name '{node.id}' is not defined (missing import?)", node.lineno))
+
+    # A script that sets params itself (as in the prompt's example) is not checked against the given ones
+    if parameter_names is not None and "params" not in bound:
+        for node in ast.walk(tree):
+            key = _parameter_key(node)
+            if key is not None and key not in parameter_names:
+                problems.append(ScriptProblem(
+                    "params", f"KeyError: params['{key}'] is not one of the given parameters ({', '.join(sorted(parameter_names))})", node.lineno))
+    return tuple(sorted(problems, key=lambda problem: problem.line or 0))
+
+
+def validate_script(code: str, params: Optional[Dict[str, Any]] = None,
+                    allowed_imports: FrozenSet[str] = DEFAULT_ALLOWED_IMPORTS) -> List[ScriptProblem]:
+    """
+    Problems that would make the script fail in the sandbox, empty if none
+    were found. params.get("key") of a missing key is not a problem.
+    """
+    return list(_check(code, frozenset(params) if params is not None else None, frozenset(allowed_imports)))
+
+
+def format_problems(problems: List[ScriptProblem]) -> str:
+    return "\n".join(str(problem) for problem in problems)
+
+
+def load_allowed_imports() -> FrozenSet[str]:
+    config = configparser.ConfigParser()
+    config.read('backend/config.ini')
+    section = config['SANDBOX'] if config.has_section('SANDBOX') else {}
+    extra = {name.strip() for name in section.get('extra_allowed_imports', '').split(",") if name.strip()}
+    return DEFAULT_ALLOWED_IMPORTS | extra
@@ -0,0 +1,302 @@
+import atexit
+import configparser
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from . import metrics
+
+SESSION_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+STEP_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+
+class SessionNotFound(KeyError):
+    pass
+
+
+class VersionConflict(ValueError):
+    pass
+
+
+def merge_patch(target: Any, patch: Any) -> Any:
+    """
+    Applies a JSON merge patch (RFC 7386): objects are merged key by key,
+    null removes a key, anything else replaces the value.
+    """
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def diff_merge_patch(source: Any, target: Any) -> Any:
+    """
+    Returns the merge patch that turns `source` into `target`, {} if they
+    are equal. Keys whose value becomes null come out as removed, since a
+    merge patch cannot set a null.
+    """
+    if not isinstance(source, dict) or not isinstance(target, dict):
+        return target
+    patch = {key: None for key in source if key not in target}
+    for key, value in target.items():
+        if key not in source:
+            if value is not None:
+                patch[key] = value
+        elif source[key] != value:
+            if value is None:
+                patch[key] = None
+            elif isinstance(value, dict) and isinstance(source[key], dict):
+                patch[key] = diff_merge_patch(source[key], value)
+            else:
+                patch[key] = value
+    return patch
+
+
+class Step:
+    """
+    One step output. The JSON text (indented as in prompts) is produced once
+    when the step is written and reused for prompts and size accounting.
+    """
+    __slots__ = ("data", "version", "text")
+
+    def __init__(self, data: Dict[str, Any], version: int = 1):
+        self.data = data
+        self.version = version
+        self.text = json.dumps(data, indent=2)
+
+    def summary(self) -> Dict[str, Any]:
+        return {"version": self.version, "size": len(self.text)}
+
+
+class Session:
+    def __init__(self, session_id: str, steps: "OrderedDict[str, Step]" = None, updated: float = None):
+        self.id = session_id
+        self.steps = steps if steps is not None else OrderedDict()
+        self.updated = updated or time.time()
+
+    @property
+    def size(self) -> int:
+        return sum(len(step.text) for step in self.steps.values())
+
+    def history(self, names: Optional[List[str]] = None) -> Dict[str, Any]:
+        names = list(self.steps) if names is None else names
+        return {name: self.steps[name].data for name in names if name in self.steps}
+
+    def history_json(self, names: Optional[List[str]] = None) -> str:
+        """
+        Equal to json.dumps(self.history(names), indent=2), assembled from
+        the text kept for each step instead of serializing everything again.
+        """
+        names = [name for name in (list(self.steps) if names is None else names) if name in self.steps]
+        if not names:
+            return "{}"
+        items = [f"  {json.dumps(name)}: " + self.steps[name].text.replace("\n", "\n  ") for name in names]
+        return "{\n" + ",\n".join(items) + "\n}"
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.id,
+            "updated": self.updated,
+            "size": self.size,
+            "steps": {name: step.summary() for name, step in self.steps.items()},
+        }
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "id": self.id,
+            "updated": self.updated,
+            "steps": [[name, step.version, step.data] for name, step in self.steps.items()],
+        })
+
+    @classmethod
+    def from_json(cls, text: str) -> "Session":
+        raw = json.loads(text)
+        steps = OrderedDict()
+        for name, version, data in raw["steps"]:
+            steps[name] = Step(data, version)
+        return cls(raw["id"], steps, raw["updated"])
+
+
+class SessionStore:
+    """
+    Keeps workflow sessions on the server so the step endpoints can take a
+    session id instead of the whole accumulated history.
+
+    A session holds named step outputs, each with a version that goes up on
+    every write; edits can be sent as merge patches. Sessions live in memory
+    up to `max_memory_bytes` of step JSON; beyond that the least recently
+    used ones are written to `root` and read back on their next use.
+    Sessions untouched for `ttl_seconds` are removed.
+    """
+    def __init__(self, root: str, max_memory_bytes: int = 256 << 20, ttl_seconds: int = 7 * 86400):
+        self.root = root
+        self.max_memory_bytes = max_memory_bytes
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.RLock()
+        self._last_purge = 0.0
+        os.makedirs(self.root, exist_ok=True)
+
+    def create(self) -> Session:
+        session = Session(uuid.uuid4().hex)
+        with self._lock:
+            self._sessions[session.id] = session
+        self._maybe_purge()
+        return session
+
+    def get(self, session_id: str) -> Session:
+        """Returns the session, from disk if it was spilled; raises SessionNotFound."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                metrics.CACHE_REQUESTS.inc(cache="session", result="hit")
+                return session
+            session = self._load(session_id)
+            self._sessions[session_id] = session
+            self._memory_bytes += session.size
+            self._evict(keep=session_id)
+            return session
+
+    def put_step(self, session_id: str, name: str, data: Dict[str, Any],
+                 expected_version: Optional[int] = None) -> Step:
+        """Stores a step output, replacing any previous one."""
+        self._check_step_name(name)
+        with self._lock:
+            session = self.get(session_id)
+            previous = session.steps.get(name)
+            self._check_version(name, previous, expected_version)
+            step = Step(data, previous.version + 1 if previous else 1)
+            self._memory_bytes += len(step.text) - (len(previous.text) if previous else 0)
+            session.steps[name] = step
+            session.updated = time.time()
+            self._evict(keep=session_id)
+            return step
+
+    def patch_step(self, session_id: str, name: str, patch: Dict[str, Any],
+                   expected_version: Optional[int] = None) -> Step:
+        """Applies a merge patch to a stored step (e.g. the user's edit of one field)."""
+        with self._lock:
+            session = self.get(session_id)
+            step = session.steps.get(name)
+            if step is None:
+                raise KeyError(name)
+            self._check_version(name, step, expected_version)
+            return self.put_step(session_id, name, merge_patch(step.data, patch))
+
+    def delete(self, session_id: str):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._memory_bytes -= session.size
+            path = self._path(session_id)
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._memory_bytes
+
+    def spill_all(self):
+        """Writes every in-memory session to disk and drops it from memory (e.g. on shutdown)."""
+        with self._lock:
+            while self._sessions:
+                self._spill(next(iter(self._sessions)))
+
+    def purge_expired(self) -> int:
+        """Removes sessions, in memory or on disk, not updated for `ttl_seconds`."""
+        removed = 0
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            for session_id in [s.id for s in self._sessions.values() if s.updated < cutoff]:
+                self.delete(session_id)
+                removed += 1
+            for entry in os.listdir(self.root):
+                path = os.path.join(self.root, entry)
+                try:
+                    if entry.endswith(".json") and os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        self._last_purge = time.time()
+        return removed
+
+    def _load(self, session_id: str) -> Session:
+        path = self._path(session_id)
+        if path is None or not os.path.exists(path) or time.time() - os.path.getmtime(path) > self.ttl_seconds:
+            metrics.CACHE_REQUESTS.inc(cache="session", result="miss")
+            raise SessionNotFound(session_id)
+        metrics.CACHE_REQUESTS.inc(cache="session", result="disk")
+        with open(path, "r", encoding="utf-8") as f:
+            session = Session.from_json(f.read())
+        os.remove(path)
+        return session
+
+    def _spill(self, session_id: str):
+        session = self._sessions.pop(session_id)
+        self._memory_bytes -= session.size
+        fd, temp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(session.to_json())
+        os.replace(temp_path, self._path(session_id))
+        os.utime(self._path(session_id), (session.updated, session.updated))
+
+    def _evict(self, keep: str):
+        # The session in use stays in memory even if it alone is over the budget
+        while self._memory_bytes > self.max_memory_bytes and len(self._sessions) > 1:
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                self._sessions.move_to_end(keep)
+                continue
+            self._spill(oldest)
+
+    def _maybe_purge(self):
+        if time.time() - self._last_purge > self.ttl_seconds / 10:
+            self.purge_expired()
+
+    def _path(self, session_id: str) -> Optional[str]:
+        if not SESSION_ID_PATTERN.match(session_id):
+            return None
+        return os.path.join(self.root, session_id + ".json")
+
+    @staticmethod
+    def _check_step_name(name: str):
+        if not STEP_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid step name: {name!r}")
+
+    @staticmethod
+    def _check_version(name: str, step: Optional[Step], expected_version: Optional[int]):
+        if expected_version is not None and (step.version if step else 0) != expected_version:
+            raise VersionConflict(
+                f"Step {name} is at version {step.version if step else 0}, not {expected_version}")
+
+
+def create_session_store() -> SessionStore:
+    config = configparser.ConfigParser()
+    config.read('backend/config.ini')
+    section = config['SESSIONS'] if config.has_section('SESSIONS') else {}
+    root = section.get('directory') or os.path.join(tempfile.gettempdir(), "archimedes-sessions")
+    return SessionStore(
+        root,
+        max_memory_bytes=int(float(section.get('max_memory_mb', 256)) * (1 << 20)),
+        ttl_seconds=int(section.get('ttl_seconds', 7 * 86400)),
+    )
+
+
+# Shared store used by the step endpoints
+session_store = create_session_store()
+# Sessions outlive a restart of the server, as the client keeps their ids
+atexit.register(session_store.spill_all)
@@ -0,0 +1,391 @@
+"""
+Built-in solvers for canonical problems with closed-form solutions.
+
+Problems such as the cantilever of mvp_benchmark.md need no LLM modeling,
+generated script or sandbox run: the solution is a formula evaluated over
+a grid. match_solver recognizes them from the structured parameters,
+with the problem text used to tell beam supports apart. Unless the
+parameters give a problem_type, the text must describe nothing but the
+solver's canonical problem. A solver matches only if it understands every
+parameter (and, for the text, every word) it is given, since an unknown
+one may change the problem. run_builtin evaluates the solution
+in-process and returns an ExecutionResult with the values a generated
+script would emit.
+
+Sign conventions follow the mock provider's script: loads act downward and
+deflections are negative.
+"""
+import configparser
+import re
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import metrics
+from .agents import ExecutionResult
+
+DEFAULT_POINTS = 201
+HEAT_SERIES_TERMS = 200
+# Keys that name the problem rather than a quantity
+DESCRIPTIVE_KEYS = ("problem_type", "support")
+
+# Problem text that identifies each beam support
+BEAM_SUPPORT_KEYWORDS = {
+    "cantilever": ("cantilever", "clamped at one end", "fixed at one end", "free end"),
+    "simply_supported": ("simply supported", "simply-supported", "pinned at both ends", "pin-roller"),
+    "fixed_fixed": ("fixed-fixed", "fixed at both ends", "clamped at both ends", "clamped-clamped", "built-in at both ends"),
+}
+# Words any problem text may use
+COMMON_PROBLEM_WORDS = frozenset("""
+    an the of and is are be at by with to in on under its it one both end ends along entire whole from for as
+    given this that find compute calculate determine obtain evaluate plot what per magnitude constant position
+    located distance maximum max minimum min value values other mm cm kn pa kpa mpa gpa kg hz rad sec seconds
+""".split())
+# Words a canonical problem of each solver may use besides the common ones
+# (and, for beams, the support phrase). Any other word ("propped",
+# "foundation", "pipe", "convection", "pendulum", ...) may describe another
+# problem, so the text then does not name a problem the solver can solve.
+BEAM_PROBLEM_WORDS = COMMON_PROBLEM_WORDS | frozenset("""
+    deflection deflections displacement displacements curve shape profile tip beam length span long loaded
+    load loads loading point force concentrated uniform uniformly distributed acting applied downward vertical
+    transverse stiffness bending flexural rigidity modulus young youngs elastic moment inertia second area
+    cross section sectional prismatic euler bernoulli intensity midspan mid centre center
+""".split())
+HEAT_PROBLEM_WORDS = COMMON_PROBLEM_WORDS | frozenset("""
+    rod bar slab plane wall plate thin long length thickness thick one dimensional conduction heat heated
+    temperature temperatures distribution profile field steady state transient unsteady thermal conductivity
+    diffusivity generation generated internal uniform uniformly volumetric source fixed held kept maintained
+    prescribed boundary conditions left right face faces side sides initial initially time after flux celsius
+    kelvin degc through across between
+""".split())
+SPRING_PROBLEM_WORDS = COMMON_PROBLEM_WORDS | frozenset("""
+    mass spring springs damper dashpot damped undamped damping viscous linear single degree freedom sdof
+    oscillator system vibration vibrations vibrating free forced harmonic harmonically sinusoidal excitation
+    force forcing amplitude frequency natural response motion displacement velocity initial initially
+    released rest equilibrium time history attached connected coefficient stiffness block
+""".split())
+
+
+def _resolve(parameters: Dict[str, Any], aliases: Dict[str, Tuple[str, ...]]) -> Optional[Dict[str, float]]:
+    """
+    The parameters as floats under their canonical names, or None if one
+    of them is not numeric, has no canonical name or is given twice.
+    """
+    canonical = {alias: name for name, names in aliases.items() for alias in names}
+    resolved = {}
+    for key, value in parameters.items():
+        if key in DESCRIPTIVE_KEYS:
+            continue
+        name = canonical.get(key)
+        if name is None or name in resolved or isinstance(value, bool):
+            return None
+        try:
+            resolved[name] = float(value)
+        except (TypeError, ValueError):
+            return None
+    return resolved
+
+
+def _points(inputs: Dict[str, float]) -> int:
+    return max(int(inputs.get("n_points", DEFAULT_POINTS)), 2)
+
+
+def _extreme(values: np.ndarray) -> int:
+    """Index of the value of largest magnitude."""
+    return int(np.argmax(np.abs(values)))
+
+
+class SolverMatch:
+    __slots__ = ("solver", "variant", "inputs")
+
+    def __init__(self, solver: "BuiltinSolver", variant: str, inputs: Dict[str, float]):
+        self.solver = solver
+        self.variant = variant
+        self.inputs = inputs
+
+    @property
+    def name(self) -> str:
+        return self.solver.name
+
+    @property
+    def description(self) -> str:
+        return self.solver.describe(self.variant, self.inputs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.solver.name, "variant": self.variant}
+
+
+class BuiltinSolver(ABC):
+    name = ""
+    # canonical parameter name -> accepted keys
+    aliases: Dict[str, Tuple[str, ...]] = {}
+    required: Tuple[str, ...] = ()
+
+    def match(self, parameters: Dict[str, Any], problem: str) -> Optional[SolverMatch]:
+        problem_type = parameters.get("problem_type")
+        if problem_type is not None and not str(problem_type).startswith(self.name):
+            return None
+        inputs = _resolve(parameters, self.aliases)
+        if inputs is None or any(name not in inputs for name in self.required):
+            return None
+        variant = self.variant(parameters, problem.lower(), inputs)
+        return SolverMatch(self, variant, inputs) if variant else None
+
+    @abstractmethod
+    def variant(self, parameters: Dict[str, Any], problem: str, inputs: Dict[str, float]) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def solve(self, variant: str, inputs: Dict[str, float]) -> Tuple[Dict[str, Any], str]:
+        """The emitted values and the printed output."""
+
+    @abstractmethod
+    def describe(self, variant: str, inputs: Dict[str, float]) -> str:
+        pass
+
+
+class BeamSolver(BuiltinSolver):
+    """
+    Euler-Bernoulli beams on cantilever, simply supported or fixed-fixed
+    supports under a point load F at a (the tip or mid-span by default),
+    a uniform load q, or both superposed.
+    """
+    name = "beam"
+    aliases = {
+        "L": ("L", "length"), "E": ("E", "youngs_modulus", "elastic_modulus"),
+        "I": ("I", "moment_of_inertia", "second_moment_of_area"),
+        "F": ("F", "P", "force", "point_load"), "q": ("q", "distributed_load", "uniform_load"),
+        "a": ("a", "load_position"), "n_points": ("n_points",),
+    }
+    required = ("L", "E", "I")
+
+    def variant(self, parameters, problem, inputs):
+        if "F" not in inputs and "q" not in inputs:
+            return None
+        support = parameters.get("support") or str(parameters.get("problem_type", ""))[len("beam_"):]
+        if support not in BEAM_SUPPORT_KEYWORDS:
+            support = _support_from_text(problem)
+            if support is None:
+                return None
+        default_position = inputs["L"] if support == "cantilever" else inputs["L"] / 2
+        if not 0 <= inputs.setdefault("a", default_position) <= inputs["L"]:
+            return None
+        return support
+
+    def solve(self, variant, inputs):
+        L, EI = inputs["L"], inputs["E"] * inputs["I"]
+        x = np.linspace(0.0, L, _points(inputs))
+        w = np.zeros_like(x)
+        if "F" in inputs:
+            w += inputs["F"] / EI * _POINT_LOAD[variant](x, L, inputs["a"])
+        if "q" in inputs:
+            w += inputs["q"] / EI * _UNIFORM_LOAD[variant](x, L)
+        peak = _extreme(w)
+        data = {"x": x, "deflection": w, "max_deflection": float(w[peak]), "max_deflection_position": float(x[peak])}
+        return data, f"Maximum deflection: {w[peak]:.6e} m at x = {x[peak]:.6g} m\n"
+
+    def describe(self, variant, inputs):
+        support = variant.replace("_", " ")
+        loads = " and ".join(text for key, text in (("F", f"a point force F at x = {inputs['a']:g}"),
+                                                    ("q", "a uniform load q")) if key in inputs)
+        return (f"Euler-Bernoulli {support} beam of length L and bending stiffness EI under {loads}: "
+                f"EI d^4w/dx^4 = -q(x), solved in closed form by the built-in beam solver.")
+
+
+def _support_from_text(problem: str) -> Optional[str]:
+    """The support named by a problem text that describes only a canonical beam, else None."""
+    found = [name for name, keywords in BEAM_SUPPORT_KEYWORDS.items() if any(k in problem for k in keywords)]
+    if len(found) != 1:
+        return None
+    rest = problem
+    for keyword in sorted((k for keywords in BEAM_SUPPORT_KEYWORDS.values() for k in keywords), key=len, reverse=True):
+        rest = rest.replace(keyword, " ")
+    return found[0] if _describes_only(rest, BEAM_PROBLEM_WORDS) else None
+
+
+def _describes_only(problem: str, vocabulary: frozenset) -> bool:
+    """Whether every word of the (lower-case) problem text is in the vocabulary."""
+    # Single letters are symbols such as L, F or a
+    return all(len(word) == 1 or word in vocabulary for word in re.findall(r"[a-z]+", problem))
+
+
+def _cantilever_point(x, L, a):
+    return -np.where(x <= a, x ** 2 * (3 * a - x), a ** 2 * (3 * x - a)) / 6
+
+
+def _simply_supported_point(x, L, a):
+    b = L - a
+    left = b * x * (L ** 2 - b ** 2 - x ** 2)
+    right = a * (L - x) * (L ** 2 - a ** 2 - (L - x) ** 2)
+    return -np.where(x <= a, left, right) / (6 * L)
+
+
+def _fixed_fixed_point(x, L, a):
+    b = L - a
+    left = b ** 2 * x ** 2 * (3 * a * L - 3 * a * x - b * x)
+    right = a ** 2 * (L - x) ** 2 * (3 * b * L - 3 * b * (L - x) - a * (L - x))
+    return -np.where(x <= a, left, right) / (6 * L ** 3)
+
+
+# Deflection times EI per unit load
+_POINT_LOAD = {"cantilever": _cantilever_point, "simply_supported": _simply_supported_point,
+               "fixed_fixed": _fixed_fixed_point}
+_UNIFORM_LOAD = {
+    "cantilever": lambda x, L: -x ** 2 * (6 * L ** 2 - 4 * L * x + x ** 2) / 24,
+    "simply_supported": lambda x, L: -x * (L ** 3 - 2 * L * x ** 2 + x ** 3) / 24,
+    "fixed_fixed": lambda x, L: -x ** 2 * (L - x) ** 2 / 24,
+}
+
+
+class HeatConductionSolver(BuiltinSolver):
+    """
+    One-dimensional conduction in a rod or slab with fixed end temperatures
+    and optional uniform heat generation: the steady profile, or with a
+    diffusivity alpha and time t the transient from a uniform initial
+    temperature as a Fourier sine series.
+    """
+    name = "heat_conduction"
+    aliases = {
+        "L": ("L", "length", "thickness"), "k": ("k", "conductivity", "thermal_conductivity"),
+        "T_left": ("T_left", "T0", "T_a"), "T_right": ("T_right", "T1", "T_b"),
+        "q_gen": ("q_gen", "heat_generation"), "alpha": ("alpha", "diffusivity", "thermal_diffusivity"),
+        "t": ("t", "time"), "T_initial": ("T_initial", "T_init"), "n_points": ("n_points",),
+    }
+    required = ("L", "T_left", "T_right")
+
+    def variant(self, parameters, problem, inputs):
+        if "problem_type" not in parameters and not _describes_only(problem, HEAT_PROBLEM_WORDS):
+            return None
+        if "q_gen" in inputs and "k" not in inputs:
+            return None
+        transient = [name for name in ("alpha", "t", "T_initial") if name in inputs]
+        if not transient:
+            return "steady"
+        return "transient" if len(transient) == 3 else None
+
+    def solve(self, variant, inputs):
+        L, T0, T1 = inputs["L"], inputs["T_left"], inputs["T_right"]
+        generation = inputs.get("q_gen", 0.0) / inputs["k"] if "q_gen" in inputs else 0.0
+        x = np.linspace(0.0, L, _points(inputs))
+        temperature = T0 + (T1 - T0) * x / L + generation * x * (L - x) / 2
+        gradient = (T1 - T0) / L + generation * (L - 2 * x) / 2
+        if variant == "transient":
+            n = np.arange(1, HEAT_SERIES_TERMS + 1)
+            odd = 1 - (-1.0) ** n
+            wave = n * np.pi
+            # Sine coefficients of the initial departure from the steady profile
+            coefficients = 2 * ((inputs["T_initial"] - T0) * odd / wave + (T1 - T0) * (-1.0) ** n / wave
+                                - generation * L ** 2 * odd / wave ** 3)
+            decay = coefficients * np.exp(-inputs["alpha"] * (wave / L) ** 2 * inputs["t"])
+            temperature = temperature + decay @ np.sin(np.outer(wave / L, x))
+            gradient = gradient + (decay * wave / L) @ np.cos(np.outer(wave / L, x))
+        data = {"x": x, "temperature": temperature, "max_temperature": float(temperature.max()),
+                "min_temperature": float(temperature.min())}
+        if "k" in inputs:
+            data["heat_flux"] = -inputs["k"] * gradient
+        return data, f"Temperature range: {temperature.min():.6g} to {temperature.max():.6g}\n"
+
+    def describe(self, variant, inputs):
+        if variant == "steady":
+            return ("Steady one-dimensional conduction, k d^2T/dx^2 + q_gen = 0 with fixed end temperatures, "
+                    "solved in closed form by the built-in heat conduction solver.")
+        return ("Transient one-dimensional conduction, dT/dt = alpha d^2T/dx^2 (+ q_gen alpha / k), from a uniform "
+                "initial temperature with fixed end temperatures, solved as a Fourier sine series by the built-in "
+                "heat conduction solver.")
+
+
+class SpringMassSolver(BuiltinSolver):
+    """
+    A single-degree-of-freedom mass-spring-damper, m x'' + c x' + k x =
+    F0 cos(omega t), from initial displacement x0 and velocity v0, over
+    t_end (ten undamped periods by default).
+    """
+    name = "spring_mass"
+    aliases = {
+        "m": ("m", "mass"), "k": ("k", "stiffness", "spring_constant"), "c": ("c", "damping"),
+        "x0": ("x0", "initial_displacement"), "v0": ("v0", "initial_velocity"),
+        "F0": ("F0", "force_amplitude"), "omega": ("omega", "forcing_frequency"),
+        "t_end": ("t_end", "duration"), "n_points": ("n_points",),
+    }
+    required = ("m", "k")
+
+    def variant(self, parameters, problem, inputs):
+        if "problem_type" not in parameters and not _describes_only(problem, SPRING_PROBLEM_WORDS):
+            return None
+        if inputs["m"] <= 0 or inputs["k"] <= 0 or inputs.get("c", 0.0) < 0:
+            return None
+        if inputs.get("F0", 0.0) == 0:
+            return "free"
+        return "forced"
+
+    def solve(self, variant, inputs):
+        m, k, c = inputs["m"], inputs["k"], inputs.get("c", 0.0)
+        F0, omega = inputs.get("F0", 0.0), inputs.get("omega", 0.0)
+        natural = np.sqrt(k / m)
+        zeta = c / (2 * np.sqrt(k * m))
+        t = np.linspace(0.0, inputs.get("t_end", 20 * np.pi / natural), _points(inputs))
+
+        # Particular solution and its value and rate at t = 0
+        if F0 == 0:
+            particular, p0, dp0 = np.zeros_like(t), 0.0, 0.0
+        elif c == 0 and np.isclose(omega, natural):
+            particular, p0, dp0 = F0 / (2 * m * natural) * t * np.sin(natural * t), 0.0, 0.0
+        else:
+            det = (k - m * omega ** 2) ** 2 + (c * omega) ** 2
+            A, B = F0 * (k - m * omega ** 2) / det, F0 * c * omega / det
+            particular = A * np.cos(omega * t) + B * np.sin(omega * t)
+            p0, dp0 = A, B * omega
+        y0, dy0 = inputs.get("x0", 0.0) - p0, inputs.get("v0", 0.0) - dp0
+
+        if np.isclose(zeta, 1.0):
+            homogeneous = np.exp(-natural * t) * (y0 + (dy0 + natural * y0) * t)
+        elif zeta < 1:
+            damped = natural * np.sqrt(1 - zeta ** 2)
+            homogeneous = np.exp(-zeta * natural * t) * (
+                y0 * np.cos(damped * t) + (dy0 + zeta * natural * y0) / damped * np.sin(damped * t))
+        else:
+            root = natural * np.sqrt(zeta ** 2 - 1)
+            s1, s2 = -zeta * natural + root, -zeta * natural - root
+            C1 = (dy0 - s2 * y0) / (s1 - s2)
+            homogeneous = C1 * np.exp(s1 * t) + (y0 - C1) * np.exp(s2 * t)
+        x = homogeneous + particular
+        peak = _extreme(x)
+        data = {"t": t, "displacement": x, "max_displacement": float(x[peak]),
+                "natural_frequency": float(natural), "damping_ratio": float(zeta)}
+        return data, (f"Natural frequency: {natural:.6g} rad/s, damping ratio: {zeta:.6g}\n"
+                      f"Maximum displacement: {x[peak]:.6e} at t = {t[peak]:.6g}\n")
+
+    def describe(self, variant, inputs):
+        forcing = "F0 cos(omega t)" if variant == "forced" else "0"
+        return (f"Single-degree-of-freedom oscillator m x'' + c x' + k x = {forcing}, "
+                "solved in closed form by the built-in spring-mass solver.")
+
+
+SOLVERS: Tuple[BuiltinSolver, ...] = (BeamSolver(), HeatConductionSolver(), SpringMassSolver())
+
+
+def builtin_solvers_enabled() -> bool:
+    config = configparser.ConfigParser()
+    config.read('backend/config.ini')
+    return config.getboolean('SOLVERS', 'builtin', fallback=True)
+
+
+def match_solver(parameters: Dict[str, Any], problem: str = "") -> Optional[SolverMatch]:
+    """The built-in solver for the problem, or None if none or more than one applies."""
+    matches: List[SolverMatch] = [m for m in (solver.match(parameters, problem or "") for solver in SOLVERS) if m]
+    return matches[0] if len(matches) == 1 else None
+
+
+def run_builtin(match: SolverMatch) -> ExecutionResult:
+    started = time.perf_counter()
+    try:
+        data, output = match.solver.solve(match.variant, dict(match.inputs))
+    except (ArithmeticError, ValueError) as e:
+        return ExecutionResult(success=False, output="", error=f"{type(e).__name__}: {e}")
+    finally:
+        metrics.BUILTIN_SOLVER_SECONDS.observe(time.perf_counter() - started, solver=match.name)
+    if not all(np.all(np.isfinite(value)) for value in data.values()):
+        return ExecutionResult(success=False, output=output, error="The solution is not finite for these parameters.")
+    return ExecutionResult(success=True, output=output, error="", data=data)
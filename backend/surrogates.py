@@ -0,0 +1,320 @@
+"""
+Surrogate models over past simulation results.
+
+Every successful run adds a point (numeric parameters -> scalar results) to
+an index kept on disk per problem and script. The problem key covers the
+problem text, the non-numeric parameters and the names of the numeric
+ones, so points of one index are comparable; the script is part of the
+key because a different script may compute something different.
+
+predict() estimates the results for new parameters from an index with a
+Gaussian process (on log scales for positive parameters and results of
+one sign), so a client can show an estimate with an uncertainty
+while the real run is pending. The kernel hyperparameters are chosen by
+marginal likelihood on a small grid and the fit is cached until the index
+changes; with more than MAX_GP_POINTS points the prediction uses the
+nearest ones. nearest_satisfying() finds stored parameters that met a
+goal, for the optimizer to start from.
+"""
+import configparser
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve
+
+INDEX_FILE = "index.npz"
+MIN_GP_POINTS = 3
+MAX_GP_POINTS = 400
+# Length scales on parameters scaled to [0, 1], and noise on standardized results
+LENGTH_SCALES = (0.05, 0.1, 0.2, 0.4, 0.8, 1.6, 3.2)
+NOISE_LEVELS = (1e-8, 1e-4, 1e-2)
+
+
+def script_hash(script: str) -> str:
+    return hashlib.sha256(script.strip().encode("utf-8")).hexdigest()[:16]
+
+
+def split_parameters(parameters: Dict[str, Any]) -> Tuple[Dict[str, float], Dict[str, Any]]:
+    """The numeric parameters as floats, and the others, which are part of the problem key."""
+    numeric, descriptive = {}, {}
+    for name, value in parameters.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and np.isfinite(value):
+            numeric[name] = float(value)
+        else:
+            descriptive[name] = value
+    return numeric, descriptive
+
+
+def scalar_results(data: Dict[str, Any]) -> Dict[str, float]:
+    """The finite scalar values among emitted results; arrays are not modelled."""
+    scalars = {}
+    for name, value in data.items():
+        if isinstance(value, bool):
+            continue
+        array = np.asarray(value) if isinstance(value, (int, float, np.ndarray, np.generic)) else None
+        if array is not None and array.size == 1 and np.issubdtype(array.dtype, np.number):
+            number = float(array.reshape(()))
+            if np.isfinite(number):
+                scalars[name] = number
+    return scalars
+
+
+def _problem_key(problem: str, numeric: Dict[str, float], descriptive: Dict[str, Any]) -> str:
+    text = re.sub(r"\s+", " ", problem.strip().lower())
+    key = json.dumps([text, sorted(numeric), descriptive], sort_keys=True, default=str)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+class _Scaling:
+    """
+    Maps parameters to [0, 1] per dimension, positive ones on a log scale:
+    physical results tend to follow power laws of them, which are linear
+    there.
+    """
+    def __init__(self, X: np.ndarray):
+        self.log = (X > 0).all(axis=0)
+        Z = self._log(X)
+        self.low = Z.min(axis=0)
+        self.span = np.where(Z.max(axis=0) > self.low, Z.max(axis=0) - self.low, 1.0)
+
+    def _log(self, X: np.ndarray) -> np.ndarray:
+        Z = X.astype(np.float64, copy=True)
+        # Non-positive values of a log-scaled parameter land far below the data
+        Z[:, self.log] = np.log10(np.maximum(Z[:, self.log], 1e-300))
+        return Z
+
+    def __call__(self, X: np.ndarray) -> np.ndarray:
+        return (self._log(X) - self.low) / self.span
+
+
+class GaussianProcess:
+    """Zero-mean GP on standardized results with a squared-exponential kernel."""
+    def __init__(self, Z: np.ndarray, y: np.ndarray, length_scale: float = None, noise: float = None):
+        self.Z = Z
+        self.mean = y.mean()
+        self.scale = y.std() or max(abs(self.mean), 1.0)
+        self.y = (y - self.mean) / self.scale
+        if length_scale is None:
+            length_scale, noise = max(((l, s) for l in LENGTH_SCALES for s in NOISE_LEVELS),
+                                      key=lambda pair: self._log_likelihood(*pair))
+        self.length_scale, self.noise = length_scale, noise
+        self._factor = cho_factor(self._kernel(Z, Z) + noise * np.eye(len(Z)), lower=True)
+        self._alpha = cho_solve(self._factor, self.y)
+
+    def _kernel(self, A: np.ndarray, B: np.ndarray, length_scale: float = None) -> np.ndarray:
+        distances = ((A[:, None, :] - B[None, :, :]) ** 2).sum(axis=-1)
+        return np.exp(-distances / (2 * (length_scale or self.length_scale) ** 2))
+
+    def _log_likelihood(self, length_scale: float, noise: float) -> float:
+        K = self._kernel(self.Z, self.Z, length_scale) + noise * np.eye(len(self.Z))
+        try:
+            factor = cho_factor(K, lower=True)
+        except np.linalg.LinAlgError:
+            return -np.inf
+        alpha = cho_solve(factor, self.y)
+        return float(-0.5 * self.y @ alpha - np.log(np.diag(factor[0])).sum())
+
+    def predict(self, Z: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        k = self._kernel(Z, self.Z)
+        variance = 1.0 - (k * cho_solve(self._factor, k.T).T).sum(axis=1)
+        return self.mean + self.scale * (k @ self._alpha), self.scale * np.sqrt(np.clip(variance, 0.0, None))
+
+
+class SurrogateIndex:
+    """The points of one (problem, script) pair."""
+    def __init__(self, meta: Dict[str, Any], X: np.ndarray, Y: np.ndarray):
+        self.meta = meta
+        self.X = X
+        self.Y = Y
+        self._models: Dict[str, Tuple[_Scaling, float, GaussianProcess]] = {}
+
+    @property
+    def parameter_names(self) -> List[str]:
+        return self.meta["parameters"]
+
+    @property
+    def result_names(self) -> List[str]:
+        return self.meta["results"]
+
+    def __len__(self) -> int:
+        return len(self.X)
+
+    def add(self, x: np.ndarray, results: Dict[str, float], max_points: int):
+        for name in results:
+            if name not in self.result_names:
+                self.result_names.append(name)
+                self.Y = np.hstack([self.Y, np.full((len(self.Y), 1), np.nan)])
+        y = np.array([results.get(name, np.nan) for name in self.result_names])
+        # Runs are deterministic: the same parameters replace the earlier point
+        same = np.flatnonzero((self.X == x).all(axis=1))
+        if len(same):
+            self.X, self.Y = np.delete(self.X, same, axis=0), np.delete(self.Y, same, axis=0)
+        self.X = np.vstack([self.X, x])[-max_points:]
+        self.Y = np.vstack([self.Y, y])[-max_points:]
+        self._models.clear()
+
+    def predict(self, x: np.ndarray) -> Dict[str, Dict[str, Any]]:
+        predictions = {}
+        for column, name in enumerate(self.result_names):
+            known = ~np.isnan(self.Y[:, column])
+            X, y = self.X[known], self.Y[known, column]
+            if len(X) < MIN_GP_POINTS:
+                if len(X):
+                    nearest = int(np.argmin(np.abs(X - x).sum(axis=1)))
+                    predictions[name] = {"mean": float(y[nearest]), "std": None, "points": len(X), "method": "nearest"}
+                continue
+            scaling, sign, model = self._model(name, X, y)
+            z = scaling(x[None, :])
+            if len(X) > MAX_GP_POINTS:
+                # A local model on the nearest points, with the hyperparameters of the global one
+                Z = scaling(X)
+                nearest = np.argsort(((Z - z) ** 2).sum(axis=1))[:MAX_GP_POINTS]
+                local = np.log10(np.abs(y[nearest])) if sign else y[nearest]
+                model = GaussianProcess(Z[nearest], local, model.length_scale, model.noise)
+            mean, std = model.predict(z)
+            if sign:
+                mean = sign * 10.0 ** mean
+                std = np.abs(mean) * np.log(10) * std
+            predictions[name] = {"mean": float(mean[0]), "std": float(std[0]), "points": len(X), "method": "gp"}
+        return predictions
+
+    def _model(self, name: str, X: np.ndarray, y: np.ndarray) -> Tuple[_Scaling, float, GaussianProcess]:
+        """
+        The scaling, the sign of the result if it is modelled as log10 of
+        its magnitude (0 if not), and the GP, fitted on up to MAX_GP_POINTS.
+        """
+        if name not in self._models:
+            scaling = _Scaling(X)
+            # Results of one sign are modelled as log10 of their magnitude, like positive parameters
+            sign = float(np.sign(y[0])) if (y > 0).all() or (y < 0).all() else 0.0
+            subset = np.random.default_rng(0).choice(len(X), MAX_GP_POINTS, replace=False) if len(X) > MAX_GP_POINTS else slice(None)
+            model = GaussianProcess(scaling(X[subset]), np.log10(np.abs(y[subset])) if sign else y[subset])
+            self._models[name] = (scaling, sign, model)
+        return self._models[name]
+
+
+class SurrogateStore:
+    """
+    Keeps the surrogate indexes under `root`, one directory per problem key
+    with one subdirectory per script, at most `max_points` points each (the
+    oldest are dropped).
+    """
+    def __init__(self, root: str, max_points: int = 5000):
+        self.root = root
+        self.max_points = max_points
+        self._indexes: Dict[str, SurrogateIndex] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def record(self, problem: str, script_key: str, parameters: Dict[str, Any], data: Dict[str, Any]) -> bool:
+        """Adds the scalar results of a run; returns False if there were none or no numeric parameters."""
+        numeric, descriptive = split_parameters(parameters)
+        results = scalar_results(data)
+        if not numeric or not results:
+            return False
+        names = sorted(numeric)
+        directory = os.path.join(self.root, _problem_key(problem, numeric, descriptive), script_key)
+        with self._lock:
+            index = self._load(directory)
+            if index is None:
+                meta = {"problem": problem, "script": script_key, "descriptive": descriptive,
+                        "parameters": names, "results": []}
+                index = self._indexes[directory] = SurrogateIndex(meta, np.empty((0, len(names))), np.empty((0, 0)))
+            index.add(np.array([numeric[name] for name in names]), results, self.max_points)
+            self._save(directory, index)
+        return True
+
+    def predict(self, problem: str, parameters: Dict[str, Any], script_key: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Estimates of the scalar results for `parameters`, from the index of
+        `script_key` or, if it is None, from the problem's largest index.
+        None if there is no index.
+        """
+        numeric, descriptive = split_parameters(parameters)
+        with self._lock:
+            indexes = self._indexes_for(problem, numeric, descriptive)
+            if script_key is not None:
+                indexes = {key: index for key, index in indexes.items() if key == script_key}
+            if not indexes:
+                return None
+            script_key, index = max(indexes.items(), key=lambda item: len(item[1]))
+            x = np.array([numeric[name] for name in index.parameter_names])
+            predictions = index.predict(x)
+            outside = bool(((x < index.X.min(axis=0)) | (x > index.X.max(axis=0))).any())
+        return {"script": script_key, "points": len(index), "extrapolating": outside, "predictions": predictions}
+
+    def nearest_satisfying(self, problem: str, parameters: Dict[str, Any],
+                           satisfied: Callable[[Dict[str, float]], Optional[bool]]) -> Optional[Dict[str, Any]]:
+        """
+        Of the stored points of every script for the problem whose results
+        satisfy the goal, the one with parameters nearest to `parameters`
+        (in the scaled space of its index).
+        """
+        numeric, descriptive = split_parameters(parameters)
+        best = None
+        with self._lock:
+            for script_key, index in self._indexes_for(problem, numeric, descriptive).items():
+                rows = [i for i, y in enumerate(index.Y) if satisfied(
+                    {name: value for name, value in zip(index.result_names, y) if not np.isnan(value)})]
+                if not rows:
+                    continue
+                scaling = _Scaling(index.X)
+                x = np.array([[numeric[name] for name in index.parameter_names]])
+                distances = ((scaling(index.X[rows]) - scaling(x)) ** 2).sum(axis=1)
+                row = rows[int(np.argmin(distances))]
+                if best is None or distances.min() < best[0]:
+                    best = (float(distances.min()), {
+                        "script": script_key,
+                        "parameters": dict(zip(index.parameter_names, index.X[row].tolist())),
+                        "results": {name: float(value) for name, value in zip(index.result_names, index.Y[row]) if not np.isnan(value)},
+                        "points": len(index),
+                    })
+        return best[1] if best else None
+
+    def _indexes_for(self, problem: str, numeric: Dict[str, float], descriptive: Dict[str, Any]) -> Dict[str, SurrogateIndex]:
+        problem_dir = os.path.join(self.root, _problem_key(problem, numeric, descriptive))
+        if not os.path.isdir(problem_dir):
+            return {}
+        indexes = {}
+        for script_key in os.listdir(problem_dir):
+            index = self._load(os.path.join(problem_dir, script_key))
+            if index is not None and len(index):
+                indexes[script_key] = index
+        return indexes
+
+    def _load(self, directory: str) -> Optional[SurrogateIndex]:
+        if directory in self._indexes:
+            return self._indexes[directory]
+        try:
+            with np.load(os.path.join(directory, INDEX_FILE)) as saved:
+                index = SurrogateIndex(json.loads(str(saved["meta"])), saved["X"], saved["Y"])
+        except (OSError, ValueError, KeyError):
+            return None
+        self._indexes[directory] = index
+        return index
+
+    def _save(self, directory: str, index: SurrogateIndex):
+        # Written to a temporary file and renamed, so a reader never sees a partial index
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".npz")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, X=index.X, Y=index.Y, meta=np.array(json.dumps(index.meta, default=str)))
+        os.replace(temp_path, os.path.join(directory, INDEX_FILE))
+
+
+def create_surrogate_store() -> SurrogateStore:
+    config = configparser.ConfigParser()
+    config.read('backend/config.ini')
+    section = config['SURROGATES'] if config.has_section('SURROGATES') else {}
+    root = section.get('directory') or os.path.join(tempfile.gettempdir(), "archimedes-surrogates")
+    return SurrogateStore(root, max_points=int(section.get('max_points', 5000)))
+
+
+# Shared store fed by the workflows and read by the surrogate endpoint and the optimizer
+surrogate_store = create_surrogate_store()
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import stat
+import sys
+import textwrap
+
+import pytest
+
+from backend.AbaqusAgent import AbaqusAgent
+from backend.abaqus_scheduler import AbaqusJob, AbaqusJobScheduler, license_tokens_for_cpus
+
+FAKE_ABAQUS = textwrap.dedent("""\
+    #!{python}
+    import os, sys, time
+    args = sys.argv[1:]
+    if args == ["information=version"]:
+        print("ABAQUS version 2024")
+        sys.exit(0)
+    script = args[1].split("=", 1)[1]
+    with open("started.log", "a") as f:
+        f.write(script + "\\n")
+    with open(os.path.splitext(os.path.basename(script))[0] + ".sta", "w") as sta:
+        for inc in range(1, 4):
+            sta.write(f"  1  {{inc}}  1  0  1  1  {{inc * 0.25:.3f}}  {{inc * 0.25:.3f}}  0.2500\\n")
+            sta.flush()
+            time.sleep(float(os.environ.get("FAKE_ABAQUS_DELAY", "0.1")))
+        sta.write(" THE ANALYSIS HAS COMPLETED SUCCESSFULLY\\n")
+    print("done")
+""")
+
+
+@pytest.fixture
+def fake_abaqus(tmp_path):
+    path = tmp_path / "abaqus"
+    path.write_text(FAKE_ABAQUS.format(python=sys.executable))
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    AbaqusAgent._self_check_cache.clear()
+    return str(path)
+
+
+def make_script(tmp_path, name):
+    job_dir = tmp_path / name
+    job_dir.mkdir()
+    script = job_dir / f"{name}.py"
+    script.write_text("# abaqus script\n")
+    return str(script)
+
+
+def test_license_tokens_for_cpus():
+    assert license_tokens_for_cpus(1) == 5
+    assert license_tokens_for_cpus(4) == 8
+
+
+def test_self_check_is_cached(fake_abaqus, mocker):
+    agent = AbaqusAgent(abaqus_path=fake_abaqus)
+    assert agent.self_check()[0]
+    spy = mocker.spy(agent, "_run_self_check")
+    assert AbaqusAgent(abaqus_path=fake_abaqus).self_check()[0]
+    assert agent.self_check()[0]
+    spy.assert_not_called()
+
+
+def test_jobs_run_with_progress_and_capped_concurrency(fake_abaqus, tmp_path):
+    scheduler = AbaqusJobScheduler(
+        agent=AbaqusAgent(abaqus_path=fake_abaqus), license_tokens=5, cpus=8, poll_interval=0.05
+    )
+    assert scheduler.capacity == 1
+
+    async def run():
+        jobs = [await scheduler.submit(make_script(tmp_path, f"job{i}"), {"load": i}) for i in range(2)]
+        await asyncio.sleep(0.15)
+        assert [job.status for job in jobs] == ["running", "queued"]
+        return jobs, [await scheduler.wait(job.job_id) for job in jobs]
+
+    jobs, results = asyncio.run(run())
+    assert all(result.success for result in results)
+    assert jobs[0].progress["increment"] == 3
+    assert jobs[0].progress["total_time"] == pytest.approx(0.75)
+    assert "COMPLETED SUCCESSFULLY" in jobs[0].progress["message"]
+    assert os.path.exists(os.path.join(jobs[1].work_dir, "params.json"))
+
+
+def test_cancel_running_job(fake_abaqus, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_ABAQUS_DELAY", "5")
+    scheduler = AbaqusJobScheduler(agent=AbaqusAgent(abaqus_path=fake_abaqus), poll_interval=0.05)
+
+    async def run():
+        job = await scheduler.submit(make_script(tmp_path, "slow"))
+        while job.status != "running":
+            await asyncio.sleep(0.05)
+        assert scheduler.cancel(job.job_id)
+        return job, await scheduler.wait(job.job_id)
+
+    job, result = asyncio.run(run())
+    assert job.status == "cancelled"
+    assert not result.success
+    assert not scheduler.cancel(job.job_id)
+
+
+def test_progress_is_read_from_the_jobs_own_files_only(tmp_path):
+    (tmp_path / "other.sta").write_text("  2  9  1  0  1  1  0.900  0.900  0.1000\n")
+    (tmp_path / "beam.msg").write_text(" THE ANALYSIS HAS NOT BEEN COMPLETED\n")
+    (tmp_path / "beam.sta").write_text("  1  2  1  0  1  1  0.500  0.500  0.2500\n  1  3")
+    job = AbaqusJob("1", str(tmp_path / "beam.py"), {}, str(tmp_path))
+    AbaqusJobScheduler(agent=AbaqusAgent(abaqus_path="abaqus"))._tail_progress(job)
+
+    assert job.log == ["  1  2  1  0  1  1  0.500  0.500  0.2500", " THE ANALYSIS HAS NOT BEEN COMPLETED"]
+    assert (job.progress["step"], job.progress["increment"]) == (1, 2)
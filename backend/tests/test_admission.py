@@ -0,0 +1,145 @@
+import asyncio
+import sys
+from unittest.mock import MagicMock, patch
+
+sys.modules['matlab'] = MagicMock()
+sys.modules['matlab.engine'] = MagicMock()
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+from backend import main
+from backend.admission import AdmissionController, Overloaded, PriorityLimiter, current_priority
+
+
+def test_freed_slots_go_to_the_highest_class_first():
+    async def scenario():
+        limiter = PriorityLimiter("test", 1)
+        order = []
+
+        async def worker(priority):
+            async with limiter.slot(priority):
+                order.append(priority)
+                await asyncio.sleep(0)
+
+        await limiter.acquire("batch")
+        tasks = [asyncio.create_task(worker(p)) for p in ("batch", "standard", "interactive", "batch")]
+        await asyncio.sleep(0)
+        assert limiter.snapshot()["queued"] == {"interactive": 1, "standard": 1, "batch": 2}
+        limiter.release("batch")
+        await asyncio.gather(*tasks)
+        return order, limiter.snapshot()
+
+    order, snapshot = asyncio.run(scenario())
+    assert order == ["interactive", "standard", "batch", "batch"]
+    assert snapshot["running"] == {"interactive": 0, "standard": 0, "batch": 0}
+
+
+def test_class_limits_keep_room_for_other_classes_and_queues_shed():
+    async def scenario():
+        limiter = PriorityLimiter("test", 3, {"batch": 1}, {"batch": 1}, {"standard": 0.01})
+        await limiter.acquire("batch")
+        waiting = asyncio.create_task(limiter.acquire("batch"))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as full:
+            await limiter.acquire("batch")
+        await limiter.acquire("interactive")
+        await limiter.acquire("standard")
+        # Every slot is taken now, so standard work waits and gives up
+        with pytest.raises(Overloaded) as timeout:
+            await limiter.acquire("standard")
+        # A cancelled waiter leaves the queue
+        waiting.cancel()
+        await asyncio.sleep(0)
+        return full.value, timeout.value, limiter.snapshot()
+
+    full, timeout, snapshot = asyncio.run(scenario())
+    assert (full.priority, full.reason) == ("batch", "queue_full")
+    assert (timeout.priority, timeout.reason) == ("standard", "timeout")
+    assert snapshot["queued"] == {"interactive": 0, "standard": 0, "batch": 0}
+    assert snapshot["running"] == {"interactive": 1, "standard": 1, "batch": 1}
+
+
+def test_routes_are_classed_by_longest_prefix_and_body_size():
+    controller = AdmissionController(PriorityLimiter("requests", 1), {}, interactive_max_body_bytes=100)
+    assert controller.classify("/api/call-ai", 50) == "interactive"
+    assert controller.classify("/api/call-ai", 5000) == "standard"
+    assert controller.classify("/api/sessions/abc/steps/step-model") == "interactive"
+    assert controller.classify("/api/run-optimization") == "batch"
+    assert controller.classify("/api/unknown") == "standard"
+    assert controller.classify("/metrics") is None
+
+
+def test_malformed_content_length_is_not_a_server_error():
+    request = MagicMock(headers={"content-length": "12abc"})
+    assert main._content_length(request) == 0
+    assert main._content_length(MagicMock(headers={"content-length": "-5"})) == 0
+    assert main._content_length(MagicMock(headers={"content-length": "42"})) == 42
+
+
+def test_saturated_batch_class_is_shed_while_interactive_requests_are_served():
+    controller = AdmissionController(
+        PriorityLimiter("requests", 4, {"batch": 1}, {"batch": 1}),
+        {name: PriorityLimiter(name, 4) for name in ("llm", "sandbox", "embedding")},
+    )
+    release = asyncio.Event()
+    seen = []
+
+    async def slow_optimization(*args, **kwargs):
+        seen.append(current_priority())
+        await release.wait()
+        return {"status": "success"}
+
+    body = {"provider": "mock", "model": "mock", "problem": "p", "initial_parameters": {}, "solver_preference": "python",
+            "optimization_goal": "x > 0"}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            running = asyncio.create_task(client.post("/api/run-optimization", json=body))
+            queued = asyncio.create_task(client.post("/api/run-optimization", json=body))
+            while controller.requests.snapshot()["queued"]["batch"] < 1:
+                await asyncio.sleep(0.01)
+            shed = await client.post("/api/run-optimization", json=body)
+            session = await client.post("/api/sessions")
+            state = (await client.get("/api/admission")).json()
+            release.set()
+            return shed, session, state, await running, await queued
+
+    with patch.object(main, "admission_controller", controller), \
+            patch.object(main, "run_optimization_workflow", slow_optimization):
+        shed, session, state, *finished = asyncio.run(scenario())
+    assert shed.status_code == 503 and shed.headers["Retry-After"]
+    assert shed.json()["error_code"] == "SERVER_OVERLOADED"
+    assert session.status_code == 200
+    assert state["requests"]["running"]["batch"] == 1 and state["requests"]["queued"]["batch"] == 1
+    assert [response.status_code for response in finished] == [200, 200]
+    assert seen == ["batch", "batch"]
+
+
+def test_streaming_responses_hold_their_slot_until_the_body_is_sent():
+    controller = AdmissionController(PriorityLimiter("requests", 4), {})
+    app = FastAPI()
+    app.middleware("http")(main.admit_requests)
+    held = []
+
+    @app.post("/api/drawings/digitize")
+    async def digitize():
+        async def body():
+            for line in ("a\n", "b\n"):
+                await asyncio.sleep(0.01)
+                held.append(controller.requests.snapshot()["running"]["batch"])
+                yield line
+        return StreamingResponse(body())
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.post("/api/drawings/digitize")
+
+    with patch.object(main, "admission_controller", controller):
+        response = asyncio.run(scenario())
+    assert response.text == "a\nb\n"
+    assert held == [1, 1]
+    assert controller.requests.snapshot()["running"]["batch"] == 0
@@ -0,0 +1,55 @@
+import json
+import sys
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+sys.modules['matlab'] = MagicMock()
+sys.modules['matlab.engine'] = MagicMock()
+
+import backend.main  # noqa: F401 -- the workflow modules must be imported through main
+from backend import sandbox_results
+from backend.agents import analyze_data, load_results, results_to_json, summarize_data
+from backend.optimization_workflow import evaluate_numeric_goal
+
+
+def test_emitted_results_are_loaded_memory_mapped(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sandbox_results.emit("deflection", np.linspace(0, -0.0016, 5))
+    sandbox_results.emit_many(max_deflection=0.0016, n_nodes=5)
+
+    data = load_results(str(tmp_path / sandbox_results.RESULTS_DIR))
+
+    assert isinstance(data["deflection"], np.memmap)
+    assert data["max_deflection"] == pytest.approx(0.0016)
+    assert data["n_nodes"] == 5
+    assert results_to_json(data)["deflection"][-1] == pytest.approx(-0.0016)
+    assert "max_deflection = 0.0016" in summarize_data(data)
+
+
+def test_non_finite_results_become_null_and_are_reported():
+    data = {"x": np.array([1.0, np.nan, np.inf]), "peak": np.float64(-np.inf), "n": np.int64(3)}
+    converted = results_to_json(data)
+    assert converted == {"x": [1.0, None, None], "peak": None, "n": 3}
+    json.dumps(converted, allow_nan=False)
+    assert "non-finite values (NaN or infinite) in x, peak" in analyze_data("python", data)
+
+
+def test_emit_rejects_non_numeric_values(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(TypeError):
+        sandbox_results.emit("label", "beam")
+    with pytest.raises(ValueError):
+        sandbox_results.emit("../escape", 1.0)
+
+
+def test_evaluate_numeric_goal():
+    data = {"max_deflection": 0.0016, "stress": np.array([1.0, 3.0])}
+    assert evaluate_numeric_goal("max_deflection < 0.002", data) is True
+    assert evaluate_numeric_goal("stress <= 2", data) is False
+    assert evaluate_numeric_goal("minimize weight", data) is None
+    assert evaluate_numeric_goal("mass < 3", data) is None
+    assert evaluate_numeric_goal("max_deflection < .002", data) is True
+    assert evaluate_numeric_goal("max_deflection < 1.2.3", data) is None
+    assert evaluate_numeric_goal("max_deflection < .", data) is None
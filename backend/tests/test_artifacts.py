@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+from unittest.mock import MagicMock
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+sys.modules['matlab'] = MagicMock()
+sys.modules['matlab.engine'] = MagicMock()
+
+from fastapi.testclient import TestClient
+
+from backend import main
+from backend.agents import collect_artifacts
+from backend.artifacts import ArtifactStore
+
+
+def test_store_is_content_addressed_and_expires(tmp_path):
+    store = ArtifactStore(str(tmp_path / "store"), ttl_seconds=60)
+    first = tmp_path / "a.csv"
+    first.write_text("x,y\n1,2\n")
+    second = tmp_path / "b.csv"
+    second.write_text("x,y\n1,2\n")
+
+    ref_a = store.put_file(str(first))
+    ref_b = store.put_file(str(second))
+    assert ref_a["id"] == ref_b["id"]
+    assert ref_a["url"] == f"/api/artifacts/{ref_a['id']}"
+    assert "thumbnail_url" not in ref_a
+
+    path = store.path_for(ref_a["id"])
+    old = time.time() - 120
+    os.utime(path, (old, old))
+    assert store.path_for(ref_a["id"]) is None
+    assert store.purge_expired() == 1
+    assert store.path_for("../../etc/passwd") is None
+
+
+def test_job_outputs_are_collected_and_served(tmp_path, monkeypatch):
+    store = ArtifactStore(str(tmp_path / "store"))
+    monkeypatch.setattr("backend.agents.artifact_store", store)
+    monkeypatch.setattr(main, "artifact_store", store)
+    job_dir = tmp_path / "job"
+    (job_dir / "results").mkdir(parents=True)
+    (job_dir / "script.py").write_text("print('hi')")
+    (job_dir / "results" / "w.npy").write_bytes(b"")
+    for name in ("deflection.png", "moment.png"):
+        plt.figure(figsize=(4, 3))
+        plt.plot([0, 1], [0, 1])
+        plt.savefig(job_dir / name)
+        plt.close()
+
+    artifacts = collect_artifacts(str(job_dir))
+    assert [a["name"] for a in artifacts] == ["deflection.png", "moment.png"]
+
+    client = TestClient(main.app)
+    full = client.get(artifacts[0]["url"])
+    assert full.status_code == 200
+    assert full.headers["content-type"] == "image/png"
+    assert "immutable" in full.headers["cache-control"]
+
+    etag = full.headers["etag"]
+    assert client.get(artifacts[0]["url"], headers={"If-None-Match": etag}).status_code == 304
+    partial = client.get(artifacts[0]["url"], headers={"Range": "bytes=0-7"})
+    assert partial.status_code == 206
+    assert partial.content == full.content[:8]
+
+    thumbnail = client.get(artifacts[0]["thumbnail_url"], params={"size": 64})
+    assert thumbnail.status_code == 200
+    assert len(thumbnail.content) < len(full.content)
+
+    assert client.get(f"/api/artifacts/{'0' * 64}").status_code == 400
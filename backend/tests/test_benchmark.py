@@ -0,0 +1,50 @@
+import asyncio
+import sys
+from unittest.mock import MagicMock
+
+sys.modules['matlab'] = MagicMock()
+sys.modules['matlab.engine'] = MagicMock()
+
+import backend.main  # noqa: F401 -- the workflow modules must be imported through main
+from backend import benchmark
+from backend.mock_provider import SIMULATION_SCRIPT, mock_response
+
+
+def test_mock_provider_is_deterministic_per_step():
+    assert mock_response("Problem: beam\nParameters: {}") == mock_response("Problem: beam\nParameters: {}")
+    assert mock_response("Modeling Result:\nw(x)\nParameters: {\"I\": 1e-05}") == SIMULATION_SCRIPT
+    assert mock_response('Optimization goal: x\nCurrent parameters: {"I": 2e-05}') == '{"I": 4e-05}'
+
+
+def test_benchmark_runs_pipeline_offline(monkeypatch):
+    monkeypatch.setenv("SANDBOX_BACKEND", "local")
+    report = asyncio.run(benchmark.run_benchmark(["steps", "optimization"], [2], samples=2, warmup=0))
+
+    for result in report["results"]:
+        assert result["errors"] == 0, result["error_examples"]
+        assert result["latency_ms"]["p50"] > 0
+    steps = report["results"][0]
+    assert set(steps["stages_ms"]) == {"model", "generate_script", "execute", "synthesize"}
+
+
+def test_only_the_builtin_scenario_skips_the_pipeline(monkeypatch):
+    from backend import workflow
+    monkeypatch.setenv("SANDBOX_BACKEND", "local")
+    calls = []
+    run_builtin = workflow.run_builtin
+    monkeypatch.setattr(workflow, "run_builtin", lambda match: calls.append(match.name) or run_builtin(match))
+
+    report = asyncio.run(benchmark.run_benchmark(["optimization"], [1], samples=1, warmup=0))
+    assert report["results"][0]["errors"] == 0 and calls == []
+    report = asyncio.run(benchmark.run_benchmark(["builtin"], [1], samples=1, warmup=0))
+    assert report["results"][0]["errors"] == 0 and calls and set(calls) == {"beam"}
+
+
+def test_compare_reports_flags_regressions():
+    def report(throughput, p50):
+        return {"results": [{"scenario": "steps", "concurrency": 1, "throughput_per_s": throughput,
+                             "latency_ms": {"p50": p50, "p99": p50 * 2}}]}
+
+    assert benchmark.compare_reports(report(10, 100), report(10, 100), 20) == []
+    regressions = benchmark.compare_reports(report(5, 200), report(10, 100), 20)
+    assert len(regressions) == 3
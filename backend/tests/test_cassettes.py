@@ -0,0 +1,90 @@
+import asyncio
+import gzip
+import json
+import sys
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.modules['matlab'] = MagicMock()
+sys.modules['matlab.engine'] = MagicMock()
+
+from backend import cassettes
+from backend.main import app
+
+client = TestClient(app)
+
+
+class FakeProvider:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, provider, model, prompt):
+        self.calls += 1
+        return "shared answer" if prompt.startswith("same") else f"answer to {prompt}"
+
+
+def _use(mode, **kwargs):
+    return cassettes.use_selection(cassettes.CassetteSelection(mode, "unit", **kwargs))
+
+
+def test_record_then_replay_without_calling_the_provider(tmp_path):
+    library = cassettes.CassetteLibrary(str(tmp_path))
+    provider = FakeProvider()
+
+    async def run(mode, prompts, **kwargs):
+        token = _use(mode, **kwargs)
+        try:
+            return [await library.call("google", "m", prompt, provider) for prompt in prompts]
+        finally:
+            cassettes.reset_selection(token)
+
+    recorded = asyncio.run(run("record", ["same 1", "same 2", "other"]))
+    assert provider.calls == 3
+    # Only the first call was written right away; the rest wait for the next flush
+    with gzip.open(tmp_path / "unit.json.gz", "rt") as f:
+        assert len(json.load(f)["entries"]) == 1
+    library.flush()
+
+    # A fresh library reads the compressed file; identical responses are stored once
+    with gzip.open(tmp_path / "unit.json.gz", "rt") as f:
+        payload = json.load(f)
+    assert len(payload["entries"]) == 3 and len(payload["responses"]) == 2
+
+    library = cassettes.CassetteLibrary(str(tmp_path))
+    started = time.perf_counter()
+    replayed = asyncio.run(run("replay", ["same 1", "same 2", "other"], latency="50"))
+    assert replayed == recorded
+    assert provider.calls == 3
+    assert time.perf_counter() - started >= 0.15
+
+    with pytest.raises(cassettes.CassetteMiss):
+        asyncio.run(run("replay", ["unseen"]))
+    assert asyncio.run(run("replay_or_record", ["unseen"])) == ["answer to unseen"]
+    assert provider.calls == 4
+
+
+def test_requests_select_cassette_with_headers(tmp_path):
+    library = cassettes.CassetteLibrary(str(tmp_path), allow_request_selection=True)
+    body = {"provider": "mock", "model": "m", "task": "modeling", "data": {}}
+    headers = {"X-LLM-Cassette-Name": "api"}
+
+    with patch.object(cassettes, "cassette_library", library), patch("backend.main.load_prompt", return_value="ping"):
+        recorded = client.post("/api/call-ai", json=body, headers={**headers, "X-LLM-Cassette": "record"})
+        with patch("backend.main.call_mock_api", side_effect=AssertionError("provider must not be called")):
+            replayed = client.post("/api/call-ai", json=body, headers={**headers, "X-LLM-Cassette": "replay"})
+        with patch("backend.main.load_prompt", return_value="not recorded"):
+            missing = client.post("/api/call-ai", json=body, headers={**headers, "X-LLM-Cassette": "replay"})
+        invalid = client.post("/api/call-ai", json=body, headers={"X-LLM-Cassette": "rewind"})
+
+    assert replayed.status_code == 200
+    assert replayed.json() == recorded.json()
+    assert missing.json()["error_code"] == "CASSETTE_MISS"
+    assert invalid.status_code == 400 and invalid.json()["error_code"] == "INVALID_INPUT"
+
+
+def test_headers_are_ignored_unless_allowed(tmp_path):
+    library = cassettes.CassetteLibrary(str(tmp_path))
+    assert library.selection_from_headers({"x-llm-cassette": "replay"}) is None
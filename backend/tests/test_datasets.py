@@ -0,0 +1,83 @@
+import asyncio
+import io
+import os
+import time
+
+import numpy as np
+
+from backend import datasets, sandbox_data
+from backend.datasets import DatasetStore, convert_csv
+
+
+class FakeUpload:
+    def __init__(self, content: bytes):
+        self._stream = io.BytesIO(content)
+
+    async def read(self, size: int = -1) -> bytes:
+        return self._stream.read(size)
+
+
+CSV = b"x,deflection,label\n0,0.0,fixed\n5,-0.0005,\n10,-0.0016,tip\n"
+
+
+def test_upload_is_converted_once_and_deduplicated(tmp_path):
+    store = DatasetStore(str(tmp_path / "datasets"))
+    manifest = asyncio.run(store.save_upload(FakeUpload(CSV)))
+
+    assert manifest["rows"] == 3
+    assert [(c["name"], c["dtype"]) for c in manifest["columns"]] == [("x", "float64"), ("deflection", "float64"), ("label", "str")]
+    dataset_dir = store.dataset_dir_for(manifest["filepath"])
+    assert dataset_dir is not None
+    with open(manifest["filepath"], "rb") as f:
+        assert f.read() == CSV
+
+    again = asyncio.run(store.save_upload(FakeUpload(CSV)))
+    assert again["filepath"] == manifest["filepath"]
+    assert os.listdir(os.path.join(store.root, "incoming")) == []
+
+
+def test_sandbox_loads_memory_mapped_columns(tmp_path, monkeypatch):
+    store = DatasetStore(str(tmp_path / "datasets"))
+    manifest = asyncio.run(store.save_upload(FakeUpload(CSV)))
+    monkeypatch.chdir(tmp_path)
+    os.symlink(store.dataset_dir_for(manifest["filepath"]), tmp_path / sandbox_data.DATASET_DIR)
+
+    data = sandbox_data.load_dataset()
+    assert isinstance(data["deflection"], np.memmap)
+    np.testing.assert_allclose(data["deflection"], [0.0, -0.0005, -0.0016])
+    assert list(data["label"]) == ["fixed", "", "tip"]
+
+
+def test_columns_that_turn_to_text_late_keep_their_cells_in_one_read(tmp_path, monkeypatch):
+    monkeypatch.setattr(datasets, "CONVERSION_BLOCK_ROWS", 2)
+    csv_path = tmp_path / "data.csv"
+    csv_path.write_bytes(b'x,id,note\n1,1.50,a\n2,007,\n3,n/a,"two\nlines"\n4,12,b\n5,,c\n')
+    opened = []
+    real_open = open
+
+    def counting_open(path, *args, **kwargs):
+        opened.append(os.path.basename(path))
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(datasets, "open", counting_open, raising=False)
+    columns, rows = convert_csv(str(csv_path), str(tmp_path))
+
+    assert opened.count("data.csv") == 1
+    assert rows == 5
+    assert [c["dtype"] for c in columns] == ["float64", "str", "str"]
+    np.testing.assert_allclose(np.load(tmp_path / "0.npy"), [1, 2, 3, 4, 5])
+    assert list(np.load(tmp_path / "1.npy")) == ["1.50", "007", "n/a", "12", ""]
+    assert list(np.load(tmp_path / "2.npy")) == ["a", "", "two\nlines", "b", "c"]
+    assert sorted(os.listdir(tmp_path)) == ["0.npy", "1.npy", "2.npy", "data.csv"]
+
+
+def test_stale_datasets_are_purged(tmp_path):
+    store = DatasetStore(str(tmp_path / "datasets"), ttl_seconds=60)
+    manifest = asyncio.run(store.save_upload(FakeUpload(CSV)))
+    dataset_dir = store.dataset_dir_for(manifest["filepath"])
+    old = time.time() - 120
+    os.utime(os.path.join(dataset_dir, "manifest.json"), (old, old))
+
+    assert store.purge_stale() == 1
+    assert not os.path.exists(dataset_dir)
+    assert store.dataset_dir_for("/etc/data.csv") is None
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from backend.drawing import GridIndex, TextBox, associate_text, merge_collinear, point_segment_distances
+from backend.drawing_benchmark import associate_dense, run_size, simulate_detections, synthetic_drawing
+
+
+def test_merge_collinear_joins_overlapping_and_broken_pieces():
+    segments = [
+        [0, 0, 40, 0], [35, 0.5, 80, 0.4], [83, 0, 100, 0],  # one broken horizontal line
+        [100, 0.2, 60, 0.3],                                  # reversed duplicate
+        [0, 10, 0, 50], [0.5, 52, 0.5, 90],                   # one vertical line
+        [0, 30, 100, 30],                                     # a separate parallel line
+    ]
+    merged = merge_collinear(segments)
+
+    assert len(merged) == 3
+    horizontal = merged[np.argmin(np.abs(merged[:, 1]) + np.abs(merged[:, 3]))]
+    assert sorted([horizontal[0], horizontal[2]]) == pytest.approx([0, 100], abs=0.5)
+
+
+def test_merge_collinear_recovers_simulated_detections():
+    lines, _, _ = synthetic_drawing(200)
+    merged = merge_collinear(simulate_detections(lines, pieces=3))
+    assert len(merged) == len(lines)
+
+
+def test_grid_index_nearest_matches_brute_force():
+    rng = np.random.default_rng(1)
+    segments = rng.uniform(0, 1000, (400, 2)).repeat(2, axis=0).reshape(-1, 4) + rng.normal(0, 40, (400, 4))
+    points = rng.uniform(0, 1000, (300, 2))
+    nearest, distances = GridIndex(segments, cell_size=25).nearest(points, 30.0)
+
+    assert np.array_equal(nearest, associate_dense(points, segments, 30.0))
+    found = nearest >= 0
+    assert np.allclose(distances[found], point_segment_distances(points[found], segments[nearest[found]]))
+    assert np.all(np.isinf(distances[~found]))
+
+
+def test_associate_text_picks_dimension_line():
+    segments = [[100, 100, 400, 100], [100, 80, 100, 120], [400, 80, 400, 120], [100, 300, 400, 300]]
+    boxes = [TextBox("300", 230, 70, 40, 20), TextBox("note", 600, 600, 40, 20)]
+
+    associations = associate_text(boxes, segments, max_distance=50)
+
+    assert [(a["text"], a["segment"]) for a in associations] == [("300", 0)]
+    assert associations[0]["distance"] == 20
+
+
+def test_drawing_benchmark_grid_agrees_with_references():
+    result = run_size(50, detect=False)
+    assert result["merge"]["lines_merged"] == result["lines_drawn"]
+    assert result["associate"]["grid_matches_dense"]
+    assert result["associate"]["grid_matches_loop"]
+    assert result["associate"]["labels_on_dimension_line"] == result["labels"]
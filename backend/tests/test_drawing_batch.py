@@ -0,0 +1,100 @@
+import json
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from unittest.mock import MagicMock
+
+import numpy as np
+
+sys.modules['matlab'] = MagicMock()
+sys.modules['matlab.engine'] = MagicMock()
+
+from fastapi.testclient import TestClient
+
+from backend import drawing_batch
+from backend.drawing import OcrEngine
+from backend.main import app
+
+client = TestClient(app)
+
+
+def test_ocr_mosaic_maps_words_back_to_their_regions(monkeypatch):
+    fake = MagicMock()
+    fake.Output.DICT = "dict"
+    # Second region starts at y = 10 + 20 + 10 = 40 in the mosaic
+    fake.image_to_data.return_value = {
+        "text": ["300", "", "R5"], "conf": ["91", "-1", "75.5"],
+        "left": [12, 0, 14], "top": [11, 0, 42], "width": [30, 0, 16], "height": [15, 0, 14],
+    }
+    monkeypatch.setitem(sys.modules, "pytesseract", fake)
+    monkeypatch.setitem(sys.modules, "tesserocr", None)
+    gray = np.zeros((400, 600), dtype=np.uint8)
+    regions = np.array([[230, 70, 50, 20], [400, 300, 40, 18]])
+
+    boxes = OcrEngine().read_regions(gray, regions)
+
+    mosaic = fake.image_to_data.call_args[0][0]
+    assert mosaic.shape == (10 + 20 + 10 + 18 + 10, 50 + 20)
+    assert [(b.text, b.left, b.top) for b in boxes] == [("300", 232, 71), ("R5", 404, 302)]
+
+
+def test_processor_streams_a_result_per_drawing(tmp_path):
+    paths = [str(tmp_path / "missing-a.png"), str(tmp_path / "missing-b.png")]
+    with drawing_batch.DrawingProcessor(workers=2, ocr_language=None) as processor:
+        results = list(processor.run(paths, str(tmp_path / "dxf"), max_in_flight=1))
+
+    assert sorted(result["path"] for result in results) == paths
+    assert all("error" in result for result in results)
+
+
+def test_drawings_with_the_same_name_get_their_own_dxf_file():
+    name = drawing_batch._dxf_names()
+    names = [name(path) for path in ("a/plan.png", "b/plan.png", "plan.tif", "section.png")]
+
+    assert names[0] == "plan.dxf" and names[3] == "section.dxf"
+    assert len(set(names)) == 4 and all(n.startswith("plan-") for n in names[1:3])
+
+
+def test_expand_paths_lists_images_in_directories(tmp_path):
+    for name in ("b.png", "a.TIF", "notes.txt"):
+        (tmp_path / name).write_bytes(b"")
+    assert drawing_batch.expand_paths([str(tmp_path), "x.jpg"]) == [
+        str(tmp_path / "a.TIF"), str(tmp_path / "b.png"), "x.jpg"]
+
+
+def test_digitize_endpoint_streams_results_and_summary(monkeypatch):
+    def fake_run(paths, output_dir, max_in_flight=None, cancel=None):
+        for path in paths:
+            yield {"path": path, "error": "FileNotFoundError: unreadable", "timings_ms": {}}
+
+    monkeypatch.setattr(drawing_batch.drawing_processor, "run", fake_run)
+    response = client.post("/api/drawings/digitize", files=[("files", ("plan.png", b"x", "image/png"))])
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["path"] == "plan.png"
+    assert lines[-1]["summary"]["pages"] == 1
+    assert lines[-1]["summary"]["errors"] == 1
+
+
+def test_run_stops_when_cancelled_while_another_thread_waits(tmp_path, monkeypatch):
+    cancel = threading.Event()
+    slow = Future()
+    processor = drawing_batch.DrawingProcessor(workers=1, ocr_language=None)
+    monkeypatch.setattr(processor, "_pool", MagicMock(submit=lambda *args: slow))
+    results = processor.run(["a.png", "b.png"], str(tmp_path), cancel=cancel)
+
+    waiting = threading.Thread(target=lambda: next(results, None))
+    waiting.start()
+    time.sleep(0.05)
+    cancel.set()
+    waiting.join(timeout=2)
+    assert not waiting.is_alive()
+    results.close()
+    assert slow.cancelled()
+
+
+def test_digitize_endpoint_rejects_non_images():
+    response = client.post("/api/drawings/digitize", files=[("files", ("notes.txt", b"x", "text/plain"))])
+    assert response.status_code == 400
+    assert response.json()["error_code"] == "INVALID_INPUT"
@@ -0,0 +1,58 @@
+import numpy as np
+
+from backend.drawing_tiles import TiledProcessor, coarse_contrast, plan_tiles, select_tiles
+
+MARKER = 1
+
+
+def detect_dark_rows(tile, max_radius):
+    """Stand-in detector: one segment per row of dark pixels, a circle per marker pixel."""
+    segments = []
+    for y in np.flatnonzero((tile == 0).any(axis=1)):
+        xs = np.flatnonzero(tile[y] == 0)
+        segments.append([xs.min(), y, xs.max(), y])
+    ys, xs = np.nonzero(tile == MARKER)
+    circles = np.stack([xs, ys, np.full(len(xs), 5)], axis=1) if len(xs) else np.empty((0, 3))
+    return np.array(segments, dtype=float).reshape(-1, 4), circles
+
+
+def test_tile_cores_partition_the_image():
+    windows, cores = plan_tiles(1000, 1700, tile_size=512, overlap=64)
+
+    area = np.zeros((1000, 1700), dtype=int)
+    for y0, x0, y1, x1 in cores:
+        area[y0:y1, x0:x1] += 1
+    assert np.all(area == 1)
+    assert np.all(windows[:, 2] - windows[:, 0] <= 512) and np.all(windows[:, 3] - windows[:, 1] <= 512)
+    assert np.all((windows[:, :2] <= cores[:, :2]) & (cores[:, 2:] <= windows[:, 2:]))
+
+
+def test_coarse_pass_selects_only_tiles_with_ink():
+    raster = np.full((1000, 1000), 255, dtype=np.uint8)
+    raster[105, 100:300] = 0
+    windows, _ = plan_tiles(1000, 1000, tile_size=256, overlap=32)
+
+    contrast = coarse_contrast(raster, scale=8, strip_rows=100)
+    selected = select_tiles(contrast, windows, scale=8)
+
+    assert contrast.shape == (125, 125)
+    assert 1 <= selected.sum() <= 3
+    assert np.all(windows[selected, 0] <= 110)
+
+
+def test_tiles_are_stitched_and_circles_reported_once(tmp_path):
+    raster = np.full((1500, 2000), 255, dtype=np.uint8)
+    raster[300, 10:1990] = 0
+    # A marker inside the overlap of two tiles is seen by both
+    raster[100, 480] = MARKER
+
+    processor = TiledProcessor(tile_size=512, overlap=64, workers=2, scale=8, detector=detect_dark_rows,
+                               scratch_dir=str(tmp_path))
+    result = processor.process(raster)
+
+    assert processor.stats["tiles_processed"] < processor.stats["tiles"]
+    assert processor.stats["raw_segments"] > 1
+    assert len(result.segments) == 1
+    assert sorted([result.segments[0, 0], result.segments[0, 2]]) == [10, 1989]
+    assert result.circles.tolist() == [[480, 100, 5]]
+    assert not list(tmp_path.iterdir())
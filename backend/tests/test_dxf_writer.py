@@ -0,0 +1,62 @@
+import io
+
+import numpy as np
+import pytest
+
+from backend.drawing import DrawingResult, TextBox, associate_text
+from backend.dxf_writer import chain_polylines, dedupe_segments, export_drawing, snap_points
+
+
+def test_snap_points_joins_close_points_across_cell_borders():
+    points = np.array([[9.9, 0.0], [10.1, 0.2], [50.0, 50.0]])
+    snapped = snap_points(points, 1.0)
+
+    assert np.allclose(snapped[0], snapped[1])
+    assert np.allclose(snapped[2], [50.0, 50.0])
+
+
+def test_dedupe_segments_drops_reversed_duplicates_and_points():
+    segments = [[0, 0, 10, 0], [10.2, 0.1, 0.1, -0.2], [5, 5, 5.1, 5.1], [0, 0, 0, 10]]
+    assert len(dedupe_segments(segments, snap_tolerance=1.0)) == 2
+
+
+def test_chain_polylines_closes_loops_and_drops_straight_vertices():
+    segments = np.array([
+        [0, 0, 5, 0], [5, 0, 10, 0], [10, 0, 10, 10], [10, 10, 0, 10], [0, 10, 0, 0],  # square, split edge
+        [20, 0, 30, 0], [30, 0, 40, 5],                                                # open chain
+        [50, 50, 60, 60],                                                              # lone line
+    ], dtype=float)
+    chains = sorted(chain_polylines(segments), key=lambda chain: len(chain[0]))
+
+    assert [(len(vertices), closed) for vertices, closed in chains] == [(2, False), (3, False), (4, True)]
+    assert sorted(map(tuple, chains[2][0].tolist())) == [(0, 0), (0, 10), (10, 0), (10, 10)]
+
+
+def test_export_drawing_is_readable_by_ezdxf(tmp_path):
+    ezdxf = pytest.importorskip("ezdxf")
+    segments = np.array([[0, 0, 100, 0], [100, 0, 100, 50], [100, 50, 0, 50], [0, 50, 0, 0],
+                         [0, 0.3, 100, 0.2], [0, 70, 100, 70]], dtype=float)
+    labels = [TextBox("100", 40, 75, 20, 10), TextBox("note", 500, 500, 30, 10)]
+    result = DrawingResult(segments, labels, associate_text(labels, segments, 20), np.array([[50, 25, 10]]))
+    path = str(tmp_path / "drawing.dxf")
+
+    counts = export_drawing(result, path)
+
+    assert counts == {"LINE": 1, "POLYLINE": 1, "CIRCLE": 1, "TEXT": 2, "duplicates_removed": 1}
+    msp = ezdxf.readfile(path).modelspace()
+    (polyline,) = msp.query("POLYLINE")
+    assert polyline.is_closed and len(list(polyline.points())) == 4
+    (dimension,) = msp.query("LINE[layer=='DIMENSIONS']")
+    texts = {text.dxf.text: text for text in msp.query("TEXT")}
+    assert texts["100"].get_xdata("ARCHIMEDES")[1].value == dimension.get_xdata("ARCHIMEDES")[1].value
+    assert not texts["note"].has_xdata("ARCHIMEDES")
+
+
+def test_export_drawing_streams_to_text():
+    segments = np.random.default_rng(0).uniform(0, 1000, (25000, 4))
+    stream = io.StringIO()
+    counts = export_drawing(DrawingResult(segments, [], []), stream, polylines=False)
+
+    text = stream.getvalue()
+    assert counts["LINE"] == text.count("\nLINE\n") == 25000
+    assert text.endswith("0\nENDSEC\n0\nEOF\n")
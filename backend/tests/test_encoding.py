@@ -0,0 +1,75 @@
+import json
+import sys
+from unittest.mock import MagicMock
+
+sys.modules['matlab'] = MagicMock()
+sys.modules['matlab.engine'] = MagicMock()
+
+import msgpack
+from fastapi.testclient import TestClient
+
+from backend import main
+from backend.encoding import expand_history, negotiate, slim_history
+from backend.encoding_benchmark import synthetic_history
+
+
+def test_negotiate_follows_the_accept_headers():
+    assert negotiate() == ("application/json", None)
+    assert negotiate("application/msgpack", "gzip, deflate, br") == ("application/msgpack", "br")
+    assert negotiate("application/json, application/x-msgpack;q=0.5", "br;q=0, gzip") == ("application/json", "gzip")
+    assert negotiate("*/*", "identity") == ("application/json", None)
+
+
+def test_slim_history_stores_repeated_fields_once():
+    history = synthetic_history(4, 50)
+    history[2]["results"]["execution_result"]["error"] = "warning: slow convergence"
+    slim = slim_history(history)
+
+    # Text that does not change between iterations is only in the first entry
+    assert "simulation_script" not in slim[1]["patch"]["results"]
+    assert slim[1]["patch"]["parameters"] == {"thickness": history[1]["parameters"]["thickness"]}
+    assert len(json.dumps(slim)) < len(json.dumps(history))
+
+    expanded = expand_history(json.loads(json.dumps(slim)))
+    assert expanded[:3] == history[:3]
+    # The error going back to null is a removed key in the patch
+    assert "error" not in expanded[3]["results"]["execution_result"]
+    expanded[3]["results"]["execution_result"]["error"] = None
+    assert expanded[3] == history[3]
+
+
+def test_run_optimization_is_compressed_and_encoded_as_requested(monkeypatch):
+    calls = []
+
+    async def fake_workflow(*args, **kwargs):
+        calls.append(args)
+        history = synthetic_history(3, 200)
+        return {"status": "failed", "message": "not met", "history_mode": args[-1],
+                "history": slim_history(history) if args[-1] == "slim" else history}
+
+    monkeypatch.setattr(main, "run_optimization_workflow", fake_workflow)
+    client = TestClient(main.app)
+    body = {"provider": "mock", "model": "m", "problem": "beam", "initial_parameters": {"length": 2.0},
+            "solver_preference": "python", "optimization_goal": "max_deflection < 0.001"}
+
+    plain = client.post("/api/run-optimization", json=body, headers={"Accept-Encoding": "identity"})
+    assert plain.headers["content-type"] == "application/json"
+    assert "content-encoding" not in plain.headers
+    full = plain.json()
+
+    response = client.post("/api/run-optimization", json={**body, "history_mode": "slim"},
+                           headers={"Accept": "application/msgpack", "Accept-Encoding": "br"})
+    assert response.headers["content-type"] == "application/msgpack"
+    assert response.headers["content-encoding"] == "br"
+    # httpx decodes br itself when brotli is installed; msgpack is ours to read
+    slim = msgpack.unpackb(response.content)
+    assert slim["history_mode"] == "slim"
+    assert expand_history(slim["history"])[:2] == full["history"][:2]
+
+    raw = client.post("/api/run-optimization", json=body, headers={"Accept-Encoding": "gzip"})
+    assert raw.headers["content-encoding"] == "gzip"
+    assert raw.json() == full
+
+    rejected = client.post("/api/run-optimization", json={**body, "history_mode": "tiny"})
+    assert rejected.status_code == 400
+    assert len(calls) == 3
@@ -0,0 +1,49 @@
+import numpy as np
+
+from backend.isometric import junctions_from_segments, projection_matrix, reconstruct
+from backend.isometric_benchmark import aligned_error, synthetic_scene
+
+
+def test_reconstruct_recovers_synthetic_scene():
+    truth, points, edges = synthetic_scene(30, noise=0.0)
+    model = reconstruct(points, edges)
+
+    assert model.components == 1
+    assert np.all(model.axes >= 0)
+    assert aligned_error(model.vertices, truth, model.component) < 1e-6
+    assert np.allclose(model.vertices @ projection_matrix().T, points)
+
+
+def test_reconstruct_down_weights_contradicting_edges():
+    truth, points, edges = synthetic_scene(4, noise=0.1, seed=3)
+    # A junction on the X line through vertex 7 and the Z line through vertex 13:
+    # both edges look axis-parallel, but they cannot both be (the vertices differ in Y)
+    directions = projection_matrix()
+    s, t = np.linalg.solve(np.stack([directions[:, 0], -directions[:, 2]], axis=1), points[13] - points[7])
+    points = np.vstack([points, points[7] + s * directions[:, 0]])
+    edges = np.vstack([edges, [[7, 32], [13, 32]]])
+    assert truth[7, 1] != truth[13, 1]
+
+    plain = reconstruct(points, edges, robust_iterations=0)
+    robust = reconstruct(points, edges)
+
+    assert np.all(robust.axes >= 0)
+    assert robust.projection_rms < plain.projection_rms
+    error = aligned_error(robust.vertices[:32], truth, robust.component[:32])
+    assert error < 0.5 < aligned_error(plain.vertices[:32], truth, plain.component[:32])
+
+
+def test_junctions_from_segments_splits_t_junctions_and_joins_corners():
+    segments = np.array([
+        [0, 0, 100, 0],      # base
+        [50, 2, 50, 60],     # stands on the base: splits it
+        [-3, 1, -2, 60],     # meets the base's left end a few pixels off
+    ])
+    points, edges = junctions_from_segments(segments, tolerance=5.0)
+
+    assert len(points) == 5
+    assert len(edges) == 4
+    # Where the two lines meet, not the mean of the nearby ends
+    corner = points[np.argmin(np.hypot(*points.T))]
+    assert np.allclose(corner, [-3.017, 0.0], atol=0.01)
+    assert np.any(np.all(np.abs(points - [50, 0]) < 2.5, axis=1))
@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+
+from backend.chunking import NearDuplicateIndex, chunk_text, token_spans
+from backend.knowledge import KnowledgeBase
+from backend.knowledge_benchmark import synthetic_corpus
+
+
+def test_chunks_have_token_sizes_and_overlaps():
+    text = " ".join(f"Sentence {i} about beam number {i}." for i in range(300))
+    chunks = chunk_text(text, chunk_size=40, overlap=10)
+    sizes = [len(token_spans(chunk)) for chunk in chunks]
+
+    assert max(sizes) <= 40
+    assert all(chunk.endswith(".") for chunk in chunks)
+    # Each chunk starts with the last 10 tokens of the one before it
+    for previous, chunk in zip(chunks, chunks[1:]):
+        tail = previous[token_spans(previous)[-10, 0]:]
+        assert chunk.startswith(tail)
+    assert text.endswith(chunks[-1])
+    assert chunk_text("") == []
+
+
+def test_near_duplicates_are_found_across_documents():
+    corpus = synthetic_corpus(6, pages=2, reuploads=0.5, seed=3)
+    index = NearDuplicateIndex()
+    first = [index.add(chunk_text(text)) for text in corpus[:6]]
+    again = [index.add(chunk_text(text)) for text in corpus[6:]]
+
+    assert all(match is None for matches in first for match in matches)
+    found = sum(match is not None for matches in again for match in matches)
+    assert found >= 0.8 * sum(len(matches) for matches in again)
+    assert index.add(["Completely different words about heat flux in a copper rod."]) == [None]
+    assert index.add(["completely different WORDS about heat flux, in a copper rod"]) == [len(index) - 1]
+
+
+def test_repeated_chunks_are_not_embedded_again():
+    knowledge_base = KnowledgeBase(chunk_tokens=30, overlap_tokens=5)
+    document = " ".join(f"The beam {i} carries a load of {i} newtons at its tip." for i in range(40))
+
+    added = knowledge_base.add_document(document)
+    assert added["duplicates"] == 0
+    assert len(knowledge_base.chunks) == added["added"] == len(knowledge_base._index)
+
+    again = knowledge_base.add_document(document)
+    assert again == {"chunks": added["chunks"], "added": 0, "duplicates": added["chunks"]}
+    assert knowledge_base.get_relevant_chunks("beam 7 load", top_k=1)
+
+
+def test_a_failed_encode_does_not_mark_the_chunks_as_seen(monkeypatch):
+    knowledge_base = KnowledgeBase(chunk_tokens=30, overlap_tokens=5)
+    knowledge_base.add_document("A steel rod conducts heat from its hot end to its cold end.")
+    document = " ".join(f"The beam {i} carries a load of {i} newtons at its tip." for i in range(40))
+    encode = knowledge_base._model.encode
+
+    def failing_encode(*args, **kwargs):
+        raise RuntimeError("out of memory")
+
+    monkeypatch.setattr(knowledge_base._model, "encode", failing_encode)
+    with pytest.raises(RuntimeError):
+        knowledge_base.add_document(document)
+    assert len(knowledge_base._duplicates) == len(knowledge_base.chunks) == 1
+
+    monkeypatch.setattr(knowledge_base._model, "encode", encode)
+    added = knowledge_base.add_document(document)
+    assert added["added"] == added["chunks"] > 0 and added["duplicates"] == 0
+    assert len(knowledge_base.chunks) == len(knowledge_base._index) == len(knowledge_base._duplicates)
+
+
+def test_documents_added_from_several_threads_keep_chunks_and_embeddings_aligned(monkeypatch):
+    knowledge_base = KnowledgeBase(chunk_tokens=30, overlap_tokens=5)
+    encode = knowledge_base._model.encode
+    add = knowledge_base._index.add
+    delays = iter([0.05])
+
+    def slow_add(vectors):
+        # The first upload is slow to store its embeddings, so the others overtake it
+        time.sleep(next(delays, 0))
+        add(vectors)
+
+    monkeypatch.setattr(knowledge_base._index, "add", slow_add)
+    documents = [" ".join(f"Part {d} item {i} weighs {d * 100 + i} kilograms." for i in range(20)) for d in range(8)]
+    threads = [threading.Thread(target=knowledge_base.add_document, args=(document,)) for document in documents]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(knowledge_base.chunks) == len(knowledge_base._index) == len(knowledge_base._duplicates)
+    for i, chunk in enumerate(knowledge_base.chunks):
+        found, _ = knowledge_base._index.search(encode([chunk])[0], 1)
+        assert found[0] == i
@@ -0,0 +1,93 @@
+import asyncio
+import stat
+import sys
+import textwrap
+
+import pytest
+
+from backend.latex_compiler import LatexCompiler, LatexTimeoutError
+
+# Mimics pdflatex: writes report.aux/report.pdf, fails on \error, hangs on \hang.
+# The .aux only changes when the document's labels change, like the real thing.
+FAKE_ENGINE = textwrap.dedent("""\
+    #!{python}
+    import re, sys, time
+    source = open("report.tex").read()
+    with open("passes.log", "a") as f:
+        f.write("pass\\n")
+    if "\\\\hang" in source:
+        time.sleep(30)
+    if "\\\\error" in source:
+        # A failed pass leaves a truncated .aux behind
+        with open("report.aux", "w") as f:
+            f.write("\\\\relax")
+        print("./report.tex:3: Undefined control sequence.")
+        print("l.3 \\\\error")
+        sys.exit(1)
+    aux = "".join(sorted(re.findall(r"\\\\label\\{{[^}}]*\\}}", source)))
+    with open("report.aux", "w") as f:
+        f.write(aux)
+    with open("report.pdf", "w") as f:
+        f.write("%PDF " + source)
+""")
+
+
+@pytest.fixture
+def compiler(tmp_path):
+    engine = tmp_path / "pdflatex"
+    engine.write_text(FAKE_ENGINE.format(python=sys.executable))
+    engine.chmod(engine.stat().st_mode | stat.S_IEXEC)
+    return LatexCompiler(engine_path=str(engine), cache_dir=str(tmp_path / "cache"), timeout=2)
+
+
+def test_compile_is_cached_and_incremental_across_fixes(compiler):
+    source = "\\documentclass{article}\\begin{document}\\section{A}\\label{a}\\end{document}"
+
+    async def run():
+        first = await compiler.compile(source, session_id="report-1")
+        again = await compiler.compile(source, session_id="report-1")
+        broken = await compiler.compile(source + "\\error", session_id="report-1")
+        fixed = await compiler.compile(source.replace("\\section{A}", "\\section{B}"), session_id="report-1")
+        return first, again, broken, fixed
+
+    first, again, broken, fixed = asyncio.run(run())
+
+    assert first.success and first.passes == 2
+    assert again.cached and again.pdf_path == first.pdf_path
+    assert not broken.success
+    assert broken.errors[0].startswith("./report.tex:3: Undefined control sequence.")
+    # The .aux of the last good pass is restored after the failure, so the fix needs a single pass
+    assert fixed.success and fixed.passes == 1
+    with open(fixed.pdf_path) as f:
+        assert "\\section{B}" in f.read()
+
+
+def test_unchanged_labels_need_a_single_pass(compiler):
+    source = "\\begin{document}\\label{a}TEXT\\end{document}"
+
+    async def run():
+        await compiler.compile(source.replace("TEXT", "draft"), session_id="s")
+        return await compiler.compile(source.replace("TEXT", "final"), session_id="s")
+
+    assert asyncio.run(run()).passes == 1
+
+
+def test_hard_timeout_and_input_validation(compiler):
+    with pytest.raises(LatexTimeoutError):
+        asyncio.run(compiler.compile("\\hang"))
+    with pytest.raises(ValueError):
+        asyncio.run(compiler.compile("x", session_id="../escape"))
+    with pytest.raises(ValueError):
+        asyncio.run(compiler.compile("x", figures={"../plot.png": __file__}))
+    with pytest.raises(ValueError):
+        asyncio.run(compiler.compile("x", figures={"Report.pdf": __file__}))
+
+
+def test_figures_are_copied_into_the_working_directory(compiler, tmp_path):
+    figure = tmp_path / "plot.png"
+    figure.write_bytes(b"png")
+    result = asyncio.run(compiler.compile("\\includegraphics{plot.png}", figures={"plot.png": str(figure)}))
+
+    assert result.success
+    # A hard link would let anything written in the working directory reach the caller's file
+    assert figure.stat().st_nlink == 1 and figure.read_bytes() == b"png"
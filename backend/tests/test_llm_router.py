@@ -0,0 +1,133 @@
+import asyncio
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.modules['matlab'] = MagicMock()
+sys.modules['matlab.engine'] = MagicMock()
+
+from backend.llm_router import LLMRouter
+from backend.main import app, call_openai_api
+
+
+class FakeProviders:
+    """Local providers whose latency and failures are set per target."""
+    def __init__(self, latencies, failing=()):
+        self.latencies = latencies
+        self.failing = set(failing)
+        self.started = []
+        self.cancelled = []
+
+    async def __call__(self, provider, model, prompt):
+        target = f"{provider}/{model}"
+        self.started.append(target)
+        try:
+            await asyncio.sleep(self.latencies[target])
+        except asyncio.CancelledError:
+            self.cancelled.append(target)
+            raise
+        if target in self.failing:
+            raise RuntimeError(f"{target} failed")
+        return target
+
+
+def _router(**kwargs):
+    settings = {"min_samples": 2, "min_hedge_delay": 0.01, "initial_hedge_delay": 0.05}
+    settings.update(kwargs)
+    return LLMRouter(**settings)
+
+
+def test_routes_to_fastest_target_after_measuring():
+    router = _router(hedge=False)
+    providers = FakeProviders({"a/slow": 0.05, "b/fast": 0.01})
+
+    async def run():
+        for _ in range(3):
+            await router.route("a/slow,b/fast", "p", providers)
+        return await router.route("a/slow,b/fast", "p", providers)
+
+    assert asyncio.run(run()) == "b/fast"
+    assert router.rank([("a", "slow"), ("b", "fast")]) == [("b", "fast"), ("a", "slow")]
+
+
+def test_hedges_slow_primary_and_cancels_the_loser():
+    router = _router()
+    # History says a/usually-fast answers in ~10 ms, but this time it hangs
+    for _ in range(5):
+        router._record(("a", "usually-fast"), 0.01, ok=True)
+        router._record(("b", "backup"), 0.03, ok=True)
+    providers = FakeProviders({"a/usually-fast": 5.0, "b/backup": 0.01})
+
+    async def run():
+        started = asyncio.get_running_loop().time()
+        result = await router.route("a/usually-fast,b/backup", "p", providers)
+        return result, asyncio.get_running_loop().time() - started
+
+    result, elapsed = asyncio.run(run())
+    assert result == "b/backup"
+    assert elapsed < 1.0
+    assert providers.cancelled == ["a/usually-fast"]
+
+
+def test_fails_over_and_marks_failing_target_unhealthy():
+    router = _router(hedge=False, max_consecutive_failures=2, cooldown=60)
+    providers = FakeProviders({"a/broken": 0.0, "b/ok": 0.0}, failing={"a/broken"})
+
+    async def run():
+        return [await router.route("a/broken,b/ok", "p", providers) for _ in range(3)]
+
+    assert asyncio.run(run()) == ["b/ok"] * 3
+    # After two failures a/broken is cooling down and no longer tried first
+    assert providers.started.count("a/broken") == 2
+    assert not router.is_healthy(("a", "broken"))
+
+
+def test_all_targets_failing_raises_last_error():
+    router = _router(hedge=False)
+    providers = FakeProviders({"a/x": 0.0, "b/y": 0.0}, failing={"a/x", "b/y"})
+    with pytest.raises(RuntimeError):
+        asyncio.run(router.route("a/x,b/y", "p", providers))
+
+
+def test_invalid_target_spec():
+    with pytest.raises(ValueError):
+        _router().parse_targets("gemini")
+    with pytest.raises(ValueError):
+        _router().parse_targets("mock/m,auto/auto")
+
+
+def test_auto_provider_routes_between_mock_models():
+    router = _router(initial_hedge_delay=0.05)
+    with patch("backend.main.llm_router", router), patch("backend.main.load_prompt", return_value="Problem: beam"):
+        response = TestClient(app).post("/api/call-ai", json={
+            "provider": "auto", "model": "mock/mock-2000ms,mock/mock-10ms", "task": "modeling", "data": {},
+        })
+    assert response.status_code == 200
+    # The first target was hedged after 50 ms and the second answered
+    assert router.stats_for(("mock", "mock-10ms")).latencies
+    assert not router.stats_for(("mock", "mock-2000ms")).latencies
+
+
+def test_cancelled_provider_request_is_aborted():
+    aborted = []
+
+    async def slow_post(self, url, **kwargs):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            aborted.append(url)
+            raise
+
+    async def run():
+        task = asyncio.create_task(call_openai_api("gpt", "p"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    with patch("httpx.AsyncClient.post", slow_post):
+        asyncio.run(run())
+    # Cancelling a hedged loser stops its HTTP request rather than only the wait for it
+    assert aborted == ["https://api.openai.com/v1/chat/completions"]
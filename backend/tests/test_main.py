@@ -8,6 +8,7 @@ import sys
 sys.modules['matlab'] = MagicMock()
 sys.modules['matlab.engine'] = MagicMock()
 
+from backend.llm_router import LLMRouter
 from backend.main import app, load_prompt, AppError, ErrorCodes
 
 client = TestClient(app)
@@ -65,6 +66,23 @@ def test_test_connection_failure(mock_get):
     assert json_response["error_code"] == ErrorCodes.AI_API_ERROR
     assert "Connection to openai failed" in json_response["message"]
 
+@patch('requests.get')
+def test_test_connection_auto_probes_the_routing_targets(mock_get):
+    """ "auto" is usable while one of the configured targets is reachable. """
+    def get(url, timeout):
+        if "openai" in url:
+            raise requests.exceptions.RequestException("Test error")
+    mock_get.side_effect = get
+    router = LLMRouter(targets=[("google", "gemini"), ("openai", "gpt"), ("google", "flash")])
+    with patch("backend.main.llm_router", router):
+        response = client.post("/api/test-connection", json={"provider": "auto"})
+        assert response.status_code == 200
+        assert response.json()["message"] == "Connected to google. Unreachable targets are skipped: openai."
+        assert mock_get.call_count == 2
+        router.targets = [("openai", "gpt")]
+        response = client.post("/api/test-connection", json={"provider": "auto"})
+    assert response.status_code == 400 and response.json()["error_code"] == ErrorCodes.AI_API_ERROR
+
 def test_test_connection_invalid_provider():
     """ Tests the case of an invalid provider. """
     response = client.post("/api/test-connection", json={"provider": "invalid_provider"})
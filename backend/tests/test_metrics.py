@@ -0,0 +1,40 @@
+import sys
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+sys.modules['matlab'] = MagicMock()
+sys.modules['matlab.engine'] = MagicMock()
+
+from backend import metrics
+from backend.main import app
+
+client = TestClient(app)
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = metrics.Registry()
+    with patch.object(metrics, "REGISTRY", registry):
+        histogram = metrics.Histogram("test_seconds", "Test histogram.", ["stage"], buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="a")
+    histogram.observe(0.5, stage="a")
+    histogram.observe(5, stage="a")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE test_seconds histogram" in lines
+    assert 'test_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="a",le="1"} 2' in lines
+    assert 'test_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{stage="a"} 3' in lines
+
+
+def test_metrics_endpoint_reports_llm_calls_and_routes():
+    before = metrics.LLM_REQUEST_SECONDS.count(provider="google", model="m", status="ok")
+    with patch("backend.main.load_prompt", return_value="ping"), patch("backend.main.call_gemini_api", return_value="pong"):
+        response = client.post("/api/call-ai", json={"provider": "google", "model": "m", "task": "modeling", "data": {}})
+    assert response.json() == {"response": "pong"}
+    assert metrics.LLM_REQUEST_SECONDS.count(provider="google", model="m", status="ok") == before + 1
+
+    body = client.get("/metrics").text
+    assert "# TYPE llm_request_duration_seconds histogram" in body
+    assert 'http_request_duration_seconds_count{method="POST",route="/api/call-ai"' in body
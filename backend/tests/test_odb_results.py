@@ -0,0 +1,81 @@
+import json
+import stat
+import sys
+
+import numpy as np
+import pytest
+
+from backend.AbaqusAgent import AbaqusAgent
+from backend.odb_results import OutputRequest, extract_results, open_result_file, summarize_results
+
+
+def write_fixture(path, n_frames=4):
+    with open(path, "w") as f:
+        f.write(json.dumps({
+            "format": "odb-fixture",
+            "sets": {"TIP": [3]},
+            "history": {"Step-1": {"Node ASSEMBLY.3": {"U2": [[0.0, 0.0], [0.5, -0.05], [1.0, -0.1]]}}},
+        }) + "\n")
+        for i in range(n_frames):
+            t = i / (n_frames - 1)
+            f.write(json.dumps({
+                "step": "Step-1", "frame": i, "time": t,
+                "fields": {
+                    "S": {"labels": [1, 2, 3], "components": ["MISES"], "values": [[10 * t], [20 * t], [5 * t]]},
+                    "U": {"labels": [1, 2, 3], "components": ["U1", "U2"], "values": [[0, 0], [0, -0.05 * t], [0.03 * t, -0.04 * t]]},
+                },
+            }) + "\n")
+
+
+def test_extract_field_and_history_outputs(tmp_path):
+    fixture = tmp_path / "beam.odb"
+    write_fixture(fixture)
+    requests = [
+        OutputRequest("max_mises", "S", "MISES"),
+        OutputRequest("tip_u2", "U", "U2", region="tip", reduction="values"),
+        OutputRequest("max_u", "U", "MAGNITUDE", frame_stride=3),
+        OutputRequest("tip_history", "U2", region="Node ASSEMBLY.3", kind="history"),
+    ]
+    results = extract_results(open_result_file(str(fixture)), requests)
+
+    np.testing.assert_allclose(results["max_mises"], [0, 20 / 3, 40 / 3, 20], rtol=1e-6)
+    assert results["max_mises"].dtype == np.float32
+    np.testing.assert_allclose(results["tip_u2"][:, 0], [0, -0.04 / 3, -0.08 / 3, -0.04], rtol=1e-6)
+    np.testing.assert_allclose(results["max_u_time"], [0, 1])
+    np.testing.assert_allclose(results["max_u"], [0, 0.05], rtol=1e-6)
+    np.testing.assert_allclose(results["tip_history"], [0, -0.05, -0.1])
+    assert "max_mises: final=20" in summarize_results(results)
+
+
+def test_unknown_region_is_an_error_rather_than_no_data(tmp_path):
+    fixture = tmp_path / "beam.odb"
+    write_fixture(fixture)
+    with pytest.raises(KeyError, match="TIPP"):
+        extract_results(open_result_file(str(fixture)), [OutputRequest("tip_u2", "U", "U2", region="TIPP")])
+    # A variable missing from some frames is still skipped in those frames
+    results = extract_results(open_result_file(str(fixture)), [OutputRequest("max_e", "E", "E11")])
+    assert results["max_e"].size == 0
+
+
+def test_unknown_reduction_is_rejected():
+    with pytest.raises(ValueError):
+        OutputRequest("bad", "S", reduction="median")
+
+
+def test_parse_odb_runs_extraction_under_abaqus_python(tmp_path):
+    fake_abaqus = tmp_path / "abaqus"
+    fake_abaqus.write_text(
+        f"#!{sys.executable}\n"
+        "import subprocess, sys\n"
+        "assert sys.argv[1] == 'python'\n"
+        f"sys.exit(subprocess.call([{sys.executable!r}] + sys.argv[2:]))\n"
+    )
+    fake_abaqus.chmod(fake_abaqus.stat().st_mode | stat.S_IEXEC)
+    script = tmp_path / "beam.py"
+    write_fixture(tmp_path / "beam.odb")
+
+    result = AbaqusAgent(abaqus_path=str(fake_abaqus)).collect_results(str(script))
+
+    assert result.success, result.error
+    assert result.data["max_mises"][-1] == pytest.approx(20)
+    assert "max_displacement" in result.output
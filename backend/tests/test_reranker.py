@@ -0,0 +1,77 @@
+import threading
+
+import numpy as np
+
+from backend.knowledge import KnowledgeBase
+from backend.reranker import CrossEncoderReranker
+
+
+class WordOverlapModel:
+    """Scores a pair by the words the query and chunk share; can be held back to exceed the budget."""
+    def __init__(self):
+        self.pairs = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.release.wait(5)
+        self.pairs.extend(pairs)
+        return np.array([len(set(q.split()) & set(c.split())) for q, c in pairs], dtype=np.float32)
+
+
+def make_reranker(**kwargs) -> CrossEncoderReranker:
+    reranker = CrossEncoderReranker("fake", **kwargs)
+    reranker._model = WordOverlapModel()
+    return reranker
+
+
+def test_candidates_are_reordered_in_batches_and_scores_cached():
+    reranker = make_reranker(batch_size=2, budget_seconds=5)
+    chunks = ["steel beam", "heat flux in a rod", "cantilever beam tip load", "rod", "beam"]
+
+    order, reranked = reranker.rerank("cantilever beam load", chunks, 3)
+    assert reranked
+    assert order == [2, 0, 4]
+    assert len(reranker.model.pairs) == 5
+
+    # Only the new chunk is scored the second time
+    order, reranked = reranker.rerank("cantilever beam load", chunks + ["load"], 2)
+    assert order == [2, 0]
+    assert len(reranker.model.pairs) == 6
+
+
+def test_over_budget_queries_keep_the_first_stage_order():
+    reranker = make_reranker(budget_seconds=0.05)
+    reranker.model.release.clear()
+    chunks = ["rod", "beam", "cantilever beam tip"]
+
+    order, reranked = reranker.rerank("cantilever beam", chunks, 2)
+    assert not reranked
+    assert order == [0, 1]
+
+    # The late scores are cached, so asking again is answered without the model
+    reranker.model.release.set()
+    reranker._executor.shutdown(wait=True)
+    assert reranker.rerank("cantilever beam", chunks, 2) == ([2, 1], True)
+
+
+def test_knowledge_base_reranks_its_candidates():
+    knowledge_base = KnowledgeBase(chunk_tokens=12, overlap_tokens=0,
+                                   reranker=make_reranker(budget_seconds=5), rerank_candidates=10)
+    knowledge_base.add_document(" ".join(f"Section {i} covers topic number {i} only." for i in range(8))
+                                + " The cantilever beam deflection under tip load is P L^3 / 3 E I.")
+
+    chunks = knowledge_base.get_relevant_chunks("cantilever beam deflection tip load", top_k=1)
+    assert len(chunks) == 1 and chunks[0].startswith("The cantilever beam deflection")
+
+
+def test_batches_not_started_within_the_budget_are_dropped():
+    reranker = make_reranker(batch_size=1, workers=1, budget_seconds=0.05)
+    reranker.model.release.clear()
+    chunks = ["rod", "beam", "cantilever beam tip", "tip"]
+
+    assert reranker.rerank("cantilever beam", chunks, 2) == ([0, 1], False)
+    reranker.model.release.set()
+    reranker._executor.shutdown(wait=True)
+    # Only the batch that was running when the budget ran out was scored
+    assert len(reranker.model.pairs) == 1
@@ -0,0 +1,107 @@
+import asyncio
+import sys
+from unittest.mock import MagicMock, patch
+
+sys.modules['matlab'] = MagicMock()
+sys.modules['matlab.engine'] = MagicMock()
+
+from backend import main  # noqa: F401 (imports workflow, which needs main first)
+from backend.agents import ExecutionResult
+from backend.script_checks import extract_code, validate_script
+from backend.workflow import run_script_with_fixes
+
+GOOD_SCRIPT = """
+import numpy as np
+from sandbox_results import emit
+
+def deflection(load):
+    return load * params["length"] ** 3 / (3 * params["E"] * params.get("I", 1.0))
+
+x = np.linspace(0, 1, 10)
+emit("tip", deflection(params["load"]))
+"""
+
+
+def kinds(code, params=None):
+    return [problem.kind for problem in validate_script(code, params)]
+
+
+def test_plausible_script_passes():
+    assert validate_script(GOOD_SCRIPT, {"length": 2.0, "E": 200e9, "load": 1000}) == []
+
+
+def test_trivial_failures_are_found_with_their_lines():
+    assert kinds("x = (1,\n") == ["syntax"]
+    assert kinds("import tensorflow\nimport os.path\n") == ["import"]
+    problems = validate_script("y = np.zeros(3)\nz = np.ones(2)\n")
+    assert [(p.kind, p.line) for p in problems] == [("name", 1)]
+    problems = validate_script(GOOD_SCRIPT, {"length": 2.0, "load": 1000})
+    assert [(p.kind, p.line) for p in problems] == [("params", 6)]
+
+
+def test_imports_follow_the_sandbox_image():
+    assert kinds("import sys, abc, heapq, bisect, operator, logging\nimport scipy.integrate\n") == []
+    # Not installed by Dockerfile.sandbox
+    assert kinds("import pandas as pd\n") == ["import"]
+
+
+def test_standard_library_is_the_sandbox_python_version():
+    assert kinds("import tomllib\n") == ["import"]
+    assert kinds("import imp, asyncore, distutils.core\n") == []
+
+
+def test_guarded_imports_star_imports_and_own_params_are_not_reported():
+    assert kinds("try:\n    import numba\nexcept ImportError:\n    numba = None\n") == []
+    assert kinds("from numpy import *\ny = zeros(3)\n") == []
+    assert kinds("params = {'a': 1}\nprint(params['b'])\n", {"a": 1}) == []
+
+
+def test_code_is_taken_from_the_longest_fenced_block():
+    answer = "Here:\n```python\nprint(1)\n```\nand\n```python\nx = 1\nprint(x)\n```\n"
+    assert extract_code(answer) == "x = 1\nprint(x)\n"
+    assert extract_code("print(1)\n") == "print(1)\n"
+
+
+class FakeAgent:
+    def __init__(self, results):
+        self.results = list(results)
+        self.scripts = []
+
+    def run(self, script, parameters, data_filepath=None):
+        self.scripts.append(script)
+        return self.results.pop(0)
+
+
+def run_loop(first_script, fixes, agent, max_attempts=3):
+    prompts = []
+
+    async def fake_ai(provider, model, prompt):
+        prompts.append(prompt)
+        return fixes.pop(0)
+
+    with patch("backend.workflow.call_ai_provider", fake_ai):
+        fixed = asyncio.run(run_script_with_fixes("mock", "m", first_script, {"load": 1}, None, max_attempts, agent))
+    return fixed, prompts
+
+
+def test_fix_loop_rejects_before_the_sandbox_and_reports_attempts():
+    agent = FakeAgent([ExecutionResult(False, "", "ZeroDivisionError: division by zero"),
+                       ExecutionResult(True, "ok", "")])
+    fixes = ["```python\nprint(params['load'] / 0)\n```", "print(params['load'])\n"]
+    fixed, prompts = run_loop("print(np.pi)\n", fixes, agent)
+
+    report = fixed["report"]
+    assert fixed["execution_result"].success and fixed["script"] == "print(params['load'])\n"
+    assert [(a["stage"], a["success"]) for a in report["attempts"]] == [
+        ("validation", False), ("execution", False), ("execution", True)]
+    assert report["sandbox_runs"] == 2 and report["rejected_before_sandbox"] == 1
+    assert agent.scripts == ["print(params['load'] / 0)\n", "print(params['load'])\n"]
+    assert "name 'np' is not defined" in prompts[0] and "ZeroDivisionError" in prompts[1]
+
+
+def test_fix_loop_stops_at_the_attempt_limit():
+    agent = FakeAgent([])
+    fixed, prompts = run_loop("import torch\n", ["import torch\n"], agent, max_attempts=2)
+    assert not fixed["execution_result"].success
+    assert "torch" in fixed["execution_result"].error
+    assert fixed["report"]["attempt_count"] == 2 and len(prompts) == 1 and agent.scripts == []
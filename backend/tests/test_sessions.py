@@ -0,0 +1,118 @@
+import json
+import sys
+from unittest.mock import MagicMock
+
+sys.modules['matlab'] = MagicMock()
+sys.modules['matlab.engine'] = MagicMock()
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import main
+from backend.sessions import SessionNotFound, SessionStore, VersionConflict, merge_patch
+
+
+def test_history_json_matches_json_dumps_and_patches_apply(tmp_path):
+    store = SessionStore(str(tmp_path))
+    session = store.create()
+    store.put_step(session.id, "step-model", {"computational_result": "model \"A\"\nline 2", "citations": []})
+    store.put_step(session.id, "step-execute", {"computational_result": {"output": "ok", "data": {"w": [1.5, 2]}}})
+
+    assert session.history_json() == json.dumps(session.history(), indent=2)
+    assert session.history_json(["step-execute", "missing"]) == json.dumps(session.history(["step-execute"]), indent=2)
+
+    step = store.patch_step(session.id, "step-execute", {"computational_result": {"output": None, "data": {"w": [3]}}},
+                            expected_version=1)
+    assert step.version == 2
+    assert step.data == {"computational_result": {"data": {"w": [3]}}}
+    with pytest.raises(VersionConflict):
+        store.put_step(session.id, "step-execute", {}, expected_version=1)
+    assert merge_patch({"a": 1, "b": {"c": 2}}, {"b": {"c": None, "d": 3}}) == {"a": 1, "b": {"d": 3}}
+
+
+def test_sessions_over_the_memory_budget_spill_to_disk(tmp_path):
+    store = SessionStore(str(tmp_path), max_memory_bytes=5000)
+    sessions = [store.create() for _ in range(3)]
+    for session in sessions:
+        store.put_step(session.id, "step-model", {"computational_result": "x" * 2000})
+
+    # The least recently used session went to disk
+    assert store.memory_bytes <= 5000
+    assert (tmp_path / f"{sessions[0].id}.json").exists()
+
+    restored = store.get(sessions[0].id)
+    assert restored.steps["step-model"].data["computational_result"] == "x" * 2000
+    assert store.memory_bytes <= 5000
+    with pytest.raises(SessionNotFound):
+        store.get("0" * 32)
+
+
+def test_sessions_spilled_on_shutdown_survive_a_restart(tmp_path):
+    store = SessionStore(str(tmp_path))
+    session = store.create()
+    store.put_step(session.id, "step-model", {"computational_result": "model"})
+    store.spill_all()
+
+    restarted = SessionStore(str(tmp_path))
+    assert restarted.get(session.id).steps["step-model"].data == {"computational_result": "model"}
+
+
+def test_step_endpoints_take_their_inputs_from_the_session(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "session_store", SessionStore(str(tmp_path)))
+    prompts = []
+
+    async def fake_ai(provider, model, prompt):
+        prompts.append(prompt)
+        return f"response {len(prompts)}"
+
+    monkeypatch.setattr(main, "call_ai_provider", fake_ai)
+    monkeypatch.setattr(main.knowledge_base_instance, "get_relevant_chunks", lambda query: [])
+    client = TestClient(main.app)
+    session_id = client.post("/api/sessions").json()["session_id"]
+    ai = {"provider": "mock", "model": "m", "session_id": session_id}
+
+    model = client.post("/api/step/model", json={**ai, "problem": "beam", "parameters": {"L": 2}}).json()
+    assert model["session"] == {"session_id": session_id, "step": "step-model", "version": 1}
+
+    script = client.post("/api/step/generate-script", json={**ai, "parameters": {"L": 2}}).json()
+    assert "Modeling Result:\nresponse 1\n" in prompts[2]
+    assert script["computational_result"] == "response 3"
+
+    # The user's edit of the model step goes up as a patch
+    patched = client.patch(f"/api/sessions/{session_id}/steps/step-model",
+                           json={"patch": {"computational_result": "edited"}, "expected_version": 1})
+    assert patched.json()["version"] == 2
+    stale = client.patch(f"/api/sessions/{session_id}/steps/step-model",
+                         json={"patch": {"ai_review": "x"}, "expected_version": 1})
+    assert stale.json()["error_code"] == main.ErrorCodes.SESSION_CONFLICT
+
+    client.post("/api/step/synthesize", json=ai)
+    history = client.get(f"/api/sessions/{session_id}", params={"include_data": True}).json()["history"]
+    expected = {name: history[name] for name in ("step-model", "step-generate-script")}
+    assert prompts[-1].endswith("history:\n" + json.dumps(expected, indent=2))
+    assert history["step-synthesize"]["synthesis_report"] == f"response {len(prompts)}"
+
+    missing = client.post("/api/step/synthesize", json={**ai, "session_id": "f" * 32})
+    assert missing.json()["error_code"] == main.ErrorCodes.SESSION_NOT_FOUND
+
+
+def test_unknown_session_fails_before_the_llm_is_called(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "session_store", SessionStore(str(tmp_path)))
+    prompts = []
+
+    async def fake_ai(provider, model, prompt):
+        prompts.append(prompt)
+        return "response"
+
+    monkeypatch.setattr(main, "call_ai_provider", fake_ai)
+    monkeypatch.setattr(main.knowledge_base_instance, "get_relevant_chunks", lambda query: [])
+    client = TestClient(main.app)
+    ai = {"provider": "mock", "model": "m", "session_id": "f" * 32}
+
+    responses = [
+        client.post("/api/step/model", json={**ai, "problem": "beam", "parameters": {"L": 2}}),
+        client.post("/api/step/generate-script", json={**ai, "modeling_result": "model", "parameters": {"L": 2}}),
+        client.post("/api/step/synthesize", json={**ai, "history": {"step-model": "model"}}),
+    ]
+    assert [r.json()["error_code"] for r in responses] == [main.ErrorCodes.SESSION_NOT_FOUND] * 3
+    assert prompts == []
@@ -0,0 +1,160 @@
+import asyncio
+import sys
+from unittest.mock import MagicMock, patch
+
+sys.modules['matlab'] = MagicMock()
+sys.modules['matlab.engine'] = MagicMock()
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from scipy.integrate import solve_ivp
+
+from backend import main
+from backend.benchmark import PARAMETERS, PROBLEM
+from backend.mock_provider import SIMULATION_SCRIPT
+from backend.solvers import match_solver, run_builtin
+from backend.workflow import run_engineering_workflow
+
+BEAM = {"L": 2.0, "E": 200e9, "I": 4e-6}
+
+
+def solve(parameters, problem=""):
+    match = match_solver(parameters, problem)
+    assert match is not None
+    result = run_builtin(match)
+    assert result.success, result.error
+    return result.data
+
+
+def test_cantilever_matches_the_benchmark_script():
+    emitted = {}
+    exec(SIMULATION_SCRIPT, {"params": PARAMETERS, "emit": emitted.__setitem__})
+    data = solve(PARAMETERS, PROBLEM)
+    np.testing.assert_allclose(data["deflection"], emitted["deflection"])
+    assert data["max_deflection"] == pytest.approx(emitted["max_deflection"])
+
+
+@pytest.mark.parametrize("support, load, expected", [
+    ("cantilever", "F", -1 / 3), ("simply_supported", "F", -1 / 48), ("fixed_fixed", "F", -1 / 192),
+    ("cantilever", "q", -1 / 8), ("simply_supported", "q", -5 / 384), ("fixed_fixed", "q", -1 / 384),
+])
+def test_beam_handbook_deflections(support, load, expected):
+    data = solve({**BEAM, load: 1000.0, "support": support})
+    power = 3 if load == "F" else 4
+    assert data["max_deflection"] == pytest.approx(expected * 1000.0 * 2.0 ** power / (200e9 * 4e-6))
+
+
+@pytest.mark.parametrize("support", ["cantilever", "simply_supported", "fixed_fixed"])
+def test_off_centre_point_loads_are_smooth_and_superpose(support):
+    point = solve({**BEAM, "F": 500.0, "a": 0.6, "support": support, "n_points": 2001})["deflection"]
+    # Supported ends do not deflect, clamped ones do not turn, and the slope is continuous under the load
+    slope = np.diff(point) / 0.001
+    assert point[0] == 0 and (support == "cantilever" or abs(point[-1]) < 1e-18)
+    assert abs(slope[0]) < 1e-2 * np.abs(slope).max() or support == "simply_supported"
+    assert abs(slope[600] - slope[599]) < 1e-2 * np.abs(slope).max()
+    uniform = solve({**BEAM, "q": 300.0, "support": support, "n_points": 2001})["deflection"]
+    both = solve({**BEAM, "F": 500.0, "a": 0.6, "q": 300.0, "support": support, "n_points": 2001})["deflection"]
+    np.testing.assert_allclose(both, point + uniform)
+
+
+def test_matcher_needs_every_parameter_understood_and_a_single_support():
+    assert match_solver({**BEAM, "F": 1.0}, "A simply supported beam").variant == "simply_supported"
+    assert match_solver({**BEAM, "F": 1.0, "problem_type": "beam_fixed_fixed"}).variant == "fixed_fixed"
+    assert match_solver({**BEAM, "F": 1.0}, "A beam") is None
+    assert match_solver({**BEAM, "F": 1.0}, "A cantilever, or a simply supported beam") is None
+    assert match_solver({**BEAM, "F": 1.0, "rho": 7850}, "A cantilever") is None
+    assert match_solver({**BEAM, "F": "heavy"}, "A cantilever") is None
+    assert match_solver({"m": 1.0, "k": 4.0, "problem_type": "beam"}) is None
+
+
+@pytest.mark.parametrize("problem", [
+    "A propped cantilever beam (fixed at A, roller at B) carries a point load F at mid-span.",
+    "A cantilever beam on an elastic foundation is loaded by a point force F at the free end.",
+    "A tapered cantilever beam is loaded by a point force F at the free end.",
+])
+def test_other_problems_with_a_support_phrase_are_not_solved_from_the_text(problem):
+    parameters = {"length": 2, "E": 2e11, "I": 1e-6, "F": 1000}
+    assert match_solver(parameters, problem) is None
+    # An explicit support is trusted
+    assert match_solver({**parameters, "support": "cantilever"}, problem).variant == "cantilever"
+
+
+@pytest.mark.parametrize("parameters, problem", [
+    ({"thickness": 0.01, "T0": 100, "T1": 20, "k": 50}, "Radial conduction through a pipe wall with convection"),
+    ({"L": 1.0, "T0": 100, "T1": 20}, "A rod with an insulated end and a fixed temperature at the other"),
+    ({"mass": 1, "stiffness": 4}, "Large-amplitude pendulum with a torsional spring"),
+    ({"m": 2, "k": 800, "c": 3}, "A mass on a spring sliding with Coulomb friction"),
+])
+def test_other_heat_and_vibration_problems_are_not_solved(parameters, problem):
+    assert match_solver(parameters, problem) is None
+    # The canonical problems, and an explicit problem type, still match
+    name = "heat_conduction" if "T0" in parameters else "spring_mass"
+    assert match_solver({**parameters, "problem_type": name}, problem).name == name
+    canonical = {"heat_conduction": "Steady conduction through a plane wall with fixed face temperatures.",
+                 "spring_mass": "Free vibration of a damped mass-spring system released from rest."}[name]
+    assert match_solver(parameters, canonical).name == name
+
+
+def test_steady_and_transient_conduction():
+    steady = solve({"L": 0.5, "k": 20.0, "T_left": 300.0, "T_right": 350.0, "q_gen": 1e5})
+    assert steady["max_temperature"] == pytest.approx(482.25)
+    # Heat generated in the slab leaves through both faces
+    assert steady["heat_flux"][-1] - steady["heat_flux"][0] == pytest.approx(1e5 * 0.5)
+
+    parameters = {"L": 1.0, "T0": 0.0, "T1": 100.0, "alpha": 1e-2, "T_initial": 20.0, "t": 5.0, "n_points": 51}
+    transient = solve(parameters)["temperature"]
+    # Method of lines on the same grid
+    x = np.linspace(0, 1.0, 51)
+    dx = x[1] - x[0]
+
+    def rhs(t, u):
+        full = np.concatenate([[0.0], u, [100.0]])
+        return 1e-2 * (full[2:] - 2 * full[1:-1] + full[:-2]) / dx ** 2
+
+    reference = solve_ivp(rhs, (0, 5.0), np.full(49, 20.0), method="BDF", rtol=1e-8, atol=1e-8).y[:, -1]
+    np.testing.assert_allclose(transient[1:-1], reference, atol=0.2)
+    late = solve({**parameters, "t": 1e4})["temperature"]
+    np.testing.assert_allclose(late, 100.0 * x, atol=1e-9)
+
+
+@pytest.mark.parametrize("c, F0, omega", [(0.0, 0.0, 0.0), (0.4, 2.0, 1.5), (4.0, 0.0, 0.0), (6.0, 1.0, 0.0),
+                                          (0.0, 1.0, 2.0)])
+def test_spring_mass_matches_numerical_integration(c, F0, omega):
+    m, k = 1.0, 4.0  # critical damping at c = 4
+    parameters = {"m": m, "k": k, "c": c, "x0": 0.1, "v0": -0.3, "F0": F0, "omega": omega, "t_end": 15.0}
+    data = solve(parameters)
+    reference = solve_ivp(lambda t, y: [y[1], (F0 * np.cos(omega * t) - c * y[1] - k * y[0]) / m],
+                          (0, 15.0), [0.1, -0.3], t_eval=data["t"], rtol=1e-10, atol=1e-12)
+    np.testing.assert_allclose(data["displacement"], reference.y[0], atol=1e-6)
+    assert data["natural_frequency"] == 2.0
+
+
+def test_workflow_skips_modeling_script_generation_and_the_sandbox():
+    prompts = []
+
+    async def fake_ai(provider, model, prompt):
+        prompts.append(prompt)
+        return "analysis"
+
+    with patch("backend.workflow.call_ai_provider", fake_ai), \
+            patch("backend.workflow.PythonAgent", side_effect=AssertionError("sandbox used")):
+        result = asyncio.run(run_engineering_workflow("mock", "m", PROBLEM, PARAMETERS, "python"))
+    # Only the emitted numbers are analysed, without a model call
+    assert prompts == [] and result["analysis_result"].startswith("Results of the built-in beam solver:")
+    assert result["builtin_solver"] == {"name": "beam", "variant": "cantilever"}
+    assert result["simulation_script"] is None
+    assert result["execution_result"]["data"]["max_deflection"] == pytest.approx(-1000.0 * 10 ** 3 / (3 * 210e9 * 1e-5))
+
+
+def test_solve_endpoint_has_the_execute_response_shape():
+    client = TestClient(main.app)
+    response = client.post("/api/step/solve", json={"problem": PROBLEM, "parameters": PARAMETERS})
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body["computational_result"]) == {"output", "artifacts", "data"}
+    assert body["solver"]["name"] == "beam"
+    assert len(body["computational_result"]["data"]["deflection"]) == 201
+
+    response = client.post("/api/step/solve", json={"problem": "A truss", "parameters": {"nodes": 4}})
+    assert response.status_code == 400 and response.json()["error_code"] == "NO_BUILTIN_SOLVER"
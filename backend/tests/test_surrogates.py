@@ -0,0 +1,104 @@
+import asyncio
+import sys
+from unittest.mock import MagicMock, patch
+
+sys.modules['matlab'] = MagicMock()
+sys.modules['matlab.engine'] = MagicMock()
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import main
+from backend.benchmark import PARAMETERS, PROBLEM
+from backend.optimization_workflow import run_optimization_workflow
+from backend.surrogates import SurrogateStore, scalar_results
+
+
+def tip_deflection(L, I):
+    return -1000.0 * L ** 3 / (3 * 210e9 * I)
+
+
+def filled_store(root, points=40):
+    store = SurrogateStore(str(root))
+    rng = np.random.default_rng(0)
+    for _ in range(points):
+        L, I = rng.uniform(5, 15), 10 ** rng.uniform(-6, -4)
+        store.record("Cantilever", "script-a", {"L": L, "I": I, "E": 210e9, "F": 1000.0, "support": "cantilever"},
+                     {"max_deflection": tip_deflection(L, I), "deflection": np.zeros(5)})
+    return store
+
+
+def test_only_finite_scalars_are_modelled():
+    assert scalar_results({"a": 1, "b": np.float32(2.5), "c": np.ones(3), "d": np.array([4.0]),
+                           "e": float("nan"), "f": True, "g": "text"}) == {"a": 1.0, "b": 2.5, "d": 4.0}
+
+
+def test_predictions_interpolate_with_uncertainty_and_persist(tmp_path):
+    filled_store(tmp_path)
+    # A new store reads the index back from disk; the key ignores case and spacing of the problem
+    store = SurrogateStore(str(tmp_path))
+    estimate = store.predict(" cantilever", {"L": 10.0, "I": 1e-5, "E": 210e9, "F": 1000.0, "support": "cantilever"})
+    assert estimate["points"] == 40 and not estimate["extrapolating"]
+    prediction = estimate["predictions"]["max_deflection"]
+    assert prediction["method"] == "gp"
+    assert abs(prediction["mean"] - tip_deflection(10.0, 1e-5)) < 3 * prediction["std"] + 1e-3
+    assert "deflection" not in estimate["predictions"]
+
+    # Far from the data the estimate is less certain
+    far = store.predict("Cantilever", {"L": 40.0, "I": 1e-2, "E": 210e9, "F": 1000.0, "support": "cantilever"})
+    assert far["extrapolating"] and far["predictions"]["max_deflection"]["std"] > prediction["std"]
+
+    # Other descriptive parameters or parameter names are other problems
+    query = {"L": 10.0, "I": 1e-5, "E": 210e9, "F": 1000.0}
+    assert store.predict("Cantilever", {**query, "support": "fixed"}) is None
+    assert store.predict("Cantilever", {**query, "support": "cantilever", "q": 1.0}) is None
+    assert store.predict("Cantilever", {**query, "support": "cantilever"}, "script-b") is None
+
+
+def test_repeated_parameters_replace_points_and_the_index_is_bounded(tmp_path):
+    store = SurrogateStore(str(tmp_path), max_points=3)
+    for value in (1.0, 2.0, 3.0, 2.0):
+        store.record("p", "s", {"x": value}, {"y": value * 10})
+    store.record("p", "s", {"x": 2.0}, {"y": 21.0, "z": 5.0})
+    estimate = store.predict("p", {"x": 2.0})
+    assert estimate["points"] == 3
+    assert estimate["predictions"]["y"]["mean"] == pytest.approx(21.0, abs=0.5)
+    assert estimate["predictions"]["z"] == {"mean": 5.0, "std": None, "points": 1, "method": "nearest"}
+    assert not store.record("p", "s", {"name": "x"}, {"y": 1.0})
+
+
+def test_optimizer_warm_starts_from_parameters_that_met_the_goal(tmp_path):
+    store = filled_store(tmp_path)
+    expected = store.nearest_satisfying("Cantilever", {**PARAMETERS, "support": "cantilever"},
+                                        lambda results: results["max_deflection"] > -0.05)
+    assert tip_deflection(expected["parameters"]["L"], expected["parameters"]["I"]) > -0.05
+
+    runs = []
+
+    async def fake_workflow(provider, model, problem, parameters, solver_preference, data_filepath):
+        runs.append(dict(parameters))
+        return {"execution_result": {"data": {"max_deflection": tip_deflection(parameters["L"], parameters["I"])}}}
+
+    with patch("backend.optimization_workflow.surrogate_store", store), \
+            patch("backend.optimization_workflow.run_engineering_workflow", fake_workflow):
+        result = asyncio.run(run_optimization_workflow(
+            "mock", "m", "Cantilever", {**PARAMETERS, "support": "cantilever"}, "python",
+            "max_deflection > -0.05", warm_start=True))
+    assert result["status"] == "success" and len(runs) == 1
+    assert result["warm_start"] == expected
+    assert runs[0]["L"] == expected["parameters"]["L"]
+
+
+def test_workflow_runs_feed_the_predict_endpoint(tmp_path):
+    store = SurrogateStore(str(tmp_path))
+    client = TestClient(main.app)
+    body = {"problem": PROBLEM, "parameters": PARAMETERS}
+    with patch.object(main, "surrogate_store", store):
+        missing = client.post("/api/surrogate/predict", json=body)
+        assert missing.status_code == 400 and missing.json()["error_code"] == "NO_SURROGATE_DATA"
+        for I in (1e-5, 2e-5, 4e-5, 8e-5):
+            assert client.post("/api/step/solve", json={**body, "parameters": {**PARAMETERS, "I": I}}).status_code == 200
+        estimate = client.post("/api/surrogate/predict", json={**body, "parameters": {**PARAMETERS, "I": 3e-5}}).json()
+    assert estimate["script"] == "builtin-beam-cantilever" and estimate["points"] == 4
+    assert estimate["predictions"]["max_deflection"]["mean"] == pytest.approx(tip_deflection(10.0, 3e-5), rel=0.1)
@@ -0,0 +1,65 @@
+import json
+import sys
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+sys.modules['matlab'] = MagicMock()
+sys.modules['matlab.engine'] = MagicMock()
+
+from backend import tracing
+from backend.main import app, AppError, ErrorCodes
+
+client = TestClient(app)
+REMOTE_TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+
+def _post_call_ai(headers=None):
+    return client.post(
+        "/api/call-ai",
+        json={"provider": "google", "model": "m", "task": "modeling", "data": {}},
+        headers=headers or {},
+    )
+
+
+def test_request_continues_remote_trace_and_nests_llm_span():
+    exporter = tracing.InMemorySpanExporter()
+    with patch.object(tracing, "tracer", tracing.Tracer(exporter, export_interval=3600)) as tracer, \
+            patch("backend.main.load_prompt", return_value="ping"), \
+            patch("backend.main.call_gemini_api", return_value="pong"):
+        response = _post_call_ai({"traceparent": f"00-{REMOTE_TRACE_ID}-00f067aa0ba902b7-01"})
+        tracer.flush()
+
+    assert response.headers["X-Trace-Id"] == REMOTE_TRACE_ID
+    spans = {span["name"]: span for span in exporter.spans}
+    server, llm = spans["POST /api/call-ai"], spans["llm.call"]
+    assert server["parentSpanId"] == "00f067aa0ba902b7"
+    assert llm["traceId"] == REMOTE_TRACE_ID
+    assert llm["parentSpanId"] == server["spanId"]
+    assert {"key": "gen_ai.system", "value": {"stringValue": "google"}} in llm["attributes"]
+
+
+def test_app_error_payload_includes_trace_id():
+    def fail(model, prompt):
+        raise AppError(ErrorCodes.AI_API_ERROR, "boom")
+
+    with patch("backend.main.load_prompt", return_value="ping"), patch("backend.main.call_gemini_api", side_effect=fail):
+        response = _post_call_ai()
+
+    assert response.status_code == 400
+    assert response.json()["trace_id"] == response.headers["X-Trace-Id"]
+
+
+def test_file_exporter_writes_otlp_json(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = tracing.Tracer(tracing.FileSpanExporter(str(path)), export_interval=3600)
+    with tracer.start_span("outer"):
+        with tracer.start_span("inner", attributes={"iteration": 1}):
+            pass
+    tracer.flush()
+
+    payload = json.loads(path.read_text())
+    spans = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [span["name"] for span in spans] == ["inner", "outer"]
+    assert spans[0]["parentSpanId"] == spans[1]["spanId"]
+    assert spans[0]["attributes"] == [{"key": "iteration", "value": {"intValue": "1"}}]
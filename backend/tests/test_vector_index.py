@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from backend.vector_index import VectorIndex
+from backend.vector_index_benchmark import synthetic_embeddings
+
+
+@pytest.mark.parametrize("quantization", ["int8", "binary"])
+def test_quantized_search_reranks_to_the_exact_results(quantization, tmp_path):
+    vectors = synthetic_embeddings(3000, 96, clusters=50)
+    exact = VectorIndex("none")
+    quantized = VectorIndex(quantization, str(tmp_path), rerank_factor=30)
+    for start in range(0, len(vectors), 700):
+        exact.add(vectors[start:start + 700])
+        quantized.add(vectors[start:start + 700])
+
+    rng = np.random.default_rng(1)
+    hits = 0
+    for query in vectors[rng.integers(0, len(vectors), 20)] + rng.normal(size=(20, 96)):
+        expected, expected_scores = exact.search(query, 5)
+        found, scores = quantized.search(query, 5)
+        hits += len(np.intersect1d(found, expected))
+        # Scores of the re-ranked results are the exact cosine similarities
+        np.testing.assert_allclose(scores, vectors[found] @ query / np.linalg.norm(vectors[found], axis=1)
+                                   / np.linalg.norm(query), rtol=1e-4)
+    assert hits >= 0.95 * 20 * 5
+    assert quantized.memory_bytes * (4 if quantization == "int8" else 20) < exact.memory_bytes * 1.1
+
+
+def test_binary_codes_follow_the_median_of_all_vectors(tmp_path):
+    rng = np.random.default_rng(2)
+    # The first batch sits on one side of the data, so it is a poor centre for the rest
+    vectors = np.concatenate([rng.normal(size=(50, 32)) + 3, rng.normal(size=(950, 32))]).astype(np.float32)
+    index = VectorIndex("binary", str(tmp_path))
+    for start in range(0, len(vectors), 50):
+        index.add(vectors[start:start + 50])
+
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    added = index._centered_count
+    assert added > 500
+    np.testing.assert_allclose(index._center, np.median(normalized[:added], axis=0), atol=1e-6)
+    index._consolidate()
+    fresh = VectorIndex("binary")
+    fresh._center = index._center
+    np.testing.assert_array_equal(index._codes[:added], fresh._quantize(normalized[:added])[0])
+    assert len(index._codes) == len(index) == len(vectors)
+
+
+def test_empty_and_small_indexes():
+    index = VectorIndex("binary")
+    assert len(index.search(np.ones(8), 3)[0]) == 0
+    index.add(np.eye(8)[:2])
+    found, scores = index.search(np.array([0, 1, 0, 0, 0, 0, 0, 0.1]), 3)
+    assert list(found) == [1, 0]
+    assert scores[0] == pytest.approx(1 / np.sqrt(1.01))
+    with pytest.raises(ValueError):
+        index.add(np.ones((1, 4)))
+    with pytest.raises(ValueError):
+        VectorIndex("float16")
@@ -0,0 +1,279 @@
+"""
+Lightweight span tracing, compatible with OpenTelemetry.
+
+Trace and span ids follow the W3C Trace Context format, so a `traceparent`
+header from a caller is continued and the ids can be looked up in any
+OpenTelemetry backend. Finished spans are exported in batches from a
+background thread as OTLP/JSON, either appended to a file (which the
+collector's otlpjsonfile receiver can read) or posted to an OTLP/HTTP
+endpoint.
+"""
+import configparser
+import contextvars
+import functools
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import requests
+
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+SPAN_KINDS = {"INTERNAL": 1, "SERVER": 2, "CLIENT": 3}
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: str = "INTERNAL", attributes: Dict[str, Any] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.events: List[Dict[str, Any]] = []
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_status(self, status: int, message: str = ""):
+        self.status = status
+        self.status_message = message
+
+    def record_exception(self, exc: BaseException):
+        self.events.append({
+            "name": "exception",
+            "time_ns": time.time_ns(),
+            "attributes": {"exception.type": type(exc).__name__, "exception.message": str(exc)},
+        })
+        self.set_status(STATUS_ERROR, str(exc))
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KINDS.get(self.kind, 1),
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": _otlp_attributes(self.attributes),
+            "events": [
+                {"name": event["name"], "timeUnixNano": str(event["time_ns"]), "attributes": _otlp_attributes(event["attributes"])}
+                for event in self.events
+            ],
+            "status": {"code": self.status, "message": self.status_message} if self.status_message else {"code": self.status},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class FileSpanExporter:
+    """Appends one OTLP/JSON export request per batch to a file."""
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def export(self, payload: Dict[str, Any]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(payload, separators=(",", ":")) + "\n")
+
+
+class OtlpHttpSpanExporter:
+    """Posts batches to an OTLP/HTTP collector, e.g. http://localhost:4318/v1/traces."""
+    def __init__(self, endpoint: str, timeout: float = 5):
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def export(self, payload: Dict[str, Any]):
+        requests.post(self.endpoint, json=payload, timeout=self.timeout)
+
+
+class InMemorySpanExporter:
+    """Keeps exported spans in a list; used by tests."""
+    def __init__(self):
+        self.spans: List[Dict[str, Any]] = []
+
+    def export(self, payload: Dict[str, Any]):
+        for resource_spans in payload["resourceSpans"]:
+            for scope_spans in resource_spans["scopeSpans"]:
+                self.spans.extend(scope_spans["spans"])
+
+
+class Tracer:
+    """
+    Creates spans and hands finished ones to an exporter.
+
+    Spans are queued when they end and exported from a daemon thread every
+    `export_interval` seconds (or once `max_batch_size` are waiting), so
+    request handling never waits on file or network I/O. Without an
+    exporter, spans are still created (trace ids are still returned to
+    clients) but nothing is written.
+    """
+    def __init__(self, exporter=None, service_name: str = "archimedes-backend",
+                 export_interval: float = 2.0, max_batch_size: int = 512, max_queue_size: int = 8192):
+        self.exporter = exporter
+        self.service_name = service_name
+        self.export_interval = export_interval
+        self.max_batch_size = max_batch_size
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._wakeup = threading.Event()
+        self._export_lock = threading.Lock()
+        self.dropped_spans = 0
+        if exporter is not None:
+            threading.Thread(target=self._export_loop, name="span-exporter", daemon=True).start()
+
+    @contextmanager
+    def start_span(self, name: str, kind: str = "INTERNAL", attributes: Dict[str, Any] = None, traceparent: str = None):
+        """
+        Starts a span as a child of the current one (or of `traceparent`,
+        for spans continuing a remote trace) and makes it current for the
+        with-block. Exceptions are recorded on the span and re-raised.
+        """
+        parent = _current_span.get()
+        remote = TRACEPARENT_PATTERN.match(traceparent.strip().lower()) if traceparent else None
+        if remote:
+            trace_id, parent_id = remote.group(1), remote.group(2)
+        elif parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        else:
+            trace_id, parent_id = secrets.token_hex(16), None
+
+        span = Span(name, trace_id, parent_id, kind, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            self._enqueue(span)
+
+    def flush(self):
+        """Exports all queued spans now."""
+        if self.exporter is None:
+            return
+        with self._export_lock:
+            while True:
+                batch = self._drain()
+                if not batch:
+                    return
+                self._export(batch)
+
+    def _enqueue(self, span: Span):
+        if self.exporter is None:
+            return
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped_spans += 1
+            return
+        if self._queue.qsize() >= self.max_batch_size:
+            self._wakeup.set()
+
+    def _drain(self) -> List[Span]:
+        batch = []
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _export_loop(self):
+        while True:
+            self._wakeup.wait(self.export_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # Losing a batch of spans must never affect request handling
+                print(f"Warning: span export failed: {e}")
+
+    def _export(self, spans: List[Span]):
+        self.exporter.export({
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": [span.to_otlp() for span in spans]}],
+            }]
+        })
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span is not None else None
+
+
+def start_span(name: str, kind: str = "INTERNAL", attributes: Dict[str, Any] = None, traceparent: str = None):
+    """Starts a span on the shared tracer."""
+    return tracer.start_span(name, kind=kind, attributes=attributes, traceparent=traceparent)
+
+
+def traced(name: str, kind: str = "INTERNAL"):
+    """Decorator running each call of an async function in its own span."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with start_span(name, kind=kind):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    encoded = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            encoded_value = {"boolValue": value}
+        elif isinstance(value, int):
+            encoded_value = {"intValue": str(value)}
+        elif isinstance(value, float):
+            encoded_value = {"doubleValue": value}
+        else:
+            encoded_value = {"stringValue": str(value)}
+        encoded.append({"key": key, "value": encoded_value})
+    return encoded
+
+
+def create_tracer() -> Tracer:
+    config = configparser.ConfigParser()
+    config.read('backend/config.ini')
+    section = config['TRACING'] if config.has_section('TRACING') else {}
+    exporter_name = (section.get('exporter') or "none").lower()
+    if exporter_name == "file":
+        exporter = FileSpanExporter(section.get('export_path') or "traces.jsonl")
+    elif exporter_name == "otlp_http":
+        exporter = OtlpHttpSpanExporter(section.get('endpoint') or "http://localhost:4318/v1/traces")
+    else:
+        exporter = None
+    return Tracer(
+        exporter,
+        service_name=section.get('service_name') or "archimedes-backend",
+        export_interval=float(section.get('export_interval_seconds', 2.0)),
+    )
+
+
+# Shared tracer used by the HTTP middleware, the workflows and the agents
+tracer = create_tracer()
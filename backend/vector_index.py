@@ -0,0 +1,180 @@
+import tempfile
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+
+QUANTIZATIONS = ("none", "int8", "binary")
+# Rows of codes scored per step; the float32 copy of a block of int8 codes stays in cache
+SCORE_BLOCK_ROWS = 2048
+# Binary codes are re-encoded around a new centre each time the index grows this many times over
+RECENTER_GROWTH = 2
+# Vectors, evenly spaced over the index, whose median is the centre
+CENTER_SAMPLE_ROWS = 65536
+# Bits set in each byte value, for NumPy versions without bitwise_count
+POPCOUNT_TABLE = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return POPCOUNT_TABLE[values.view(np.uint8)].reshape(*values.shape, -1).sum(axis=-1)
+
+
+class VectorIndex:
+    """
+    Cosine-similarity search over embeddings, with the vectors kept in
+    memory in one of three forms:
+
+    - "none": float32, searched exactly (4 bytes per dimension);
+    - "int8": each vector scaled so its largest component is 127 and
+      rounded, plus its scale (1 byte per dimension);
+    - "binary": the signs of the components after subtracting the median
+      of the vectors, so that each bit splits them in half (1 bit per
+      dimension), compared by Hamming distance. The median is taken again
+      and every vector re-encoded whenever the index has doubled, so the
+      first batches added do not fix it for good.
+
+    With int8 or binary codes the best `rerank_factor * top_k` (at least
+    `min_candidates`) vectors by code are re-scored exactly with their
+    float32 values, which are appended to a temporary file in `directory`
+    and read back through a memory map only for those candidates.
+    """
+    def __init__(self, quantization: str = "none", directory: Optional[str] = None,
+                 rerank_factor: int = 10, min_candidates: int = 50):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"quantization must be one of {QUANTIZATIONS}, not {quantization!r}")
+        self.quantization = quantization
+        self.directory = directory
+        self.rerank_factor = rerank_factor
+        self.min_candidates = min_candidates
+        self.dimensions = None
+        self._count = 0
+        self._blocks = []
+        self._codes = None
+        self._scales = None
+        self._center = None
+        self._centered_count = 0
+        self._file = None
+        self._memmap = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes held in memory for the first-stage search."""
+        self._consolidate()
+        if self._codes is None:
+            return 0
+        return self._codes.nbytes + (self._scales.nbytes if self._scales is not None else 0)
+
+    def add(self, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) == 0:
+            return
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms > 0, norms, 1)
+        with self._lock:
+            if self.dimensions is None:
+                self.dimensions = vectors.shape[1]
+            elif vectors.shape[1] != self.dimensions:
+                raise ValueError(f"Expected {self.dimensions}-dimensional vectors, got {vectors.shape[1]}")
+
+            if self.quantization != "none":
+                self._append_to_file(vectors)
+            self._count += len(vectors)
+            if self.quantization == "binary" and self._count >= RECENTER_GROWTH * self._centered_count:
+                self._recenter()
+                return
+            self._blocks.append((vectors, None) if self.quantization == "none" else self._quantize(vectors))
+
+    def search(self, query: np.ndarray, top_k: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (indices, cosine similarities) of the top_k vectors, best first."""
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(query)
+        query = query / norm if norm > 0 else query
+        with self._lock:
+            self._consolidate()
+            if self._count == 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            if self.quantization == "none":
+                return self._top(self._codes @ query, top_k)
+
+            candidates = min(self._count, max(top_k * self.rerank_factor, self.min_candidates))
+            indices, _ = self._top(self._code_scores(query), candidates)
+            # Sorted reads from the memory map, then the exact order
+            indices = np.sort(indices)
+            exact = self._full_vectors()[indices] @ query
+            order, scores = self._top(exact, top_k)
+            return indices[order], scores
+
+    def _code_scores(self, query: np.ndarray) -> np.ndarray:
+        """Approximate scores, higher is better: int8 dot products or negated Hamming distances."""
+        scores = np.empty(self._count, dtype=np.float32)
+        if self.quantization == "binary":
+            bits = np.packbits((query - self._center) > 0)
+            bits = np.pad(bits, (0, (-len(bits)) % 8)).view(np.uint64)
+            for start in range(0, self._count, SCORE_BLOCK_ROWS):
+                block = self._codes[start:start + SCORE_BLOCK_ROWS]
+                scores[start:start + len(block)] = -_popcount(block ^ bits).sum(axis=1, dtype=np.int32)
+            return scores
+        buffer = np.empty((SCORE_BLOCK_ROWS, self.dimensions), dtype=np.float32)
+        for start in range(0, self._count, SCORE_BLOCK_ROWS):
+            block = self._codes[start:start + SCORE_BLOCK_ROWS]
+            np.copyto(buffer[:len(block)], block, casting="unsafe")
+            np.dot(buffer[:len(block)], query, out=scores[start:start + len(block)])
+        return scores * self._scales
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.quantization == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1
+            return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        bits = np.packbits((vectors - self._center) > 0, axis=1)
+        # Whole 64-bit words per row, so Hamming distances take one XOR per word
+        padding = (-bits.shape[1]) % 8
+        return np.pad(bits, ((0, 0), (0, padding))).view(np.uint64), None
+
+    def _recenter(self):
+        """Takes the median of a sample of the vectors added as the centre and re-encodes them all from the file."""
+        vectors = self._full_vectors()
+        sample = vectors[::max(self._count // CENTER_SAMPLE_ROWS, 1)]
+        self._center = np.median(sample, axis=0).astype(np.float32)
+        self._codes = np.concatenate([self._quantize(vectors[start:start + SCORE_BLOCK_ROWS])[0]
+                                      for start in range(0, self._count, SCORE_BLOCK_ROWS)])
+        self._blocks = []
+        self._centered_count = self._count
+
+    def _consolidate(self):
+        if not self._blocks:
+            return
+        with self._lock:
+            codes = [self._codes] if self._codes is not None else []
+            codes += [block for block, _ in self._blocks]
+            self._codes = np.concatenate(codes)
+            if self.quantization == "int8":
+                scales = [self._scales] if self._scales is not None else []
+                self._scales = np.concatenate(scales + [scales_ for _, scales_ in self._blocks])
+            self._blocks = []
+
+    def _append_to_file(self, vectors: np.ndarray):
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(dir=self.directory, prefix="vectors-")
+        self._file.seek(0, 2)
+        self._file.write(vectors.tobytes())
+        self._file.flush()
+        self._memmap = None
+
+    def _full_vectors(self) -> np.ndarray:
+        if self._memmap is None:
+            self._memmap = np.memmap(self._file, dtype=np.float32, mode="r", shape=(self._count, self.dimensions))
+        return self._memmap
+
+    @staticmethod
+    def _top(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, len(scores))
+        indices = np.argpartition(-scores, k - 1)[:k]
+        indices = indices[np.argsort(-scores[indices], kind="stable")]
+        return indices, scores[indices]
@@ -0,0 +1,124 @@
+"""
+Benchmark of the VectorIndex quantization modes against exact search.
+
+    python -m backend.vector_index_benchmark --vectors 100000 --dimensions 768 --output vector_index_benchmark.json
+
+The embeddings are synthetic: clusters around `--clusters` random centres
+plus an offset shared by all vectors, as sentence embeddings have, and
+the queries are perturbed copies of indexed vectors. For each mode and
+rerank factor the report gives the memory held for first-stage search per
+million vectors, the median and 95th percentile query latency, and the
+recall@k against exact float32 search; the first row is the search
+KnowledgeBase did before, on float64 embeddings. Recall on real model
+embeddings differs; run it on an exported matrix with --embeddings.
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .vector_index import QUANTIZATIONS, VectorIndex
+
+
+def synthetic_embeddings(count: int, dimensions: int = 768, clusters: int = 1000, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dimensions)).astype(np.float32)
+    offset = 2 * rng.normal(size=dimensions).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, count)] + 0.8 * rng.normal(size=(count, dimensions)).astype(np.float32)
+    return vectors + offset
+
+
+def run_mode(vectors: np.ndarray, queries: np.ndarray, truth: List[np.ndarray], quantization: str,
+             rerank_factor: int, top_k: int) -> Dict:
+    index = VectorIndex(quantization, rerank_factor=rerank_factor, min_candidates=top_k)
+    started = time.perf_counter()
+    for start in range(0, len(vectors), 10000):
+        index.add(vectors[start:start + 10000])
+    build_seconds = time.perf_counter() - started
+    index.search(queries[0], top_k)
+
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        found, _ = index.search(query, top_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        recalls.append(len(np.intersect1d(found, expected)) / top_k)
+    return {
+        "quantization": quantization,
+        "rerank_factor": rerank_factor if quantization != "none" else None,
+        "memory_mb_per_million": round(index.memory_bytes / len(vectors) * 1e6 / 2 ** 20, 1),
+        "build_s": round(build_seconds, 2),
+        "latency_ms": {"p50": round(float(np.percentile(latencies, 50)), 2),
+                       "p95": round(float(np.percentile(latencies, 95)), 2)},
+        f"recall_at_{top_k}": round(float(np.mean(recalls)), 4),
+    }
+
+
+def run_legacy(vectors: np.ndarray, queries: np.ndarray, top_k: int) -> Dict:
+    """
+    The search KnowledgeBase did before VectorIndex: float64 after vstack,
+    norms on every query. (It also divided an (N, 1) array by an (N,) one,
+    building an (N, N) matrix; the scores here are taken as it meant them.)
+    """
+    embeddings = vectors.astype(np.float64)
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        scores = np.dot(embeddings, query[None, :].T).ravel() / (
+            np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query))
+        np.argsort(scores.flatten())[-top_k:][::-1]
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {
+        "quantization": "legacy float64",
+        "memory_mb_per_million": round(embeddings.nbytes / len(vectors) * 1e6 / 2 ** 20, 1),
+        "latency_ms": {"p50": round(float(np.percentile(latencies, 50)), 2),
+                       "p95": round(float(np.percentile(latencies, 95)), 2)},
+    }
+
+
+def run(count: int, dimensions: int, queries: int = 100, top_k: int = 10,
+        rerank_factors: List[int] = (4, 10, 30), embeddings: Optional[str] = None, seed: int = 0) -> Dict:
+    if embeddings:
+        vectors = np.load(embeddings, mmap_mode="r")[:count].astype(np.float32)
+    else:
+        vectors = synthetic_embeddings(count, dimensions, seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    picked = vectors[rng.integers(0, len(vectors), queries)]
+    query_vectors = picked + 0.5 * rng.normal(size=picked.shape).astype(np.float32) * picked.std()
+
+    exact = VectorIndex("none")
+    exact.add(vectors)
+    truth = [exact.search(query, top_k)[0] for query in query_vectors]
+    results = [run_legacy(vectors, query_vectors, top_k), run_mode(vectors, query_vectors, truth, "none", 0, top_k)]
+    for quantization in QUANTIZATIONS[1:]:
+        results.extend(run_mode(vectors, query_vectors, truth, quantization, factor, top_k)
+                       for factor in rerank_factors)
+    return {"vectors": len(vectors), "dimensions": vectors.shape[1], "queries": queries, "results": results}
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark of quantized embedding search.")
+    parser.add_argument("--vectors", type=int, default=100000, help="indexed vectors")
+    parser.add_argument("--dimensions", type=int, default=768, help="dimensions of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rerank-factors", nargs="+", type=int, default=[4, 10, 30])
+    parser.add_argument("--embeddings", help="an (N, D) .npy matrix of real embeddings instead of synthetic ones")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = run(args.vectors, args.dimensions, args.queries, args.top_k, args.rerank_factors, args.embeddings)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
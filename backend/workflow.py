@@ -1,14 +1,119 @@
+import asyncio
+import configparser
 import json
-from typing import Dict, Any
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List
 
 from fastapi import HTTPException
 
-from .agents import PythonAgent
+from .agents import ExecutionResult, PythonAgent, analyze_data, results_to_json
 from .MATLABAgent import MATLABAgent
 from .AbaqusAgent import AbaqusAgent
+from . import metrics, tracing
+from .admission import admission_controller
 from .main import call_ai_provider
+from .solvers import builtin_solvers_enabled, match_solver, run_builtin
+from .surrogates import script_hash, surrogate_store
+from .script_checks import extract_code, format_problems, load_allowed_imports, validate_script
 
+DEFAULT_MAX_FIX_ATTEMPTS = 3
 
+
+@contextmanager
+def _workflow_step(step: str):
+    """Times a workflow step and records it as a span of the current trace."""
+    with tracing.start_span(f"workflow.{step}"), metrics.WORKFLOW_STEP_SECONDS.time(step=step):
+        yield
+
+
+def max_fix_attempts() -> int:
+    config = configparser.ConfigParser()
+    config.read('backend/config.ini')
+    section = config['SANDBOX'] if config.has_section('SANDBOX') else {}
+    return int(section.get('max_fix_attempts', DEFAULT_MAX_FIX_ATTEMPTS))
+
+
+def _mean_sandbox_seconds() -> float:
+    """Mean wall time of failed Python sandbox runs so far (of all runs if none failed yet)."""
+    for status in ("failure", "success"):
+        count = metrics.SANDBOX_RUN_SECONDS.count(solver="python", status=status)
+        if count:
+            return metrics.SANDBOX_RUN_SECONDS.sum(solver="python", status=status) / count
+    return 0.0
+
+
+@tracing.traced("script_fix_loop")
+async def run_script_with_fixes(
+    provider: str,
+    model: str,
+    script: str,
+    parameters: Dict[str, Any],
+    data_filepath: str = None,
+    max_attempts: int = DEFAULT_MAX_FIX_ATTEMPTS,
+    agent: PythonAgent = None,
+) -> Dict[str, Any]:
+    """
+    Checks a generated script statically, runs it in the sandbox only if
+    the checks pass, and on either kind of failure asks the model for a
+    fixed script, for up to `max_attempts` attempts in all.
+
+    Returns the last script and its ExecutionResult (a failed one carrying
+    the problems if it never reached the sandbox) with a report of the
+    attempts, including the sandbox time saved by the attempts rejected
+    before it, estimated from the mean duration of failed sandbox runs.
+    """
+    agent = agent or PythonAgent()
+    allowed_imports = load_allowed_imports()
+    attempts: List[Dict[str, Any]] = []
+    rejected = 0
+    for attempt in range(1, max(max_attempts, 1) + 1):
+        code = extract_code(script)
+        started = time.perf_counter()
+        problems = validate_script(code, parameters, allowed_imports)
+        if problems:
+            rejected += 1
+            error = format_problems(problems)
+            execution_result = ExecutionResult(success=False, output="", error=error)
+            metrics.SCRIPT_ATTEMPTS.inc(stage="validation", result="rejected")
+            attempts.append({"attempt": attempt, "stage": "validation", "success": False,
+                             "problems": [problem.to_dict() for problem in problems],
+                             "ms": round((time.perf_counter() - started) * 1000, 3)})
+        else:
+            with _workflow_step("execution"):
+                async with admission_controller.resource("sandbox"):
+                    execution_result = await asyncio.to_thread(agent.run, code, parameters, data_filepath)
+            error = execution_result.error
+            metrics.SCRIPT_ATTEMPTS.inc(stage="execution", result="success" if execution_result.success else "failure")
+            attempts.append({"attempt": attempt, "stage": "execution", "success": execution_result.success,
+                             "error": None if execution_result.success else error[-2000:],
+                             "ms": round((time.perf_counter() - started) * 1000, 3)})
+            if execution_result.success:
+                break
+        if attempt < max_attempts:
+            fix_prompt = (
+                "The following Python simulation script failed"
+                f" {'static checks before running' if problems else 'when run'}.\n"
+                f"Parameters (available as `params`): {json.dumps(parameters)}\n"
+                f"```python\n{code}```\nError:\n```\n{error[-4000:]}\n```\n"
+                "Return the complete corrected script in a single ```python code block."
+            )
+            with _workflow_step("script_fix"):
+                script = await call_ai_provider(provider, model, fix_prompt)
+    return {
+        "script": code,
+        "execution_result": execution_result,
+        "report": {
+            "attempts": attempts,
+            "attempt_count": len(attempts),
+            "sandbox_runs": len(attempts) - rejected,
+            "rejected_before_sandbox": rejected,
+            "estimated_seconds_saved": round(rejected * _mean_sandbox_seconds(), 3),
+        },
+    }
+
+
+@tracing.traced("engineering_workflow")
 async def run_engineering_workflow(
     provider: str,
     model: str,
@@ -20,65 +125,96 @@ async def run_engineering_workflow(
     """
     Runs the full engineering modeling and simulation workflow.
     """
-    # Step 1: Modeling (remains the same)
-    modeling_result = await call_ai_provider(
-        provider,
-        model,
-        f"Problem: {problem}\nParameters: {json.dumps(parameters)}"
-    )
-
-    # Step 2: Model Review (remains the same)
-    model_review_result = await call_ai_provider(
-        provider,
-        model,
-        f"Modeling Result:\n{modeling_result}"
-    )
-
-    # Step 3: Simulation Script Generation
-    script_generation_prompt_map = {
-        "python": "generate_python_solution",
-        "matlab": "generate_matlab_script",
-        "abaqus": "generate_abaqus_script",
-    }
-    script_generation_task = script_generation_prompt_map.get(solver_preference)
-    if not script_generation_task:
-        raise HTTPException(status_code=400, detail=f"Invalid solver preference: {solver_preference}")
-
-    simulation_script = await call_ai_provider(
-        provider,
-        model,
-        f"Modeling Result:\n{modeling_result}\nParameters: {json.dumps(parameters)}",
-    )
-
-    # Step 4: Execute Simulation
-    # Force python solver for now
-    agent = PythonAgent()
-    execution_result = agent.run(simulation_script, parameters, data_filepath)
-    # if solver_preference == "python":
-    #     agent = PythonAgent()
-    #     execution_result = agent.run(simulation_script, parameters, data_filepath)
-    # elif solver_preference == "matlab":
-    #     agent = MATLABAgent()
-    #     execution_result = agent.run(simulation_script, parameters)
-    # elif solver_preference == "abaqus":
-    #     agent = AbaqusAgent()
-    #     # Abaqus script execution might need a file path
-    #     with open("abaqus_script.py", "w") as f:
-    #         f.write(simulation_script)
-    #     execution_result = agent.run("abaqus_script.py", parameters)
-    # else:
-    #     raise HTTPException(status_code=400, detail="Invalid solver preference.")
+    # Canonical problems with a closed-form solution skip steps 1-4
+    builtin = None
+    if solver_preference == "python" and builtin_solvers_enabled():
+        builtin = match_solver(parameters, problem)
+    execution_result = None
+    if builtin is not None:
+        with _workflow_step("builtin_solver"):
+            execution_result = run_builtin(builtin)
+    if execution_result is not None and execution_result.success:
+        modeling_result = builtin.description
+        model_review_result = "Closed-form solution of a standard problem; no review needed."
+        simulation_script = None
+        script_attempts = None
+    else:
+        # Not matched, or not solvable in closed form for these parameters
+        builtin = None
+        # Step 1: Modeling (remains the same)
+        with _workflow_step("modeling"):
+            modeling_result = await call_ai_provider(
+                provider,
+                model,
+                f"Problem: {problem}\nParameters: {json.dumps(parameters)}"
+            )
+
+        # Step 2: Model Review (remains the same)
+        with _workflow_step("model_review"):
+            model_review_result = await call_ai_provider(
+                provider,
+                model,
+                f"Modeling Result:\n{modeling_result}"
+            )
+
+        # Step 3: Simulation Script Generation
+        script_generation_prompt_map = {
+            "python": "generate_python_solution",
+            "matlab": "generate_matlab_script",
+            "abaqus": "generate_abaqus_script",
+        }
+        script_generation_task = script_generation_prompt_map.get(solver_preference)
+        if not script_generation_task:
+            raise HTTPException(status_code=400, detail=f"Invalid solver preference: {solver_preference}")
+
+        with _workflow_step("script_generation"):
+            simulation_script = await call_ai_provider(
+                provider,
+                model,
+                f"Modeling Result:\n{modeling_result}\nParameters: {json.dumps(parameters)}",
+            )
+
+        # Step 4: Execute Simulation, fixing the script if it fails
+        # Force python solver for now
+        fixed = await run_script_with_fixes(provider, model, simulation_script, parameters, data_filepath,
+                                            max_fix_attempts())
+        simulation_script = fixed["script"]
+        execution_result = fixed["execution_result"]
+        script_attempts = fixed["report"]
+        # if solver_preference == "python":
+        #     agent = PythonAgent()
+        #     execution_result = agent.run(simulation_script, parameters, data_filepath)
+        # elif solver_preference == "matlab":
+        #     agent = MATLABAgent()
+        #     execution_result = agent.run(simulation_script, parameters)
+        # elif solver_preference == "abaqus":
+        #     agent = AbaqusAgent()
+        #     # Abaqus script execution might need a file path
+        #     with open("abaqus_script.py", "w") as f:
+        #         f.write(simulation_script)
+        #     execution_result = agent.run("abaqus_script.py", parameters)
+        # else:
+        #     raise HTTPException(status_code=400, detail="Invalid solver preference.")
 
     if not execution_result.success:
         raise HTTPException(status_code=400, detail=f"{solver_preference} execution failed: {execution_result.error}")
+    # Feeds the surrogate estimates and optimizer warm starts of later requests
+    script_key = f"builtin-{builtin.name}-{builtin.variant}" if builtin is not None else script_hash(simulation_script)
+    await asyncio.to_thread(surrogate_store.record, problem, script_key, parameters, execution_result.data)
 
     # Step 5: Parse and Analyze Results
-    parsing_prompt = f"Solver: {solver_preference}\nOutput:\n{execution_result.output}"
-    analysis_result = await call_ai_provider(
-        provider,
-        model,
-        parsing_prompt,
-    )
+    solver_name = f"built-in {builtin.name}" if builtin is not None else solver_preference
+    if execution_result.data:
+        # The numbers are already structured, so no model call is needed to read them out of stdout
+        with _workflow_step("analysis"):
+            analysis_result = analyze_data(solver_name, execution_result.data)
+    else:
+        with _workflow_step("analysis"):
+            analysis_result = await call_ai_provider(
+                provider,
+                model,
+                f"Solver: {solver_name}\nOutput:\n{execution_result.output}",
+            )
 
     return {
         "modeling_result": modeling_result,
@@ -87,7 +223,10 @@ async def run_engineering_workflow(
         "execution_result": {
             "output": execution_result.output,
             "error": execution_result.error,
-            "image": execution_result.image,
+            "artifacts": execution_result.artifacts,
+            "data": results_to_json(execution_result.data),
         },
         "analysis_result": analysis_result,
+        "script_attempts": script_attempts,
+        "builtin_solver": builtin.to_dict() if builtin is not None else None,
     }
@@ -78,28 +78,64 @@ window.app.api = {
         }
     },
 
-    stepModel: async function(provider, model, problem, parameters) {
+    compileLatex: async function(latex, sessionId = null, figures = {}) {
+        const url = `${this.BASE_URL}/api/compile-latex`;
+        const response = await fetch(url, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ latex, session_id: sessionId, figures })
+        });
+        if (!response.ok) {
+            // Compile errors come back as a structured AppError with the TeX error lines
+            const errorData = await response.json();
+            const error = new Error(errorData.message || `LaTeX compilation failed: ${response.status}`);
+            error.isAppError = true;
+            error.errorData = errorData;
+            throw error;
+        }
+        return await response.blob();
+    },
+
+    createSession: async function() {
+        const url = `${this.BASE_URL}/api/sessions`;
+        return this.post(url, {});
+    },
+
+    // With a server session, step results stay on the server and are not uploaded again
+    stepModel: async function(provider, model, problem, parameters, knowledgeBase = null, sessionId = null) {
         const url = `${this.BASE_URL}/api/step/model`;
         const requestBody = { provider, model, problem, parameters };
-        return this.post(url, requestBody);
+        return this.postStep(url, requestBody, sessionId && { ...requestBody, session_id: sessionId });
     },
 
-    stepGenerateScript: async function(provider, model, modeling_result, parameters, knowledgeBase, revised_content = null) {
+    stepGenerateScript: async function(provider, model, modeling_result, parameters, knowledgeBase, revised_content = null, sessionId = null) {
         const url = `${this.BASE_URL}/api/step/generate-script`;
-        const requestBody = { provider, model, modeling_result, parameters, knowledge_base: knowledgeBase, revised_content: revised_content };
-        return this.post(url, requestBody);
+        const requestBody = { provider, model, parameters, knowledge_base: knowledgeBase, revised_content: revised_content };
+        return this.postStep(url, { ...requestBody, modeling_result }, sessionId && { ...requestBody, session_id: sessionId });
     },
 
-    stepExecute: async function(script, parameters, data_filepath) {
+    stepExecute: async function(script, parameters, data_filepath, sessionId = null) {
         const url = `${this.BASE_URL}/api/step/execute`;
-        const requestBody = { script, parameters, data_filepath };
-        return this.post(url, requestBody);
+        const requestBody = { parameters, data_filepath };
+        return this.postStep(url, { ...requestBody, script }, sessionId && { ...requestBody, session_id: sessionId });
     },
 
-    stepSynthesize: async function(provider, model, history) {
+    stepSynthesize: async function(provider, model, history, sessionId = null) {
         const url = `${this.BASE_URL}/api/step/synthesize`;
-        const requestBody = { provider, model, history };
-        return this.post(url, requestBody);
+        return this.postStep(url, { provider, model, history }, sessionId && { provider, model, session_id: sessionId });
+    },
+
+    // Sends a step with its session; if the server no longer has the session (a restart,
+    // or it expired), sends the full input instead and carries on without a session
+    postStep: async function(url, fullBody, sessionBody = null) {
+        if (!sessionBody) return this.post(url, fullBody);
+        try {
+            return await this.post(url, sessionBody);
+        } catch (error) {
+            if (!error.isAppError || error.errorData.error_code !== 'SESSION_NOT_FOUND') throw error;
+            window.app.state.workflow.sessionId = null;
+            return this.post(url, fullBody);
+        }
     },
 
     post: async function(url, body) {
@@ -111,17 +147,18 @@ window.app.api = {
             });
             if (!response.ok) {
                 // Try to parse the structured error, but have a fallback
+                let errorData = null;
                 try {
-                    const errorData = await response.json();
-                    // Create an error object that includes the structured data
-                    const error = new Error(errorData.message || 'API request failed');
-                    error.isAppError = true;
-                    error.errorData = errorData;
-                    throw error;
+                    errorData = await response.json();
                 } catch (e) {
                     // If parsing fails, throw a generic error
                     throw new Error(`API request failed with status ${response.status}`);
                 }
+                // Create an error object that includes the structured data
+                const error = new Error(errorData.message || 'API request failed');
+                error.isAppError = true;
+                error.errorData = errorData;
+                throw error;
             }
             return await response.json();
         } catch (error) {
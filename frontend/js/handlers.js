@@ -37,7 +37,10 @@ window.app.handlers = {
         const knowledgeBase = this.getKnowledgeBaseContent();
 
         try {
-            const result = await window.app.api.stepModel(provider, model, problem, parameters, knowledgeBase);
+            // Without a server session every step falls back to sending its full input
+            const session = await window.app.api.createSession().catch(() => null);
+            window.app.state.workflow.sessionId = session ? session.session_id : null;
+            const result = await window.app.api.stepModel(provider, model, problem, parameters, knowledgeBase, window.app.state.workflow.sessionId);
             window.app.state.workflow.history['step-model'] = result;
             this.displayStepResult('step-model', result);
         } catch (error) {
@@ -113,14 +116,15 @@ window.app.handlers = {
         const parameters = window.app.parameters.getParameters();
         const knowledgeBase = this.getKnowledgeBaseContent();
         const history = window.app.state.workflow.history;
+        const sessionId = window.app.state.workflow.sessionId;
 
         try {
             let result;
             if (step === 'step-model') {
-                result = await window.app.api.stepModel(provider, model, revisedContent, parameters, knowledgeBase);
+                result = await window.app.api.stepModel(provider, model, revisedContent, parameters, knowledgeBase, sessionId);
             } else if (step === 'step-generate-script') {
                 const modelingResult = history['step-model'].computational_result;
-                result = await window.app.api.stepGenerateScript(provider, model, modelingResult, parameters, knowledgeBase, revisedContent);
+                result = await window.app.api.stepGenerateScript(provider, model, modelingResult, parameters, knowledgeBase, revisedContent, sessionId);
             }
             // Add other steps as needed
 
@@ -145,6 +149,7 @@ window.app.handlers = {
         const provider = window.app.state.systemState.aiConfig.provider;
         const model = window.app.state.systemState.aiConfig.model;
         const history = window.app.state.workflow.history;
+        const sessionId = window.app.state.workflow.sessionId;
         const knowledgeBase = this.getKnowledgeBaseContent();
 
         try {
@@ -152,7 +157,7 @@ window.app.handlers = {
             if (step === 'step-generate-script') {
                 const modelingResult = history['step-model'].computational_result;
                 const parameters = window.app.parameters.getParameters();
-                result = await window.app.api.stepGenerateScript(provider, model, modelingResult, parameters, knowledgeBase);
+                result = await window.app.api.stepGenerateScript(provider, model, modelingResult, parameters, knowledgeBase, null, sessionId);
             } else if (step === 'step-execute') {
                 const script = history['step-generate-script'].computational_result;
                 const parameters = window.app.parameters.getParameters();
@@ -163,9 +168,9 @@ window.app.handlers = {
                     const uploadResult = await window.app.api.uploadData(file);
                     filePath = uploadResult.filepath;
                 }
-                result = await window.app.api.stepExecute(script, parameters, filePath);
+                result = await window.app.api.stepExecute(script, parameters, filePath, sessionId);
             } else if (step === 'step-synthesize') {
-                result = await window.app.api.stepSynthesize(provider, model, history, knowledgeBase);
+                result = await window.app.api.stepSynthesize(provider, model, history, sessionId);
             }
 
             window.app.state.workflow.history[step] = result;
@@ -205,6 +210,7 @@ window.app.handlers = {
         window.app.state.activeSessionId = sessionId;
         // Reset for new session
         window.app.state.workflow.history = {};
+        window.app.state.workflow.sessionId = null;
         window.app.state.workflow.currentStep = 'step-model';
         window.app.state.knowledge.files = [];
         this.saveStateToLocalStorage();
@@ -5,6 +5,8 @@ window.app.state = {
         currentStep: 'step-model',
         stepOrder: ['step-model', 'step-generate-script', 'step-execute', 'step-synthesize'],
         history: {},
+        // Server-side session holding the step results (see /api/sessions)
+        sessionId: null,
         getNextStep: function(current) {
             const currentIndex = this.stepOrder.indexOf(current);
             if (currentIndex < this.stepOrder.length - 1) {
@@ -59,6 +61,9 @@ window.app.state = {
             { value: 'gpt-4-turbo', text: 'GPT-4 Turbo' },
             { value: 'gpt-4', text: 'GPT-4' },
             { value: 'gpt-3.5-turbo', text: 'GPT-3.5 Turbo' }
+        ],
+        auto: [
+            { value: 'auto', text: 'Configured targets' }
         ]
     },
     initializeState: function() {
@@ -122,6 +122,7 @@ window.app.ui = {
                 <strong>${message.error_code || 'Error'}</strong>
                 <p>${message.message}</p>
                 ${message.suggestion ? `<p><em>Suggestion: ${message.suggestion}</em></p>` : ''}
+                ${message.trace_id ? `<p><small>Trace ID: ${message.trace_id}</small></p>` : ''}
             `;
         } else {
             // Simple string message
@@ -252,6 +253,25 @@ window.app.ui = {
         });
     },
 
+    renderArtifacts: function(artifacts) {
+        if (!artifacts || artifacts.length === 0) return '';
+        const baseUrl = window.app.api.BASE_URL;
+        const escapeHtml = window.app.utils.escapeHtml;
+        const items = artifacts.map(artifact => {
+            // The generated script chooses the file names
+            const name = escapeHtml(artifact.name);
+            const url = escapeHtml(`${baseUrl}${artifact.url}`);
+            if (artifact.thumbnail_url) {
+                return `<a class="artifact-preview" href="${url}" target="_blank" rel="noopener" title="${name}">
+                    <img src="${escapeHtml(`${baseUrl}${artifact.thumbnail_url}`)}" alt="${name}" loading="lazy">
+                </a>`;
+            }
+            const sizeKb = (artifact.size / 1024).toFixed(1);
+            return `<a class="artifact-link" href="${url}" download="${name}">${name} (${sizeKb} KB)</a>`;
+        }).join('');
+        return `<div class="result-part artifacts"><h4>Artifacts:</h4><div class="artifact-list">${items}</div></div>`;
+    },
+
     displayStepResult: function(step, result) {
         const resultsContainer = document.getElementById('results-container');
         const resultDiv = document.createElement('div');
@@ -261,7 +281,10 @@ window.app.ui = {
         let contentHtml = '';
         if (result.computational_result) {
              if (typeof result.computational_result === 'object') {
-                contentHtml += `<div class="result-part"><h4>Computational Result:</h4><pre><code>${JSON.stringify(result.computational_result, null, 2)}</code></pre></div>`;
+                // Artifacts are rendered as links/previews and fetched on demand, not dumped as JSON
+                const { artifacts, ...computationalResult } = result.computational_result;
+                contentHtml += `<div class="result-part"><h4>Computational Result:</h4><pre><code>${JSON.stringify(computationalResult, null, 2)}</code></pre></div>`;
+                contentHtml += this.renderArtifacts(artifacts);
             } else {
                 contentHtml += `<div class="result-part"><h4>Computational Result:</h4><div class="result-content-editable">${result.computational_result}</div></div>`;
             }
@@ -32,6 +32,16 @@ window.app.utils = {
             .replace(/\^/g, '\\textasciicircum{}');
     },
 
+    // For text and attribute values put into HTML markup
+    escapeHtml: function(text) {
+        return String(text)
+            .replace(/&/g, '&amp;')
+            .replace(/</g, '&lt;')
+            .replace(/>/g, '&gt;')
+            .replace(/"/g, '&quot;')
+            .replace(/'/g, '&#39;');
+    },
+
     convertToLatex: function(markdownText) {
         if (typeof markdownText !== 'string') return '';
         return markdownText
@@ -1,32 +1,33 @@
+import sys
+
 import numpy as np
 
-# These are the 2D points from the isometric drawing
-# In a real application, these would be detected from the image
-P2D = np.array([
-    [256, 100], [156, 150], [156, 250], [256, 300],
-    [356, 250], [356, 150]
-])
+from backend.drawing import extract_lines, ink_mask, load_grayscale, stroke_width
+from backend.isometric import junctions_from_segments, reconstruct
+
+# generate_isometric_cube.py draws its axes with a 2:1 slope
+CUBE_ANGLE = float(np.degrees(np.arctan(0.5)))
 
-# This is the inverse of the isometric projection matrix
-# It allows us to go from 2D isometric coordinates back to 3D coordinates
-# This is a simplified version and assumes a standard isometric projection
-inv_iso_matrix = np.array([
-    [1, -0.5, -0.5],
-    [0, np.sqrt(3)/2, -np.sqrt(3)/2],
-    [1, 1, 1]  # This row is not used in this simplified example
-])
 
-# For a cube, we can infer the 3D coordinates by assuming the lengths of the sides
-# This is a very simplified example. A real system would need more complex logic.
-# We assume the origin is at the bottom point (256, 300)
-origin_2d = np.array([256, 300])
-p0 = np.array([256, 300, 0]) # Let's assume this is the origin in 3D
+def reconstruct_isometric(image_path, angle=CUBE_ANGLE):
+    """
+    Reconstructs the 3D vertices of an isometric line drawing.
+    """
+    gray = load_grayscale(image_path)
+    segments = extract_lines(gray)
+    # Line ends of thick strokes stop up to a stroke width away from the corner
+    points, edges = junctions_from_segments(segments, tolerance=max(5.0, 2 * stroke_width(ink_mask(gray))))
+    model = reconstruct(points, edges, angle=angle)
+    print(f"Found {len(points)} junctions and {len(edges)} edges "
+          f"({int(np.sum(model.axes >= 0))} parallel to a model axis).")
+    # Put the lowest corner at the origin
+    vertices = model.vertices - model.vertices.min(axis=0)
+    for (x, y), vertex in zip(points, vertices):
+        print(f"({x:6.1f}, {y:6.1f}) -> ({vertex[0]:7.1f}, {vertex[1]:7.1f}, {vertex[2]:7.1f})")
+    if model.components > 1:
+        print(f"{model.components} separate groups of vertices: their depths relative to each other are not known.")
+    return model
 
-# This is a placeholder for a more complex reconstruction logic
-# For now, we will just print the 2D points
-print("Detected 2D points:")
-print(P2D)
 
-print("\n3D reconstruction from a single isometric view is a complex problem.")
-print("This script is a placeholder to demonstrate the concept.")
-print("A full implementation would require more advanced algorithms.")
+if __name__ == '__main__':
+    reconstruct_isometric(sys.argv[1] if len(sys.argv) > 1 else 'isometric_cube.png')